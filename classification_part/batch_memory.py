@@ -0,0 +1,36 @@
+import argparse
+import tracemalloc
+
+import numpy as np
+
+from vgg_jpeg_keras.generators import DCTGeneratorJPEG2DCT
+
+parser = argparse.ArgumentParser(description="Allocation volume, host memory and host-to-device bytes per batch of DCTGeneratorJPEG2DCT for the former and the compact batch layouts.")
+parser.add_argument("data_directory", help="The ImageNet directory to read the images from (one sub-directory per class).")
+parser.add_argument("index_file", help="The json file matching the class ids and the class names.")
+parser.add_argument("-nb", "--numberOfBatches", help="The number of batches to measure for each layout.", type=int, default=10)
+parser.add_argument("-bs", "--batchSize", help="The size of the batches.", type=int, default=32)
+
+args = parser.parse_args()
+
+layouts = [("int32, one-hot labels, fresh arrays (former)", {"dtype": np.int32, "sparse_labels": False, "buffer_ring_size": 0}),
+           ("int16, one-hot labels, fresh arrays", {"dtype": np.int16, "sparse_labels": False, "buffer_ring_size": 0}),
+           ("int16, sparse labels, ring of 2 buffers", {"dtype": np.int16, "sparse_labels": True, "buffer_ring_size": 2})]
+
+for name, layout in layouts:
+    generator = DCTGeneratorJPEG2DCT(args.data_directory, args.index_file, batch_size=args.batchSize, shuffle=False, **layout)
+    # Fills the ring (if any) before measuring
+    generator[0]
+
+    allocated, host, transferred = [], [], []
+    for i in range(args.numberOfBatches):
+        tracemalloc.start()
+        X, y = generator[i]
+        allocated.append(tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+        host.append(sum(array.nbytes for array in X) + y.nbytes)
+        # Keras casts the inputs and the labels to the float32 of the model placeholders before copying them to the device
+        transferred.append(sum(array.astype(np.float32).nbytes for array in X + [y]))
+
+    print("{}: {:.2f} MB allocated per batch, {:.2f} MB in host memory per batch, {:.2f} MB to the device per batch".format(
+        name, np.mean(allocated) / 1024 ** 2, np.mean(host) / 1024 ** 2, np.mean(transferred) / 1024 ** 2))
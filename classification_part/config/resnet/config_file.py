@@ -85,6 +85,8 @@ class TrainingConfiguration(TemplateConfiguration):
         self._validation_generator = None
 
         self._horovod = None
+        # Seed of the per-epoch permutations of the samples, shared by all the horovod ranks
+        self.sampling_seed = 0
 
     def add_csv_logger(self,
                        output_path,
@@ -147,7 +149,12 @@ class TrainingConfiguration(TemplateConfiguration):
         self._batch_size = self._batch_size // self.batch_size_divider
         self._steps_per_epoch = self._steps_per_epoch // (
             hvd.size() // self.batch_size_divider)
-        self._validation_steps = 3 * self._validation_steps // hvd.size()
+
+    def distributed_sampling(self):
+        """ Returns the arguments of the generators giving each horovod rank a disjoint shard of the samples."""
+        if self._horovod is None:
+            return {}
+        return {"rank": self._horovod.rank(), "number_of_ranks": self._horovod.size(), "seed": self.sampling_seed}
 
     def prepare_for_inference(self):
         pass
@@ -163,13 +170,17 @@ class TrainingConfiguration(TemplateConfiguration):
         #transformations=[rotate, brightness_augment, elastic_transform]
         # transformations=None
         if not self.deconv:
-            self._train_generator = DCTGeneratorJPEG2DCT(self.train_directory, self.index_file, self._batch_size, scale=True, transformations=transformations)
+            self._train_generator = DCTGeneratorJPEG2DCT(self.train_directory, self.index_file, self._batch_size, scale=True, transformations=transformations, **self.distributed_sampling())
             self._validation_generator = DCTGeneratorJPEG2DCT(
-            self.validation_directory, self.index_file, self._batch_size, scale=False)
+            self.validation_directory, self.index_file, self._batch_size, scale=False, **self.distributed_sampling())
         else:
-            self._train_generator = DCTGeneratorJPEG2DCTDeconv(self.train_directory, self.index_file, self._batch_size, scale=True, transformations=transformations)
+            self._train_generator = DCTGeneratorJPEG2DCTDeconv(self.train_directory, self.index_file, self._batch_size, scale=True, transformations=transformations, **self.distributed_sampling())
             self._validation_generator = DCTGeneratorJPEG2DCTDeconv(
-            self.validation_directory, self.index_file, self._batch_size, scale=False)
+            self.validation_directory, self.index_file, self._batch_size, scale=False, **self.distributed_sampling())
+
+        # With horovod, every rank validates on its own shard and MetricAverageCallback averages the metrics
+        if self._horovod is not None:
+            self._validation_steps = len(self._validation_generator)
 
 
     @property
@@ -74,6 +74,8 @@ class TrainingConfiguration(TemplateConfiguration):
         self._validation_generator = None
 
         self._horovod = None
+        # Seed of the per-epoch permutations of the samples, shared by all the horovod ranks
+        self.sampling_seed = 0
 
     def add_csv_logger(self,
                        output_path,
@@ -136,7 +138,12 @@ class TrainingConfiguration(TemplateConfiguration):
         self._batch_size = self._batch_size // self.batch_size_divider
         self._steps_per_epoch = self._steps_per_epoch // (
             hvd.size() // self.batch_size_divider)
-        self._validation_steps = 3 * self._validation_steps // hvd.size()
+
+    def distributed_sampling(self):
+        """ Returns the arguments of the generators giving each horovod rank a disjoint shard of the samples."""
+        if self._horovod is None:
+            return {}
+        return {"rank": self._horovod.rank(), "number_of_ranks": self._horovod.size(), "seed": self.sampling_seed}
 
     def prepare_for_inference(self):
         pass
@@ -149,10 +156,14 @@ class TrainingConfiguration(TemplateConfiguration):
 
     def prepare_training_generators(self):
         self._train_generator = DCTGeneratorJPEG2DCT(
-            self.train_directory, self.index_file, self._batch_size, scale=True)
+            self.train_directory, self.index_file, self._batch_size, scale=True, **self.distributed_sampling())
 
         self._validation_generator = DCTGeneratorJPEG2DCT(
-            self.validation_directory, self.index_file, self._batch_size, scale=False)
+            self.validation_directory, self.index_file, self._batch_size, scale=False, **self.distributed_sampling())
+
+        # With horovod, every rank validates on its own shard and MetricAverageCallback averages the metrics
+        if self._horovod is not None:
+            self._validation_steps = len(self._validation_generator)
 
     @property
     def train_generator(self):
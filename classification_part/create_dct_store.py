@@ -0,0 +1,23 @@
+import argparse
+
+from vgg_jpeg_keras.generators import create_dct_store
+from vgg_jpeg_keras.generators import dct_store_size
+
+parser = argparse.ArgumentParser(description="Converts an ImageNet directory into a memory-mapped store of DCT coefficients, to be read with DCTGeneratorMemmap.")
+parser.add_argument("data_directory", help="The ImageNet directory to convert (one sub-directory per class).")
+parser.add_argument("index_file", help="The json file matching the class ids and the class names.")
+parser.add_argument("store_directory", help="The directory to write the store to.")
+parser.add_argument("-tl", "--targetLength", help="The side of the samples, in pixels.", type=int, default=224)
+parser.add_argument("-sl", "--shardLength", help="The number of samples per shard.", type=int, default=10000)
+parser.add_argument("-w", "--workers", help="The number of processes used for the conversion.", type=int, default=4)
+
+args = parser.parse_args()
+
+number_of_samples = create_dct_store(args.data_directory,
+                                     args.index_file,
+                                     args.store_directory,
+                                     target_length=args.targetLength,
+                                     shard_length=args.shardLength,
+                                     workers=args.workers)
+
+print("{} samples written to {} ({:.2f} GB).".format(number_of_samples, args.store_directory, dct_store_size(args.store_directory) / 1024 ** 3))
@@ -0,0 +1,44 @@
+import argparse
+import time
+
+from vgg_jpeg_keras.generators import DCTGeneratorJPEG2DCT
+from vgg_jpeg_keras.generators import load_dct_crop
+
+parser = argparse.ArgumentParser(description="Compares the number of samples per second produced by the DCT-native and the pixel sample paths of DCTGeneratorJPEG2DCT.")
+parser.add_argument("data_directory", help="The ImageNet directory to read the images from (one sub-directory per class).")
+parser.add_argument("index_file", help="The json file matching the class ids and the class names.")
+parser.add_argument("-nb", "--numberOfBatches", help="The number of batches to generate for each path.", type=int, default=20)
+parser.add_argument("-bs", "--batchSize", help="The size of the batches.", type=int, default=32)
+parser.add_argument("-tl", "--targetLength", help="The side of the samples, in pixels.", type=int, default=224)
+parser.add_argument("--noScale", help="Resize the images to a square instead of the scale data-augmentation.", action="store_true")
+
+args = parser.parse_args()
+
+results = {}
+for dct_native in [False, True]:
+    generator = DCTGeneratorJPEG2DCT(args.data_directory,
+                                     args.index_file,
+                                     batch_size=args.batchSize,
+                                     shuffle=False,
+                                     scale=not args.noScale,
+                                     target_length=args.targetLength,
+                                     dct_native=dct_native)
+    number_of_batches = min(args.numberOfBatches, len(generator))
+
+    # The first batch warms up the file system cache for both runs
+    generator[0]
+
+    start = time.time()
+    for i in range(number_of_batches):
+        generator[i]
+    duration = time.time() - start
+
+    results[dct_native] = number_of_batches * args.batchSize / duration
+
+# Number of images that the DCT-native path can actually serve without falling back to the pixel path
+images_path = generator.images_path[:number_of_batches * args.batchSize]
+native_samples = sum(load_dct_crop(path, args.targetLength, scale=not args.noScale, flip=False) is not None for path in images_path)
+
+print("Pixel path: {:.1f} samples/sec".format(results[False]))
+print("DCT-native path: {:.1f} samples/sec ({}/{} samples served without re-encoding)".format(results[True], native_samples, len(images_path)))
+print("Speed-up: x{:.2f}".format(results[True] / results[False]))
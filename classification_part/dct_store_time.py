@@ -0,0 +1,39 @@
+import argparse
+import os
+import time
+
+from vgg_jpeg_keras.generators import DCTGeneratorJPEG2DCT
+from vgg_jpeg_keras.generators import DCTGeneratorMemmap
+from vgg_jpeg_keras.generators import dct_store_size
+
+parser = argparse.ArgumentParser(description="Compares the DCT store generator with the generator decoding the images on the fly.")
+parser.add_argument("data_directory", help="The ImageNet directory the store was created from.")
+parser.add_argument("index_file", help="The json file matching the class ids and the class names.")
+parser.add_argument("store_directory", help="The directory of the store created with create_dct_store.py.")
+parser.add_argument("-nb", "--numberOfBatches", help="The number of batches to generate for each generator.", type=int, default=20)
+parser.add_argument("-bs", "--batchSize", help="The size of the batches.", type=int, default=32)
+parser.add_argument("--deconv", help="Serve the separated Cb/Cr layout.", action="store_true")
+
+args = parser.parse_args()
+
+
+def samples_per_second(generator, number_of_batches):
+    generator[0]
+    start = time.time()
+    for i in range(number_of_batches):
+        generator[i]
+    return number_of_batches * generator.batch_size / (time.time() - start)
+
+
+def directory_size(directory):
+    return sum(os.path.getsize(os.path.join(root, filename)) for root, _, filenames in os.walk(directory) for filename in filenames)
+
+
+decoding_generator = DCTGeneratorJPEG2DCT(args.data_directory, args.index_file, batch_size=args.batchSize, scale=False, flip=False)
+store_generator = DCTGeneratorMemmap(args.store_directory, batch_size=args.batchSize, deconv=args.deconv)
+number_of_batches = min(args.numberOfBatches, len(decoding_generator), len(store_generator))
+
+print("JPEG files: {:.2f} GB, {:.1f} samples/sec".format(directory_size(args.data_directory) / 1024 ** 3,
+                                                          samples_per_second(decoding_generator, number_of_batches)))
+print("DCT store: {:.2f} GB, {:.1f} samples/sec".format(dct_store_size(args.store_directory) / 1024 ** 3,
+                                                         samples_per_second(store_generator, number_of_batches)))
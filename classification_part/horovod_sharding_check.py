@@ -0,0 +1,53 @@
+""" Checks the distributed sampling of DCTGeneratorJPEG2DCT with several local horovod processes, e.g. on CPU with
+the Gloo backend:
+
+    horovodrun --gloo -np 4 -H localhost:4 python horovod_sharding_check.py <data_directory> <index_file>
+
+For every epoch, the indexes read by all the ranks are gathered on rank 0, which checks that the shards have the
+same length, that they are disjoint apart from the padding and that they cover the whole dataset.
+"""
+import argparse
+
+import numpy as np
+
+import horovod.keras as hvd
+
+from vgg_jpeg_keras.generators import DCTGeneratorJPEG2DCT
+
+parser = argparse.ArgumentParser(description="Checks the sharding of the samples between the horovod ranks.")
+parser.add_argument("data_directory", help="The ImageNet directory (one sub-directory per class).")
+parser.add_argument("index_file", help="The json file matching the class ids and the class names.")
+parser.add_argument("-bs", "--batchSize", help="The size of the batches.", type=int, default=32)
+parser.add_argument("-e", "--epochs", help="The number of epochs to check.", type=int, default=3)
+parser.add_argument("-s", "--seed", help="The seed of the permutations.", type=int, default=0)
+
+args = parser.parse_args()
+
+hvd.init()
+
+generator = DCTGeneratorJPEG2DCT(args.data_directory, args.index_file, batch_size=args.batchSize, shuffle=True,
+                                 rank=hvd.rank(), number_of_ranks=hvd.size(), seed=args.seed)
+
+# Every rank must be able to build a batch out of its shard
+X, y = generator[0]
+
+number_of_samples = len(generator.images_path)
+previous_shards = None
+for epoch in range(args.epochs):
+    shards = hvd.allgather(np.asarray(generator.indexes, dtype=np.int64)[None])
+    batches = hvd.allgather(np.array([[len(generator)]], dtype=np.int64))
+
+    if hvd.rank() == 0:
+        assert shards.shape[0] == hvd.size(), "One shard per rank is expected."
+        assert len(np.unique(batches)) == 1, "The ranks have different numbers of batches: {}.".format(batches.ravel())
+        padding = shards.size - number_of_samples
+        assert 0 <= padding < hvd.size(), "The padding should be smaller than the number of ranks."
+        assert len(np.unique(shards)) == number_of_samples, "The shards do not cover the whole dataset."
+        assert previous_shards is None or not np.array_equal(shards, previous_shards), "The shards did not change between epochs."
+        print("Epoch {}: {} ranks x {} samples ({} of padding), {} batches per rank.".format(epoch, shards.shape[0], shards.shape[1], padding, batches[0, 0]))
+        previous_shards = shards
+
+    generator.on_epoch_end()
+
+if hvd.rank() == 0:
+    print("The shards are disjoint, equal and cover the dataset.")
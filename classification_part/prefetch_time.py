@@ -0,0 +1,41 @@
+import argparse
+import time
+
+import numpy as np
+
+from vgg_jpeg_keras.generators import DCTGeneratorJPEG2DCT, PrefetchGenerator
+
+parser = argparse.ArgumentParser(description="Batches per second of DCTGeneratorJPEG2DCT without and with PrefetchGenerator, with the prefetching counters.")
+parser.add_argument("data_directory", help="The ImageNet directory to read the images from (one sub-directory per class).")
+parser.add_argument("index_file", help="The json file matching the class ids and the class names.")
+parser.add_argument("-nb", "--numberOfBatches", help="The number of batches to read for each setting.", type=int, default=100)
+parser.add_argument("-bs", "--batchSize", help="The size of the batches.", type=int, default=32)
+parser.add_argument("-d", "--depth", help="The number of batches in flight.", type=int, default=4)
+parser.add_argument("-w", "--workers", help="The number of threads or processes building the batches.", type=int, default=4)
+parser.add_argument("-st", "--stepTime", help="The time of a simulated training step, in seconds.", type=float, default=0.1)
+
+args = parser.parse_args()
+
+settings = [("synchronous (former)", None),
+            ("threads", False),
+            ("processes, shared memory", True)]
+
+for name, use_processes in settings:
+    generator = DCTGeneratorJPEG2DCT(args.data_directory, args.index_file, batch_size=args.batchSize, shuffle=True)
+    if use_processes is not None:
+        generator = PrefetchGenerator(generator, depth=args.depth, workers=args.workers, use_processes=use_processes)
+        # Starts the workers before measuring
+        generator[0]
+        generator.reset_statistics()
+
+    start = time.time()
+    for i in range(1, args.numberOfBatches + 1):
+        X, y = generator[i]
+        time.sleep(args.stepTime)
+    duration = time.time() - start
+
+    print("{}: {:.2f} batches/s".format(name, args.numberOfBatches / duration))
+    if use_processes is not None:
+        statistics = generator.statistics()
+        print("    {} stalls, {:.2f} s stalled, {:.2f} batches ready on average".format(statistics["stalls"], statistics["stall_time"], statistics["mean_queue_depth"]))
+        generator.close()
@@ -3,6 +3,11 @@ from .generators import DCTGeneratorJPEG2DCTDeconv
 from .generators import DCTGeneratorImageNet
 from .generators import DummyGenerator
 from .generators import prepare_imagenet
+from .generators import dct_horizontal_flip
+from .generators import load_dct_crop
+from .generators import load_dct_pixels
+from .generators import load_dct_sample
+from .generators import shard_indexes
 from .helper import vertical_flip
 from .helper import horizontal_flip
 from .helper import lighting
@@ -12,4 +17,15 @@ from .helper import saturation
 from .helper import grayscale
 from .helper import rotate
 from .helper import brightness_augment
-from .helper import elastic_transform
\ No newline at end of file
+from .helper import elastic_transform
+from .buffers import BatchBufferRing
+from .buffers import allocate_batch
+from .prefetch import PrefetchGenerator
+
+from .dct_store import DCTGeneratorMemmap
+from .dct_store import create_dct_store
+from .dct_store import dct_store_size
+
+from .manifest import ImageNetManifest
+from .manifest import build_imagenet_manifest
+from .manifest import load_imagenet_manifest
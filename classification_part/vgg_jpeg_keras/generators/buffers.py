@@ -0,0 +1,41 @@
+""" Preallocated batch buffers for the generators."""
+
+import numpy as np
+
+
+class BatchBufferRing(object):
+    """ A ring of preallocated batch buffers, handed out in turn and filled in place by the generators.
+
+    A set of buffers is reused `size` batches after it was handed out, so `size` must be larger than the number of
+    batches alive at the same time, e.g. the `max_queue_size` of fit_generator plus the batch being trained on and
+    the batch being built when the generator runs in threads. With use_multiprocessing=True the batches are copied
+    to the main process and a ring of 1 is enough.
+
+    # Arguments:
+        - size: The number of sets of buffers in the ring.
+        - shapes: The shapes of the buffers of one set, the first dimension being the batch size.
+        - dtypes: The dtypes of the buffers of one set.
+    """
+
+    def __init__(self, size, shapes, dtypes):
+        self.buffers = [[np.empty(shape, dtype=dtype) for shape, dtype in zip(shapes, dtypes)] for _ in range(size)]
+        self.position = 0
+
+    def get(self):
+        """ Returns the next set of buffers of the ring."""
+        buffers = self.buffers[self.position]
+        self.position = (self.position + 1) % len(self.buffers)
+        return buffers
+
+
+def allocate_batch(shapes, dtypes, buffer_ring=None):
+    """ Returns the arrays of a batch, taken from the ring if any, freshly allocated otherwise.
+
+    # Arguments:
+        - shapes: The shapes of the arrays, the first dimension being the batch size.
+        - dtypes: The dtypes of the arrays.
+        - buffer_ring: A BatchBufferRing built with the same shapes and dtypes, or None.
+    """
+    if buffer_ring is None:
+        return [np.empty(shape, dtype=dtype) for shape, dtype in zip(shapes, dtypes)]
+    return buffer_ring.get()
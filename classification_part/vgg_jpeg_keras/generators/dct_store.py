@@ -0,0 +1,230 @@
+""" Memory-mapped store of precomputed DCT coefficients.
+
+The store is a directory containing fixed-shape int16 shards and an index file:
+    - index.json: the description of the store (shapes, number of samples, shards)
+    - labels.npy: the class id of every sample, int16
+    - y_XXXXX.dat: the Y coefficients of a shard, (shard_length, length / 8, length / 8, 64) int16
+    - cbcr_XXXXX.dat: the Cb and Cr coefficients of a shard, (shard_length, length / 16, length / 16, 128) int16
+"""
+import os
+import json
+from multiprocessing import Pool
+
+import numpy as np
+
+from template_keras.generators import TemplateGenerator
+
+from .manifest import load_imagenet_manifest
+from .generators import load_dct_pixels
+from .generators import HFLIP_SIGNS
+from .generators import shard_indexes
+
+INDEX_FILE = "index.json"
+LABELS_FILE = "labels.npy"
+STORE_DTYPE = np.int16
+
+
+def _load_store_sample(arguments):
+    image_path, target_length = arguments
+    dct_y, dct_cb, dct_cr = load_dct_pixels(image_path, target_length, scale=False, flip=False)
+    return dct_y, np.concatenate([dct_cb, dct_cr], axis=-1)
+
+
+def create_dct_store(data_directory, index_file, store_directory, target_length=224, shard_length=10000, workers=1):
+    """ Converts an ImageNet directory into a DCT store, the images are resized to target_length x target_length as
+    done by the generators with scale=False.
+
+    # Arguments:
+        - data_directory: The ImageNet directory to convert (one sub-directory per class).
+        - index_file: The json file matching the class ids and the class names.
+        - store_directory: The directory to write the store to.
+        - target_length: The side of the samples, in pixels.
+        - shard_length: The number of samples per shard.
+        - workers: The number of processes used to compute the coefficients.
+
+    # Returns:
+        The number of samples written.
+    """
+    manifest = load_imagenet_manifest(index_file, data_directory)
+
+    y_shape = (target_length // 8, target_length // 8, 64)
+    cbcr_shape = (target_length // 16, target_length // 16, 128)
+    int16_info = np.iinfo(STORE_DTYPE)
+
+    os.makedirs(store_directory, exist_ok=True)
+
+    labels = np.asarray(manifest.labels, dtype=STORE_DTYPE)
+    shards = []
+
+    with Pool(workers) as pool:
+        for shard_start in range(0, len(manifest), shard_length):
+            shard_paths = [manifest[i] for i in range(shard_start, min(shard_start + shard_length, len(manifest)))]
+            shard = {"y": "y_{:05d}.dat".format(len(shards)),
+                     "cbcr": "cbcr_{:05d}.dat".format(len(shards)),
+                     "length": len(shard_paths)}
+
+            y_map = np.memmap(os.path.join(store_directory, shard["y"]), dtype=STORE_DTYPE, mode="w+", shape=(len(shard_paths), *y_shape))
+            cbcr_map = np.memmap(os.path.join(store_directory, shard["cbcr"]), dtype=STORE_DTYPE, mode="w+", shape=(len(shard_paths), *cbcr_shape))
+
+            samples = pool.imap(_load_store_sample, [(path, target_length) for path in shard_paths], chunksize=64)
+            for i, (dct_y, dct_cbcr) in enumerate(samples):
+                if min(dct_y.min(), dct_cbcr.min()) < int16_info.min or max(dct_y.max(), dct_cbcr.max()) > int16_info.max:
+                    raise ValueError("The coefficients of {} do not fit in int16.".format(shard_paths[i]))
+                y_map[i] = dct_y
+                cbcr_map[i] = dct_cbcr
+
+            y_map.flush()
+            cbcr_map.flush()
+            del y_map, cbcr_map
+            shards.append(shard)
+
+    np.save(os.path.join(store_directory, LABELS_FILE), labels)
+
+    with open(os.path.join(store_directory, INDEX_FILE), "w") as index:
+        json.dump({"number_of_samples": len(manifest),
+                   "number_of_classes": len(manifest.association),
+                   "target_length": target_length,
+                   "shard_length": shard_length,
+                   "y_shape": y_shape,
+                   "cbcr_shape": cbcr_shape,
+                   "dtype": np.dtype(STORE_DTYPE).name,
+                   "shards": shards}, index, indent=4)
+
+    return len(manifest)
+
+
+def dct_store_size(store_directory):
+    """ Returns the size in bytes of the files of a DCT store."""
+    return sum(os.path.getsize(os.path.join(store_directory, filename)) for filename in os.listdir(store_directory))
+
+
+class DCTGeneratorMemmap(TemplateGenerator):
+    'Generates data in the DCT space for Keras from a store created with create_dct_store. The batches are gathered from memory-mapped shards, nothing is decoded on the fly.'
+
+    def __init__(self,
+                 store_directory,
+                 batch_size=32,
+                 shuffle=True,
+                 flip=False,
+                 deconv=False,
+                 sparse_labels=False,
+                 rank=0,
+                 number_of_ranks=1,
+                 seed=0):
+        with open(os.path.join(store_directory, INDEX_FILE)) as index:
+            self.index = json.load(index)
+
+        # External data
+        self._batch_size = batch_size
+        self._shuffle = shuffle
+        self._number_of_data_samples = self.index["number_of_samples"]
+
+        # Internal data
+        self.flip = flip
+        self.deconv = deconv
+        self.sparse_labels = sparse_labels
+        self.number_of_classes = self.index["number_of_classes"]
+        self.shard_length = self.index["shard_length"]
+        self.labels = np.load(os.path.join(store_directory, LABELS_FILE))
+        self.y_maps = []
+        self.cbcr_maps = []
+        for shard in self.index["shards"]:
+            self.y_maps.append(np.memmap(os.path.join(store_directory, shard["y"]), dtype=self.index["dtype"], mode="r",
+                                         shape=(shard["length"], *self.index["y_shape"])))
+            self.cbcr_maps.append(np.memmap(os.path.join(store_directory, shard["cbcr"]), dtype=self.index["dtype"], mode="r",
+                                            shape=(shard["length"], *self.index["cbcr_shape"])))
+
+        # Distributed sampling: with several ranks, each one reads its own shard of an epoch-seeded permutation
+        self.rank = rank
+        self.number_of_ranks = number_of_ranks
+        self.seed = seed
+        self.epoch = 0
+        self.indexes = shard_indexes(self._number_of_data_samples, rank, number_of_ranks, shuffle=False)
+        self.batches_per_epoch = len(self.indexes) // self._batch_size
+
+        # Initialization of the first batch
+        self.on_epoch_end()
+
+    @property
+    def batch_size(self):
+        return self._batch_size
+
+    @batch_size.setter
+    def batch_size(self, value):
+        self._batch_size = value
+
+    @property
+    def number_of_data_samples(self):
+        return self._number_of_data_samples
+
+    @number_of_data_samples.setter
+    def number_of_data_samples(self, value):
+        self._number_of_data_samples = value
+
+    @property
+    def shuffle(self):
+        return self._shuffle
+
+    @shuffle.setter
+    def shuffle(self, value):
+        self._shuffle = value
+
+    def __len__(self):
+        'Denotes the number of batches per epoch'
+        return self.batches_per_epoch
+
+    def __getitem__(self, index):
+        'Generate one batch of data'
+        return self.get_batch(index)
+
+    def get_batch(self, index, seed=None):
+        """ Generates the batch index. If a seed is given, the flips of the batch are drawn from a
+        np.random.RandomState(seed) of its own instead of the global NumPy random state.
+        """
+        # We have to use modulo to avoid overflowing the index size if we have too many batches per epoch
+        index = index % self.batches_per_epoch
+        indexes = self.indexes[index * self._batch_size:(index + 1) * self._batch_size]
+
+        # Generate data
+        X, y = self.__data_generation(indexes, np.random if seed is None else np.random.RandomState(seed))
+
+        return X, y
+
+    def on_epoch_end(self):
+        'Updates indexes after each epoch'
+        if self.number_of_ranks > 1:
+            self.indexes = shard_indexes(self._number_of_data_samples, self.rank, self.number_of_ranks,
+                                         epoch=self.epoch, seed=self.seed, shuffle=self._shuffle)
+            self.epoch += 1
+        elif self._shuffle == True:
+            np.random.shuffle(self.indexes)
+
+    def __data_generation(self, indexes, random_state):
+        'Generates data containing batch_size samples'
+        X_y = np.empty((len(indexes), *self.index["y_shape"]), dtype=self.index["dtype"])
+        X_cbcr = np.empty((len(indexes), *self.index["cbcr_shape"]), dtype=self.index["dtype"])
+
+        # One fancy indexing per shard, with sorted offsets to read the shard sequentially
+        shards, offsets = np.divmod(indexes, self.shard_length)
+        for shard in np.unique(shards):
+            batch_positions = np.flatnonzero(shards == shard)
+            batch_positions = batch_positions[np.argsort(offsets[batch_positions])]
+            X_y[batch_positions] = self.y_maps[shard][offsets[batch_positions]]
+            X_cbcr[batch_positions] = self.cbcr_maps[shard][offsets[batch_positions]]
+
+        # Horizontal flip in the DCT domain on half of the batch
+        if self.flip:
+            flipped = random_state.uniform(0, 1, len(indexes)) > 0.5
+            X_y[flipped] = X_y[flipped][:, :, ::-1] * HFLIP_SIGNS.astype(X_y.dtype)
+            X_cbcr[flipped] = X_cbcr[flipped][:, :, ::-1] * np.tile(HFLIP_SIGNS, 2).astype(X_cbcr.dtype)
+
+        if self.sparse_labels:
+            y = self.labels[indexes].astype(np.int32)
+        else:
+            y = np.zeros((len(indexes), self.number_of_classes), dtype=np.int32)
+            y[np.arange(len(indexes)), self.labels[indexes]] = 1
+
+        if self.deconv:
+            return [X_y, X_cbcr[..., :64], X_cbcr[..., 64:]], y
+
+        return [X_y, X_cbcr], y
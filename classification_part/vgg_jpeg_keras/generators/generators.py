@@ -12,6 +12,10 @@ from jpeg2dct.numpy import load, loads
 
 from template_keras.generators import TemplateGenerator
 
+from .buffers import BatchBufferRing
+from .buffers import allocate_batch
+from .manifest import load_imagenet_manifest
+
 def prepare_imagenet(index_file, data_directory):
 
     association = {}
@@ -35,6 +39,194 @@ def prepare_imagenet(index_file, data_directory):
     return association, classes, images_path
 
 
+def shard_indexes(number_of_samples, rank=0, number_of_ranks=1, epoch=0, seed=0, shuffle=True):
+    """ Returns the indexes of the samples read by one rank of a distributed training during one epoch.
+
+    All the ranks draw the same permutation of the samples from the seed and the epoch. The permutation is padded
+    by repeating its first samples to a multiple of number_of_ranks, then every rank takes one sample out of
+    number_of_ranks, starting at its rank. The shards are thus disjoint (apart from the padding) and all have the
+    same length.
+
+    # Arguments:
+        - number_of_samples: The number of samples of the dataset.
+        - rank: The rank of the process, e.g. hvd.rank().
+        - number_of_ranks: The number of processes, e.g. hvd.size().
+        - epoch: The epoch number, changes the permutation.
+        - seed: The seed of the permutations, must be the same for all the ranks.
+        - shuffle: Whether to permute the samples, if False the shards are taken in the order of the samples.
+    """
+    if shuffle:
+        indexes = np.random.RandomState((seed + epoch) % 2 ** 32).permutation(number_of_samples)
+    else:
+        indexes = np.arange(number_of_samples)
+    padded_length = -(-number_of_samples // number_of_ranks) * number_of_ranks
+    return np.resize(indexes, padded_length)[rank::number_of_ranks]
+
+
+# Sign applied to each of the 64 coefficients of a block (natural order, index = u * 8 + v) when the
+# block is mirrored horizontally: the basis functions with an odd horizontal frequency v are antisymmetric.
+HFLIP_SIGNS = np.array([1 if v % 2 == 0 else -1 for _ in range(8) for v in range(8)], dtype=np.int32)
+
+
+def dct_horizontal_flip(dct):
+    """ Flips horizontally a tensor of DCT blocks of shape (rows, cols, 64) without leaving the DCT domain.
+
+    The order of the block columns is reversed and the coefficients with an odd horizontal frequency change sign.
+    """
+    return dct[:, ::-1] * HFLIP_SIGNS
+
+
+def load_dct_crop(image_path, target_length, scale=True, flip=True, random_state=None):
+    """ Loads a training sample directly from the DCT coefficients stored in the JPEG file.
+
+    The crop is cut on the 16x16 MCU grid so that the luma and chroma blocks stay aligned, and the flip is done on
+    the coefficients. This is only possible when no rescale is needed, i.e. when the smallest side of the image is
+    already target_length (scale=True) or when the image is already target_length x target_length (scale=False),
+    and when the file is a 4:2:0 YCbCr JPEG.
+
+    # Arguments:
+        - image_path: The path to the JPEG image.
+        - target_length: The side of the square sample, in pixels.
+        - scale: If True, a random crop is taken along the longest side of the image.
+        - flip: If True, the sample is flipped horizontally with a probability of 0.5.
+        - random_state: The random.Random to draw the crop and the flip from, by default the random module.
+
+    # Returns:
+        The tuple (dct_y, dct_cb, dct_cr) or None if the sample can't be built in the DCT domain.
+    """
+    if random_state is None:
+        random_state = random
+
+    if target_length % 16 != 0:
+        return None
+
+    with Image.open(image_path) as im:
+        if im.format != "JPEG" or im.mode != "RGB":
+            return None
+        sampling = [(h, v) for _, h, v, _ in getattr(im, "layer", [])]
+        if sampling != [(2, 2), (1, 1), (1, 1)]:
+            return None
+        width, height = im.size
+
+    if scale:
+        if min(width, height) != target_length:
+            return None
+        # Same draw as the pixel path, restricted to the offsets on the MCU grid
+        offset = random_state.randint(0, (max(width, height) - target_length) // 16) * 16
+    else:
+        if width != target_length or height != target_length:
+            return None
+        offset = 0
+
+    try:
+        dct_y, dct_cb, dct_cr = load(image_path)
+    except (OSError, RuntimeError, ValueError):
+        return None
+
+    luma_length, chroma_length = target_length // 8, target_length // 16
+    luma_offset, chroma_offset = offset // 8, offset // 16
+
+    if width > height:
+        dct_y = dct_y[:luma_length, luma_offset:luma_offset + luma_length]
+        dct_cb = dct_cb[:chroma_length, chroma_offset:chroma_offset + chroma_length]
+        dct_cr = dct_cr[:chroma_length, chroma_offset:chroma_offset + chroma_length]
+    else:
+        dct_y = dct_y[luma_offset:luma_offset + luma_length, :luma_length]
+        dct_cb = dct_cb[chroma_offset:chroma_offset + chroma_length, :chroma_length]
+        dct_cr = dct_cr[chroma_offset:chroma_offset + chroma_length, :chroma_length]
+
+    if dct_y.shape[:2] != (luma_length, luma_length) or dct_cb.shape[:2] != (chroma_length, chroma_length):
+        return None
+
+    if flip and (random_state.uniform(0, 1) > 0.5):
+        dct_y = dct_horizontal_flip(dct_y)
+        dct_cb = dct_horizontal_flip(dct_cb)
+        dct_cr = dct_horizontal_flip(dct_cr)
+
+    return dct_y, dct_cb, dct_cr
+
+
+def load_dct_pixels(image_path, target_length, scale=True, flip=True, transformations=None, random_state=None):
+    """ Loads a training sample by decoding the image, applying the data-augmentation in the pixel domain and
+    re-encoding the result in memory to get its DCT coefficients.
+
+    # Arguments:
+        - image_path: The path to the image.
+        - target_length: The side of the square sample, in pixels.
+        - scale: If True, the image is rescaled so that its smallest side is target_length and randomly cropped,
+          otherwise it is resized to target_length x target_length.
+        - flip: If True, the sample is flipped horizontally with a probability of 0.5.
+        - transformations: A list of functions to apply to the image, each with a probability of 0.5.
+        - random_state: The random.Random to draw the crop, the flip and the transformations to apply from, by default
+          the random module. The transformations themselves draw from the global NumPy random state.
+
+    # Returns:
+        The tuple (dct_y, dct_cb, dct_cr).
+    """
+    if random_state is None:
+        random_state = random
+
+    # Load the image in RGB,
+    with Image.open(image_path) as im:
+
+        # Scale data-augmentation
+        im = im.convert("RGB")
+        if scale:
+            min_side = min(im.size)
+            scaling_ratio = target_length / min_side
+
+            width, height = im.size
+            im = im.resize((int(round(width * scaling_ratio)),
+                            int(round(height * scaling_ratio))))
+            offset = random_state.randint(0, max(im.size) - target_length)
+
+            if im.size[0] > im.size[1]:
+                im = im.crop((offset, 0, target_length + offset,
+                              target_length))
+            else:
+                im = im.crop((0, offset, target_length,
+                              target_length + offset))
+        else:
+            im = im.resize((int(target_length), int(target_length)))
+
+        # If the flip is required
+        if flip and (random_state.uniform(0, 1) > 0.5):
+            im = im.transpose(PIL.Image.FLIP_LEFT_RIGHT)
+
+        # If some image transformations are available
+        if transformations is not None:
+            im = np.array(im)
+            random_state.shuffle(transformations)
+            for transformation in transformations:
+                if random_state.uniform(0, 1) > 0.5:
+                    im = transformation(im)
+            im = Image.fromarray(im)
+            im = im.convert("RGB")
+
+        # Saving the file to ram and reloading it from there to avoid writing to disk
+        fake_file = BytesIO()
+        im.save(fake_file, format="jpeg")
+
+    return loads(fake_file.getvalue())
+
+
+def load_dct_sample(image_path, target_length, scale=True, flip=True, transformations=None, dct_native=True, random_state=None):
+    """ Loads a training sample, in the DCT domain when possible (see load_dct_crop), through the pixel domain
+    otherwise (rescale needed or photometric transformations requested, see load_dct_pixels). The random draws come
+    from random_state, by default the random module.
+
+    # Returns:
+        The tuple (dct_y, dct_cb, dct_cr).
+    """
+    if dct_native and transformations is None:
+        sample = load_dct_crop(image_path, target_length, scale=scale, flip=flip, random_state=random_state)
+        if sample is not None:
+            return sample
+
+    return load_dct_pixels(image_path, target_length, scale=scale, flip=flip, transformations=transformations, random_state=random_state)
+
+
+
 
 class DCTGeneratorJPEG2DCT(TemplateGenerator):
     'Generates data in the DCT space for Keras. This generator makes usage of the [following](https://github.com/uber-research/jpeg2dct) repository to read the jpeg images in the correct format.'
@@ -47,10 +239,20 @@ class DCTGeneratorJPEG2DCT(TemplateGenerator):
                  scale=True,
                  target_length=224,
                  flip=True,
-                 transformations=None):
-        # Process the index dictionary to get the matching name/class_id
-        self.association, self.classes, self.images_path = prepare_imagenet(
-            index_file, data_directory)
+                 transformations=None,
+                 dct_native=True,
+                 dtype=np.int32,
+                 sparse_labels=False,
+                 buffer_ring_size=0,
+                 manifest_root=None,
+                 check_classes=True,
+                 rank=0,
+                 number_of_ranks=1,
+                 seed=0):
+        # Load the cached manifest of the data directory to get the images and their class ids, rebuilt if an image was
+        # added to or removed from a class directory unless check_classes is False (see load_imagenet_manifest)
+        self.manifest = load_imagenet_manifest(index_file, data_directory, manifest_root=manifest_root, check_classes=check_classes)
+        self.association, self.classes, self.images_path = self.manifest.association, self.manifest.classes, self.manifest
 
         # External data
         self._batch_size = batch_size
@@ -63,9 +265,20 @@ class DCTGeneratorJPEG2DCT(TemplateGenerator):
         self.target_length = target_length
         self.flip = flip
         self.transformations = transformations
+        self.dct_native = dct_native
+        self.dtype = dtype
+        self.sparse_labels = sparse_labels
+        self.buffer_ring_size = buffer_ring_size
+        self.buffer_ring = None
         self.number_of_classes = len(self.classes)
-        self.batches_per_epoch = len(self.images_path) // self._batch_size
-        self.indexes = np.arange(len(self.images_path))
+
+        # Distributed sampling: with several ranks, each one reads its own shard of an epoch-seeded permutation
+        self.rank = rank
+        self.number_of_ranks = number_of_ranks
+        self.seed = seed
+        self.epoch = 0
+        self.indexes = shard_indexes(len(self.images_path), rank, number_of_ranks, shuffle=False)
+        self.batches_per_epoch = len(self.indexes) // self._batch_size
 
         # Initialization of the first batch
         self.on_epoch_end()
@@ -100,6 +313,13 @@ class DCTGeneratorJPEG2DCT(TemplateGenerator):
 
     def __getitem__(self, index):
         'Generate one batch of data'
+        return self.get_batch(index)
+
+    def get_batch(self, index, seed=None):
+        """ Generates the batch index. If a seed is given, the crops and flips of the batch are drawn from a
+        random.Random(seed) of its own instead of the random module, so the batch is the same for the same seed
+        whatever the thread or process building it.
+        """
         # Generate indexes of the batch
         # We have to use modulo to avoid overflowing the index size if we have too many batches per epoch
         index = index % self.batches_per_epoch
@@ -107,89 +327,70 @@ class DCTGeneratorJPEG2DCT(TemplateGenerator):
                                self._batch_size]
 
         # Generate data
-        X, y = self.__data_generation(indexes)
+        X, y = self.__data_generation(indexes, random if seed is None else random.Random(seed))
 
         return X, y
 
+    def batch_buffers(self, input_shapes):
+        """ Returns the arrays of a batch: one per input (without the batch dimension) plus the labels.
+
+        The arrays come from the ring of preallocated buffers if buffer_ring_size > 0. The labels are either
+        one-hot (batch_size, number_of_classes) or, with sparse_labels, the class indexes (batch_size,).
+        """
+        shapes = [(self._batch_size, *shape) for shape in input_shapes]
+        dtypes = [self.dtype] * len(input_shapes) + [np.int32]
+        if self.sparse_labels:
+            shapes.append((self._batch_size,))
+        else:
+            shapes.append((self._batch_size, self.number_of_classes))
+
+        # The ring is built again if the batch size changed
+        if self.buffer_ring_size > 0 and (self.buffer_ring is None or self.buffer_ring.buffers[0][0].shape != shapes[0]):
+            self.buffer_ring = BatchBufferRing(self.buffer_ring_size, shapes, dtypes)
+
+        buffers = allocate_batch(shapes, dtypes, self.buffer_ring)
+        buffers[-1].fill(0)
+        return buffers
+
     def on_epoch_end(self):
         'Updates indexes after each epoch'
-        if self._shuffle == True:
+        if self.number_of_ranks > 1:
+            self.indexes = shard_indexes(len(self.images_path), self.rank, self.number_of_ranks,
+                                         epoch=self.epoch, seed=self.seed, shuffle=self._shuffle)
+            self.epoch += 1
+        elif self._shuffle == True:
             np.random.shuffle(self.indexes)
 
-    def __data_generation(self, indexes):
+    def __data_generation(self, indexes, random_state):
         # X : (n_samples, *dim, n_channels)
         'Generates data containing batch_size samples'
 
         # Two inputs for the data of one image.
-        X_y = np.empty((self._batch_size, 28, 28, 64), dtype=np.int32)
-        X_cbcr = np.empty((self._batch_size, 14, 14, 128), dtype=np.int32)
-        
-
-
-        y = np.zeros((self._batch_size, self.number_of_classes),
-                     dtype=np.int32)
+        X_y, X_cbcr, y = self.batch_buffers([(28, 28, 64), (14, 14, 128)])
 
         # iterate over the indexes to get the correct values
         for i, k in enumerate(indexes):
 
-            # Get the index of the class for later usage
-            last_slash = self.images_path[k].rfind("/")
-            second_last_slash = self.images_path[k][:last_slash].rfind("/")
-            index_class = self.images_path[k][second_last_slash + 1:last_slash]
-
-            # Load the image in RGB,
-            with Image.open(self.images_path[k]) as im:
-
-                # Scale data-augmentation
-                im = im.convert("RGB")
-                if self.scale:
-                    min_side = min(im.size)
-                    scaling_ratio = self.target_length / min_side
-
-                    width, height = im.size
-                    im = im.resize((int(round(width * scaling_ratio)),
-                                    int(round(height * scaling_ratio))))
-                    offset = random.randint(0,
-                                            max(im.size) - self.target_length)
-
-                    if im.size[0] > im.size[1]:
-                        im = im.crop((offset, 0, self.target_length + offset,
-                                      self.target_length))
-                    else:
-                        im = im.crop((0, offset, self.target_length,
-                                      self.target_length + offset))
-                else:
-                    im = im.resize(
-                        (int(self.target_length), int(self.target_length)))
-                    
-                # If the flip is required
-                if self.flip and (random.uniform(0, 1) > 0.5):
-                    im = im.transpose(PIL.Image.FLIP_LEFT_RIGHT)
-
-                # If some image transformations are available
-                if self.transformations is not None:
-                    im = np.array(im)
-                    random.shuffle(self.transformations)
-                    for transformation in self.transformations:
-                        if random.uniform(0, 1) > 0.5:
-                            im = transformation(im)
-                    im = Image.fromarray(im)
-                    im = im.convert("RGB")
-
-                # Saving the file to ram and reloading it from there to avoid writing to disk
-                fake_file = BytesIO()
-                im.save(fake_file, format="jpeg")
-
-            dct_y, dct_cb, dct_cr = loads(fake_file.getvalue())
+            dct_y, dct_cb, dct_cr = load_dct_sample(self.images_path[k],
+                                                    self.target_length,
+                                                    scale=self.scale,
+                                                    flip=self.flip,
+                                                    transformations=self.transformations,
+                                                    dct_native=self.dct_native,
+                                                    random_state=random_state)
 
             try:
                 X_y[i] = dct_y
-                X_cbcr[i] = np.concatenate([dct_cb, dct_cr], axis=-1)
+                X_cbcr[i, :, :, :64] = dct_cb
+                X_cbcr[i, :, :, 64:] = dct_cr
             except Exception as e:
                 raise Exception(str(e) + str(self.images_path[k]))
 
-            # Setting the target class to 1
-            y[i, int(self.association[index_class])] = 1
+            # Setting the target class to 1, or storing its index with sparse labels
+            if self.sparse_labels:
+                y[i] = self.manifest.labels[k]
+            else:
+                y[i, self.manifest.labels[k]] = 1
 
         return [X_y, X_cbcr], y
 
@@ -205,10 +406,20 @@ class DCTGeneratorJPEG2DCTDeconv(TemplateGenerator):
                  scale=True,
                  target_length=224,
                  flip=True,
-                 transformations=None):
-        # Process the index dictionary to get the matching name/class_id
-        self.association, self.classes, self.images_path = prepare_imagenet(
-            index_file, data_directory)
+                 transformations=None,
+                 dct_native=True,
+                 dtype=np.int32,
+                 sparse_labels=False,
+                 buffer_ring_size=0,
+                 manifest_root=None,
+                 check_classes=True,
+                 rank=0,
+                 number_of_ranks=1,
+                 seed=0):
+        # Load the cached manifest of the data directory to get the images and their class ids, rebuilt if an image was
+        # added to or removed from a class directory unless check_classes is False (see load_imagenet_manifest)
+        self.manifest = load_imagenet_manifest(index_file, data_directory, manifest_root=manifest_root, check_classes=check_classes)
+        self.association, self.classes, self.images_path = self.manifest.association, self.manifest.classes, self.manifest
 
         # External data
         self._batch_size = batch_size
@@ -221,9 +432,20 @@ class DCTGeneratorJPEG2DCTDeconv(TemplateGenerator):
         self.target_length = target_length
         self.flip = flip
         self.transformations = transformations
+        self.dct_native = dct_native
+        self.dtype = dtype
+        self.sparse_labels = sparse_labels
+        self.buffer_ring_size = buffer_ring_size
+        self.buffer_ring = None
         self.number_of_classes = len(self.classes)
-        self.batches_per_epoch = len(self.images_path) // self._batch_size
-        self.indexes = np.arange(len(self.images_path))
+
+        # Distributed sampling: with several ranks, each one reads its own shard of an epoch-seeded permutation
+        self.rank = rank
+        self.number_of_ranks = number_of_ranks
+        self.seed = seed
+        self.epoch = 0
+        self.indexes = shard_indexes(len(self.images_path), rank, number_of_ranks, shuffle=False)
+        self.batches_per_epoch = len(self.indexes) // self._batch_size
 
         # Initialization of the first batch
         self.on_epoch_end()
@@ -258,6 +480,13 @@ class DCTGeneratorJPEG2DCTDeconv(TemplateGenerator):
 
     def __getitem__(self, index):
         'Generate one batch of data'
+        return self.get_batch(index)
+
+    def get_batch(self, index, seed=None):
+        """ Generates the batch index. If a seed is given, the crops and flips of the batch are drawn from a
+        random.Random(seed) of its own instead of the random module, so the batch is the same for the same seed
+        whatever the thread or process building it.
+        """
         # Generate indexes of the batch
         # We have to use modulo to avoid overflowing the index size if we have too many batches per epoch
         index = index % self.batches_per_epoch
@@ -265,80 +494,57 @@ class DCTGeneratorJPEG2DCTDeconv(TemplateGenerator):
                                self._batch_size]
 
         # Generate data
-        X, y = self.__data_generation(indexes)
+        X, y = self.__data_generation(indexes, random if seed is None else random.Random(seed))
 
         return X, y
 
+    def batch_buffers(self, input_shapes):
+        """ Returns the arrays of a batch: one per input (without the batch dimension) plus the labels.
+
+        The arrays come from the ring of preallocated buffers if buffer_ring_size > 0. The labels are either
+        one-hot (batch_size, number_of_classes) or, with sparse_labels, the class indexes (batch_size,).
+        """
+        shapes = [(self._batch_size, *shape) for shape in input_shapes]
+        dtypes = [self.dtype] * len(input_shapes) + [np.int32]
+        if self.sparse_labels:
+            shapes.append((self._batch_size,))
+        else:
+            shapes.append((self._batch_size, self.number_of_classes))
+
+        # The ring is built again if the batch size changed
+        if self.buffer_ring_size > 0 and (self.buffer_ring is None or self.buffer_ring.buffers[0][0].shape != shapes[0]):
+            self.buffer_ring = BatchBufferRing(self.buffer_ring_size, shapes, dtypes)
+
+        buffers = allocate_batch(shapes, dtypes, self.buffer_ring)
+        buffers[-1].fill(0)
+        return buffers
+
     def on_epoch_end(self):
         'Updates indexes after each epoch'
-        if self._shuffle == True:
+        if self.number_of_ranks > 1:
+            self.indexes = shard_indexes(len(self.images_path), self.rank, self.number_of_ranks,
+                                         epoch=self.epoch, seed=self.seed, shuffle=self._shuffle)
+            self.epoch += 1
+        elif self._shuffle == True:
             np.random.shuffle(self.indexes)
 
-    def __data_generation(self, indexes):
+    def __data_generation(self, indexes, random_state):
         # X : (n_samples, *dim, n_channels)
         'Generates data containing batch_size samples'
 
-        # Two inputs for the data of one image.
-        X_y = np.empty((self._batch_size, 28, 28, 64), dtype=np.int32)
-        X_cb = np.empty((self._batch_size, 14, 14, 64), dtype=np.int32)
-        X_cr = np.empty((self._batch_size, 14, 14, 64), dtype=np.int32)
-
-
-        y = np.zeros((self._batch_size, self.number_of_classes),
-                     dtype=np.int32)
+        # Three inputs for the data of one image.
+        X_y, X_cb, X_cr, y = self.batch_buffers([(28, 28, 64), (14, 14, 64), (14, 14, 64)])
 
         # iterate over the indexes to get the correct values
         for i, k in enumerate(indexes):
 
-            # Get the index of the class for later usage
-            last_slash = self.images_path[k].rfind("/")
-            second_last_slash = self.images_path[k][:last_slash].rfind("/")
-            index_class = self.images_path[k][second_last_slash + 1:last_slash]
-
-            # Load the image in RGB,
-            with Image.open(self.images_path[k]) as im:
-
-                # Scale data-augmentation
-                im = im.convert("RGB")
-                if self.scale:
-                    min_side = min(im.size)
-                    scaling_ratio = self.target_length / min_side
-
-                    width, height = im.size
-                    im = im.resize((int(round(width * scaling_ratio)),
-                                    int(round(height * scaling_ratio))))
-                    offset = random.randint(0,
-                                            max(im.size) - self.target_length)
-
-                    if im.size[0] > im.size[1]:
-                        im = im.crop((offset, 0, self.target_length + offset,
-                                      self.target_length))
-                    else:
-                        im = im.crop((0, offset, self.target_length,
-                                      self.target_length + offset))
-                else:
-                    im = im.resize(
-                        (int(self.target_length), int(self.target_length)))
-                    
-                # If the flip is required
-                if self.flip and (random.uniform(0, 1) > 0.5):
-                    im = im.transpose(PIL.Image.FLIP_LEFT_RIGHT)
-
-                # If some image transformations are available
-                if self.transformations is not None:
-                    im = np.array(im)
-                    random.shuffle(self.transformations)
-                    for transformation in self.transformations:
-                        if random.uniform(0, 1) > 0.5:
-                            im = transformation(im)
-                    im = Image.fromarray(im)
-                    im = im.convert("RGB")
-
-                # Saving the file to ram and reloading it from there to avoid writing to disk
-                fake_file = BytesIO()
-                im.save(fake_file, format="jpeg")
-
-            dct_y, dct_cb, dct_cr = loads(fake_file.getvalue())
+            dct_y, dct_cb, dct_cr = load_dct_sample(self.images_path[k],
+                                                    self.target_length,
+                                                    scale=self.scale,
+                                                    flip=self.flip,
+                                                    transformations=self.transformations,
+                                                    dct_native=self.dct_native,
+                                                    random_state=random_state)
 
             try:
                 X_y[i] = dct_y
@@ -347,8 +553,11 @@ class DCTGeneratorJPEG2DCTDeconv(TemplateGenerator):
             except Exception as e:
                 raise Exception(str(e) + str(self.images_path[k]))
 
-            # Setting the target class to 1
-            y[i, int(self.association[index_class])] = 1
+            # Setting the target class to 1, or storing its index with sparse labels
+            if self.sparse_labels:
+                y[i] = self.manifest.labels[k]
+            else:
+                y[i, self.manifest.labels[k]] = 1
 
         return [X_y, X_cb, X_cr], y
 
@@ -362,10 +571,12 @@ class DCTGeneratorImageNet(TemplateGenerator):
                  batch_size=32,
                  image_shape=(224, 224, 3),
                  shuffle=True,
-                 target_length=224):
+                 target_length=224,
+                 manifest_root=None,
+                 check_classes=True):
         
-        self.association, self.classes, self.images_path = prepare_imagenet(
-            index_file, data_directory)
+        self.manifest = load_imagenet_manifest(index_file, data_directory, manifest_root=manifest_root, check_classes=check_classes)
+        self.association, self.classes, self.images_path = self.manifest.association, self.manifest.classes, self.manifest
         
         # External variables
         self._batch_size = batch_size
@@ -397,11 +608,8 @@ class DCTGeneratorImageNet(TemplateGenerator):
         batch_images_path = []
         # Find list of IDs
         for k in indexes:
-            last_slash = self.images_path[k].rfind("/")
-            second_last_slash = self.images_path[k][:last_slash].rfind("/")
-            index_class = self.images_path[k][second_last_slash + 1:last_slash]
             batch_images_path.append(
-                (self.images_path[k], self.association[index_class]))
+                (self.images_path[k], self.manifest.labels[k]))
 
         # Generate data
         X, y = self.__data_generation(batch_images_path)
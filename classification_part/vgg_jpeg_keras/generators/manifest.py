@@ -0,0 +1,184 @@
+""" Cached manifest of an ImageNet directory, to avoid walking the class directories every time a generator is built.
+
+A manifest is a directory containing:
+    - manifest.json: the data directory, the class names and the association between the class names and ids
+    - paths.bin: the paths of the images relative to the data directory, utf-8 encoded and concatenated
+    - offsets.npy: the path of the image i is paths.bin[offsets[i]:offsets[i + 1]], int64
+    - labels.npy: the class id of every image, int16
+    - sizes.npy: optionally, the size in bytes of every image, int64
+
+The images are sorted by class directory then by name, so every process building a manifest gets the same order.
+The manifests of a data directory are stored under one sub-directory per version of the data directory, the
+version being named after the modification times of the data directory, of the index file and, by default, of
+every class directory, so that an image added to or removed from a class directory gives a new manifest. Loading a
+manifest thus costs one stat call per class directory, e.g. a few milliseconds for the 1000 classes of ImageNet on
+a local disk, and memory-maps the arrays. With check_classes=False, it only costs two stat calls, but the images
+added to or removed from an existing class directory are not seen, and a removed image makes the generators fail
+in the middle of an epoch.
+"""
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+
+import numpy as np
+
+MANIFEST_FILE = "manifest.json"
+PATHS_FILE = "paths.bin"
+OFFSETS_FILE = "offsets.npy"
+LABELS_FILE = "labels.npy"
+SIZES_FILE = "sizes.npy"
+DEFAULT_MANIFEST_ROOT = os.path.join(os.path.expanduser("~"), ".cache", "vgg_jpeg_keras", "manifests")
+
+
+class ImageNetManifest(object):
+    """ A manifest loaded from disk, the arrays are memory-mapped.
+
+    The manifest can be indexed like the list of paths returned by prepare_imagenet: manifest[i] is the full path of
+    the image i, manifest[i:j] the list of the full paths of the images i to j - 1, len(manifest) the number of images.
+
+    # Arguments:
+        - manifest_directory: The directory of the manifest, as written by build_imagenet_manifest.
+    """
+
+    def __init__(self, manifest_directory):
+        with open(os.path.join(manifest_directory, MANIFEST_FILE)) as manifest:
+            description = json.load(manifest)
+
+        self.data_directory = description["data_directory"]
+        self.classes = description["classes"]
+        self.association = description["association"]
+        self.offsets = np.load(os.path.join(manifest_directory, OFFSETS_FILE), mmap_mode="r")
+        self.labels = np.load(os.path.join(manifest_directory, LABELS_FILE), mmap_mode="r")
+
+        # np.memmap does not accept empty files
+        if self.offsets[-1] > 0:
+            self.paths = np.memmap(os.path.join(manifest_directory, PATHS_FILE), dtype=np.uint8, mode="r")
+        else:
+            self.paths = np.empty(0, dtype=np.uint8)
+
+        sizes_path = os.path.join(manifest_directory, SIZES_FILE)
+        self.sizes = np.load(sizes_path, mmap_mode="r") if os.path.isfile(sizes_path) else None
+
+    def __len__(self):
+        return len(self.labels)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("The manifest has {} images.".format(len(self)))
+        relative_path = self.paths[self.offsets[index]:self.offsets[index + 1]].tobytes().decode("utf-8")
+        return os.path.join(self.data_directory, relative_path)
+
+
+def manifest_version(index_file, data_directory, check_classes=True):
+    """ Returns the name of the version of the data directory, which changes when a class directory is added or
+    removed or when the index file is modified. With check_classes, the default, it also changes when an image is
+    added to or removed from a class directory, at the cost of one stat call per class.
+    """
+    mtimes = "{}-{}".format(os.stat(data_directory).st_mtime_ns, os.stat(index_file).st_mtime_ns)
+    if check_classes:
+        class_mtimes = sorted((entry.name, entry.stat().st_mtime_ns) for entry in os.scandir(data_directory) if entry.is_dir())
+        mtimes += "".join("-{}:{}".format(name, mtime) for name, mtime in class_mtimes)
+    return hashlib.sha1(mtimes.encode("utf-8")).hexdigest()[:16]
+
+
+def default_manifest_root(index_file, data_directory):
+    """ Returns the directory holding the manifests of a data directory under DEFAULT_MANIFEST_ROOT."""
+    key = "{}\n{}".format(os.path.abspath(data_directory), os.path.abspath(index_file))
+    return os.path.join(DEFAULT_MANIFEST_ROOT, hashlib.sha1(key.encode("utf-8")).hexdigest()[:16])
+
+
+def build_imagenet_manifest(index_file, data_directory, manifest_directory, with_sizes=False):
+    """ Walks an ImageNet directory and writes its manifest.
+
+    The manifest is written to a temporary directory renamed to manifest_directory, so a concurrent process never
+    reads a partial manifest. If another process wrote the manifest first, its manifest is kept.
+
+    # Arguments:
+        - index_file: The json file matching the class ids and the class names.
+        - data_directory: The ImageNet directory (one sub-directory per class).
+        - manifest_directory: The directory to write the manifest to.
+        - with_sizes: Whether to store the size in bytes of every image.
+    """
+    association = {}
+    with open(index_file) as index:
+        data = json.load(index)
+        for id, value in data.items():
+            association[value[0]] = id
+
+    classes = []
+    paths = []
+    labels = []
+    sizes = []
+    for class_entry in sorted(os.scandir(data_directory), key=lambda entry: entry.name):
+        if not class_entry.is_dir():
+            continue
+        if class_entry.name not in association:
+            raise ValueError("The class directory {} is not in {}.".format(class_entry.path, index_file))
+        classes.append(class_entry.name)
+        for image_entry in sorted(os.scandir(class_entry.path), key=lambda entry: entry.name):
+            paths.append("{}/{}".format(class_entry.name, image_entry.name).encode("utf-8"))
+            labels.append(int(association[class_entry.name]))
+            if with_sizes:
+                sizes.append(image_entry.stat().st_size)
+
+    parent_directory = os.path.dirname(os.path.abspath(manifest_directory))
+    os.makedirs(parent_directory, exist_ok=True)
+    temporary_directory = tempfile.mkdtemp(dir=parent_directory)
+
+    with open(os.path.join(temporary_directory, PATHS_FILE), "wb") as paths_file:
+        paths_file.write(b"".join(paths))
+    np.save(os.path.join(temporary_directory, OFFSETS_FILE), np.cumsum([0] + [len(path) for path in paths], dtype=np.int64))
+    np.save(os.path.join(temporary_directory, LABELS_FILE), np.array(labels, dtype=np.int16))
+    if with_sizes:
+        np.save(os.path.join(temporary_directory, SIZES_FILE), np.array(sizes, dtype=np.int64))
+    with open(os.path.join(temporary_directory, MANIFEST_FILE), "w") as manifest:
+        json.dump({"data_directory": os.path.abspath(data_directory),
+                   "index_file": os.path.abspath(index_file),
+                   "classes": classes,
+                   "association": association}, manifest)
+
+    try:
+        os.rename(temporary_directory, manifest_directory)
+    except OSError:
+        # Another process wrote the manifest in the meantime
+        shutil.rmtree(temporary_directory, ignore_errors=True)
+
+
+def load_imagenet_manifest(index_file, data_directory, manifest_root=None, with_sizes=False, check_classes=True):
+    """ Returns the manifest of an ImageNet directory, built first if the data directory changed since the last one.
+
+    # Arguments:
+        - index_file: The json file matching the class ids and the class names.
+        - data_directory: The ImageNet directory (one sub-directory per class).
+        - manifest_root: The directory holding the versions of the manifest, by default a directory under
+          DEFAULT_MANIFEST_ROOT named after the data directory and the index file.
+        - with_sizes: Whether the manifest must contain the size in bytes of every image.
+        - check_classes: Whether to also look for changes inside the class directories, at the cost of one stat call
+          per class, see manifest_version. Only set it to False for a data directory whose class directories never
+          change.
+
+    # Returns:
+        An ImageNetManifest.
+    """
+    if manifest_root is None:
+        manifest_root = default_manifest_root(index_file, data_directory)
+
+    version = manifest_version(index_file, data_directory, check_classes=check_classes)
+    manifest_directory = os.path.join(manifest_root, version)
+
+    if not os.path.isdir(manifest_directory) or (with_sizes and not os.path.isfile(os.path.join(manifest_directory, SIZES_FILE))):
+        shutil.rmtree(manifest_directory, ignore_errors=True)
+        build_imagenet_manifest(index_file, data_directory, manifest_directory, with_sizes=with_sizes)
+
+        # The outdated versions are not used anymore
+        for entry in os.scandir(manifest_root):
+            if entry.is_dir() and entry.name != version and not entry.name.startswith("tmp"):
+                shutil.rmtree(entry.path, ignore_errors=True)
+
+    return ImageNetManifest(manifest_directory)
@@ -0,0 +1,266 @@
+""" Background prefetching of the batches of a generator.
+
+The batches are built ahead of time either by a pool of threads (the jpeg decoding of PIL and jpeg2dct releases the
+GIL) or by a pool of forked processes. The processes write the batches into slots of anonymous shared memory
+instead of sending them back through a pipe, so no batch is pickled.
+"""
+import mmap
+import time
+import random
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from template_keras.generators import TemplateGenerator
+
+# State of a prefetch worker process, set by _initialize_worker
+_worker_generator = None
+_worker_slots = None
+_worker_layout = None
+
+
+def _initialize_worker(generator, slots, layout, indexes):
+    global _worker_generator, _worker_slots, _worker_layout
+    _worker_generator = generator
+    _worker_slots = slots
+    _worker_layout = layout
+    # The order of the samples is set by the main process at each epoch
+    _worker_generator.indexes = indexes
+
+
+def _build_batch(generator, index, seed):
+    """ Builds the batch index with its own random draws if the generator has a get_batch method, e.g. the crops and
+    flips of DCTGeneratorJPEG2DCT, from the shared random state otherwise.
+    """
+    if hasattr(generator, "get_batch"):
+        return generator.get_batch(index, seed)
+    return generator[index]
+
+
+def _fill_slot(index, slot, seed):
+    """ Builds a batch in a worker process and writes it to a slot. The batch is returned through the pipe only if
+    its layout does not match the slots, e.g. a smaller last batch.
+    """
+    # The forked workers start with the same random states, the draws that do not come from the seed of the batch
+    # (e.g. the photometric transformations) must not be the same in all the workers.
+    np.random.seed(seed)
+    random.seed(seed)
+    X, y = _build_batch(_worker_generator, index, seed)
+    arrays = (list(X) if isinstance(X, list) else [X]) + [y]
+
+    if [(array.shape, array.dtype) for array in arrays] != [(shape, dtype) for shape, dtype, _ in _worker_layout]:
+        return X, y
+
+    for array, (shape, dtype, offset) in zip(arrays, _worker_layout):
+        np.ndarray(shape, dtype=dtype, buffer=_worker_slots[slot], offset=offset)[...] = array
+    return None
+
+
+def _batch_layout(X, y):
+    """ Returns the shape, dtype and offset in a slot of every array of a batch, and the size of a slot."""
+    layout = []
+    offset = 0
+    for array in (list(X) if isinstance(X, list) else [X]) + [y]:
+        layout.append((array.shape, array.dtype, offset))
+        # Keep the arrays aligned on 64 bytes
+        offset += -(-array.nbytes // 64) * 64
+    return layout, max(offset, 1)
+
+
+class PrefetchGenerator(TemplateGenerator):
+    """ Wraps a generator and keeps the next depth batches in flight in a pool of workers.
+
+    The wrapper is meant to be given to fit_generator with workers=0, the parallelism coming from its own pool. The
+    batches are requested in order, a batch requested before it was prefetched is built right away.
+
+    With threads, the wrapped generator is shared by the threads, so its buffer_ring_size must be 0. With processes,
+    the workers are forked once with a copy of the generator, the order of the samples being shared with the main
+    process at each epoch end. The arrays returned with processes are views on the shared memory, valid until the
+    next batch is requested, which is the behaviour of fit_generator with workers=0.
+
+    # Arguments:
+        - generator: The generator to wrap, e.g. a DCTGeneratorJPEG2DCT.
+        - depth: The number of batches built ahead of the one requested.
+        - workers: The number of threads or processes building the batches.
+        - use_processes: Whether to build the batches in forked processes instead of threads.
+        - seed: The seed of the random augmentations. Every batch is built with a seed of its own, set from this seed,
+          the epoch and the batch index, so a batch is the same for the same seed, epoch and index with threads or
+          processes, and the augmentations of the workers are independent. The generators with a get_batch method draw
+          their augmentations from a random state created from the seed of the batch. With processes, the global
+          random states of the worker are also set from it before every batch. With threads, which share the global
+          random states, the photometric transformations, drawn from the global NumPy random state, are not
+          reproducible. If None, a random seed is drawn.
+    """
+
+    def __init__(self, generator, depth=4, workers=4, use_processes=False, seed=None):
+        if not use_processes and getattr(generator, "buffer_ring_size", 0) > 0:
+            raise ValueError("The buffer ring of the generator cannot be shared by threads, set its buffer_ring_size to 0.")
+
+        self.generator = generator
+        self.depth = depth
+        self.workers = workers
+        self.use_processes = use_processes
+        self.seed = np.random.randint(2 ** 31) if seed is None else seed
+        self.epoch = 0
+
+        self.executor = None
+        self.pending = {}
+        self.slots = None
+        self.layout = None
+        self.free_slots = []
+        self.returned_slots = []
+        self.indexes = None
+
+        self.reset_statistics()
+
+    @property
+    def batch_size(self):
+        return self.generator.batch_size
+
+    @property
+    def number_of_data_samples(self):
+        return self.generator.number_of_data_samples
+
+    @property
+    def shuffle(self):
+        return self.generator.shuffle
+
+    def __len__(self):
+        return len(self.generator)
+
+    def reset_statistics(self):
+        """ Resets the counters returned by statistics."""
+        self.requested_batches = 0
+        self.stalls = 0
+        self.stall_time = 0.0
+        self.ready_batches = 0
+
+    def statistics(self):
+        """ Returns the counters used to size the prefetching:
+            - batches: The number of batches requested.
+            - stalls: The number of batches that were not ready when requested.
+            - stall_time: The time spent waiting for the batches, in seconds.
+            - mean_queue_depth: The mean number of prefetched batches ready when a batch is requested.
+        """
+        return {"batches": self.requested_batches,
+                "stalls": self.stalls,
+                "stall_time": self.stall_time,
+                "mean_queue_depth": self.ready_batches / max(self.requested_batches, 1)}
+
+    def _start(self):
+        if self.use_processes:
+            # The layout of the slots is the one of a first batch built in the main process
+            X, y = self.generator[0]
+            self.layout, slot_size = _batch_layout(X, y)
+            self.inputs_as_list = isinstance(X, list)
+            self.slots = [mmap.mmap(-1, slot_size) for _ in range(self.depth + 1)]
+            self.free_slots = list(range(len(self.slots)))
+
+            self.indexes_buffer = mmap.mmap(-1, max(np.asarray(self.generator.indexes).nbytes, 1))
+            self.indexes = np.ndarray(np.shape(self.generator.indexes), dtype=np.asarray(self.generator.indexes).dtype, buffer=self.indexes_buffer)
+            self.indexes[...] = self.generator.indexes
+
+            # Forked, so the generator and the anonymous shared memory are inherited and not pickled
+            context = multiprocessing.get_context("fork")
+            self.executor = context.Pool(self.workers, initializer=_initialize_worker,
+                                         initargs=(self.generator, self.slots, self.layout, self.indexes))
+        else:
+            self.executor = ThreadPoolExecutor(max_workers=self.workers)
+
+    def _batch_seed(self, index):
+        return (self.seed + self.epoch * len(self) + index) % 2 ** 32
+
+    def _submit(self, index):
+        if self.use_processes:
+            if not self.free_slots:
+                return
+            slot = self.free_slots.pop()
+            self.pending[index] = (self.executor.apply_async(_fill_slot, (index, slot, self._batch_seed(index))), slot)
+        else:
+            self.pending[index] = (self.executor.submit(_build_batch, self.generator, index, self._batch_seed(index)), None)
+
+    def _is_ready(self, result):
+        return result.ready() if self.use_processes else result.done()
+
+    def _get(self, result):
+        return result.get() if self.use_processes else result.result()
+
+    def _batch(self, slot):
+        arrays = [np.ndarray(shape, dtype=dtype, buffer=self.slots[slot], offset=offset) for shape, dtype, offset in self.layout]
+        if self.inputs_as_list:
+            return arrays[:-1], arrays[-1]
+        return arrays[0], arrays[1]
+
+    def __getitem__(self, index):
+        index = index % len(self)
+        if self.executor is None:
+            self._start()
+
+        # The slot of the previous batch is not used by the model anymore
+        while self.returned_slots:
+            self.free_slots.append(self.returned_slots.pop())
+
+        self.requested_batches += 1
+        self.ready_batches += sum(self._is_ready(result) for result, _ in self.pending.values())
+
+        if index not in self.pending:
+            self._submit(index)
+
+        if index in self.pending:
+            result, slot = self.pending.pop(index)
+            if not self._is_ready(result):
+                self.stalls += 1
+            start = time.time()
+            batch = self._get(result)
+            self.stall_time += time.time() - start
+        else:
+            # No free slot, should not happen as there is one more slot than the prefetch depth
+            self.stalls += 1
+            start = time.time()
+            batch, slot = _build_batch(self.generator, index, self._batch_seed(index)), None
+            self.stall_time += time.time() - start
+
+        if slot is not None:
+            if batch is None:
+                batch = self._batch(slot)
+                self.returned_slots.append(slot)
+            else:
+                self.free_slots.append(slot)
+
+        # Keep the next batches in flight
+        for next_index in range(index + 1, index + 1 + self.depth):
+            next_index = next_index % len(self)
+            if next_index not in self.pending and next_index != index:
+                self._submit(next_index)
+
+        return batch
+
+    def on_epoch_end(self):
+        # The batches prefetched for this epoch are dropped before the order of the samples changes
+        for result, slot in self.pending.values():
+            self._get(result)
+            if slot is not None:
+                self.free_slots.append(slot)
+        self.pending = {}
+
+        self.generator.on_epoch_end()
+        self.epoch += 1
+        if self.indexes is not None:
+            self.indexes[...] = self.generator.indexes
+
+    def close(self):
+        """ Stops the workers."""
+        if getattr(self, "executor", None) is None:
+            return
+        if self.use_processes:
+            self.executor.terminate()
+        else:
+            self.executor.shutdown(wait=True)
+        self.executor = None
+        self.pending = {}
+        self.free_slots = list(range(len(self.slots))) if self.slots is not None else []
+        self.returned_slots = []
+
+    def __del__(self):
+        self.close()
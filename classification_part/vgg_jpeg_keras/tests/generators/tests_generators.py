@@ -1,7 +1,11 @@
-from vgg_jpeg_keras.generators import DCTGeneratorJPEG2DCT, prepare_imagenet
+from vgg_jpeg_keras.generators import DCTGeneratorJPEG2DCT, PrefetchGenerator, prepare_imagenet, shard_indexes, build_imagenet_manifest, load_imagenet_manifest, ImageNetManifest
+from PIL import Image
 import numpy as np
 import tensorflow as tf
 import os
+import json
+import shutil
+import tempfile
 import unittest
 import logging
 logging.getLogger('tensorflow').disabled = True
@@ -80,5 +84,122 @@ class test_DCTGeneratorJPEG2DCT(unittest.TestCase):
         self.assertTrue(len(images_path) == 50000)
 
 
+
+class test_shard_indexes(unittest.TestCase):
+
+    def test_shards_are_disjoint_and_equal(self):
+        shards = [shard_indexes(1003, rank, 4, epoch=2, seed=7) for rank in range(4)]
+
+        self.assertTrue(all(len(shard) == 251 for shard in shards))
+        self.assertTrue(len(np.unique(np.concatenate(shards))) == 1003)
+
+    def test_shards_change_with_the_epoch(self):
+        first_epoch = shard_indexes(1003, 1, 4, epoch=0, seed=7)
+        second_epoch = shard_indexes(1003, 1, 4, epoch=1, seed=7)
+
+        self.assertTrue(np.array_equal(first_epoch, shard_indexes(1003, 1, 4, epoch=0, seed=7)))
+        self.assertFalse(np.array_equal(first_epoch, second_epoch))
+
+    def test_shards_without_shuffle(self):
+        self.assertTrue(shard_indexes(10, 1, 4, shuffle=False).tolist() == [1, 5, 9])
+        self.assertTrue(shard_indexes(10, 3, 4, shuffle=False).tolist() == [3, 7, 1])
+
+
+class test_ImageNetManifest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.data_directory = os.path.join(self.directory, "data")
+        self.index_file = os.path.join(self.directory, "index.json")
+        with open(self.index_file, "w") as index:
+            json.dump({"0": ["n01", "tench"], "1": ["n02", "goldfish"]}, index)
+        self.images_path = []
+        for class_name, number_of_images in [("n01", 3), ("n02", 4)]:
+            os.makedirs(os.path.join(self.data_directory, class_name))
+            for i in range(number_of_images):
+                image_path = os.path.join(self.data_directory, class_name, "{}_{}.JPEG".format(class_name, i))
+                open(image_path, "wb").close()
+                self.images_path.append(image_path)
+        build_imagenet_manifest(self.index_file, self.data_directory, os.path.join(self.directory, "manifest"))
+        self.manifest = ImageNetManifest(os.path.join(self.directory, "manifest"))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_indexing(self):
+        self.assertTrue(len(self.manifest) == 7)
+        self.assertTrue([self.manifest[i] for i in range(7)] == self.images_path)
+        self.assertTrue(self.manifest[-1] == self.images_path[-1])
+        self.assertTrue(self.manifest.labels.tolist() == [0, 0, 0, 1, 1, 1, 1])
+        with self.assertRaises(IndexError):
+            self.manifest[7]
+
+    def test_slicing(self):
+        self.assertTrue(self.manifest[:5] == self.images_path[:5])
+        self.assertTrue(self.manifest[2:100] == self.images_path[2:])
+        self.assertTrue(self.manifest[-3:] == self.images_path[-3:])
+        self.assertTrue(self.manifest[::2] == self.images_path[::2])
+        self.assertTrue(self.manifest[5:2] == [])
+        self.assertTrue(list(self.manifest) == self.images_path)
+
+    def test_changes_of_the_class_directories(self):
+        manifest_root = os.path.join(self.directory, "manifests")
+        self.assertTrue(list(load_imagenet_manifest(self.index_file, self.data_directory, manifest_root=manifest_root)) == self.images_path)
+
+        class_directory = os.path.join(self.data_directory, "n01")
+        mtime = os.stat(class_directory).st_mtime_ns
+        os.remove(self.images_path[0])
+        open(os.path.join(class_directory, "n01_9.JPEG"), "wb").close()
+        # The directory timestamps of some file systems are too coarse to change within the test
+        os.utime(class_directory, ns=(mtime + 10 ** 9, mtime + 10 ** 9))
+
+        expected = self.images_path[1:3] + [os.path.join(class_directory, "n01_9.JPEG")] + self.images_path[3:]
+        self.assertTrue(list(load_imagenet_manifest(self.index_file, self.data_directory, manifest_root=manifest_root)) == expected)
+
+
+class test_PrefetchGenerator(unittest.TestCase):
+
+    def setUp(self):
+        # Copies of the same image, so that the batches only differ by their random crops and flips
+        self.directory = tempfile.mkdtemp()
+        self.data_directory = os.path.join(self.directory, "data")
+        self.index_file = os.path.join(self.directory, "index.json")
+        with open(self.index_file, "w") as index:
+            json.dump({"0": ["n01", "tench"], "1": ["n02", "goldfish"]}, index)
+        image = Image.fromarray(np.random.RandomState(0).randint(0, 256, size=(224, 480, 3), dtype=np.uint8))
+        for class_name in ["n01", "n02"]:
+            os.makedirs(os.path.join(self.data_directory, class_name))
+            for i in range(6):
+                image.save(os.path.join(self.data_directory, class_name, "{}_{}.JPEG".format(class_name, i)), quality=90)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def batches(self, indexes, use_processes, seed, dct_native=True):
+        generator = DCTGeneratorJPEG2DCT(self.data_directory, self.index_file, batch_size=4, shuffle=False, dct_native=dct_native,
+                                         manifest_root=os.path.join(self.directory, "manifests"))
+        generator = PrefetchGenerator(generator, depth=2, workers=2, use_processes=use_processes, seed=seed)
+        try:
+            # With processes, the arrays are only valid until the next batch is requested
+            return [[np.array(array) for array in generator[index][0]] for index in indexes]
+        finally:
+            generator.close()
+
+    def test_batches_are_augmented_independently(self):
+        for use_processes in [False, True]:
+            for dct_native in [False, True]:
+                first_batch, second_batch, third_batch = self.batches([0, 1, 2], use_processes, 3, dct_native=dct_native)
+                self.assertFalse(np.array_equal(first_batch[0], second_batch[0]))
+                self.assertFalse(np.array_equal(second_batch[0], third_batch[0]))
+
+    def test_batches_are_reproducible(self):
+        batches = self.batches([0, 1, 2], True, 3)
+        second_batch, third_batch, first_batch = self.batches([1, 2, 0], True, 3)
+        # The same seed, epoch and batch index give the same batch, whatever the order of the requests and the workers
+        for other_batches in [self.batches([0, 1, 2], True, 3), [first_batch, second_batch, third_batch], self.batches([0, 1, 2], False, 3)]:
+            self.assertTrue(all(np.array_equal(array, other_array) for batch, other_batch in zip(batches, other_batches)
+                                for array, other_array in zip(batch, other_batch)))
+        self.assertFalse(np.array_equal(batches[0][0], self.batches([0], True, 4)[0][0]))
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,80 @@
+'''
+Measures, per batch of the DCT training pipeline, the volume of memory allocated while the batch
+is built (with `tracemalloc`), the size of the DCT inputs in host memory, i.e. in the queue of
+`fit_generator()`, and the number of bytes copied from the host to the device, for the former float64
+layout and the compact int16 layout with a ring of preallocated buffers.
+
+The inputs of the model are float32, so Keras casts the coefficient arrays to float32 on the host
+before feeding them: the bytes sent to the device are the same for every layout.
+'''
+
+import argparse
+import tracemalloc
+
+import numpy as np
+
+from data_generator.object_detection_2d_data_generator_dct_j2d import DataGeneratorDCT
+from data_generator.object_detection_2d_data_sequence_dct_j2d import DataSequenceDCT
+from data_generator.object_detection_2d_geometric_ops import Resize
+from data_generator.object_detection_2d_photometric_ops import ConvertTo3Channels
+
+parser = argparse.ArgumentParser(description="Allocation volume, host memory and host-to-device bytes per batch of DCT inputs.")
+parser.add_argument("images_dir", help="The Pascal VOC JPEGImages directory.")
+parser.add_argument("annotations_dir", help="The Pascal VOC Annotations directory.")
+parser.add_argument("image_set_filename", help="The Pascal VOC image set file, e.g. ImageSets/Main/val.txt.")
+parser.add_argument("-nb", "--numberOfBatches", help="The number of batches to measure for each layout.", type=int, default=10)
+parser.add_argument("-bs", "--batchSize", help="The size of the batches.", type=int, default=32)
+parser.add_argument("--deconv", help="Use the separated Cb/Cr layout.", action="store_true")
+args = parser.parse_args()
+
+classes = ['background',
+           'aeroplane', 'bicycle', 'bird', 'boat',
+           'bottle', 'bus', 'car', 'cat',
+           'chair', 'cow', 'diningtable', 'dog',
+           'horse', 'motorbike', 'person', 'pottedplant',
+           'sheep', 'sofa', 'train', 'tvmonitor']
+
+dataset = DataGeneratorDCT(load_images_into_memory=False, hdf5_dataset_path=None)
+dataset.parse_xml(images_dirs=[args.images_dir],
+                  image_set_filenames=[args.image_set_filename],
+                  annotations_dirs=[args.annotations_dir],
+                  classes=classes,
+                  include_classes='all',
+                  exclude_truncated=False,
+                  exclude_difficult=False,
+                  ret=False)
+
+# The former generator also allocated an unused int32 copy of the 300x300x3 images for every batch.
+unused_images_bytes = args.batchSize * 300 * 300 * 3 * np.dtype(np.int32).itemsize
+
+layouts = [("float64, fresh arrays (former)", np.float64, 0, unused_images_bytes),
+           ("int16, fresh arrays", np.int16, 0, 0),
+           ("int16, ring of 2 buffers", np.int16, 2, 0)]
+
+for name, dct_dtype, buffer_ring_size, extra_bytes in layouts:
+    sequence = DataSequenceDCT(dataset,
+                               batch_size=args.batchSize,
+                               shuffle=False,
+                               transformations=[ConvertTo3Channels(), Resize(height=300, width=300)],
+                               returns={'processed_images'},
+                               keep_images_without_gt=True,
+                               deconv=args.deconv,
+                               dct_dtype=dct_dtype,
+                               buffer_ring_size=buffer_ring_size)
+    # Fills the ring (if any) before measuring.
+    sequence[0]
+
+    allocated, host, transferred = [], [], []
+    for i in range(args.numberOfBatches):
+        tracemalloc.start()
+        inputs, = sequence[i % len(sequence)]
+        allocated.append(tracemalloc.get_traced_memory()[1] + extra_bytes)
+        tracemalloc.stop()
+        host.append(sum(array.nbytes for array in inputs))
+        # The arrays actually copied to the device are the float32 casts of the inputs.
+        transferred.append(sum(array.astype(np.float32).nbytes for array in inputs))
+
+    print("{}: {:.1f} MB allocated per batch, {:.1f} MB of DCT inputs in host memory, {:.1f} MB to the device".format(name,
+                                                                                                                    np.mean(allocated) / 1024 ** 2,
+                                                                                                                    np.mean(host) / 1024 ** 2,
+                                                                                                                    np.mean(transferred) / 1024 ** 2))
@@ -381,3 +381,78 @@ def iou(boxes1, boxes2, coords='centroids', mode='outer_product', border_pixels=
     union_areas = boxes1_areas + boxes2_areas - intersection_areas
 
     return intersection_areas / union_areas
+
+def iou_batch(boxes1, boxes2, coords='centroids', border_pixels='half', dtype=np.float64):
+    '''
+    Computes the IoU similarities of the boxes of every batch item with one common set of boxes,
+    e.g. the ground truth boxes of a batch with the anchor boxes.
+
+    For every batch item, the result is the matrix that `iou()` returns in 'outer_product' mode, computed
+    with the same operations so that it is identical for `dtype=np.float64`. In particular, as in `iou()`,
+    `border_pixels` only applies to the areas of the boxes and not to the intersection areas.
+
+    Arguments:
+        boxes1 (array): A 3D Numpy array of shape `(batch_size, m, 4)` containing the coordinates for `m` boxes
+            per batch item in the format specified by `coords`.
+        boxes2 (array): A 2D Numpy array of shape `(n, 4)` containing the coordinates for `n` boxes in the format
+            specified by `coords`.
+        coords (str, optional): The coordinate format in the input arrays. Can be either 'centroids' for the format
+            `(cx, cy, w, h)`, 'minmax' for the format `(xmin, xmax, ymin, ymax)`, or 'corners' for the format
+            `(xmin, ymin, xmax, ymax)`.
+        border_pixels (str, optional): How to treat the border pixels of the bounding boxes.
+            Can be 'include', 'exclude', or 'half'.
+        dtype (type, optional): The floating point type in which the IoU similarities are computed.
+
+    Returns:
+        A 3D Numpy array of shape `(batch_size, m, n)` and of type `dtype` containing the IoU similarities.
+    '''
+
+    if boxes1.ndim != 3: raise ValueError("boxes1 must have rank 3, but has rank {}.".format(boxes1.ndim))
+    if boxes2.ndim != 2: raise ValueError("boxes2 must have rank 2, but has rank {}.".format(boxes2.ndim))
+
+    # Convert the coordinates if necessary.
+    if coords == 'centroids':
+        boxes1 = convert_coordinates(boxes1, start_index=0, conversion='centroids2corners')
+        boxes2 = convert_coordinates(boxes2, start_index=0, conversion='centroids2corners')
+        coords = 'corners'
+    elif not (coords in {'minmax', 'corners'}):
+        raise ValueError("Unexpected value for `coords`. Supported values are 'minmax', 'corners' and 'centroids'.")
+
+    if coords == 'corners':
+        xmin, ymin, xmax, ymax = 0, 1, 2, 3
+    elif coords == 'minmax':
+        xmin, xmax, ymin, ymax = 0, 1, 2, 3
+
+    if border_pixels == 'half':
+        d = 0
+    elif border_pixels == 'include':
+        d = 1
+    elif border_pixels == 'exclude':
+        d = -1
+
+    boxes1 = boxes1.astype(dtype, copy=False)
+    boxes2 = boxes2.astype(dtype, copy=False)
+
+    # Coordinates of shape (batch_size, m, 1) and (n,), broadcast to (batch_size, m, n).
+    coordinates1 = [boxes1[:, :, [coordinate]] for coordinate in (xmin, ymin, xmax, ymax)]
+    coordinates2 = [boxes2[:, coordinate] for coordinate in (xmin, ymin, xmax, ymax)]
+
+    # The arrays of shape (batch_size, m, n) are computed in place in three buffers.
+    intersection_areas = np.minimum(coordinates1[2], coordinates2[2])
+    buffer = np.maximum(coordinates1[0], coordinates2[0])
+    intersection_areas -= buffer
+    np.maximum(intersection_areas, 0, out=intersection_areas) # The widths of the intersection rectangles
+    heights = np.minimum(coordinates1[3], coordinates2[3])
+    np.maximum(coordinates1[1], coordinates2[1], out=buffer)
+    heights -= buffer
+    np.maximum(heights, 0, out=heights)
+    intersection_areas *= heights
+
+    boxes1_areas = (coordinates1[2] - coordinates1[0] + d) * (coordinates1[3] - coordinates1[1] + d)
+    boxes2_areas = (coordinates2[2] - coordinates2[0] + d) * (coordinates2[3] - coordinates2[1] + d)
+
+    union_areas = np.add(boxes1_areas, boxes2_areas, out=buffer)
+    union_areas -= intersection_areas
+
+    intersection_areas /= union_areas
+    return intersection_areas
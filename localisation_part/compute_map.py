@@ -3,14 +3,12 @@ import os
 
 import numpy as np
 
-from tqdm import tqdm
-
-from bs4 import BeautifulSoup
-
 from eval_utils.utils import compute_average_precisions
+from data_generator.object_detection_2d_annotation_index import DEFAULT_CACHE_DIR, load_annotation_index
 
 parser = argparse.ArgumentParser()
 parser.add_argument("--inputFolder", default="output/")
+parser.add_argument("--cacheDir", help="The directory of the cached annotations, see load_annotation_index.", default=DEFAULT_CACHE_DIR)
 
 args = parser.parse_args()
 
@@ -30,43 +28,24 @@ def parse_xml(images_dirs,
                     'sheep', 'sofa', 'train', 'tvmonitor']
 
 
-    # Erase data that might have been parsed before.
     groundtruth = {}
     for images_dir, image_set_filename, annotations_dir in zip(images_dirs, image_set_filenames, annotations_dirs):
         print(image_set_filename)
-        # Read the image set file that so that we know all the IDs of all the images to be included in the dataset.
-        with open(image_set_filename) as f:
-            image_ids = [line.strip() for line in f]
-
-        it = tqdm(image_ids, desc="Processing image set '{}'".format(os.path.basename(image_set_filename)))
-
-        # Loop over all images in this dataset.
-        for image_id in it:
-            # Parse the XML file for this image.
-            with open(os.path.join(annotations_dir, image_id + '.xml')) as f:
-                soup = BeautifulSoup(f, 'xml')
-
-            boxes = [] # We'll store all boxes for this image here.
-            objects = soup.find_all('object') # Get a list of all objects in this image.
-
-            # Parse the data for each object.
-            for obj in objects:
-                class_name = obj.find('name', recursive=False).text
-                class_id = classes.index(class_name)
-                difficult = int(obj.find('difficult', recursive=False).text)
-
-                # Get the bounding box coordinates.
-                bndbox = obj.find('bndbox', recursive=False)
-                xmin = int(bndbox.xmin.text)
-                ymin = int(bndbox.ymin.text)
-                xmax = int(bndbox.xmax.text)
-                ymax = int(bndbox.ymax.text)
-
-                box = [class_id, xmin, ymin, xmax, ymax, difficult]
-
-                boxes.append(box)
-
-            groundtruth[image_id] = boxes
+        # The annotations come from the cached index of this image set, shared with the data generators.
+        annotation_index = load_annotation_index(image_set_filename, annotations_dir, classes, cache_dir=args.cacheDir)
+
+        # Each box is [class_id, xmin, ymin, xmax, ymax, difficult].
+        boxes = np.concatenate([annotation_index.class_ids[:, None],
+                                annotation_index.boxes,
+                                annotation_index.difficult[:, None]], axis=1).astype(np.int64)
+        if exclude_difficult:
+            boxes = boxes[~annotation_index.difficult]
+            offsets = np.concatenate([[0], np.cumsum(~annotation_index.difficult)])[annotation_index.offsets]
+        else:
+            offsets = annotation_index.offsets
+
+        for i, image_id in enumerate(annotation_index.image_ids.tolist()):
+            groundtruth[image_id] = boxes[offsets[i]:offsets[i + 1]].tolist()
 
     return groundtruth
 
@@ -0,0 +1,253 @@
+'''
+A persistent index of the Pascal VOC style annotations of an image set, shared by the `parse_xml()` methods
+of the data generators and by the mAP scripts.
+
+The annotations of all the images of an image set are stored as flat NumPy arrays, the boxes of the image `i`
+being the rows `offsets[i]:offsets[i+1]` of the box arrays. The index is cached in a `.npz` file named after
+the image set file, the annotations directory and the classes. The cache is rebuilt if the modification time
+of the image set file or of any of the XML files it refers to has changed. A rebuild parses the XML files with
+`xml.etree.ElementTree` in a pool of processes.
+'''
+
+from __future__ import division
+import numpy as np
+import os
+import sys
+import hashlib
+import tempfile
+from multiprocessing import Pool
+import xml.etree.ElementTree as ElementTree
+from tqdm import tqdm
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'ssd_annotation_index')
+
+# Below this number of files, the XML files are parsed in the calling process.
+MIN_FILES_PER_POOL = 256
+
+def parse_voc_annotation(annotation_path):
+    '''
+    Parses one Pascal VOC XML annotation file.
+
+    Arguments:
+        annotation_path (str): The path of the XML file.
+
+    Returns:
+        A list with the class name of every object and three lists of integers with, for every object, its
+        bounding box `[xmin, ymin, xmax, ymax]`, its 'truncated' flag and its 'difficult' flag.
+    '''
+    root = ElementTree.parse(annotation_path).getroot()
+
+    class_names, boxes, truncated, difficult = [], [], [], []
+    for obj in root.iter('object'):
+        class_names.append(obj.findtext('name'))
+        truncated.append(int(obj.findtext('truncated')))
+        difficult.append(int(obj.findtext('difficult')))
+        bndbox = obj.find('bndbox')
+        boxes.append([int(bndbox.findtext(coordinate)) for coordinate in ('xmin', 'ymin', 'xmax', 'ymax')])
+
+    return class_names, boxes, truncated, difficult
+
+class AnnotationIndex:
+    '''
+    The annotations of an image set as flat arrays:
+        * `image_ids`: the image IDs of the image set file, in its order.
+        * `offsets`: int64 array of length `len(image_ids) + 1`, the boxes of the image `i` are the
+            rows `offsets[i]:offsets[i+1]` of the arrays below.
+        * `boxes`: int32 array of shape `(n_boxes, 4)` in the format `(xmin, ymin, xmax, ymax)`.
+        * `class_ids`: int16 array of the class IDs, the index of the class names in `classes`.
+        * `truncated` and `difficult`: boolean arrays of the flags of the boxes.
+    '''
+
+    def __init__(self, image_ids, offsets, boxes, class_ids, truncated, difficult):
+        self.image_ids = image_ids
+        self.offsets = offsets
+        self.boxes = boxes
+        self.class_ids = class_ids
+        self.truncated = truncated
+        self.difficult = difficult
+
+    def __len__(self):
+        return len(self.image_ids)
+
+    def labels(self,
+               labels_output_format=('class_id', 'xmin', 'ymin', 'xmax', 'ymax'),
+               include_classes='all',
+               exclude_truncated=False,
+               exclude_difficult=False):
+        '''
+        Returns the labels in the format of the `labels` and `eval_neutral` lists of the data generators.
+
+        Arguments:
+            labels_output_format (list, optional): The order of the items 'class_id', 'xmin', 'ymin', 'xmax'
+                and 'ymax' in the boxes.
+            include_classes (list, optional): Either 'all' or a list of the class IDs to keep.
+            exclude_truncated (bool, optional): If `True`, excludes the boxes labeled as 'truncated'.
+            exclude_difficult (bool, optional): If `True`, excludes the boxes labeled as 'difficult'.
+
+        Returns:
+            A list with, for every image, the list of its boxes, and a list with, for every image, the list
+            of the 'difficult' flags of its boxes.
+
+        Raises:
+            ValueError: If `labels_output_format` contains an item other than 'class_id', 'xmin', 'ymin',
+                'xmax' and 'ymax'.
+        '''
+        columns = {'class_id': self.class_ids,
+                   'xmin': self.boxes[:,0],
+                   'ymin': self.boxes[:,1],
+                   'xmax': self.boxes[:,2],
+                   'ymax': self.boxes[:,3]}
+        unsupported = [item for item in labels_output_format if not item in columns]
+        if unsupported:
+            raise ValueError("`labels_output_format` can only contain the items {}, but it contains {}.".format(sorted(columns), unsupported))
+
+        keep = np.ones(len(self.class_ids), dtype=np.bool_)
+        if not include_classes == 'all':
+            keep &= np.isin(self.class_ids, include_classes)
+        if exclude_truncated:
+            keep &= ~self.truncated
+        if exclude_difficult:
+            keep &= ~self.difficult
+
+        boxes = np.stack([columns[item].astype(np.int64) for item in labels_output_format], axis=1)
+
+        # Cut the flat arrays back into one list per image only once, with the filtered offsets.
+        kept_offsets = np.concatenate([[0], np.cumsum(keep)])[self.offsets]
+        boxes = boxes[keep].tolist()
+        eval_neutral = self.difficult[keep].tolist()
+
+        labels, eval_neutrals = [], []
+        for start, stop in zip(kept_offsets[:-1], kept_offsets[1:]):
+            labels.append(boxes[start:stop])
+            eval_neutrals.append(eval_neutral[start:stop])
+
+        return labels, eval_neutrals
+
+def build_annotation_index(image_ids, annotations_dir, classes, workers=None, verbose=True):
+    '''
+    Parses the XML files of the given images into an `AnnotationIndex`.
+
+    Arguments:
+        image_ids (list): The image IDs, the name of the XML file of an image being its ID.
+        annotations_dir (str): The directory containing the XML files.
+        classes (list): The names of the classes, their index is their class ID.
+        workers (int, optional): The number of processes parsing the files. If `None`, the number of CPUs.
+        verbose (bool, optional): If `True`, prints out the progress of the parsing.
+
+    Returns:
+        The `AnnotationIndex`.
+    '''
+    paths = [os.path.join(annotations_dir, image_id + '.xml') for image_id in image_ids]
+
+    if len(paths) < MIN_FILES_PER_POOL or workers == 1:
+        pool = None
+        annotations = map(parse_voc_annotation, paths)
+    else:
+        pool = Pool(workers)
+        annotations = pool.imap(parse_voc_annotation, paths, chunksize=64)
+
+    if verbose:
+        annotations = tqdm(annotations, total=len(paths), desc="Parsing '{}'".format(annotations_dir), file=sys.stdout)
+
+    class_ids_by_name = {class_name: class_id for class_id, class_name in enumerate(classes)}
+    offsets = [0]
+    boxes, class_ids, truncated, difficult = [], [], [], []
+    try:
+        for (image_class_names, image_boxes, image_truncated, image_difficult), path in zip(annotations, paths):
+            for class_name in image_class_names:
+                if not class_name in class_ids_by_name:
+                    raise ValueError("The class '{}' of '{}' is not in `classes`.".format(class_name, path))
+                class_ids.append(class_ids_by_name[class_name])
+            boxes += image_boxes
+            truncated += image_truncated
+            difficult += image_difficult
+            offsets.append(len(boxes))
+    finally:
+        if not pool is None:
+            pool.terminate()
+
+    return AnnotationIndex(image_ids=np.array(image_ids, dtype=np.str_),
+                           offsets=np.array(offsets, dtype=np.int64),
+                           boxes=np.array(boxes, dtype=np.int32).reshape(-1, 4),
+                           class_ids=np.array(class_ids, dtype=np.int16),
+                           truncated=np.array(truncated, dtype=np.bool_),
+                           difficult=np.array(difficult, dtype=np.bool_))
+
+def annotation_mtimes(image_set_filename, annotations_dir, image_ids):
+    '''
+    Returns:
+        An int64 array with the modification time in nanoseconds of the image set file followed by the ones
+        of the XML files of its images.
+    '''
+    mtimes = [os.stat(image_set_filename).st_mtime_ns]
+    mtimes += [os.stat(os.path.join(annotations_dir, image_id + '.xml')).st_mtime_ns for image_id in image_ids]
+    return np.array(mtimes, dtype=np.int64)
+
+def annotation_index_path(image_set_filename, annotations_dir, classes, cache_dir=DEFAULT_CACHE_DIR):
+    '''
+    Returns:
+        The path of the cache file of the index of the given image set, annotations directory and classes.
+    '''
+    key = '\n'.join([os.path.abspath(image_set_filename), os.path.abspath(annotations_dir)] + list(classes))
+    name = '{}_{}.npz'.format(os.path.splitext(os.path.basename(image_set_filename))[0],
+                              hashlib.sha1(key.encode('utf-8')).hexdigest()[:16])
+    return os.path.join(cache_dir, name)
+
+def load_annotation_index(image_set_filename,
+                          annotations_dir,
+                          classes,
+                          cache_dir=DEFAULT_CACHE_DIR,
+                          workers=None,
+                          verbose=True):
+    '''
+    Returns the `AnnotationIndex` of an image set, from its cache file if it is up to date. Otherwise the
+    XML files are parsed and, if `cache_dir` is not `None`, the cache file is written.
+
+    Arguments:
+        image_set_filename (str): The image set file, which contains one image ID per line.
+        annotations_dir (str): The directory containing the XML files.
+        classes (list): The names of the classes, their index is their class ID.
+        cache_dir (str, optional): The directory of the cache files, or `None` to parse without caching.
+        workers (int, optional): The number of processes parsing the files. If `None`, the number of CPUs.
+        verbose (bool, optional): If `True`, prints out the progress of the parsing.
+
+    Returns:
+        The `AnnotationIndex`.
+    '''
+    if cache_dir is None:
+        with open(image_set_filename) as f:
+            image_ids = [line.strip() for line in f]
+        return build_annotation_index(image_ids, annotations_dir, classes, workers=workers, verbose=verbose)
+
+    cache_path = annotation_index_path(image_set_filename, annotations_dir, classes, cache_dir)
+
+    if os.path.isfile(cache_path):
+        with np.load(cache_path) as cache:
+            arrays = {name: cache[name] for name in cache.files}
+        image_set_mtime = os.stat(image_set_filename).st_mtime_ns
+        if arrays['mtimes'][0] == image_set_mtime:
+            mtimes = annotation_mtimes(image_set_filename, annotations_dir, arrays['image_ids'])
+            if np.array_equal(mtimes, arrays['mtimes']):
+                del arrays['mtimes']
+                return AnnotationIndex(**arrays)
+
+    with open(image_set_filename) as f:
+        image_ids = [line.strip() for line in f]
+    mtimes = annotation_mtimes(image_set_filename, annotations_dir, image_ids)
+    index = build_annotation_index(image_ids, annotations_dir, classes, workers=workers, verbose=verbose)
+
+    # Written to a temporary file then renamed, so that concurrent jobs never read a partial cache.
+    os.makedirs(cache_dir, exist_ok=True)
+    file_descriptor, temporary_path = tempfile.mkstemp(dir=cache_dir, suffix='.npz')
+    with os.fdopen(file_descriptor, 'wb') as f:
+        np.savez(f,
+                 image_ids=index.image_ids,
+                 offsets=index.offsets,
+                 boxes=index.boxes,
+                 class_ids=index.class_ids,
+                 truncated=index.truncated,
+                 difficult=index.difficult,
+                 mtimes=mtimes)
+    os.replace(temporary_path, cache_path)
+
+    return index
@@ -0,0 +1,49 @@
+'''
+Preallocated batch buffers for the DCT data generators.
+'''
+
+from __future__ import division
+import numpy as np
+
+class BatchBufferRing:
+    '''
+    A ring of preallocated batch buffers, handed out in turn and filled in place by the generators.
+
+    A set of buffers is reused `size` batches after it was handed out, so `size` must be larger than
+    the number of batches alive at the same time, i.e. at least the `max_queue_size` of `fit_generator()`
+    plus the batch being trained on and the batch being built. With `use_multiprocessing=True`, the
+    batches built by the workers are copied to the main process and a ring of 1 is enough.
+    '''
+
+    def __init__(self, size, shapes, dtypes):
+        '''
+        Arguments:
+            size (int): The number of sets of buffers in the ring.
+            shapes (list): The shapes of the buffers of one set, the first axis being the batch size.
+            dtypes (list): The data types of the buffers of one set.
+        '''
+        self.buffers = [[np.empty(shape, dtype=dtype) for shape, dtype in zip(shapes, dtypes)] for _ in range(size)]
+        self.position = 0
+
+    def get(self, batch_size):
+        '''
+        Returns:
+            The next set of buffers of the ring, as views on their first `batch_size` items.
+        '''
+        buffers = self.buffers[self.position]
+        self.position = (self.position + 1) % len(self.buffers)
+        return [buffer[:batch_size] for buffer in buffers]
+
+def allocate_batch(shapes, dtypes, batch_size, buffer_ring=None):
+    '''
+    Returns the arrays of a batch, taken from `buffer_ring` if one is given, freshly allocated otherwise.
+
+    Arguments:
+        shapes (list): The shapes of the arrays without the batch axis.
+        dtypes (list): The data types of the arrays.
+        batch_size (int): The number of items in the batch.
+        buffer_ring (BatchBufferRing, optional): A ring built for these shapes and data types.
+    '''
+    if buffer_ring is None:
+        return [np.empty((batch_size,) + tuple(shape), dtype=dtype) for shape, dtype in zip(shapes, dtypes)]
+    return buffer_ring.get(batch_size)
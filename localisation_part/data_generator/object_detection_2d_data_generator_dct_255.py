@@ -31,7 +31,6 @@ import os
 import subprocess
 import sys
 from tqdm import tqdm, trange
-import jpegdecoder
 try:
     import h5py
 except ImportError:
@@ -51,6 +50,8 @@ except ImportError:
 
 from ssd_encoder_decoder.ssd_input_encoder import SSDInputEncoder
 from data_generator.object_detection_2d_image_boxes_validation_utils import BoxFilter
+from data_generator.object_detection_2d_annotation_index import DEFAULT_CACHE_DIR, load_annotation_index
+from data_generator.object_detection_2d_dct_codec import JPEGCodec
 
 class DegenerateBatchError(Exception):
     '''
@@ -148,7 +149,6 @@ class DataGeneratorDCT:
         self.dataset_size = 0 # As long as we haven't loaded anything yet, the dataset size is zero.
         self.load_images_into_memory = load_images_into_memory
         self.images = None # The only way that this list will not stay `None` is if `load_images_into_memory == True`.
-        self.decoder = jpegdecoder.decoder.JPEGDecoder()
 
         # `self.filenames` is a list containing all file names of the image samples (full paths).
         # Note that it does not contain the actual image files themselves. This list is one of the outputs of the parser methods.
@@ -415,7 +415,9 @@ class DataGeneratorDCT:
                   exclude_truncated=False,
                   exclude_difficult=False,
                   ret=False,
-                  verbose=True):
+                  verbose=True,
+                  cache_dir=DEFAULT_CACHE_DIR,
+                  workers=None):
         '''
         This is an XML parser for the Pascal VOC datasets. It might be applicable to other datasets with minor changes to
         the code, but in its current form it expects the data format and XML tags of the Pascal VOC datasets.
@@ -442,6 +444,10 @@ class DataGeneratorDCT:
             exclude_difficult (bool, optional): If `True`, excludes boxes that are labeled as 'difficult'.
             ret (bool, optional): Whether or not to return the outputs of the parser.
             verbose (bool, optional): If `True`, prints out the progress for operations that may take a bit longer.
+            cache_dir (str, optional): The directory where the parsed annotations of every image set are cached,
+                see `load_annotation_index()`. If `None`, the XML files are parsed every time.
+            workers (int, optional): The number of processes parsing the XML files when the cache has to be built.
+                If `None`, the number of CPUs.
 
         Returns:
             None by default, optionally lists for whichever are available of images, image filenames, labels, image IDs,
@@ -465,70 +471,28 @@ class DataGeneratorDCT:
             annotations_dirs = [None] * len(images_dirs)
 
         for images_dir, image_set_filename, annotations_dir in zip(images_dirs, image_set_filenames, annotations_dirs):
-            # Read the image set file that so that we know all the IDs of all the images to be included in the dataset.
-            with open(image_set_filename) as f:
-                image_ids = [line.strip() for line in f] # Note: These are strings, not integers.
-                self.image_ids += image_ids
-
-            if verbose: it = tqdm(image_ids, desc="Processing image set '{}'".format(os.path.basename(image_set_filename)), file=sys.stdout)
-            else: it = image_ids
-
-            # Loop over all images in this dataset.
-            for image_id in it:
-
-                filename = '{}'.format(image_id) + '.jpg'
-                self.filenames.append(os.path.join(images_dir, filename))
-
-                if not annotations_dir is None:
-                    # Parse the XML file for this image.
-                    with open(os.path.join(annotations_dir, image_id + '.xml')) as f:
-                        soup = BeautifulSoup(f, 'xml')
-
-                    folder = soup.folder.text # In case we want to return the folder in addition to the image file name. Relevant for determining which dataset an image belongs to.
-                    #filename = soup.filename.text
-
-                    boxes = [] # We'll store all boxes for this image here.
-                    eval_neutr = [] # We'll store whether a box is annotated as "difficult" here.
-                    objects = soup.find_all('object') # Get a list of all objects in this image.
-
-                    # Parse the data for each object.
-                    for obj in objects:
-                        class_name = obj.find('name', recursive=False).text
-                        class_id = self.classes.index(class_name)
-                        # Check whether this class is supposed to be included in the dataset.
-                        if (not self.include_classes == 'all') and (not class_id in self.include_classes): continue
-                        pose = obj.find('pose', recursive=False).text
-                        truncated = int(obj.find('truncated', recursive=False).text)
-                        if exclude_truncated and (truncated == 1): continue
-                        difficult = int(obj.find('difficult', recursive=False).text)
-                        if exclude_difficult and (difficult == 1): continue
-                        # Get the bounding box coordinates.
-                        bndbox = obj.find('bndbox', recursive=False)
-                        xmin = int(bndbox.xmin.text)
-                        ymin = int(bndbox.ymin.text)
-                        xmax = int(bndbox.xmax.text)
-                        ymax = int(bndbox.ymax.text)
-                        item_dict = {'folder': folder,
-                                     'image_name': filename,
-                                     'image_id': image_id,
-                                     'class_name': class_name,
-                                     'class_id': class_id,
-                                     'pose': pose,
-                                     'truncated': truncated,
-                                     'difficult': difficult,
-                                     'xmin': xmin,
-                                     'ymin': ymin,
-                                     'xmax': xmax,
-                                     'ymax': ymax}
-                        box = []
-                        for item in self.labels_output_format:
-                            box.append(item_dict[item])
-                        boxes.append(box)
-                        if difficult: eval_neutr.append(True)
-                        else: eval_neutr.append(False)
-
-                    self.labels.append(boxes)
-                    self.eval_neutral.append(eval_neutr)
+            if annotations_dir is None:
+                # Read the image set file that so that we know all the IDs of all the images to be included in the dataset.
+                with open(image_set_filename) as f:
+                    image_ids = [line.strip() for line in f] # Note: These are strings, not integers.
+            else:
+                # The annotations come from the cached index of this image set, which is only rebuilt if files changed.
+                annotation_index = load_annotation_index(image_set_filename=image_set_filename,
+                                                         annotations_dir=annotations_dir,
+                                                         classes=self.classes,
+                                                         cache_dir=cache_dir,
+                                                         workers=workers,
+                                                         verbose=verbose)
+                image_ids = annotation_index.image_ids.tolist() # Note: These are strings, not integers.
+                labels, eval_neutral = annotation_index.labels(labels_output_format=self.labels_output_format,
+                                                               include_classes=self.include_classes,
+                                                               exclude_truncated=exclude_truncated,
+                                                               exclude_difficult=exclude_difficult)
+                self.labels += labels
+                self.eval_neutral += eval_neutral
+
+            self.image_ids += image_ids
+            self.filenames += [os.path.join(images_dir, '{}'.format(image_id) + '.jpg') for image_id in image_ids]
 
         self.dataset_size = len(self.filenames)
         self.dataset_indices = np.arange(self.dataset_size, dtype=np.int32)
@@ -838,7 +802,8 @@ class DataGeneratorDCT:
                  label_encoder=None,
                  returns={'processed_images', 'encoded_labels'},
                  keep_images_without_gt=False,
-                 degenerate_box_handling='remove'):
+                 degenerate_box_handling='remove',
+                 codec_max_retries=3):
         '''
         Generates batches of samples and (optionally) corresponding labels indefinitely.
 
@@ -905,6 +870,8 @@ class DataGeneratorDCT:
                 transformations have been applied (if any), but before the labels were passed to the `label_encoder` (if one was given).
                 Can be one of 'warn' or 'remove'. If 'warn', the generator will merely print a warning to let you know that there
                 are degenerate boxes in a batch. If 'remove', the generator will remove degenerate boxes from the batch silently.
+            codec_max_retries (int, optional): The number of times the in-memory JPEG codec stage is retried on an image
+                before a `JPEGCodecError` is raised.
 
         Yields:
             The next batch as a tuple of items as defined by the `returns` argument.
@@ -959,6 +926,9 @@ class DataGeneratorDCT:
             for transform in transformations:
                 transform.labels_format = self.labels_format
 
+        # Each generator gets its own codec, i.e. its own in-memory file.
+        codec = JPEGCodec(max_retries=codec_max_retries)
+
         #############################################################################################
         # Generate mini batches.
         #############################################################################################
@@ -1163,32 +1133,10 @@ class DataGeneratorDCT:
             # Compose the output.
             #########################################################################################
             new_batch_X = np.empty(batch_X.shape, dtype=np.int32)
-            for i, image_to_save in enumerate(batch_X):
-                im = Image.fromarray(image_to_save)
-                im.save(os.path.join(os.environ["LOCAL_WORK_DIR"], "{}.jpg".format(i)), format="jpeg", subsampling=0)
-                while True:
-                    try:
-                        img = self.decoder.decode_file(os.path.join(os.environ["LOCAL_WORK_DIR"], "{}.jpg".format(i)), 2)
-                        rows, cols = img.get_component_shape(0)[0:2]
-                        if img.get_number_of_component() == 1:
-                            new_batch_X[i, :, :, 0] = (np.reshape(img.get_data(0), (rows, cols))[
-                                :300, :300] + 1024) * 255 // 2048
-                            new_batch_X[i, :, :, 1] = new_batch_X[i, :, :, 0]
-                            new_batch_X[i, :, :, 2] = new_batch_X[i, :, :, 0]
-                        else:
-                            new_batch_X[i, :, :, 0] = (np.reshape(
-                                img.get_data(0), (rows, cols))[:300, :300]  + 1024) * 255 // 2048
-                            new_batch_X[i, :, :, 1] = (np.reshape(
-                                img.get_data(1), (rows, cols))[:300, :300] + 1024) * 255 // 2048
-                            new_batch_X[i, :, :, 2] = (np.reshape(
-                                img.get_data(2), (rows, cols))[:300, :300] + 1024) * 255 // 2048
-                    except OSError:
-                        print("i'am stuck {}.jpg".format(i))
-                        continue
-                    except Exception:
-                        print("{}.jpg".format(i))
-                        continue
-                    break
+            for i, image in enumerate(batch_X):
+                new_batch_X[i] = codec(image,
+                                       scale_to_255=True,
+                                       image_name=batch_filenames[i] if not (batch_filenames is None) else i)
 
             ret = []
             if 'processed_images' in returns: ret.append(new_batch_X)
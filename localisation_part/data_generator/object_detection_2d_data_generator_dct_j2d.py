@@ -53,6 +53,28 @@ except ImportError:
 
 from ssd_encoder_decoder.ssd_input_encoder import SSDInputEncoder
 from data_generator.object_detection_2d_image_boxes_validation_utils import BoxFilter
+from data_generator.object_detection_2d_annotation_index import DEFAULT_CACHE_DIR, load_annotation_index
+from data_generator.object_detection_2d_batch_buffers import BatchBufferRing, allocate_batch
+
+def decode_jpeg(buffer):
+    '''
+    Returns:
+        The JPEG image held in `buffer` (bytes or uint8 array) as a 3-channel uint8 array.
+    '''
+    if isinstance(buffer, np.ndarray):
+        buffer = buffer.tobytes()
+    with Image.open(BytesIO(buffer)) as image:
+        return np.array(image.convert('RGB'), dtype=np.uint8)
+
+def dct_input_shapes(deconv=False):
+    '''
+    Returns:
+        The shapes, without the batch axis, of the DCT inputs of the 300x300 SSD: Y, then either CbCr
+        or Cb and Cr if `deconv` is `True`.
+    '''
+    if deconv:
+        return [(38, 38, 64), (19, 19, 64), (19, 19, 64)]
+    return [(38, 38, 64), (19, 19, 128)]
 
 class DegenerateBatchError(Exception):
     '''
@@ -150,6 +172,7 @@ class DataGeneratorDCT:
         self.dataset_size = 0 # As long as we haven't loaded anything yet, the dataset size is zero.
         self.load_images_into_memory = load_images_into_memory
         self.images = None # The only way that this list will not stay `None` is if `load_images_into_memory == True`.
+        self.hdf5_image_format = 'pixels' # The layout of the images of the HDF5 dataset, if any, see `create_hdf5_dataset()`.
         self.decoder = jpegdecoder.decoder.JPEGDecoder()
 
         # `self.filenames` is a list containing all file names of the image samples (full paths).
@@ -235,6 +258,9 @@ class DataGeneratorDCT:
         '''
 
         self.hdf5_dataset = h5py.File(self.hdf5_dataset_path, 'r')
+        self.hdf5_image_format = self.hdf5_dataset.attrs.get('image_format', 'pixels')
+        if isinstance(self.hdf5_image_format, bytes):
+            self.hdf5_image_format = self.hdf5_image_format.decode()
         self.dataset_size = len(self.hdf5_dataset['images'])
         self.dataset_indices = np.arange(self.dataset_size, dtype=np.int32) # Instead of shuffling the HDF5 dataset or images in memory, we will shuffle this index list.
 
@@ -243,7 +269,7 @@ class DataGeneratorDCT:
             if verbose: tr = trange(self.dataset_size, desc='Loading images into memory', file=sys.stdout)
             else: tr = range(self.dataset_size)
             for i in tr:
-                self.images.append(self.hdf5_dataset['images'][i].reshape(self.hdf5_dataset['image_shapes'][i]))
+                self.images.extend(self.read_hdf5_images([i]))
 
         if self.hdf5_dataset.attrs['has_labels']:
             self.labels = []
@@ -270,6 +296,34 @@ class DataGeneratorDCT:
             for i in tr:
                 self.eval_neutral.append(eval_neutral[i])
 
+    def read_hdf5_images(self, indices, decode=True):
+        '''
+        Reads several images of the HDF5 dataset in one call. The indices are sorted and deduplicated
+        so that h5py reads the chunks in order, then the images are put back in the requested order.
+
+        Arguments:
+            indices (array): The indices of the images in the HDF5 dataset.
+            decode (bool, optional): Only relevant for the 'jpeg' layout. If `False`, the JPEG files are
+                returned as bytes instead of being decoded.
+
+        Returns:
+            A list of images as uint8 arrays of shape `(height, width, channels)`, or of bytes.
+        '''
+        indices = np.asarray(indices, dtype=np.int64)
+        unique_indices, positions = np.unique(indices, return_inverse=True)
+        images = self.hdf5_dataset['images'][unique_indices]
+
+        if self.hdf5_image_format == 'jpeg':
+            if decode:
+                images = [decode_jpeg(image) for image in images]
+            else:
+                images = [image.tobytes() for image in images]
+        else:
+            image_shapes = self.hdf5_dataset['image_shapes'][unique_indices]
+            images = [image.reshape(image_shape) for image, image_shape in zip(images, image_shapes)]
+
+        return [images[position] for position in positions.reshape(-1)]
+
     def parse_csv(self,
                   images_dir,
                   labels_filename,
@@ -417,7 +471,9 @@ class DataGeneratorDCT:
                   exclude_truncated=False,
                   exclude_difficult=False,
                   ret=False,
-                  verbose=True):
+                  verbose=True,
+                  cache_dir=DEFAULT_CACHE_DIR,
+                  workers=None):
         '''
         This is an XML parser for the Pascal VOC datasets. It might be applicable to other datasets with minor changes to
         the code, but in its current form it expects the data format and XML tags of the Pascal VOC datasets.
@@ -444,6 +500,10 @@ class DataGeneratorDCT:
             exclude_difficult (bool, optional): If `True`, excludes boxes that are labeled as 'difficult'.
             ret (bool, optional): Whether or not to return the outputs of the parser.
             verbose (bool, optional): If `True`, prints out the progress for operations that may take a bit longer.
+            cache_dir (str, optional): The directory where the parsed annotations of every image set are cached,
+                see `load_annotation_index()`. If `None`, the XML files are parsed every time.
+            workers (int, optional): The number of processes parsing the XML files when the cache has to be built.
+                If `None`, the number of CPUs.
 
         Returns:
             None by default, optionally lists for whichever are available of images, image filenames, labels, image IDs,
@@ -467,70 +527,28 @@ class DataGeneratorDCT:
             annotations_dirs = [None] * len(images_dirs)
 
         for images_dir, image_set_filename, annotations_dir in zip(images_dirs, image_set_filenames, annotations_dirs):
-            # Read the image set file that so that we know all the IDs of all the images to be included in the dataset.
-            with open(image_set_filename) as f:
-                image_ids = [line.strip() for line in f] # Note: These are strings, not integers.
-                self.image_ids += image_ids
-
-            if verbose: it = tqdm(image_ids, desc="Processing image set '{}'".format(os.path.basename(image_set_filename)), file=sys.stdout)
-            else: it = image_ids
-
-            # Loop over all images in this dataset.
-            for image_id in it:
-
-                filename = '{}'.format(image_id) + '.jpg'
-                self.filenames.append(os.path.join(images_dir, filename))
-
-                if not annotations_dir is None:
-                    # Parse the XML file for this image.
-                    with open(os.path.join(annotations_dir, image_id + '.xml')) as f:
-                        soup = BeautifulSoup(f, 'xml')
-
-                    folder = soup.folder.text # In case we want to return the folder in addition to the image file name. Relevant for determining which dataset an image belongs to.
-                    #filename = soup.filename.text
-
-                    boxes = [] # We'll store all boxes for this image here.
-                    eval_neutr = [] # We'll store whether a box is annotated as "difficult" here.
-                    objects = soup.find_all('object') # Get a list of all objects in this image.
-
-                    # Parse the data for each object.
-                    for obj in objects:
-                        class_name = obj.find('name', recursive=False).text
-                        class_id = self.classes.index(class_name)
-                        # Check whether this class is supposed to be included in the dataset.
-                        if (not self.include_classes == 'all') and (not class_id in self.include_classes): continue
-                        pose = obj.find('pose', recursive=False).text
-                        truncated = int(obj.find('truncated', recursive=False).text)
-                        if exclude_truncated and (truncated == 1): continue
-                        difficult = int(obj.find('difficult', recursive=False).text)
-                        if exclude_difficult and (difficult == 1): continue
-                        # Get the bounding box coordinates.
-                        bndbox = obj.find('bndbox', recursive=False)
-                        xmin = int(bndbox.xmin.text)
-                        ymin = int(bndbox.ymin.text)
-                        xmax = int(bndbox.xmax.text)
-                        ymax = int(bndbox.ymax.text)
-                        item_dict = {'folder': folder,
-                                     'image_name': filename,
-                                     'image_id': image_id,
-                                     'class_name': class_name,
-                                     'class_id': class_id,
-                                     'pose': pose,
-                                     'truncated': truncated,
-                                     'difficult': difficult,
-                                     'xmin': xmin,
-                                     'ymin': ymin,
-                                     'xmax': xmax,
-                                     'ymax': ymax}
-                        box = []
-                        for item in self.labels_output_format:
-                            box.append(item_dict[item])
-                        boxes.append(box)
-                        if difficult: eval_neutr.append(True)
-                        else: eval_neutr.append(False)
-
-                    self.labels.append(boxes)
-                    self.eval_neutral.append(eval_neutr)
+            if annotations_dir is None:
+                # Read the image set file that so that we know all the IDs of all the images to be included in the dataset.
+                with open(image_set_filename) as f:
+                    image_ids = [line.strip() for line in f] # Note: These are strings, not integers.
+            else:
+                # The annotations come from the cached index of this image set, which is only rebuilt if files changed.
+                annotation_index = load_annotation_index(image_set_filename=image_set_filename,
+                                                         annotations_dir=annotations_dir,
+                                                         classes=self.classes,
+                                                         cache_dir=cache_dir,
+                                                         workers=workers,
+                                                         verbose=verbose)
+                image_ids = annotation_index.image_ids.tolist() # Note: These are strings, not integers.
+                labels, eval_neutral = annotation_index.labels(labels_output_format=self.labels_output_format,
+                                                               include_classes=self.include_classes,
+                                                               exclude_truncated=exclude_truncated,
+                                                               exclude_difficult=exclude_difficult)
+                self.labels += labels
+                self.eval_neutral += eval_neutral
+
+            self.image_ids += image_ids
+            self.filenames += [os.path.join(images_dir, '{}'.format(image_id) + '.jpg') for image_id in image_ids]
 
         self.dataset_size = len(self.filenames)
         self.dataset_indices = np.arange(self.dataset_size, dtype=np.int32)
@@ -674,14 +692,22 @@ class DataGeneratorDCT:
                             file_path='dataset.h5',
                             resize=False,
                             variable_image_size=True,
+                            image_format='pixels',
+                            jpeg_quality=75,
+                            chunk_size=256,
                             verbose=True):
         '''
-        Converts the currently loaded dataset into a HDF5 file. This HDF5 file contains all
-        images as uncompressed arrays in a contiguous block of memory, which allows for them
-        to be loaded faster. Such an uncompressed dataset, however, may take up considerably
+        Converts the currently loaded dataset into a HDF5 file. With the 'pixels' layout, this HDF5
+        file contains all images as uncompressed arrays in a contiguous block of memory, which allows
+        for them to be loaded faster. Such an uncompressed dataset, however, may take up considerably
         more space on your hard drive than the sum of the source images in a compressed format
         such as JPG or PNG.
 
+        With the 'jpeg' layout, the HDF5 file contains the JPEG files themselves, so it is about the
+        size of the source images. Since the DCT pipeline works on JPEG files anyway, the stored bytes
+        are handed to `jpeg2dct` as they are when no transformations are given to `generate()`, and
+        only decoded if there are pixel transformations to apply.
+
         It is recommended that you always convert the dataset into an HDF5 dataset if you
         have enugh hard drive space since loading from an HDF5 dataset accelerates the data
         generation noticeably.
@@ -702,12 +728,22 @@ class DataGeneratorDCT:
             variable_image_size (bool, optional): The only purpose of this argument is that its
                 value will be stored in the HDF5 dataset in order to be able to quickly find out
                 whether the images in the dataset all have the same size or not.
+            image_format (str, optional): Either 'pixels' to store the images as flattened uint8 arrays or 'jpeg'
+                to store the JPEG files. With 'jpeg', the source files are stored unchanged if they are RGB
+                JPEG files and no resizing is requested, otherwise the (resized) images are encoded again.
+            jpeg_quality (int, optional): Only relevant for the 'jpeg' layout. The quality of the images that
+                have to be encoded again. The default is the one of the encoding done by `generate()`.
+            chunk_size (int, optional): Only relevant for the 'jpeg' layout. The number of samples per chunk
+                of the HDF5 datasets.
             verbose (bool, optional): Whether or not prit out the progress of the dataset creation.
 
         Returns:
             None.
         '''
 
+        if not image_format in {'pixels', 'jpeg'}:
+            raise ValueError("`image_format` must be either 'pixels' or 'jpeg', but is '{}'.".format(image_format))
+
         self.hdf5_dataset_path = file_path
 
         dataset_size = len(self.filenames)
@@ -727,12 +763,19 @@ class DataGeneratorDCT:
             hdf5_dataset.attrs.create(name='variable_image_size', data=True, shape=None, dtype=np.bool_)
         else:
             hdf5_dataset.attrs.create(name='variable_image_size', data=False, shape=None, dtype=np.bool_)
+        hdf5_dataset.attrs['image_format'] = image_format
+
+        # With the 'jpeg' layout, all datasets are chunked along the samples so that a batch
+        # touches a few chunks only. The 'pixels' layout keeps the chunks picked by h5py.
+        chunks = (max(1, min(chunk_size, dataset_size)),) if image_format == 'jpeg' else None
 
-        # Create the dataset in which the images will be stored as flattened arrays.
-        # This allows us, among other things, to store images of variable size.
+        # Create the dataset in which the images will be stored as flattened arrays, or as
+        # the bytes of the JPEG files. This allows us, among other things, to store images
+        # of variable size.
         hdf5_images = hdf5_dataset.create_dataset(name='images',
                                                   shape=(dataset_size,),
                                                   maxshape=(None),
+                                                  chunks=chunks,
                                                   dtype=h5py.special_dtype(vlen=np.uint8))
 
         # Create the dataset that will hold the image heights, widths and channels that
@@ -740,6 +783,7 @@ class DataGeneratorDCT:
         hdf5_image_shapes = hdf5_dataset.create_dataset(name='image_shapes',
                                                         shape=(dataset_size, 3),
                                                         maxshape=(None, 3),
+                                                        chunks=None if chunks is None else chunks + (3,),
                                                         dtype=np.int32)
 
         if not (self.labels is None):
@@ -748,6 +792,7 @@ class DataGeneratorDCT:
             hdf5_labels = hdf5_dataset.create_dataset(name='labels',
                                                       shape=(dataset_size,),
                                                       maxshape=(None),
+                                                      chunks=chunks,
                                                       dtype=h5py.special_dtype(vlen=np.int32))
 
             # Create the dataset that will hold the dimensions of the labels arrays for
@@ -755,6 +800,7 @@ class DataGeneratorDCT:
             hdf5_label_shapes = hdf5_dataset.create_dataset(name='label_shapes',
                                                             shape=(dataset_size, 2),
                                                             maxshape=(None, 2),
+                                                            chunks=None if chunks is None else chunks + (2,),
                                                             dtype=np.int32)
 
             hdf5_dataset.attrs.modify(name='has_labels', value=True)
@@ -764,6 +810,7 @@ class DataGeneratorDCT:
             hdf5_image_ids = hdf5_dataset.create_dataset(name='image_ids',
                                                          shape=(dataset_size,),
                                                          maxshape=(None),
+                                                         chunks=chunks,
                                                          dtype=h5py.special_dtype(vlen=str))
 
             hdf5_dataset.attrs.modify(name='has_image_ids', value=True)
@@ -774,6 +821,7 @@ class DataGeneratorDCT:
             hdf5_eval_neutral = hdf5_dataset.create_dataset(name='eval_neutral',
                                                             shape=(dataset_size,),
                                                             maxshape=(None),
+                                                            chunks=chunks,
                                                             dtype=h5py.special_dtype(vlen=np.bool_))
 
             hdf5_dataset.attrs.modify(name='has_eval_neutral', value=True)
@@ -786,27 +834,47 @@ class DataGeneratorDCT:
         # Iterate over all images in the dataset.
         for i in tr:
 
-            # Store the image.
-            with Image.open(self.filenames[i]) as image:
+            # Store the JPEG file, encoded again only if it can't be stored as it is.
+            if image_format == 'jpeg':
+
+                with open(self.filenames[i], 'rb') as f:
+                    buffer = f.read()
 
-                image = np.asarray(image, dtype=np.uint8)
+                with Image.open(BytesIO(buffer)) as image:
+                    if resize or image.format != 'JPEG' or image.mode != 'RGB':
+                        image = np.array(image.convert('RGB'), dtype=np.uint8)
+                        if resize:
+                            image = cv2.resize(image, dsize=(resize[1], resize[0]))
+                        image = Image.fromarray(image)
+                        encoded = BytesIO()
+                        image.save(encoded, format='jpeg', quality=jpeg_quality)
+                        buffer = encoded.getvalue()
 
-                # Make sure all images end up having three channels.
-                if image.ndim == 2:
-                    image = np.stack([image] * 3, axis=-1)
-                elif image.ndim == 3:
-                    if image.shape[2] == 1:
-                        image = np.concatenate([image] * 3, axis=-1)
-                    elif image.shape[2] == 4:
-                        image = image[:,:,:3]
+                    hdf5_images[i] = np.frombuffer(buffer, dtype=np.uint8)
+                    hdf5_image_shapes[i] = (image.height, image.width, 3)
+
+            # Or store the image as a flattened array.
+            else:
+                with Image.open(self.filenames[i]) as image:
 
-                if resize:
-                    image = cv2.resize(image, dsize=(resize[1], resize[0]))
+                    image = np.asarray(image, dtype=np.uint8)
 
-                # Flatten the image array and write it to the images dataset.
-                hdf5_images[i] = image.reshape(-1)
-                # Write the image's shape to the image shapes dataset.
-                hdf5_image_shapes[i] = image.shape
+                    # Make sure all images end up having three channels.
+                    if image.ndim == 2:
+                        image = np.stack([image] * 3, axis=-1)
+                    elif image.ndim == 3:
+                        if image.shape[2] == 1:
+                            image = np.concatenate([image] * 3, axis=-1)
+                        elif image.shape[2] == 4:
+                            image = image[:,:,:3]
+
+                    if resize:
+                        image = cv2.resize(image, dsize=(resize[1], resize[0]))
+
+                    # Flatten the image array and write it to the images dataset.
+                    hdf5_images[i] = image.reshape(-1)
+                    # Write the image's shape to the image shapes dataset.
+                    hdf5_image_shapes[i] = image.shape
 
             # Store the ground truth if we have any.
             if not (self.labels is None):
@@ -830,6 +898,7 @@ class DataGeneratorDCT:
         hdf5_dataset.close()
         self.hdf5_dataset = h5py.File(file_path, 'r')
         self.hdf5_dataset_path = file_path
+        self.hdf5_image_format = image_format
         self.dataset_size = len(self.hdf5_dataset['images'])
         self.dataset_indices = np.arange(self.dataset_size, dtype=np.int32) # Instead of shuffling the HDF5 dataset, we will shuffle this index list.
 
@@ -840,7 +909,9 @@ class DataGeneratorDCT:
                  label_encoder=None,
                  returns={'processed_images', 'encoded_labels'},
                  keep_images_without_gt=False,
-                 degenerate_box_handling='remove', deconv=False):
+                 degenerate_box_handling='remove', deconv=False,
+                 dct_dtype=np.float64,
+                 buffer_ring_size=0):
         '''
         Generates batches of samples and (optionally) corresponding labels indefinitely.
 
@@ -857,7 +928,8 @@ class DataGeneratorDCT:
             transformations (list, optional): A list of transformations that will be applied to the images and labels
                 in the given order. Each transformation is a callable that takes as input an image (as a Numpy array)
                 and optionally labels (also as a Numpy array) and returns an image and optionally labels in the same
-                format.
+                format. With an HDF5 dataset in the 'jpeg' layout and no transformations, the stored JPEG files are
+                read by `jpeg2dct` without being decoded, so they must already have the input size of the model.
             label_encoder (callable, optional): Only relevant if labels are given. A callable that takes as input the
                 labels of a batch (as a list of Numpy arrays) and returns some structure that represents those labels.
                 The general use case for this is to convert labels from their input format to a format that a given object
@@ -907,11 +979,77 @@ class DataGeneratorDCT:
                 transformations have been applied (if any), but before the labels were passed to the `label_encoder` (if one was given).
                 Can be one of 'warn' or 'remove'. If 'warn', the generator will merely print a warning to let you know that there
                 are degenerate boxes in a batch. If 'remove', the generator will remove degenerate boxes from the batch silently.
+            deconv (bool, optional): If `True`, the Cb and Cr coefficients are returned as two separate arrays instead of
+                one concatenated array.
+            dct_dtype (type, optional): The data type of the coefficient arrays. The coefficients are integers that fit in
+                int16, which makes the batches four times smaller than the default float64 on the host.
+            buffer_ring_size (int, optional): If greater than 0, the coefficients are written in place to a ring of that many
+                preallocated batch buffers instead of new arrays for every batch. See `BatchBufferRing` for the size to use.
 
         Yields:
             The next batch as a tuple of items as defined by the `returns` argument.
         '''
 
+        box_filter = self.prepare_generation(transformations=transformations,
+                                             label_encoder=label_encoder,
+                                             returns=returns,
+                                             degenerate_box_handling=degenerate_box_handling)
+
+        # Maybe shuffle the dataset initially.
+        if shuffle:
+            self.shuffle_dataset()
+
+        buffer_ring = None
+        if buffer_ring_size > 0:
+            buffer_ring = BatchBufferRing(buffer_ring_size,
+                                          [(batch_size,) + shape for shape in dct_input_shapes(deconv)],
+                                          [dct_dtype] * (3 if deconv else 2))
+
+        #############################################################################################
+        # Generate mini batches.
+        #############################################################################################
+
+        current = 0
+
+        while True:
+
+            if current >= self.dataset_size:
+                current = 0
+
+                # Maybe shuffle the dataset if a full pass over the dataset has finished.
+                if shuffle:
+                    self.shuffle_dataset()
+
+            batch_positions = np.arange(current, min(current + batch_size, self.dataset_size))
+            current += batch_size
+
+            yield self.generate_batch(batch_positions,
+                                      transformations=transformations,
+                                      label_encoder=label_encoder,
+                                      returns=returns,
+                                      keep_images_without_gt=keep_images_without_gt,
+                                      degenerate_box_handling=degenerate_box_handling,
+                                      box_filter=box_filter,
+                                      deconv=deconv,
+                                      dct_dtype=dct_dtype,
+                                      buffer_ring=buffer_ring)
+
+    def prepare_generation(self,
+                           transformations=[],
+                           label_encoder=None,
+                           returns={'processed_images', 'encoded_labels'},
+                           degenerate_box_handling='remove'):
+        '''
+        Checks the requested outputs and sets up the transformations before batches are generated.
+        Called by `generate()` and by `DataSequenceDCT`.
+
+        Arguments:
+            See `generate()`.
+
+        Returns:
+            The `BoxFilter` used to remove degenerate boxes or `None` if `degenerate_box_handling` is not 'remove'.
+        '''
+
         if self.dataset_size == 0:
             raise DatasetError("Cannot generate batches because you did not load a dataset.")
 
@@ -932,24 +1070,7 @@ class DataGeneratorDCT:
                 warnings.warn("`label_encoder` is not an `SSDInputEncoder` object, therefore 'matched_anchors' is not a possible return, " +
                               "but you set `returns = {}`. The impossible returns will be `None`.".format(returns))
 
-        #############################################################################################
-        # Do a few preparatory things like maybe shuffling the dataset initially.
-        #############################################################################################
-
-        if shuffle:
-            objects_to_shuffle = [self.dataset_indices]
-            if not (self.filenames is None):
-                objects_to_shuffle.append(self.filenames)
-            if not (self.labels is None):
-                objects_to_shuffle.append(self.labels)
-            if not (self.image_ids is None):
-                objects_to_shuffle.append(self.image_ids)
-            if not (self.eval_neutral is None):
-                objects_to_shuffle.append(self.eval_neutral)
-            shuffled_objects = sklearn.utils.shuffle(*objects_to_shuffle)
-            for i in range(len(objects_to_shuffle)):
-                objects_to_shuffle[i][:] = shuffled_objects[i]
-
+        box_filter = None
         if degenerate_box_handling == 'remove':
             box_filter = BoxFilter(check_overlap=False,
                                    check_min_area=False,
@@ -961,249 +1082,264 @@ class DataGeneratorDCT:
             for transform in transformations:
                 transform.labels_format = self.labels_format
 
-        #############################################################################################
-        # Generate mini batches.
-        #############################################################################################
-
-        current = 0
-
-        while True:
-
-            batch_X, batch_y = [], []
+        return box_filter
 
-            if current >= self.dataset_size:
-                current = 0
-
-            #########################################################################################
-            # Maybe shuffle the dataset if a full pass over the dataset has finished.
-            #########################################################################################
+    def shuffle_dataset(self):
+        '''
+        Shuffles the dataset in place, consistently across the image indices, file names, labels,
+        image IDs and evaluation-neutrality annotations.
+        '''
+        objects_to_shuffle = [self.dataset_indices]
+        if not (self.filenames is None):
+            objects_to_shuffle.append(self.filenames)
+        if not (self.labels is None):
+            objects_to_shuffle.append(self.labels)
+        if not (self.image_ids is None):
+            objects_to_shuffle.append(self.image_ids)
+        if not (self.eval_neutral is None):
+            objects_to_shuffle.append(self.eval_neutral)
+        shuffled_objects = sklearn.utils.shuffle(*objects_to_shuffle)
+        for i in range(len(objects_to_shuffle)):
+            objects_to_shuffle[i][:] = shuffled_objects[i]
+
+    def generate_batch(self,
+                       batch_positions,
+                       transformations=[],
+                       label_encoder=None,
+                       returns={'processed_images', 'encoded_labels'},
+                       keep_images_without_gt=False,
+                       degenerate_box_handling='remove',
+                       box_filter=None,
+                       deconv=False,
+                       dct_dtype=np.float64,
+                       buffer_ring=None):
+        '''
+        Builds one batch out of the samples at the given positions of the dataset. `generate()` calls this
+        on consecutive positions, `DataSequenceDCT` on the positions of its own per-epoch permutation.
 
-                if shuffle:
-                    objects_to_shuffle = [self.dataset_indices]
-                    if not (self.filenames is None):
-                        objects_to_shuffle.append(self.filenames)
-                    if not (self.labels is None):
-                        objects_to_shuffle.append(self.labels)
-                    if not (self.image_ids is None):
-                        objects_to_shuffle.append(self.image_ids)
-                    if not (self.eval_neutral is None):
-                        objects_to_shuffle.append(self.eval_neutral)
-                    shuffled_objects = sklearn.utils.shuffle(*objects_to_shuffle)
-                    for i in range(len(objects_to_shuffle)):
-                        objects_to_shuffle[i][:] = shuffled_objects[i]
+        Arguments:
+            batch_positions (array): The positions of the samples of the batch in the (maybe shuffled) lists
+                `filenames`, `labels`, `image_ids`, `eval_neutral` and `dataset_indices`.
+            box_filter (BoxFilter, optional): The filter returned by `prepare_generation()`, required if
+                `degenerate_box_handling` is 'remove'.
+            buffer_ring (BatchBufferRing, optional): If given, the coefficients are written to the next buffers
+                of the ring instead of freshly allocated arrays.
+            The other arguments are the ones of `generate()`.
 
-            #########################################################################################
-            # Get the images, (maybe) image IDs, (maybe) labels, etc. for this batch.
-            #########################################################################################
+        Returns:
+            The batch as a list of items as defined by the `returns` argument.
+        '''
 
-            # We prioritize our options in the following order:
-            # 1) If we have the images already loaded in memory, get them from there.
-            # 2) Else, if we have an HDF5 dataset, get the images from there.
-            # 3) Else, if we have neither of the above, we'll have to load the individual image
-            #    files from disk.
-            batch_indices = self.dataset_indices[current:current+batch_size]
-            if not (self.images is None):
-                for i in batch_indices:
-                    batch_X.append(self.images[i])
-                if not (self.filenames is None):
-                    batch_filenames = self.filenames[current:current+batch_size]
-                else:
-                    batch_filenames = None
-            elif not (self.hdf5_dataset is None):
-                for i in batch_indices:
-                    batch_X.append(self.hdf5_dataset['images'][i].reshape(self.hdf5_dataset['image_shapes'][i]))
-                if not (self.filenames is None):
-                    batch_filenames = self.filenames[current:current+batch_size]
-                else:
-                    batch_filenames = None
+        batch_X, batch_y = [], []
+
+        #########################################################################################
+        # Get the images, (maybe) image IDs, (maybe) labels, etc. for this batch.
+        #########################################################################################
+
+        # We prioritize our options in the following order:
+        # 1) If we have the images already loaded in memory, get them from there.
+        # 2) Else, if we have an HDF5 dataset, get the images from there.
+        # 3) Else, if we have neither of the above, we'll have to load the individual image
+        #    files from disk.
+        # With the 'jpeg' layout and no transformations, the JPEG files are kept as they are
+        # and handed to `jpeg2dct` directly. `batch_X` then contains bytes instead of images.
+        batch_indices = self.dataset_indices[batch_positions]
+        batch_encoded = False
+        if not (self.images is None):
+            for i in batch_indices:
+                batch_X.append(self.images[i])
+            if not (self.filenames is None):
+                batch_filenames = [self.filenames[i] for i in batch_positions]
             else:
-                batch_filenames = self.filenames[current:current+batch_size]
-                for filename in batch_filenames:
-                    with Image.open(filename) as image:
-                        batch_X.append(np.array(image, dtype=np.uint8))
-
-            # Get the labels for this batch (if there are any).
-            if not (self.labels is None):
-                batch_y = deepcopy(self.labels[current:current+batch_size])
+                batch_filenames = None
+        elif not (self.hdf5_dataset is None):
+            batch_encoded = (self.hdf5_image_format == 'jpeg') and not transformations and not ('original_images' in returns)
+            batch_X = self.read_hdf5_images(batch_indices, decode=not batch_encoded)
+            if not (self.filenames is None):
+                batch_filenames = [self.filenames[i] for i in batch_positions]
             else:
-                batch_y = None
+                batch_filenames = None
+        else:
+            batch_filenames = [self.filenames[i] for i in batch_positions]
+            for filename in batch_filenames:
+                with Image.open(filename) as image:
+                    batch_X.append(np.array(image, dtype=np.uint8))
 
-            if not (self.eval_neutral is None):
-                batch_eval_neutral = self.eval_neutral[current:current+batch_size]
-            else:
-                batch_eval_neutral = None
+        # Get the labels for this batch (if there are any).
+        if not (self.labels is None):
+            batch_y = deepcopy([self.labels[i] for i in batch_positions])
+        else:
+            batch_y = None
 
-            # Get the image IDs for this batch (if there are any).
-            if not (self.image_ids is None):
-                batch_image_ids = self.image_ids[current:current+batch_size]
-            else:
-                batch_image_ids = None
+        if not (self.eval_neutral is None):
+            batch_eval_neutral = [self.eval_neutral[i] for i in batch_positions]
+        else:
+            batch_eval_neutral = None
+
+        # Get the image IDs for this batch (if there are any).
+        if not (self.image_ids is None):
+            batch_image_ids = [self.image_ids[i] for i in batch_positions]
+        else:
+            batch_image_ids = None
 
-            if 'original_images' in returns:
-                batch_original_images = deepcopy(batch_X) # The original, unaltered images
-            if 'original_labels' in returns:
-                batch_original_labels = deepcopy(batch_y) # The original, unaltered labels
+        if 'original_images' in returns:
+            batch_original_images = deepcopy(batch_X) # The original, unaltered images
+        if 'original_labels' in returns:
+            batch_original_labels = deepcopy(batch_y) # The original, unaltered labels
 
-            current += batch_size
+        #########################################################################################
+        # Maybe perform image transformations.
+        #########################################################################################
 
-            #########################################################################################
-            # Maybe perform image transformations.
-            #########################################################################################
+        batch_items_to_remove = [] # In case we need to remove any images from the batch, store their indices in this list.
+        batch_inverse_transforms = []
 
-            batch_items_to_remove = [] # In case we need to remove any images from the batch, store their indices in this list.
-            batch_inverse_transforms = []
+        for i in range(len(batch_X)):
 
-            for i in range(len(batch_X)):
+            if not (self.labels is None):
+                # Convert the labels for this image to an array (in case they aren't already).
+                batch_y[i] = np.array(batch_y[i])
+                # If this image has no ground truth boxes, maybe we don't want to keep it in the batch.
+                if (batch_y[i].size == 0) and not keep_images_without_gt:
+                    batch_items_to_remove.append(i)
+                    batch_inverse_transforms.append([])
+                    continue
 
-                if not (self.labels is None):
-                    # Convert the labels for this image to an array (in case they aren't already).
-                    batch_y[i] = np.array(batch_y[i])
-                    # If this image has no ground truth boxes, maybe we don't want to keep it in the batch.
-                    if (batch_y[i].size == 0) and not keep_images_without_gt:
-                        batch_items_to_remove.append(i)
-                        batch_inverse_transforms.append([])
-                        continue
+            # Apply any image transformations we may have received.
+            if transformations:
 
-                # Apply any image transformations we may have received.
-                if transformations:
+                inverse_transforms = []
 
-                    inverse_transforms = []
+                for transform in transformations:
 
-                    for transform in transformations:
+                    if not (self.labels is None):
 
-                        if not (self.labels is None):
+                        if ('inverse_transform' in returns) and ('return_inverter' in inspect.signature(transform).parameters):
+                            batch_X[i], batch_y[i], inverse_transform = transform(batch_X[i], batch_y[i], return_inverter=True)
+                            inverse_transforms.append(inverse_transform)
+                        else:
+                            batch_X[i], batch_y[i] = transform(batch_X[i], batch_y[i])
 
-                            if ('inverse_transform' in returns) and ('return_inverter' in inspect.signature(transform).parameters):
-                                batch_X[i], batch_y[i], inverse_transform = transform(batch_X[i], batch_y[i], return_inverter=True)
-                                inverse_transforms.append(inverse_transform)
-                            else:
-                                batch_X[i], batch_y[i] = transform(batch_X[i], batch_y[i])
+                        if batch_X[i] is None: # In case the transform failed to produce an output image, which is possible for some random transforms.
+                            batch_items_to_remove.append(i)
+                            batch_inverse_transforms.append([])
+                            continue
 
-                            if batch_X[i] is None: # In case the transform failed to produce an output image, which is possible for some random transforms.
-                                batch_items_to_remove.append(i)
-                                batch_inverse_transforms.append([])
-                                continue
+                    else:
 
+                        if ('inverse_transform' in returns) and ('return_inverter' in inspect.signature(transform).parameters):
+                            batch_X[i], inverse_transform = transform(batch_X[i], return_inverter=True)
+                            inverse_transforms.append(inverse_transform)
                         else:
+                            batch_X[i] = transform(batch_X[i])
 
-                            if ('inverse_transform' in returns) and ('return_inverter' in inspect.signature(transform).parameters):
-                                batch_X[i], inverse_transform = transform(batch_X[i], return_inverter=True)
-                                inverse_transforms.append(inverse_transform)
-                            else:
-                                batch_X[i] = transform(batch_X[i])
-
-                    batch_inverse_transforms.append(inverse_transforms[::-1])
-
-                #########################################################################################
-                # Check for degenerate boxes in this batch item.
-                #########################################################################################
-
-                if not (self.labels is None):
-
-                    xmin = self.labels_format['xmin']
-                    ymin = self.labels_format['ymin']
-                    xmax = self.labels_format['xmax']
-                    ymax = self.labels_format['ymax']
-
-                    if np.any(batch_y[i][:,xmax] - batch_y[i][:,xmin] <= 0) or np.any(batch_y[i][:,ymax] - batch_y[i][:,ymin] <= 0):
-                        if degenerate_box_handling == 'warn':
-                            warnings.warn("Detected degenerate ground truth bounding boxes for batch item {} with bounding boxes {}, ".format(i, batch_y[i]) +
-                                          "i.e. bounding boxes where xmax <= xmin and/or ymax <= ymin. " +
-                                          "This could mean that your dataset contains degenerate ground truth boxes, or that any image transformations you may apply might " +
-                                          "result in degenerate ground truth boxes, or that you are parsing the ground truth in the wrong coordinate format." +
-                                          "Degenerate ground truth bounding boxes may lead to NaN errors during the training.")
-                        elif degenerate_box_handling == 'remove':
-                            batch_y[i] = box_filter(batch_y[i])
-                            if (batch_y[i].size == 0) and not keep_images_without_gt:
-                                batch_items_to_remove.append(i)
+                batch_inverse_transforms.append(inverse_transforms[::-1])
 
             #########################################################################################
-            # Remove any items we might not want to keep from the batch.
+            # Check for degenerate boxes in this batch item.
             #########################################################################################
 
-            if batch_items_to_remove:
-                for j in sorted(batch_items_to_remove, reverse=True):
-                    # This isn't efficient, but it hopefully shouldn't need to be done often anyway.
-                    batch_X.pop(j)
-                    batch_filenames.pop(j)
-                    if batch_inverse_transforms: batch_inverse_transforms.pop(j)
-                    if not (self.labels is None): batch_y.pop(j)
-                    if not (self.image_ids is None): batch_image_ids.pop(j)
-                    if not (self.eval_neutral is None): batch_eval_neutral.pop(j)
-                    if 'original_images' in returns: batch_original_images.pop(j)
-                    if 'original_labels' in returns and not (self.labels is None): batch_original_labels.pop(j)
-
-            #########################################################################################
+            if not (self.labels is None):
 
-            # CAUTION: Converting `batch_X` into an array will result in an empty batch if the images have varying sizes
-            #          or varying numbers of channels. At this point, all images must have the same size and the same
-            #          number of channels.
+                xmin = self.labels_format['xmin']
+                ymin = self.labels_format['ymin']
+                xmax = self.labels_format['xmax']
+                ymax = self.labels_format['ymax']
+
+                if np.any(batch_y[i][:,xmax] - batch_y[i][:,xmin] <= 0) or np.any(batch_y[i][:,ymax] - batch_y[i][:,ymin] <= 0):
+                    if degenerate_box_handling == 'warn':
+                        warnings.warn("Detected degenerate ground truth bounding boxes for batch item {} with bounding boxes {}, ".format(i, batch_y[i]) +
+                                      "i.e. bounding boxes where xmax <= xmin and/or ymax <= ymin. " +
+                                      "This could mean that your dataset contains degenerate ground truth boxes, or that any image transformations you may apply might " +
+                                      "result in degenerate ground truth boxes, or that you are parsing the ground truth in the wrong coordinate format." +
+                                      "Degenerate ground truth bounding boxes may lead to NaN errors during the training.")
+                    elif degenerate_box_handling == 'remove':
+                        batch_y[i] = box_filter(batch_y[i])
+                        if (batch_y[i].size == 0) and not keep_images_without_gt:
+                            batch_items_to_remove.append(i)
+
+        #########################################################################################
+        # Remove any items we might not want to keep from the batch.
+        #########################################################################################
+
+        if batch_items_to_remove:
+            for j in sorted(batch_items_to_remove, reverse=True):
+                # This isn't efficient, but it hopefully shouldn't need to be done often anyway.
+                batch_X.pop(j)
+                if not (batch_filenames is None): batch_filenames.pop(j)
+                if batch_inverse_transforms: batch_inverse_transforms.pop(j)
+                if not (self.labels is None): batch_y.pop(j)
+                if not (self.image_ids is None): batch_image_ids.pop(j)
+                if not (self.eval_neutral is None): batch_eval_neutral.pop(j)
+                if 'original_images' in returns: batch_original_images.pop(j)
+                if 'original_labels' in returns and not (self.labels is None): batch_original_labels.pop(j)
+
+        #########################################################################################
+
+        # CAUTION: Converting `batch_X` into an array will result in an empty batch if the images have varying sizes
+        #          or varying numbers of channels. At this point, all images must have the same size and the same
+        #          number of channels.
+        if not batch_encoded:
             batch_X = np.array(batch_X)
-            if (batch_X.size == 0):
-                raise DegenerateBatchError("You produced an empty batch. This might be because the images in the batch vary " +
-                                           "in their size and/or number of channels. Note that after all transformations " +
-                                           "(if any were given) have been applied to all images in the batch, all images " +
-                                           "must be homogenous in size along all axes.")
+        if (len(batch_X) == 0) or (not batch_encoded and batch_X.size == 0):
+            raise DegenerateBatchError("You produced an empty batch. This might be because the images in the batch vary " +
+                                       "in their size and/or number of channels. Note that after all transformations " +
+                                       "(if any were given) have been applied to all images in the batch, all images " +
+                                       "must be homogenous in size along all axes.")
 
-            #########################################################################################
-            # If we have a label encoder, encode our labels.
-            #########################################################################################
-
-            if not (label_encoder is None or self.labels is None):
+        #########################################################################################
+        # If we have a label encoder, encode our labels.
+        #########################################################################################
 
-                if ('matched_anchors' in returns) and isinstance(label_encoder, SSDInputEncoder):
-                    batch_y_encoded, batch_matched_anchors = label_encoder(batch_y, diagnostics=True)
-                else:
-                    batch_y_encoded = label_encoder(batch_y, diagnostics=False)
-                    batch_matched_anchors = None
+        if not (label_encoder is None or self.labels is None):
 
+            if ('matched_anchors' in returns) and isinstance(label_encoder, SSDInputEncoder):
+                batch_y_encoded, batch_matched_anchors = label_encoder(batch_y, diagnostics=True)
             else:
-                batch_y_encoded = None
+                batch_y_encoded = label_encoder(batch_y, diagnostics=False)
                 batch_matched_anchors = None
 
-            #########################################################################################
-            # Compose the output.
-            #########################################################################################
-            new_batch_X = np.empty(batch_X.shape, dtype=np.int32)
-            
-            X_y = np.empty((batch_X.shape[0], 38, 38, 64))
-            if deconv:
-                X_cb = np.empty((batch_X.shape[0], 19, 19, 64))
-                X_cr = np.empty((batch_X.shape[0], 19, 19, 64))
+        else:
+            batch_y_encoded = None
+            batch_matched_anchors = None
+
+        #########################################################################################
+        # Compose the output.
+        #########################################################################################
+        # The coefficients are small integers, jpeg2dct returns them as int16, `dct_dtype=np.int16` keeps them so.
+        dct_inputs = allocate_batch(dct_input_shapes(deconv), [dct_dtype] * (3 if deconv else 2), len(batch_X), buffer_ring)
+
+        for i, image_to_save in enumerate(batch_X):
+            if batch_encoded:
+                dct_y, dct_cb, dct_cr = loads(image_to_save)
             else:
-                X_cbcr = np.empty((batch_X.shape[0], 19, 19, 128))
-            
-            for i, image_to_save in enumerate(batch_X):
                 im = Image.fromarray(image_to_save)
                 fake_file = BytesIO()
                 im.save(fake_file, format="jpeg")
-                
+
                 dct_y, dct_cb, dct_cr = loads(fake_file.getvalue())
 
-                X_y[i] = dct_y
-                if deconv:
-                    X_cb[i] = dct_cb
-                    X_cr[i] = dct_cr
-                else:
-                    X_cbcr[i] = np.concatenate([dct_cb, dct_cr], axis=-1)
-                
-            ret = []
-            if 'processed_images' in returns: 
-                if deconv:
-                    ret.append([X_y, X_cb, X_cr])
-                else:
-                    ret.append([X_y, X_cbcr])
-            if 'encoded_labels' in returns: ret.append(batch_y_encoded)
-            if 'matched_anchors' in returns: ret.append(batch_matched_anchors)
-            if 'processed_labels' in returns: ret.append(batch_y)
-            if 'filenames' in returns: ret.append(batch_filenames)
-            if 'image_ids' in returns: ret.append(batch_image_ids)
-            if 'evaluation-neutral' in returns: ret.append(batch_eval_neutral)
-            if 'inverse_transform' in returns: ret.append(batch_inverse_transforms)
-            if 'original_images' in returns: ret.append(batch_original_images)
-            if 'original_labels' in returns: ret.append(batch_original_labels)
-
-            yield ret
+            dct_inputs[0][i] = dct_y
+            if deconv:
+                dct_inputs[1][i] = dct_cb
+                dct_inputs[2][i] = dct_cr
+            else:
+                dct_inputs[1][i, ..., :64] = dct_cb
+                dct_inputs[1][i, ..., 64:] = dct_cr
+
+        ret = []
+        if 'processed_images' in returns: ret.append(dct_inputs)
+        if 'encoded_labels' in returns: ret.append(batch_y_encoded)
+        if 'matched_anchors' in returns: ret.append(batch_matched_anchors)
+        if 'processed_labels' in returns: ret.append(batch_y)
+        if 'filenames' in returns: ret.append(batch_filenames)
+        if 'image_ids' in returns: ret.append(batch_image_ids)
+        if 'evaluation-neutral' in returns: ret.append(batch_eval_neutral)
+        if 'inverse_transform' in returns: ret.append(batch_inverse_transforms)
+        if 'original_images' in returns: ret.append(batch_original_images)
+        if 'original_labels' in returns: ret.append(batch_original_labels)
+
+        return ret
 
     def save_dataset(self,
                      filenames_path='filenames.pkl',
@@ -1283,7 +1419,9 @@ class DataGeneratorDeconvDCT(DataGeneratorDCT):
                  label_encoder=None,
                  returns={'processed_images', 'encoded_labels'},
                  keep_images_without_gt=False,
-                 degenerate_box_handling='remove', deconv=True):
+                 degenerate_box_handling='remove', deconv=True,
+                 dct_dtype=np.float64,
+                 buffer_ring_size=0):
         '''
         Generates batches of samples and (optionally) corresponding labels indefinitely.
 
@@ -1350,301 +1488,25 @@ class DataGeneratorDeconvDCT(DataGeneratorDCT):
                 transformations have been applied (if any), but before the labels were passed to the `label_encoder` (if one was given).
                 Can be one of 'warn' or 'remove'. If 'warn', the generator will merely print a warning to let you know that there
                 are degenerate boxes in a batch. If 'remove', the generator will remove degenerate boxes from the batch silently.
+            deconv (bool, optional): If `True`, the Cb and Cr coefficients are returned as two separate arrays instead of
+                one concatenated array.
+            dct_dtype (type, optional): The data type of the coefficient arrays. The coefficients are integers that fit in
+                int16, which makes the batches four times smaller than the default float64 on the host.
+            buffer_ring_size (int, optional): If greater than 0, the coefficients are written in place to a ring of that many
+                preallocated batch buffers instead of new arrays for every batch. See `BatchBufferRing` for the size to use.
 
         Yields:
             The next batch as a tuple of items as defined by the `returns` argument.
         '''
 
-        if self.dataset_size == 0:
-            raise DatasetError("Cannot generate batches because you did not load a dataset.")
-
-        #############################################################################################
-        # Warn if any of the set returns aren't possible.
-        #############################################################################################
-
-        if self.labels is None:
-            if any([ret in returns for ret in ['original_labels', 'processed_labels', 'encoded_labels', 'matched_anchors', 'evaluation-neutral']]):
-                warnings.warn("Since no labels were given, none of 'original_labels', 'processed_labels', 'evaluation-neutral', 'encoded_labels', and 'matched_anchors' " +
-                              "are possible returns, but you set `returns = {}`. The impossible returns will be `None`.".format(returns))
-        elif label_encoder is None:
-            if any([ret in returns for ret in ['encoded_labels', 'matched_anchors']]):
-                warnings.warn("Since no label encoder was given, 'encoded_labels' and 'matched_anchors' aren't possible returns, " +
-                              "but you set `returns = {}`. The impossible returns will be `None`.".format(returns))
-        elif not isinstance(label_encoder, SSDInputEncoder):
-            if 'matched_anchors' in returns:
-                warnings.warn("`label_encoder` is not an `SSDInputEncoder` object, therefore 'matched_anchors' is not a possible return, " +
-                              "but you set `returns = {}`. The impossible returns will be `None`.".format(returns))
-
-        #############################################################################################
-        # Do a few preparatory things like maybe shuffling the dataset initially.
-        #############################################################################################
-
-        if shuffle:
-            objects_to_shuffle = [self.dataset_indices]
-            if not (self.filenames is None):
-                objects_to_shuffle.append(self.filenames)
-            if not (self.labels is None):
-                objects_to_shuffle.append(self.labels)
-            if not (self.image_ids is None):
-                objects_to_shuffle.append(self.image_ids)
-            if not (self.eval_neutral is None):
-                objects_to_shuffle.append(self.eval_neutral)
-            shuffled_objects = sklearn.utils.shuffle(*objects_to_shuffle)
-            for i in range(len(objects_to_shuffle)):
-                objects_to_shuffle[i][:] = shuffled_objects[i]
-
-        if degenerate_box_handling == 'remove':
-            box_filter = BoxFilter(check_overlap=False,
-                                   check_min_area=False,
-                                   check_degenerate=True,
-                                   labels_format=self.labels_format)
-
-        # Override the labels formats of all the transformations to make sure they are set correctly.
-        if not (self.labels is None):
-            for transform in transformations:
-                transform.labels_format = self.labels_format
-
-        #############################################################################################
-        # Generate mini batches.
-        #############################################################################################
-
-        current = 0
-
-        while True:
-
-            batch_X, batch_y = [], []
-
-            if current >= self.dataset_size:
-                current = 0
-
-            #########################################################################################
-            # Maybe shuffle the dataset if a full pass over the dataset has finished.
-            #########################################################################################
-
-                if shuffle:
-                    objects_to_shuffle = [self.dataset_indices]
-                    if not (self.filenames is None):
-                        objects_to_shuffle.append(self.filenames)
-                    if not (self.labels is None):
-                        objects_to_shuffle.append(self.labels)
-                    if not (self.image_ids is None):
-                        objects_to_shuffle.append(self.image_ids)
-                    if not (self.eval_neutral is None):
-                        objects_to_shuffle.append(self.eval_neutral)
-                    shuffled_objects = sklearn.utils.shuffle(*objects_to_shuffle)
-                    for i in range(len(objects_to_shuffle)):
-                        objects_to_shuffle[i][:] = shuffled_objects[i]
-
-            #########################################################################################
-            # Get the images, (maybe) image IDs, (maybe) labels, etc. for this batch.
-            #########################################################################################
-
-            # We prioritize our options in the following order:
-            # 1) If we have the images already loaded in memory, get them from there.
-            # 2) Else, if we have an HDF5 dataset, get the images from there.
-            # 3) Else, if we have neither of the above, we'll have to load the individual image
-            #    files from disk.
-            batch_indices = self.dataset_indices[current:current+batch_size]
-            if not (self.images is None):
-                for i in batch_indices:
-                    batch_X.append(self.images[i])
-                if not (self.filenames is None):
-                    batch_filenames = self.filenames[current:current+batch_size]
-                else:
-                    batch_filenames = None
-            elif not (self.hdf5_dataset is None):
-                for i in batch_indices:
-                    batch_X.append(self.hdf5_dataset['images'][i].reshape(self.hdf5_dataset['image_shapes'][i]))
-                if not (self.filenames is None):
-                    batch_filenames = self.filenames[current:current+batch_size]
-                else:
-                    batch_filenames = None
-            else:
-                batch_filenames = self.filenames[current:current+batch_size]
-                for filename in batch_filenames:
-                    with Image.open(filename) as image:
-                        batch_X.append(np.array(image, dtype=np.uint8))
-
-            # Get the labels for this batch (if there are any).
-            if not (self.labels is None):
-                batch_y = deepcopy(self.labels[current:current+batch_size])
-            else:
-                batch_y = None
-
-            if not (self.eval_neutral is None):
-                batch_eval_neutral = self.eval_neutral[current:current+batch_size]
-            else:
-                batch_eval_neutral = None
-
-            # Get the image IDs for this batch (if there are any).
-            if not (self.image_ids is None):
-                batch_image_ids = self.image_ids[current:current+batch_size]
-            else:
-                batch_image_ids = None
-
-            if 'original_images' in returns:
-                batch_original_images = deepcopy(batch_X) # The original, unaltered images
-            if 'original_labels' in returns:
-                batch_original_labels = deepcopy(batch_y) # The original, unaltered labels
-
-            current += batch_size
-
-            #########################################################################################
-            # Maybe perform image transformations.
-            #########################################################################################
-
-            batch_items_to_remove = [] # In case we need to remove any images from the batch, store their indices in this list.
-            batch_inverse_transforms = []
-
-            for i in range(len(batch_X)):
-
-                if not (self.labels is None):
-                    # Convert the labels for this image to an array (in case they aren't already).
-                    batch_y[i] = np.array(batch_y[i])
-                    # If this image has no ground truth boxes, maybe we don't want to keep it in the batch.
-                    if (batch_y[i].size == 0) and not keep_images_without_gt:
-                        batch_items_to_remove.append(i)
-                        batch_inverse_transforms.append([])
-                        continue
-
-                # Apply any image transformations we may have received.
-                if transformations:
-
-                    inverse_transforms = []
-
-                    for transform in transformations:
-
-                        if not (self.labels is None):
-
-                            if ('inverse_transform' in returns) and ('return_inverter' in inspect.signature(transform).parameters):
-                                batch_X[i], batch_y[i], inverse_transform = transform(batch_X[i], batch_y[i], return_inverter=True)
-                                inverse_transforms.append(inverse_transform)
-                            else:
-                                batch_X[i], batch_y[i] = transform(batch_X[i], batch_y[i])
-
-                            if batch_X[i] is None: # In case the transform failed to produce an output image, which is possible for some random transforms.
-                                batch_items_to_remove.append(i)
-                                batch_inverse_transforms.append([])
-                                continue
-
-                        else:
-
-                            if ('inverse_transform' in returns) and ('return_inverter' in inspect.signature(transform).parameters):
-                                batch_X[i], inverse_transform = transform(batch_X[i], return_inverter=True)
-                                inverse_transforms.append(inverse_transform)
-                            else:
-                                batch_X[i] = transform(batch_X[i])
-
-                    batch_inverse_transforms.append(inverse_transforms[::-1])
-
-                #########################################################################################
-                # Check for degenerate boxes in this batch item.
-                #########################################################################################
-
-                if not (self.labels is None):
-
-                    xmin = self.labels_format['xmin']
-                    ymin = self.labels_format['ymin']
-                    xmax = self.labels_format['xmax']
-                    ymax = self.labels_format['ymax']
-
-                    if np.any(batch_y[i][:,xmax] - batch_y[i][:,xmin] <= 0) or np.any(batch_y[i][:,ymax] - batch_y[i][:,ymin] <= 0):
-                        if degenerate_box_handling == 'warn':
-                            warnings.warn("Detected degenerate ground truth bounding boxes for batch item {} with bounding boxes {}, ".format(i, batch_y[i]) +
-                                          "i.e. bounding boxes where xmax <= xmin and/or ymax <= ymin. " +
-                                          "This could mean that your dataset contains degenerate ground truth boxes, or that any image transformations you may apply might " +
-                                          "result in degenerate ground truth boxes, or that you are parsing the ground truth in the wrong coordinate format." +
-                                          "Degenerate ground truth bounding boxes may lead to NaN errors during the training.")
-                        elif degenerate_box_handling == 'remove':
-                            batch_y[i] = box_filter(batch_y[i])
-                            if (batch_y[i].size == 0) and not keep_images_without_gt:
-                                batch_items_to_remove.append(i)
-
-            #########################################################################################
-            # Remove any items we might not want to keep from the batch.
-            #########################################################################################
-
-            if batch_items_to_remove:
-                for j in sorted(batch_items_to_remove, reverse=True):
-                    # This isn't efficient, but it hopefully shouldn't need to be done often anyway.
-                    batch_X.pop(j)
-                    batch_filenames.pop(j)
-                    if batch_inverse_transforms: batch_inverse_transforms.pop(j)
-                    if not (self.labels is None): batch_y.pop(j)
-                    if not (self.image_ids is None): batch_image_ids.pop(j)
-                    if not (self.eval_neutral is None): batch_eval_neutral.pop(j)
-                    if 'original_images' in returns: batch_original_images.pop(j)
-                    if 'original_labels' in returns and not (self.labels is None): batch_original_labels.pop(j)
-
-            #########################################################################################
-
-            # CAUTION: Converting `batch_X` into an array will result in an empty batch if the images have varying sizes
-            #          or varying numbers of channels. At this point, all images must have the same size and the same
-            #          number of channels.
-            batch_X = np.array(batch_X)
-            if (batch_X.size == 0):
-                raise DegenerateBatchError("You produced an empty batch. This might be because the images in the batch vary " +
-                                           "in their size and/or number of channels. Note that after all transformations " +
-                                           "(if any were given) have been applied to all images in the batch, all images " +
-                                           "must be homogenous in size along all axes.")
-
-            #########################################################################################
-            # If we have a label encoder, encode our labels.
-            #########################################################################################
-
-            if not (label_encoder is None or self.labels is None):
-
-                if ('matched_anchors' in returns) and isinstance(label_encoder, SSDInputEncoder):
-                    batch_y_encoded, batch_matched_anchors = label_encoder(batch_y, diagnostics=True)
-                else:
-                    batch_y_encoded = label_encoder(batch_y, diagnostics=False)
-                    batch_matched_anchors = None
-
-            else:
-                batch_y_encoded = None
-                batch_matched_anchors = None
-
-            #########################################################################################
-            # Compose the output.
-            #########################################################################################
-            new_batch_X = np.empty(batch_X.shape, dtype=np.int32)
-            
-            X_y = np.empty((batch_X.shape[0], 38, 38, 64))
-            if deconv:
-                X_cb = np.empty((batch_X.shape[0], 19, 19, 64))
-                X_cr = np.empty((batch_X.shape[0], 19, 19, 64))
-            else:
-                X_cbcr = np.empty((batch_X.shape[0], 19, 19, 128))
-            
-            for i, image_to_save in enumerate(batch_X):
-                im = Image.fromarray(image_to_save)
-                fake_file = BytesIO()
-                im.save(fake_file, format="jpeg")
-                
-                dct_y, dct_cb, dct_cr = loads(fake_file.getvalue())
-
-                X_y[i] = dct_y
-                if deconv:
-                    X_cb[i] = dct_cb
-                    X_cr[i] = dct_cr
-                else:
-                    X_cbcr[i] = np.concatenate([dct_cb, dct_cr], axis=-1)
-                
-            ret = []
-            if 'processed_images' in returns: 
-                if deconv:
-                    ret.append([X_y, X_cb, X_cr])
-                else:
-                    ret.append([X_y, X_cbcr])
-            # if 'processed_images' in returns: ret.append([X_y, X_cb, X_cr])
-            if 'encoded_labels' in returns: ret.append(batch_y_encoded)
-            if 'matched_anchors' in returns: ret.append(batch_matched_anchors)
-            if 'processed_labels' in returns: ret.append(batch_y)
-            if 'filenames' in returns: ret.append(batch_filenames)
-            if 'image_ids' in returns: ret.append(batch_image_ids)
-            if 'evaluation-neutral' in returns: ret.append(batch_eval_neutral)
-            if 'inverse_transform' in returns: ret.append(batch_inverse_transforms)
-            if 'original_images' in returns: ret.append(batch_original_images)
-            if 'original_labels' in returns: ret.append(batch_original_labels)
-
-            yield ret
+        return DataGeneratorDCT.generate(self,
+                                         batch_size=batch_size,
+                                         shuffle=shuffle,
+                                         transformations=transformations,
+                                         label_encoder=label_encoder,
+                                         returns=returns,
+                                         keep_images_without_gt=keep_images_without_gt,
+                                         degenerate_box_handling=degenerate_box_handling,
+                                         deconv=deconv,
+                                         dct_dtype=dct_dtype,
+                                         buffer_ring_size=buffer_ring_size)
@@ -0,0 +1,104 @@
+'''
+An index-addressable `keras.utils.Sequence` over `DataGeneratorDCT`, so that `fit_generator()`
+can build the batches in several worker processes.
+'''
+
+from __future__ import division
+import numpy as np
+from math import ceil
+from keras.utils import Sequence
+
+from data_generator.object_detection_2d_data_generator_dct_j2d import dct_input_shapes
+from data_generator.object_detection_2d_batch_buffers import BatchBufferRing
+
+class DataSequenceDCT(Sequence):
+    '''
+    Wraps a `DataGeneratorDCT` (or `DataGeneratorDeconvDCT`) whose dataset is already loaded and
+    serves its batches by index, using the same parsing, transformation and encoding code as
+    `DataGeneratorDCT.generate()`.
+
+    The dataset lists are never shuffled in place. Instead, each epoch uses a permutation drawn
+    from `seed` and the epoch number, and the NumPy RNG that the transformations draw from is
+    reseeded from `seed`, the epoch and the batch index before every batch. Every worker process
+    thus gets its own random state, and an epoch is reproducible whatever the worker that builds
+    each batch.
+    '''
+
+    def __init__(self,
+                 data_generator,
+                 batch_size=32,
+                 shuffle=True,
+                 transformations=[],
+                 label_encoder=None,
+                 returns={'processed_images', 'encoded_labels'},
+                 keep_images_without_gt=False,
+                 degenerate_box_handling='remove',
+                 deconv=False,
+                 dct_dtype=np.float64,
+                 buffer_ring_size=0,
+                 seed=None):
+        '''
+        Arguments:
+            data_generator (DataGeneratorDCT): The data generator holding the dataset.
+            seed (int, optional): The seed of the shuffling and of the transformations. If `None`,
+                a random seed is drawn.
+            The other arguments are the ones of `DataGeneratorDCT.generate()`.
+        '''
+        self.data_generator = data_generator
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.transformations = transformations
+        self.label_encoder = label_encoder
+        self.returns = returns
+        self.keep_images_without_gt = keep_images_without_gt
+        self.degenerate_box_handling = degenerate_box_handling
+        self.deconv = deconv
+        self.dct_dtype = dct_dtype
+        self.buffer_ring_size = buffer_ring_size
+        self.buffer_ring = None
+        self.seed = np.random.randint(2**31) if seed is None else seed
+
+        self.box_filter = data_generator.prepare_generation(transformations=transformations,
+                                                            label_encoder=label_encoder,
+                                                            returns=returns,
+                                                            degenerate_box_handling=degenerate_box_handling)
+        self.epoch = 0
+        self.positions = self.epoch_positions(self.epoch)
+
+    def epoch_positions(self, epoch):
+        '''
+        Returns:
+            The order in which the samples of the dataset are served during the given epoch.
+        '''
+        if self.shuffle:
+            return np.random.RandomState((self.seed + epoch) % 2**32).permutation(self.data_generator.get_dataset_size())
+        return np.arange(self.data_generator.get_dataset_size())
+
+    def __len__(self):
+        return int(ceil(self.data_generator.get_dataset_size() / self.batch_size))
+
+    def __getitem__(self, index):
+        # The transformations draw from the global NumPy RNG, give it a state of its own for this batch.
+        np.random.seed((self.seed + self.epoch * len(self) + index) % 2**32)
+
+        # Built lazily so that every worker process allocates its own ring.
+        if self.buffer_ring_size > 0 and self.buffer_ring is None:
+            self.buffer_ring = BatchBufferRing(self.buffer_ring_size,
+                                               [(self.batch_size,) + shape for shape in dct_input_shapes(self.deconv)],
+                                               [self.dct_dtype] * (3 if self.deconv else 2))
+
+        batch = self.data_generator.generate_batch(self.positions[index * self.batch_size:(index + 1) * self.batch_size],
+                                                   transformations=self.transformations,
+                                                   label_encoder=self.label_encoder,
+                                                   returns=self.returns,
+                                                   keep_images_without_gt=self.keep_images_without_gt,
+                                                   degenerate_box_handling=self.degenerate_box_handling,
+                                                   box_filter=self.box_filter,
+                                                   deconv=self.deconv,
+                                                   dct_dtype=self.dct_dtype,
+                                                   buffer_ring=self.buffer_ring)
+        return tuple(batch)
+
+    def on_epoch_end(self):
+        self.epoch += 1
+        self.positions = self.epoch_positions(self.epoch)
@@ -0,0 +1,148 @@
+'''
+In-memory JPEG codec stage for the DCT data generators.
+
+An image is encoded to JPEG in a bytes buffer, the buffer is handed to `jpegdecoder` through an
+anonymous in-memory file and the DCT coefficients are read back. Nothing is written to the disk,
+and since every codec (and every process using it) owns its file, several generators can run at
+the same time without stepping on each other's images.
+'''
+
+from __future__ import division
+import os
+import tempfile
+import numpy as np
+from io import BytesIO
+from PIL import Image
+import jpegdecoder
+
+class JPEGCodecError(Exception):
+    '''
+    An exception class to be raised if an image cannot be encoded to or decoded from
+    a JPEG buffer.
+    '''
+    pass
+
+def encode_jpeg(image, subsampling=0):
+    '''
+    Encodes an image to JPEG in memory.
+
+    Arguments:
+        image (array): A Numpy array of shape `(height, width, 3)` and type `uint8`.
+        subsampling (int, optional): The chroma subsampling passed to PIL, 0 for 4:4:4.
+
+    Returns:
+        The JPEG file as `bytes`.
+    '''
+    buffer = BytesIO()
+    Image.fromarray(image).save(buffer, format='jpeg', subsampling=subsampling)
+    return buffer.getvalue()
+
+class JPEGCodec:
+    '''
+    Encodes images to JPEG and reads their DCT coefficients with `jpegdecoder`, without going
+    through the disk.
+
+    `jpegdecoder` only decodes files, so the bytes buffer is written to an anonymous in-memory
+    file (`memfd_create`, or a file on the `/dev/shm` tmpfs if not available) that is reused for
+    every image. The file is reopened after a fork so that worker processes don't share it, and
+    the copy of the parent's file inherited by the worker is closed.
+    '''
+
+    def __init__(self, max_retries=3):
+        '''
+        Arguments:
+            max_retries (int, optional): The number of times the codec stage is retried on an image
+                before a `JPEGCodecError` is raised.
+        '''
+        self.max_retries = max_retries
+        self.decoder = jpegdecoder.decoder.JPEGDecoder()
+        self.pid = None
+        self.fd = None
+        self.path = None
+
+    def _open_memory_file(self):
+        if not (self.fd is None) and self.pid == os.getpid():
+            return
+        # After a fork, the child closes its copy of the parent's file, the parent's one stays open.
+        self._close_memory_file()
+        if hasattr(os, 'memfd_create'):
+            self.fd = os.memfd_create('jpeg_codec')
+            self.path = '/proc/{}/fd/{}'.format(os.getpid(), self.fd)
+        else:
+            self.fd, self.path = tempfile.mkstemp(suffix='.jpg', dir='/dev/shm' if os.path.isdir('/dev/shm') else None)
+            os.unlink(self.path)
+            self.path = '/proc/{}/fd/{}'.format(os.getpid(), self.fd)
+        self.pid = os.getpid()
+
+    def _close_memory_file(self):
+        if not (self.fd is None):
+            try:
+                os.close(self.fd)
+            except OSError:
+                pass
+            self.fd = None
+            self.path = None
+
+    def decode(self, buffer, height, width, scale_to_255=False):
+        '''
+        Reads the DCT coefficients of a JPEG buffer.
+
+        Arguments:
+            buffer (bytes): The JPEG file.
+            height (int): The height of the output, the padding of the last blocks is cropped.
+            width (int): The width of the output, the padding of the last blocks is cropped.
+            scale_to_255 (bool, optional): If `True`, the coefficients are mapped from [-1024, 1024)
+                to [0, 255) as `(x + 1024) * 255 // 2048`.
+
+        Returns:
+            A Numpy array of shape `(height, width, 3)` and type `int32`. Grayscale images are repeated
+            over the three channels.
+        '''
+        self._open_memory_file()
+        os.ftruncate(self.fd, 0)
+        os.pwrite(self.fd, buffer, 0)
+
+        img = self.decoder.decode_file(self.path, 2)
+        rows, cols = img.get_component_shape(0)[0:2]
+        dct_image = np.empty((height, width, 3), dtype=np.int32)
+        for c in range(3):
+            component = c if img.get_number_of_component() == 3 else 0
+            dct_image[:, :, c] = np.reshape(img.get_data(component), (rows, cols))[:height, :width]
+
+        if scale_to_255:
+            dct_image = (dct_image + 1024) * 255 // 2048
+
+        return dct_image
+
+    def __call__(self, image, scale_to_255=False, image_name=None):
+        '''
+        Runs the codec stage on one image: JPEG encoding without chroma subsampling, then reading
+        of the DCT coefficients.
+
+        Arguments:
+            image (array): A Numpy array of shape `(height, width, 3)` and type `uint8`.
+            scale_to_255 (bool, optional): See `decode()`.
+            image_name (str, optional): The name of the image, only used in the error message.
+
+        Returns:
+            A Numpy array of shape `(height, width, 3)` and type `int32`.
+
+        Raises:
+            JPEGCodecError: If the image could not be encoded or decoded after `max_retries` retries. Only
+                the `OSError`, `RuntimeError` and `ValueError` of PIL, `jpegdecoder` and the in-memory file
+                are retried, the other exceptions are raised at once.
+        '''
+        height, width = image.shape[:2]
+        last_error = None
+        for attempt in range(self.max_retries + 1):
+            try:
+                return self.decode(encode_jpeg(image), height, width, scale_to_255=scale_to_255)
+            except (OSError, RuntimeError, ValueError) as error:
+                last_error = error
+                # Start again from a fresh file in case the current one is in a bad state.
+                self._close_memory_file()
+
+        raise JPEGCodecError("The JPEG codec stage failed {} times on image {}: {!r}".format(self.max_retries + 1, image_name, last_error)) from last_error
+
+    def __del__(self):
+        self._close_memory_file()
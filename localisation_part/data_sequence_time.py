@@ -0,0 +1,89 @@
+'''
+Scaling benchmark of `DataSequenceDCT`: training batches per second when the batches are built
+by 1, 2, 4 and 8 worker processes, as `fit_generator(workers=N, use_multiprocessing=True)` does.
+'''
+
+import argparse
+import time
+
+from keras.utils import OrderedEnqueuer
+
+from ssd_encoder_decoder.ssd_input_encoder import SSDInputEncoder
+from data_generator.object_detection_2d_data_generator_dct_j2d import DataGeneratorDCT
+from data_generator.object_detection_2d_data_sequence_dct_j2d import DataSequenceDCT
+from data_generator.data_augmentation_chain_original_ssd import SSDDataAugmentation
+
+parser = argparse.ArgumentParser(description="Batches per second of the DCT training pipeline for several numbers of workers.")
+parser.add_argument("images_dir", help="The Pascal VOC JPEGImages directory.")
+parser.add_argument("annotations_dir", help="The Pascal VOC Annotations directory.")
+parser.add_argument("image_set_filename", help="The Pascal VOC image set file, e.g. ImageSets/Main/train.txt.")
+parser.add_argument("-nb", "--numberOfBatches", help="The number of batches to time for each number of workers.", type=int, default=50)
+parser.add_argument("-bs", "--batchSize", help="The size of the batches.", type=int, default=32)
+parser.add_argument("-w", "--workers", help="The numbers of workers to benchmark.", type=int, nargs="+", default=[1, 2, 4, 8])
+args = parser.parse_args()
+
+classes = ['background',
+           'aeroplane', 'bicycle', 'bird', 'boat',
+           'bottle', 'bus', 'car', 'cat',
+           'chair', 'cow', 'diningtable', 'dog',
+           'horse', 'motorbike', 'person', 'pottedplant',
+           'sheep', 'sofa', 'train', 'tvmonitor']
+
+dataset = DataGeneratorDCT(load_images_into_memory=False, hdf5_dataset_path=None)
+dataset.parse_xml(images_dirs=[args.images_dir],
+                  image_set_filenames=[args.image_set_filename],
+                  annotations_dirs=[args.annotations_dir],
+                  classes=classes,
+                  include_classes='all',
+                  exclude_truncated=False,
+                  exclude_difficult=False,
+                  ret=False)
+
+# The predictor sizes of the SSD300.
+ssd_input_encoder = SSDInputEncoder(img_height=300,
+                                    img_width=300,
+                                    n_classes=20,
+                                    predictor_sizes=[(38, 38), (19, 19), (10, 10), (5, 5), (3, 3), (1, 1)],
+                                    scales=[0.1, 0.2, 0.37, 0.54, 0.71, 0.88, 1.05],
+                                    aspect_ratios_per_layer=[[1.0, 2.0, 0.5],
+                                                             [1.0, 2.0, 0.5, 3.0, 1.0/3.0],
+                                                             [1.0, 2.0, 0.5, 3.0, 1.0/3.0],
+                                                             [1.0, 2.0, 0.5, 3.0, 1.0/3.0],
+                                                             [1.0, 2.0, 0.5],
+                                                             [1.0, 2.0, 0.5]],
+                                    two_boxes_for_ar1=True,
+                                    steps=[8, 16, 32, 64, 100, 300],
+                                    offsets=[0.5, 0.5, 0.5, 0.5, 0.5, 0.5],
+                                    clip_boxes=False,
+                                    variances=[0.1, 0.1, 0.2, 0.2],
+                                    matching_type='multi',
+                                    pos_iou_threshold=0.5,
+                                    neg_iou_limit=0.5,
+                                    normalize_coords=True,
+                                    batched=True,
+                                    index_anchors=True)
+
+sequence = DataSequenceDCT(dataset,
+                           batch_size=args.batchSize,
+                           shuffle=True,
+                           transformations=[SSDDataAugmentation(img_height=300, img_width=300, background=[123, 117, 104])],
+                           label_encoder=ssd_input_encoder,
+                           returns={'processed_images', 'encoded_labels'},
+                           keep_images_without_gt=False,
+                           seed=1)
+
+results = {}
+for workers in args.workers:
+    enqueuer = OrderedEnqueuer(sequence, use_multiprocessing=True, shuffle=False)
+    enqueuer.start(workers=workers, max_queue_size=2 * workers)
+    output_generator = enqueuer.get()
+
+    # The first batch includes the start of the worker processes.
+    next(output_generator)
+    start = time.time()
+    for _ in range(args.numberOfBatches):
+        next(output_generator)
+    results[workers] = args.numberOfBatches / (time.time() - start)
+    enqueuer.stop()
+
+    print("{} worker(s): {:.2f} batches/sec (x{:.2f})".format(workers, results[workers], results[workers] / results[args.workers[0]]))
@@ -0,0 +1,66 @@
+'''
+Compares the batch latency of the in-memory JPEG codec stage with the former temp-file
+round trip through `$LOCAL_WORK_DIR` and `jpegdecoder`.
+'''
+
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image
+
+import jpegdecoder
+
+from data_generator.object_detection_2d_dct_codec import JPEGCodec
+
+parser = argparse.ArgumentParser(description="Batch latency of the in-memory JPEG codec stage against the temp-file round trip.")
+parser.add_argument("images_dir", help="A directory of JPEG images, e.g. the JPEGImages directory of Pascal VOC.")
+parser.add_argument("-nb", "--numberOfBatches", help="The number of batches to time.", type=int, default=20)
+parser.add_argument("-bs", "--batchSize", help="The size of the batches.", type=int, default=32)
+args = parser.parse_args()
+
+filenames = sorted(os.listdir(args.images_dir))[:args.numberOfBatches * args.batchSize]
+images = []
+for filename in filenames:
+    with Image.open(os.path.join(args.images_dir, filename)) as image:
+        images.append(np.array(image.convert('RGB').resize((300, 300)), dtype=np.uint8))
+batches = [np.array(images[i:i + args.batchSize]) for i in range(0, len(images), args.batchSize)]
+
+def in_memory_batch(batch_X, codec):
+    new_batch_X = np.empty(batch_X.shape, dtype=np.int32)
+    for i, image in enumerate(batch_X):
+        new_batch_X[i] = codec(image)
+    return new_batch_X
+
+def temp_file_batch(batch_X, decoder, work_dir):
+    new_batch_X = np.empty(batch_X.shape, dtype=np.int32)
+    for i, image in enumerate(batch_X):
+        path = os.path.join(work_dir, "{}.jpg".format(i))
+        Image.fromarray(image).save(path, format="jpeg", subsampling=0)
+        img = decoder.decode_file(path, 2)
+        rows, cols = img.get_component_shape(0)[0:2]
+        for c in range(3):
+            new_batch_X[i, :, :, c] = np.reshape(img.get_data(c), (rows, cols))[:300, :300]
+    return new_batch_X
+
+def latencies(function):
+    times, outputs = [], []
+    for batch_X in batches:
+        start = time.time()
+        outputs.append(function(batch_X))
+        times.append(time.time() - start)
+    return np.array(times) * 1000, outputs
+
+codec = JPEGCodec()
+memory_times, memory_outputs = latencies(lambda batch_X: in_memory_batch(batch_X, codec))
+
+decoder = jpegdecoder.decoder.JPEGDecoder()
+with tempfile.TemporaryDirectory(dir=os.environ.get("LOCAL_WORK_DIR")) as work_dir:
+    file_times, file_outputs = latencies(lambda batch_X: temp_file_batch(batch_X, decoder, work_dir))
+
+print("Temp-file round trip: {:.1f} ms/batch (median {:.1f} ms)".format(file_times.mean(), np.median(file_times)))
+print("In-memory codec: {:.1f} ms/batch (median {:.1f} ms)".format(memory_times.mean(), np.median(memory_times)))
+print("Speed-up: x{:.2f}".format(file_times.mean() / memory_times.mean()))
+print("Max absolute difference between the two paths: {}".format(max(np.abs(a - b).max() for a, b in zip(memory_outputs, file_outputs))))
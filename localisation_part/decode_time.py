@@ -0,0 +1,45 @@
+'''
+Micro-benchmark of the decoding of the SSD300 raw prediction output: time per batch of `decode_detections()`, which
+thresholds and suppresses each class of each batch item separately, and of `decode_detections_batched()`, which
+does it for all classes and batch items at once, with and without a pre-NMS top-k, for batch sizes 1, 8 and 32,
+on the encoded random ground truth with softmax confidences as the output of a trained model.
+'''
+
+import argparse
+import time
+
+import numpy as np
+
+from ssd_encoder_decoder.ssd_output_decoder import decode_detections, decode_detections_batched
+from tests.ssd_encoder_decoder.tests_ssd_output_decoder import random_model_output
+
+parser = argparse.ArgumentParser(description="Time per batch of the per class and of the batched SSD output decoder.")
+parser.add_argument("-bs", "--batchSizes", help="The batch sizes to benchmark.", type=int, nargs="+", default=[1, 8, 32])
+parser.add_argument("-mb", "--maxBoxes", help="The maximal number of ground truth boxes per image.", type=int, default=10)
+parser.add_argument("-ct", "--confidenceThreshold", help="The confidence threshold of the decoders.", type=float, default=0.01)
+parser.add_argument("-pk", "--preNmsTopK", help="The pre-NMS top-k per class of the batched decoder.", type=int, default=400)
+parser.add_argument("-nb", "--numberOfBatches", help="The number of batches to time for each batch size.", type=int, default=5)
+args = parser.parse_args()
+
+random_state = np.random.RandomState(0)
+for batch_size in args.batchSizes:
+    y_preds = [random_model_output(random_state, batch_size, args.maxBoxes) for _ in range(args.numberOfBatches)]
+    kwargs = dict(confidence_thresh=args.confidenceThreshold, img_height=300, img_width=300)
+
+    start = time.time()
+    expected = [decode_detections(y_pred, **kwargs) for y_pred in y_preds]
+    time_per_class = (time.time() - start) / args.numberOfBatches
+
+    start = time.time()
+    decoded = [decode_detections_batched(y_pred, **kwargs) for y_pred in y_preds]
+    time_batched = (time.time() - start) / args.numberOfBatches
+
+    start = time.time()
+    for y_pred in y_preds:
+        decode_detections_batched(y_pred, pre_nms_top_k=args.preNmsTopK, **kwargs)
+    time_top_k = (time.time() - start) / args.numberOfBatches
+
+    same = all(np.array_equal(a, b) for e, d in zip(expected, decoded) for a, b in zip(e, d))
+    print("batch size {}: per class {:.1f} ms, batched {:.1f} ms ({:.1f}x), batched with pre-NMS top-{} {:.1f} ms ({:.1f}x), same detections: {}".format(
+          batch_size, time_per_class * 1000, time_batched * 1000, time_per_class / time_batched,
+          args.preNmsTopK, time_top_k * 1000, time_per_class / time_top_k, same))
@@ -0,0 +1,82 @@
+'''
+Micro-benchmark of `SSDInputEncoder` on the SSD300 anchor boxes: time per batch of the per batch item
+matching and of the batched matching (with and without the anchor index, with float32 IoU similarities, and with
+float32 targets) for batch sizes from 8 to 64, on random ground truth boxes with a number of boxes per image drawn
+between 0 and a maximum, optionally small boxes as in crowded images.
+'''
+
+import argparse
+import time
+
+import numpy as np
+
+from ssd_encoder_decoder.ssd_input_encoder import SSDInputEncoder
+
+parser = argparse.ArgumentParser(description="Time per batch of the per batch item and of the batched SSD input encoder.")
+parser.add_argument("-bs", "--batchSizes", help="The batch sizes to benchmark.", type=int, nargs="+", default=[8, 16, 32, 64])
+parser.add_argument("-mb", "--maxBoxes", help="The maximal number of ground truth boxes per image.", type=int, default=10)
+parser.add_argument("-sb", "--smallBoxes", help="Draw boxes with sides of at most 60 pixels.", action="store_true")
+parser.add_argument("-nb", "--numberOfBatches", help="The number of batches to time for each batch size.", type=int, default=20)
+args = parser.parse_args()
+
+
+def ssd300_encoder(**kwargs):
+    # The predictor sizes of the SSD300.
+    return SSDInputEncoder(img_height=300,
+                           img_width=300,
+                           n_classes=20,
+                           predictor_sizes=[(38, 38), (19, 19), (10, 10), (5, 5), (3, 3), (1, 1)],
+                           scales=[0.1, 0.2, 0.37, 0.54, 0.71, 0.88, 1.05],
+                           aspect_ratios_per_layer=[[1.0, 2.0, 0.5],
+                                                    [1.0, 2.0, 0.5, 3.0, 1.0/3.0],
+                                                    [1.0, 2.0, 0.5, 3.0, 1.0/3.0],
+                                                    [1.0, 2.0, 0.5, 3.0, 1.0/3.0],
+                                                    [1.0, 2.0, 0.5],
+                                                    [1.0, 2.0, 0.5]],
+                           two_boxes_for_ar1=True,
+                           steps=[8, 16, 32, 64, 100, 300],
+                           offsets=[0.5, 0.5, 0.5, 0.5, 0.5, 0.5],
+                           clip_boxes=False,
+                           variances=[0.1, 0.1, 0.2, 0.2],
+                           matching_type='multi',
+                           pos_iou_threshold=0.5,
+                           neg_iou_limit=0.5,
+                           normalize_coords=True,
+                           **kwargs)
+
+
+def random_ground_truth(random_state, batch_size):
+    ground_truth = []
+    for _ in range(batch_size):
+        n_boxes = random_state.randint(0, args.maxBoxes + 1)
+        xmin = random_state.randint(0, 290, n_boxes)
+        ymin = random_state.randint(0, 290, n_boxes)
+        max_side = 60 if args.smallBoxes else 300
+        xmax = np.minimum(xmin + random_state.randint(1, max_side, n_boxes), 300)
+        ymax = np.minimum(ymin + random_state.randint(1, max_side, n_boxes), 300)
+        class_id = random_state.randint(1, 21, n_boxes)
+        ground_truth.append(np.stack([class_id, xmin, ymin, xmax, ymax], axis=1))
+    return ground_truth
+
+
+encoders = [("per batch item", ssd300_encoder(batched=False)),
+            ("batched, float64", ssd300_encoder(batched=True, index_anchors=True)),
+            ("batched, all anchor boxes", ssd300_encoder(batched=True, index_anchors=False)),
+            ("batched, float32 IoU", ssd300_encoder(batched=True, iou_dtype=np.float32)),
+            ("batched, float32 targets", ssd300_encoder(batched=True, index_anchors=True, dtype=np.float32))]
+
+random_state = np.random.RandomState(0)
+for batch_size in args.batchSizes:
+    batches = [random_ground_truth(random_state, batch_size) for _ in range(args.numberOfBatches)]
+
+    times = []
+    for name, encoder in encoders:
+        start = time.time()
+        for ground_truth in batches:
+            encoder(ground_truth)
+        times.append((time.time() - start) / args.numberOfBatches)
+
+    same = all(np.array_equal(encoders[0][1](ground_truth), encoders[1][1](ground_truth)) for ground_truth in batches[:3])
+    print("batch size {}: ".format(batch_size) +
+          ", ".join("{} {:.1f} ms ({:.2f}x)".format(name, t * 1000, times[0] / t) for (name, _), t in zip(encoders, times)) +
+          ", float64 targets identical: {}".format(same))
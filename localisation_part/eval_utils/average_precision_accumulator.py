@@ -0,0 +1,214 @@
+'''
+An accumulator of the Pascal VOC-style average precisions of the predictions on a dataset,
+which matches the predictions batch by batch as they are produced.
+'''
+
+from __future__ import division
+import numpy as np
+
+from eval_utils.average_precision_evaluator import get_ground_truth, match_best_overlaps, match_true_positives, compute_average_precision
+
+class AveragePrecisionAccumulator:
+    '''
+    Accumulates the Pascal VOC-style average precisions of the predictions on a dataset batch by batch.
+
+    Each batch of predictions is matched to the ground truth boxes of its images right away, and only the
+    confidence of each prediction and whether it is a true or a false positive are kept, in compact per-class
+    arrays of 6 bytes per prediction. The average precisions of the images seen so far can therefore be
+    computed at any point. Once every image has been seen,
+    they are the same as those of `Evaluator` with `sorting_algorithm='mergesort'` on the same predictions.
+    '''
+
+    def __init__(self,
+                 n_classes,
+                 data_generator,
+                 pred_format={'class_id': 0, 'conf': 1, 'xmin': 2, 'ymin': 3, 'xmax': 4, 'ymax': 5},
+                 gt_format={'class_id': 0, 'xmin': 1, 'ymin': 2, 'xmax': 3, 'ymax': 4},
+                 ignore_under_area=0,
+                 ignore_neutral_boxes=True,
+                 matching_iou_threshold=0.5,
+                 border_pixels='include'):
+        '''
+        Arguments:
+            n_classes (int): The number of positive classes, e.g. 20 for Pascal VOC, 80 for MS COCO.
+            data_generator (DataGenerator): A `DataGenerator` object with the labels and image IDs of the evaluation dataset.
+            pred_format (dict, optional): A dictionary that defines which index in the last axis of the decoded predictions
+                contains which bounding box coordinate. The dictionary must map the keywords 'class_id', 'conf' (for the confidence),
+                'xmin', 'ymin', 'xmax', and 'ymax' to their respective indices within last axis.
+            gt_format (list, optional): A dictionary that defines which index of a ground truth bounding box contains which of the five
+                items class ID, xmin, ymin, xmax, ymax. The expected strings are 'xmin', 'ymin', 'xmax', 'ymax', 'class_id'.
+            ignore_under_area (int, optional): The area under which ground truth boxes are left out of the evaluation.
+            ignore_neutral_boxes (bool, optional): If `True`, the ground truth boxes that the data generator annotates as neutral
+                for the evaluation, e.g. the "difficult" boxes of Pascal VOC, are neither counted nor make false positives.
+            matching_iou_threshold (float, optional): A prediction will be considered a true positive if it has a Jaccard overlap
+                of at least `matching_iou_threshold` with any ground truth bounding box of the same class.
+            border_pixels (str, optional): How to treat the border pixels of the bounding boxes.
+                Can be 'include', 'exclude', or 'half'. Refer to `Evaluator.match_predictions()`.
+        '''
+
+        if data_generator.labels is None:
+            raise ValueError("Accumulating average precisions not possible, no ground truth given.")
+
+        self.n_classes = n_classes
+        self.pred_format = pred_format
+        self.matching_iou_threshold = matching_iou_threshold
+        self.border_pixels = border_pixels
+
+        image_indices, gt_image_indices, gt_class_ids, gt_boxes, gt_neutral = get_ground_truth(data_generator,
+                                                                                               gt_format=gt_format,
+                                                                                               ignore_under_area=ignore_under_area,
+                                                                                               ignore_neutral_boxes=ignore_neutral_boxes)
+        self.image_indices = image_indices
+        self.n_images = len(data_generator.labels)
+        # The ground truth boxes of each image are `gt_image_starts[i]:gt_image_starts[i+1]`.
+        self.gt_image_starts = np.searchsorted(gt_image_indices, np.arange(self.n_images + 1))
+        self.gt_class_ids = gt_class_ids
+        self.gt_neutral = gt_neutral
+        # The image indices, coordinates and neutrality of the ground truth boxes of each class, in the order of the images.
+        self.class_ground_truth = [None]
+        for class_id in range(1, self.n_classes + 1):
+            class_gt = np.flatnonzero(gt_class_ids == class_id)
+            self.class_ground_truth.append((gt_image_indices[class_gt], gt_boxes[class_gt], gt_neutral[class_gt]))
+
+        self.reset()
+
+    def reset(self):
+        '''
+        Forgets all predictions, e.g. to evaluate a new model on the same dataset.
+
+        Returns:
+            None.
+        '''
+
+        self.images_seen = np.zeros(self.n_images, dtype=np.bool_)
+        self.num_gt_per_class = np.zeros(self.n_classes + 1, dtype=np.int64)
+        self.gt_matched = [None] + [np.zeros(len(gt_neutral), dtype=np.bool_) for _, _, gt_neutral in self.class_ground_truth[1:]]
+        # For each class, the chunks of the confidences and of the true and false positives of its predictions.
+        self.confidences = [[] for _ in range(self.n_classes + 1)]
+        self.true_positives = [[] for _ in range(self.n_classes + 1)]
+        self.false_positives = [[] for _ in range(self.n_classes + 1)]
+
+    def update(self, batch_predictions, batch_image_ids):
+        '''
+        Matches the predictions for a batch of images to their ground truth boxes.
+
+        The predictions of an image should be given in one batch only: the ground truth boxes that a
+        prediction matched stay matched, so the predictions of a later batch count as duplicates.
+
+        Arguments:
+            batch_predictions (list): A list that contains for each batch item a 2D Numpy array with its decoded predictions
+                in `pred_format` and in the coordinates of the original image, as returned by `decode_detections()` and
+                `apply_inverse_transforms()`. Batch items without predictions may be empty arrays of any shape.
+            batch_image_ids (list): The image IDs of the batch items.
+
+        Returns:
+            None.
+        '''
+
+        class_id_pred = self.pred_format['class_id']
+        conf_pred = self.pred_format['conf']
+        box_pred = [self.pred_format['xmin'], self.pred_format['ymin'], self.pred_format['xmax'], self.pred_format['ymax']]
+
+        batch_image_indices = np.array([self.image_indices[str(image_id)] for image_id in batch_image_ids], dtype=np.int64)
+
+        # Count the ground truth boxes of the images that were not seen before.
+        new_images = np.unique(batch_image_indices[~self.images_seen[batch_image_indices]])
+        self.images_seen[new_images] = True
+        if len(new_images) > 0:
+            new_gt = np.concatenate([np.arange(self.gt_image_starts[i], self.gt_image_starts[i + 1]) for i in new_images])
+            new_gt = new_gt[~self.gt_neutral[new_gt]]
+            self.num_gt_per_class += np.bincount(self.gt_class_ids[new_gt], minlength=self.n_classes + 1)[:self.n_classes + 1]
+
+        items = [k for k in range(len(batch_predictions)) if np.size(batch_predictions[k]) > 0]
+        if len(items) == 0:
+            return
+        predictions = np.concatenate([batch_predictions[k] for k in items], axis=0)
+        pred_image_indices = np.repeat(batch_image_indices[items], [len(batch_predictions[k]) for k in items])
+        class_ids = predictions[:,class_id_pred].astype(np.int64)
+        confidences = predictions[:,conf_pred].astype(np.float32)
+        # Round the box coordinates as `Evaluator.predict_on_dataset()` does.
+        boxes = np.round(predictions[:,box_pred], 1).astype(np.float32)
+
+        for class_id in np.unique(class_ids):
+
+            if not (1 <= class_id <= self.n_classes):
+                continue
+
+            class_predictions = np.flatnonzero(class_ids == class_id)
+            # Sort the predictions of this class by decreasing confidence. The stable sort keeps the order of
+            # the predictions with equal confidences, which decides the duplicate detections of an object.
+            class_predictions = class_predictions[np.argsort(-confidences[class_predictions], kind='mergesort')]
+
+            gt_image_indices, gt_boxes, gt_neutral = self.class_ground_truth[class_id]
+            gt_match_indices, gt_match_overlaps = match_best_overlaps(pred_image_indices[class_predictions],
+                                                                      boxes[class_predictions],
+                                                                      gt_image_indices,
+                                                                      gt_boxes,
+                                                                      border_pixels=self.border_pixels)
+            true_pos, false_pos = match_true_positives(gt_match_indices,
+                                                       gt_match_overlaps,
+                                                       gt_neutral,
+                                                       matching_iou_threshold=self.matching_iou_threshold,
+                                                       gt_matched=self.gt_matched[class_id])
+
+            self.confidences[class_id].append(confidences[class_predictions])
+            self.true_positives[class_id].append(true_pos.astype(np.int8))
+            self.false_positives[class_id].append(false_pos.astype(np.int8))
+
+    def compute_average_precisions(self, mode='sample', num_recall_points=11):
+        '''
+        Computes the average precision for each class over the images seen so far.
+
+        Arguments:
+            mode (str, optional): Can be either 'sample' or 'integrate'. Refer to `Evaluator.compute_average_precisions()`.
+            num_recall_points (int, optional): Only relevant if mode is 'sample'. The number of points to sample from the
+                precision-recall-curve to compute the average precisions.
+
+        Returns:
+            A list containing the average precision for each class, with a dummy entry for the background class.
+        '''
+
+        if not (mode in {'sample', 'integrate'}):
+            raise ValueError("`mode` can be either 'sample' or 'integrate', but received '{}'".format(mode))
+
+        average_precisions = [0.0]
+
+        for class_id in range(1, self.n_classes + 1):
+
+            # Merge the chunks of this class into one, sorted by decreasing confidence. Equal confidences
+            # stay in the order of the batches, as in the predictions list of `Evaluator`.
+            if len(self.confidences[class_id]) > 1:
+                confidences = np.concatenate(self.confidences[class_id])
+                descending_indices = np.argsort(-confidences, kind='mergesort')
+                self.confidences[class_id] = [confidences[descending_indices]]
+                self.true_positives[class_id] = [np.concatenate(self.true_positives[class_id])[descending_indices]]
+                self.false_positives[class_id] = [np.concatenate(self.false_positives[class_id])[descending_indices]]
+
+            if len(self.confidences[class_id]) == 0:
+                tp = np.zeros(0, dtype=np.int64)
+                fp = np.zeros(0, dtype=np.int64)
+            else:
+                tp = np.cumsum(self.true_positives[class_id][0], dtype=np.int64)
+                fp = np.cumsum(self.false_positives[class_id][0], dtype=np.int64)
+
+            cumulative_precision = np.where(tp + fp > 0, tp / (tp + fp), 0)
+            cumulative_recall = tp / self.num_gt_per_class[class_id]
+
+            average_precisions.append(compute_average_precision(cumulative_precision, cumulative_recall, mode=mode, num_recall_points=num_recall_points))
+
+        return average_precisions
+
+    def compute_mean_average_precision(self, mode='sample', num_recall_points=11):
+        '''
+        Computes the mean average precision over all classes and the images seen so far.
+
+        Arguments:
+            mode (str, optional): Can be either 'sample' or 'integrate'. Refer to `Evaluator.compute_average_precisions()`.
+            num_recall_points (int, optional): Only relevant if mode is 'sample'. The number of points to sample from the
+                precision-recall-curve to compute the average precisions.
+
+        Returns:
+            A float, the mean average precision.
+        '''
+
+        return np.average(self.compute_average_precisions(mode=mode, num_recall_points=num_recall_points)[1:])
@@ -0,0 +1,150 @@
+'''
+A Keras callback that computes the Pascal VOC-style mean average precision of a model in
+training mode on a fixed validation subset during the training.
+'''
+
+from __future__ import division
+import time
+from keras.callbacks import Callback
+
+from ssd_encoder_decoder.ssd_output_decoder import decode_detections_batched
+from data_generator.object_detection_2d_misc_utils import apply_inverse_transforms
+from eval_utils.average_precision_accumulator import AveragePrecisionAccumulator
+
+class ValidationMeanAveragePrecision(Callback):
+    '''
+    Computes the mean average precision of the model on the first batches of a validation dataset every
+    `period` epochs and writes it into the epoch logs under `name`, e.g. 'val_mAP'.
+
+    The raw predictions are decoded by `decode_detections_batched()` and matched batch by batch by an
+    `AveragePrecisionAccumulator`, so an evaluation costs little more than the forward passes.
+
+    The callbacks that read the logs, e.g. `CSVLogger`, `TensorBoard` or a `ModelCheckpoint` with
+    `monitor='val_mAP', mode='max'`, must come after this callback in the callbacks list. The first
+    epoch is always evaluated. At the epochs that are not evaluated, the mean average precision is
+    logged as NaN, since `CSVLogger` expects the keys of the first epoch at every epoch, and
+    `ModelCheckpoint` skips these epochs because NaN is never an improvement.
+    '''
+
+    def __init__(self,
+                 batches,
+                 data_generator,
+                 n_classes,
+                 img_height,
+                 img_width,
+                 n_batches=None,
+                 period=1,
+                 cache_batches=True,
+                 name='val_mAP',
+                 confidence_thresh=0.01,
+                 iou_threshold=0.45,
+                 top_k=200,
+                 pre_nms_top_k='all',
+                 input_coords='centroids',
+                 normalize_coords=True,
+                 anchor_set=None,
+                 decoding_border_pixels='half',
+                 matching_iou_threshold=0.5,
+                 ignore_neutral_boxes=True,
+                 border_pixels='include',
+                 average_precision_mode='sample',
+                 num_recall_points=11,
+                 verbose=1):
+        '''
+        Arguments:
+            batches (Sequence): A `keras.utils.Sequence` or a list whose items are the tuples
+                `(processed_images, image_ids, inverse_transforms)` of the batches of the validation dataset,
+                e.g. a `DataSequenceDCT` with `shuffle=False`, the evaluation transformations, no label encoder,
+                `returns={'processed_images', 'image_ids', 'inverse_transform'}` and `keep_images_without_gt=True`.
+            data_generator (DataGenerator): The data generator with the labels and image IDs of the validation dataset.
+            n_classes (int): The number of positive classes, e.g. 20 for Pascal VOC, 80 for MS COCO.
+            img_height (int): The input image height for the model.
+            img_width (int): The input image width for the model.
+            n_batches (int, optional): The number of the first batches of `batches` that make up the validation subset.
+                If `None`, all batches are used.
+            period (int, optional): The number of epochs between two evaluations.
+            cache_batches (bool, optional): If `True`, the batches of the validation subset are kept in memory after the first
+                evaluation, so that the later evaluations only run the model.
+            name (str, optional): The key of the mean average precision in the epoch logs.
+            confidence_thresh, iou_threshold, top_k, pre_nms_top_k, input_coords, normalize_coords, anchor_set: The arguments
+                of `decode_detections_batched()`.
+            decoding_border_pixels (str, optional): The `border_pixels` argument of `decode_detections_batched()`, i.e. how
+                the border pixels of the boxes are treated by the non-maximum suppression. Can be 'include', 'exclude', or 'half'.
+            matching_iou_threshold, ignore_neutral_boxes, border_pixels: The arguments of `AveragePrecisionAccumulator`.
+            average_precision_mode (str, optional): Can be either 'sample' or 'integrate'. Refer to `Evaluator.compute_average_precisions()`.
+            num_recall_points (int, optional): Only relevant if `average_precision_mode` is 'sample'. The number of points
+                to sample from the precision-recall-curve.
+            verbose (int, optional): If 1, prints the mean average precision and the duration of each evaluation.
+        '''
+
+        super(ValidationMeanAveragePrecision, self).__init__()
+
+        self.batches = batches
+        self.n_batches = len(batches) if n_batches is None else min(n_batches, len(batches))
+        self.period = period
+        self.cache_batches = cache_batches
+        self.cached_batches = None
+        self.name = name
+        self.decoding_kwargs = dict(confidence_thresh=confidence_thresh,
+                                    iou_threshold=iou_threshold,
+                                    top_k=top_k,
+                                    pre_nms_top_k=pre_nms_top_k,
+                                    input_coords=input_coords,
+                                    normalize_coords=normalize_coords,
+                                    img_height=img_height,
+                                    img_width=img_width,
+                                    border_pixels=decoding_border_pixels,
+                                    anchor_set=anchor_set)
+        self.average_precision_mode = average_precision_mode
+        self.num_recall_points = num_recall_points
+        self.verbose = verbose
+        self.accumulator = AveragePrecisionAccumulator(n_classes,
+                                                       data_generator,
+                                                       ignore_neutral_boxes=ignore_neutral_boxes,
+                                                       matching_iou_threshold=matching_iou_threshold,
+                                                       border_pixels=border_pixels)
+        self.evaluated = False
+
+    def get_batches(self):
+        '''
+        Returns:
+            The batches of the validation subset, from the cache if it was filled.
+        '''
+
+        if not self.cached_batches is None:
+            return self.cached_batches
+        batches = [self.batches[i] for i in range(self.n_batches)]
+        if self.cache_batches:
+            self.cached_batches = batches
+        return batches
+
+    def evaluate(self):
+        '''
+        Computes the mean average precision of the model on the validation subset.
+
+        Returns:
+            A float, the mean average precision.
+        '''
+
+        self.accumulator.reset()
+        for batch_X, batch_image_ids, batch_inverse_transforms in self.get_batches():
+            y_pred = self.model.predict_on_batch(batch_X)
+            y_pred = decode_detections_batched(y_pred, **self.decoding_kwargs)
+            # Convert the predicted box coordinates for the original images.
+            y_pred = apply_inverse_transforms(y_pred, batch_inverse_transforms)
+            self.accumulator.update(y_pred, batch_image_ids)
+        return self.accumulator.compute_mean_average_precision(mode=self.average_precision_mode,
+                                                               num_recall_points=self.num_recall_points)
+
+    def on_epoch_end(self, epoch, logs=None):
+        if self.evaluated and (epoch + 1) % self.period != 0:
+            if not logs is None:
+                logs[self.name] = float('nan')
+            return
+        start = time.time()
+        mean_average_precision = self.evaluate()
+        self.evaluated = True
+        if not logs is None:
+            logs[self.name] = float(mean_average_precision)
+        if self.verbose:
+            print("Epoch {:05d}: {} = {:.4f} ({:.1f} s)".format(epoch + 1, self.name, mean_average_precision, time.time() - start))
@@ -31,9 +31,351 @@ from data_generator.object_detection_2d_patch_sampling_ops import RandomPadFixed
 from data_generator.object_detection_2d_photometric_ops import ConvertTo3Channels
 from ssd_encoder_decoder.ssd_output_decoder import decode_detections
 from data_generator.object_detection_2d_misc_utils import apply_inverse_transforms
+from eval_utils.prediction_cache import prediction_cache_config, prediction_cache_path, PredictionCache, PredictionCacheWriter
 
 from bounding_box_utils.bounding_box_utils import iou
 
+# The matching IoU thresholds of the MS COCO mean average precision, 0.5:0.05:0.95.
+COCO_MATCHING_IOU_THRESHOLDS = np.round(np.linspace(0.5, 0.95, 10), 2)
+
+# The MS COCO ranges of ground truth box areas as `(name, lower bound, upper bound)`, both bounds being inclusive.
+COCO_AREA_RANGES = [('all', 0, np.inf),
+                    ('small', 0, 32 ** 2),
+                    ('medium', 32 ** 2, 96 ** 2),
+                    ('large', 96 ** 2, np.inf)]
+
+def match_best_overlaps(pred_image_indices, pred_boxes, gt_image_indices, gt_boxes, border_pixels='include'):
+    '''
+    Finds for each prediction the ground truth box of the same image with which it has the highest IoU.
+
+    The IoUs of all predictions with the ground truth boxes of their images are computed at once, as
+    one flat array of consecutive segments, one segment per prediction.
+
+    Arguments:
+        pred_image_indices (array): A 1D Numpy array with the image index of each prediction.
+        pred_boxes (array): A 2D Numpy array of shape `(m, 4)` with the `(xmin, ymin, xmax, ymax)` coordinates of the predictions.
+        gt_image_indices (array): A 1D Numpy array with the image index of each ground truth box, sorted in ascending order.
+        gt_boxes (array): A 2D Numpy array of shape `(n, 4)` with the `(xmin, ymin, xmax, ymax)` coordinates of the ground truth boxes.
+        border_pixels (str, optional): How to treat the border pixels of the bounding boxes, as for `iou()`.
+
+    Returns:
+        Two 1D Numpy arrays of length `m`: the index in `gt_boxes` of the ground truth box with the highest IoU,
+        or -1 for the predictions without ground truth box in their images, and that IoU. Like `np.argmax()`,
+        the first of several equal maxima and the first undefined IoU of a segment win.
+    '''
+
+    gt_starts = np.searchsorted(gt_image_indices, pred_image_indices, side='left')
+    gt_counts = np.searchsorted(gt_image_indices, pred_image_indices, side='right') - gt_starts
+
+    gt_match_indices = np.full(len(pred_image_indices), -1, dtype=np.int64)
+
+    with_gt = np.flatnonzero(gt_counts)
+    if len(with_gt) == 0:
+        return gt_match_indices, np.zeros(len(pred_image_indices))
+
+    # The pairs of every prediction with every ground truth box of its image.
+    segment_ends = np.cumsum(gt_counts[with_gt])
+    segment_starts = segment_ends - gt_counts[with_gt]
+    pair_predictions = np.repeat(with_gt, gt_counts[with_gt])
+    pair_gt = np.arange(segment_ends[-1]) + np.repeat(gt_starts[with_gt] - segment_starts, gt_counts[with_gt])
+
+    overlaps = iou(boxes1=gt_boxes[pair_gt],
+                   boxes2=pred_boxes[pair_predictions],
+                   coords='corners',
+                   mode='element-wise',
+                   border_pixels=border_pixels)
+
+    # The first maximum of each segment, where undefined IoUs (e.g. between boxes without area) come first, as for `np.argmax()`.
+    keys = np.where(np.isnan(overlaps), np.inf, overlaps)
+    maxima = np.maximum.reduceat(keys, segment_starts)
+    maximum_positions = np.flatnonzero(keys == np.repeat(maxima, gt_counts[with_gt]))
+    first_maximum_positions = maximum_positions[np.searchsorted(maximum_positions, segment_starts)]
+
+    gt_match_overlaps = np.zeros(len(pred_image_indices), dtype=overlaps.dtype)
+    gt_match_indices[with_gt] = pair_gt[first_maximum_positions]
+    gt_match_overlaps[with_gt] = overlaps[first_maximum_positions]
+
+    return gt_match_indices, gt_match_overlaps
+
+
+def get_ground_truth(data_generator,
+                     gt_format={'class_id': 0, 'xmin': 1, 'ymin': 2, 'xmax': 3, 'ymax': 4},
+                     ignore_under_area=0,
+                     ignore_neutral_boxes=True):
+    '''
+    Gathers the ground truth boxes of all images of a dataset into flat arrays, in the order of the images.
+
+    Ground truth boxes with an area under `ignore_under_area` are left out together with their
+    evaluation-neutrality annotations.
+
+    Arguments:
+        data_generator (DataGenerator): A `DataGenerator` object with the labels of the dataset.
+        gt_format (dict, optional): A dictionary that defines which index of a ground truth bounding box contains which of the five
+            items class ID, xmin, ymin, xmax, ymax.
+        ignore_under_area (int, optional): The area under which ground truth boxes are left out.
+        ignore_neutral_boxes (bool, optional): If `True` and the data generator provides annotations indicating whether
+            a ground truth bounding box is supposed to be neutral for the evaluation, the neutral boxes are marked as such.
+            Otherwise, no box is marked as neutral.
+
+    Returns:
+        A dictionary that maps the image IDs, converted to strings, to the indices of the images in the dataset,
+        and four arrays that contain for each ground truth box the index of its image, its class ID,
+        its `(xmin, ymin, xmax, ymax)` coordinates, and whether it is neutral.
+    '''
+
+    class_id_gt = gt_format['class_id']
+    xmin_gt = gt_format['xmin']
+    ymin_gt = gt_format['ymin']
+    xmax_gt = gt_format['xmax']
+    ymax_gt = gt_format['ymax']
+
+    labels = data_generator.labels
+    image_ids = data_generator.image_ids
+    if image_ids is None:
+        image_ids = range(len(labels))
+    eval_neutral_available = ignore_neutral_boxes and not (data_generator.eval_neutral is None)
+
+    image_indices = {}
+    gt_image_indices = [np.zeros(0, dtype=np.int64)]
+    gt_class_ids = [np.zeros(0, dtype=np.int64)]
+    gt_boxes = [np.zeros((0, 4))]
+    gt_neutral = [np.zeros(0, dtype=np.bool_)]
+    for i in range(len(labels)):
+        image_indices[str(image_ids[i])] = i
+        image_labels = np.asarray(labels[i])
+        if image_labels.size == 0:
+            continue
+        if eval_neutral_available:
+            neutral = np.asarray(data_generator.eval_neutral[i], dtype=np.bool_)
+        else:
+            neutral = np.zeros(len(image_labels), dtype=np.bool_)
+        if ignore_under_area > 0:
+            areas = (image_labels[:,ymax_gt] - image_labels[:,ymin_gt]) * (image_labels[:,xmax_gt] - image_labels[:,xmin_gt])
+            kept = ~(areas < ignore_under_area)
+            image_labels = image_labels[kept]
+            neutral = neutral[kept]
+        gt_image_indices.append(np.full(len(image_labels), i, dtype=np.int64))
+        gt_class_ids.append(image_labels[:,class_id_gt].astype(np.int64))
+        gt_boxes.append(image_labels[:,[xmin_gt, ymin_gt, xmax_gt, ymax_gt]])
+        gt_neutral.append(neutral)
+
+    return (image_indices,
+            np.concatenate(gt_image_indices),
+            np.concatenate(gt_class_ids),
+            np.concatenate(gt_boxes, axis=0),
+            np.concatenate(gt_neutral))
+
+def match_true_positives(gt_match_indices, gt_match_overlaps, gt_neutral, matching_iou_threshold=0.5, gt_matched=None):
+    '''
+    Decides which predictions, sorted by decreasing confidence, are true or false positives from the ground truth
+    boxes that `match_best_overlaps()` matched them to.
+
+    Predictions without ground truth box or whose best overlap is below the threshold are false positives. The others
+    are true positives if they are the first to match their ground truth box and duplicate detections, i.e. false
+    positives, otherwise, except for those that match a neutral ground truth box, which are neither.
+
+    Arguments:
+        gt_match_indices (array): A 1D Numpy array with the index of the matched ground truth box of each prediction, or -1.
+        gt_match_overlaps (array): A 1D Numpy array with the IoU of each prediction with its matched ground truth box.
+        gt_neutral (array): A 1D boolean Numpy array that indicates for each ground truth box whether it is neutral.
+        matching_iou_threshold (float, optional): The minimal IoU of a true positive with its ground truth box.
+        gt_matched (array, optional): `None` or a 1D boolean Numpy array that indicates for each ground truth box whether
+            it was matched by a previous prediction. It is updated in place with the new true positives.
+
+    Returns:
+        Two 1D Numpy arrays with 1 for each true positive and for each false positive, respectively, and 0 otherwise.
+    '''
+
+    true_pos = np.zeros(len(gt_match_indices), dtype=np.int64)
+    false_pos = np.zeros(len(gt_match_indices), dtype=np.int64)
+
+    above_threshold = (gt_match_indices >= 0) & ~(gt_match_overlaps < matching_iou_threshold)
+    false_pos[~above_threshold] = 1
+    counted = np.flatnonzero(above_threshold)
+    counted = counted[~gt_neutral[gt_match_indices[counted]]]
+    first_match_indices, first_matches = np.unique(gt_match_indices[counted], return_index=True)
+    if not gt_matched is None:
+        first_matches = first_matches[~gt_matched[first_match_indices]]
+        gt_matched[first_match_indices] = True
+    true_pos[counted[first_matches]] = 1
+    false_pos[counted] = 1 - true_pos[counted]
+
+    return true_pos, false_pos
+
+def match_true_positives_at_thresholds(gt_match_indices,
+                                       gt_match_overlaps,
+                                       gt_ignored,
+                                       matching_iou_thresholds=COCO_MATCHING_IOU_THRESHOLDS,
+                                       pred_ignored=None):
+    '''
+    Does what `match_true_positives()` does for several matching IoU thresholds and several sets of ignored ground
+    truth boxes at once, from the same matches of `match_best_overlaps()`, whose IoUs do not depend on the threshold.
+
+    The ground truth boxes that are ignored in a set, e.g. those that are neutral or whose area is out of a range,
+    are treated as neutral boxes. A prediction that is not matched to a ground truth box above the threshold
+    is a false positive, unless it is ignored in the set, e.g. because its own area is out of the range.
+
+    Arguments:
+        gt_match_indices (array): A 1D Numpy array with the index of the matched ground truth box of each prediction, or -1.
+        gt_match_overlaps (array): A 1D Numpy array with the IoU of each prediction with its matched ground truth box.
+        gt_ignored (array): A 2D boolean Numpy array of shape `(n_sets, n_gt)` that indicates for each set whether each ground
+            truth box is ignored.
+        matching_iou_thresholds (array, optional): A 1D Numpy array with the minimal IoUs of a true positive with its ground truth box.
+        pred_ignored (array, optional): `None` or a 2D boolean Numpy array of shape `(n_sets, n_predictions)` that indicates
+            for each set whether each unmatched prediction is ignored rather than a false positive.
+
+    Returns:
+        Two int8 Numpy arrays of shape `(n_sets, n_thresholds, n_predictions)` with 1 for each true positive and for each
+        false positive, respectively, and 0 otherwise.
+    '''
+
+    matching_iou_thresholds = np.asarray(matching_iou_thresholds)
+    n_sets, n_gt = gt_ignored.shape
+    n_thresholds = len(matching_iou_thresholds)
+    shape = (n_sets, n_thresholds, len(gt_match_indices))
+
+    with_gt = gt_match_indices >= 0
+    # The predictions matched above each threshold, of shape `(n_thresholds, n_predictions)`.
+    above_threshold = with_gt & ~(gt_match_overlaps < matching_iou_thresholds[:,np.newaxis])
+    if n_gt == 0:
+        matched_ignored = np.zeros((n_sets, len(gt_match_indices)), dtype=np.bool_)
+    else:
+        matched_ignored = gt_ignored[:,np.maximum(gt_match_indices, 0)] & with_gt
+    counted = above_threshold & ~matched_ignored[:,np.newaxis]
+
+    # The first counted prediction of each ground truth box in each set and at each threshold is a true positive.
+    # `np.nonzero()` lists the predictions of a set and a threshold in order, so that the first occurrence of a key wins.
+    set_indices, threshold_indices, pred_indices = np.nonzero(counted)
+    keys = (set_indices * n_thresholds + threshold_indices) * n_gt + gt_match_indices[pred_indices]
+    first_matches = np.unique(keys, return_index=True)[1]
+    true_pos = np.zeros(shape, dtype=np.int8)
+    true_pos[set_indices[first_matches], threshold_indices[first_matches], pred_indices[first_matches]] = 1
+
+    false_pos = counted.astype(np.int8) - true_pos
+    unmatched = np.broadcast_to(~above_threshold, shape)
+    if not pred_ignored is None:
+        unmatched = unmatched & ~pred_ignored[:,np.newaxis]
+    false_pos[unmatched] = 1
+
+    return true_pos, false_pos
+
+def box_areas(boxes):
+    '''
+    Returns:
+        A 1D Numpy array with the areas `(xmax - xmin) * (ymax - ymin)` of the boxes of a 2D Numpy array of shape
+        `(n, 4)` with `(xmin, ymin, xmax, ymax)` coordinates, as for `ignore_under_area`.
+    '''
+    return (boxes[:,2] - boxes[:,0]) * (boxes[:,3] - boxes[:,1])
+
+def out_of_area_ranges(areas, area_ranges=COCO_AREA_RANGES):
+    '''
+    Returns:
+        A 2D boolean Numpy array of shape `(len(area_ranges), len(areas))` that indicates whether each area is out of each
+        range `(name, lower bound, upper bound)`.
+    '''
+    lower_bounds = np.array([area_range[1] for area_range in area_ranges], dtype=np.float64)[:,np.newaxis]
+    upper_bounds = np.array([area_range[2] for area_range in area_ranges], dtype=np.float64)[:,np.newaxis]
+    return (areas < lower_bounds) | (areas > upper_bounds)
+
+def summarize_average_precisions(average_precisions, matching_iou_thresholds=COCO_MATCHING_IOU_THRESHOLDS, area_ranges=COCO_AREA_RANGES):
+    '''
+    Summarizes the average precisions of `Evaluator.compute_average_precisions_at_thresholds()` in the manner of MS COCO.
+
+    The classes without ground truth box in an area range, whose average precision is NaN, are left out of the means.
+
+    Arguments:
+        average_precisions (array): A Numpy array of shape `(len(area_ranges), len(matching_iou_thresholds), n_classes + 1)`
+            with the average precision of each area range, threshold and class, the first class being the background.
+        matching_iou_thresholds (array, optional): The matching IoU thresholds of the average precisions.
+        area_ranges (list, optional): The area ranges of the average precisions, the first one covering all areas.
+
+    Returns:
+        A dictionary with the mean average precision over all thresholds of the first area range as 'mAP', over the first
+        area range at each threshold as e.g. 'mAP@0.50', and over all thresholds of each other area range as e.g. 'mAP_small'.
+    '''
+
+    class_average_precisions = average_precisions[:,:,1:]
+    n_classes = np.sum(~np.isnan(class_average_precisions), axis=-1)
+    with np.errstate(invalid='ignore'):
+        # The mean average precision of each area range and threshold, of shape `(len(area_ranges), len(matching_iou_thresholds))`.
+        mean_average_precisions = np.nansum(class_average_precisions, axis=-1) / n_classes
+
+    summary = {'mAP': float(np.mean(mean_average_precisions[0]))}
+    for i, matching_iou_threshold in enumerate(matching_iou_thresholds):
+        summary['mAP@{:.2f}'.format(matching_iou_threshold)] = float(mean_average_precisions[0, i])
+    for i in range(1, len(area_ranges)):
+        summary['mAP_{}'.format(area_ranges[i][0])] = float(np.mean(mean_average_precisions[i]))
+
+    return summary
+
+def compute_average_precision(cumulative_precision, cumulative_recall, mode='sample', num_recall_points=11):
+    '''
+    Computes the average precision of one class from its cumulative precisions and recalls.
+
+    Arguments:
+        cumulative_precision (array): A 1D Numpy array with the precision of the first i highest confidence predictions.
+        cumulative_recall (array): A 1D Numpy array with the recall of the first i highest confidence predictions.
+        mode (str, optional): Can be either 'sample' or 'integrate'. Refer to `Evaluator.compute_average_precisions()`.
+        num_recall_points (int, optional): Only relevant if mode is 'sample'. The number of points to sample from the
+            precision-recall-curve.
+
+    Returns:
+        A float, the average precision.
+    '''
+
+    average_precision = 0.0
+
+    if mode == 'sample':
+
+        for t in np.linspace(start=0, stop=1, num=num_recall_points, endpoint=True):
+
+            cum_prec_recall_greater_t = cumulative_precision[cumulative_recall >= t]
+
+            if cum_prec_recall_greater_t.size == 0:
+                precision = 0.0
+            else:
+                precision = np.amax(cum_prec_recall_greater_t)
+
+            average_precision += precision
+
+        average_precision /= num_recall_points
+
+    elif mode == 'integrate':
+
+        # We will compute the precision at all unique recall values.
+        unique_recalls, unique_recall_indices, unique_recall_counts = np.unique(cumulative_recall, return_index=True, return_counts=True)
+
+        # Store the maximal precision for each recall value and the absolute difference
+        # between any two unique recal values in the lists below. The products of these
+        # two nummbers constitute the rectangular areas whose sum will be our numerical
+        # integral.
+        maximal_precisions = np.zeros_like(unique_recalls)
+        recall_deltas = np.zeros_like(unique_recalls)
+
+        # Iterate over all unique recall values in reverse order. This saves a lot of computation:
+        # For each unique recall value `r`, we want to get the maximal precision value obtained
+        # for any recall value `r* >= r`. Once we know the maximal precision for the last `k` recall
+        # values after a given iteration, then in the next iteration, in order compute the maximal
+        # precisions for the last `l > k` recall values, we only need to compute the maximal precision
+        # for `l - k` recall values and then take the maximum between that and the previously computed
+        # maximum instead of computing the maximum over all `l` values.
+        # We skip the very last recall value, since the precision after between the last recall value
+        # recall 1.0 is defined to be zero.
+        for i in range(len(unique_recalls)-2, -1, -1):
+            begin = unique_recall_indices[i]
+            end   = unique_recall_indices[i + 1]
+            # When computing the maximal precisions, use the maximum of the previous iteration to
+            # avoid unnecessary repeated computation over the same precision values.
+            # The maximal precisions are the heights of the rectangle areas of our integral under
+            # the precision-recall curve.
+            maximal_precisions[i] = np.maximum(np.amax(cumulative_precision[begin:end]), maximal_precisions[i + 1])
+            # The differences between two adjacent recall values are the widths of our rectangle areas.
+            recall_deltas[i] = unique_recalls[i + 1] - unique_recalls[i]
+
+        average_precision = np.sum(maximal_precisions * recall_deltas)
+
+    return average_precision
+
 class Evaluator:
     '''
     Computes the mean average precision of the given Keras SSD model on the given dataset.
@@ -94,6 +436,14 @@ class Evaluator:
         self.average_precisions = None
         self.mean_average_precision = None
 
+        # The same per area range and matching IoU threshold, see `match_predictions_at_thresholds()`.
+        self.matching_iou_thresholds = None
+        self.area_ranges = None
+        self.num_gt_per_area_range = None
+        self.true_positives_at_thresholds = None
+        self.false_positives_at_thresholds = None
+        self.average_precisions_at_thresholds = None
+
     def __call__(self,
                  img_height,
                  img_width,
@@ -114,7 +464,11 @@ class Evaluator:
                  decoding_iou_threshold=0.45,
                  decoding_top_k=200,
                  decoding_pred_coords='centroids',
-                 decoding_normalize_coords=True):
+                 decoding_normalize_coords=True,
+                 weights_path=None,
+                 prediction_cache_dir=None,
+                 matching_iou_thresholds=None,
+                 area_ranges=COCO_AREA_RANGES):
         '''
         Computes the mean average precision of the given Keras SSD model on the given dataset.
 
@@ -180,6 +534,14 @@ class Evaluator:
             decoding_normalize_coords (bool, optional): Only relevant if the model is in 'training' mode. Set to `True` if the model
                 outputs relative coordinates. Do not set this to `True` if the model already outputs absolute coordinates,
                 as that would result in incorrect coordinates.
+            weights_path (str, optional): Only relevant if `prediction_cache_dir` is given. Refer to `predict_on_dataset()`.
+            prediction_cache_dir (str, optional): If given, the raw predictions are cached. Refer to `predict_on_dataset()`.
+            matching_iou_thresholds (array, optional): If given, e.g. `COCO_MATCHING_IOU_THRESHOLDS`, the predictions are matched at
+                all these thresholds and for all `area_ranges` in one pass by `match_predictions_at_thresholds()`, and the summary
+                of `summarize_average_precisions()` is returned last. `matching_iou_threshold` must be one of them, the Pascal VOC
+                results are the slice of the first area range at that threshold.
+            area_ranges (list, optional): Only relevant if `matching_iou_thresholds` is given. The ranges of ground truth box areas
+                as `(name, lower bound, upper bound)`, the first range covering all areas.
 
         Returns:
             A float, the mean average precision, plus any optional returns specified in the arguments.
@@ -201,6 +563,8 @@ class Evaluator:
                                 decoding_border_pixels=border_pixels,
                                 round_confidences=round_confidences,
                                 verbose=verbose,
+                                weights_path=weights_path,
+                                prediction_cache_dir=prediction_cache_dir,
                                 ret=False)
 
         #############################################################################################
@@ -215,12 +579,22 @@ class Evaluator:
         # Match predictions to ground truth boxes for all classes.
         #############################################################################################
 
-        self.match_predictions(ignore_neutral_boxes=ignore_neutral_boxes,
-                               matching_iou_threshold=matching_iou_threshold,
-                               border_pixels=border_pixels,
-                               sorting_algorithm=sorting_algorithm,
-                               verbose=verbose,
-                               ret=False)
+        if matching_iou_thresholds is None:
+            self.match_predictions(ignore_neutral_boxes=ignore_neutral_boxes,
+                                   matching_iou_threshold=matching_iou_threshold,
+                                   border_pixels=border_pixels,
+                                   sorting_algorithm=sorting_algorithm,
+                                   verbose=verbose,
+                                   ret=False)
+        else:
+            self.match_predictions_at_thresholds(ignore_neutral_boxes=ignore_neutral_boxes,
+                                                 matching_iou_thresholds=matching_iou_thresholds,
+                                                 area_ranges=area_ranges,
+                                                 matching_iou_threshold=matching_iou_threshold,
+                                                 border_pixels=border_pixels,
+                                                 sorting_algorithm=sorting_algorithm,
+                                                 verbose=verbose,
+                                                 ret=False)
 
         #############################################################################################
         # Compute the cumulative precision and recall for all classes.
@@ -243,10 +617,23 @@ class Evaluator:
 
         mean_average_precision = self.compute_mean_average_precision(ret=True)
 
+        #############################################################################################
+        # Compute the average precisions at all matching thresholds and for all area ranges.
+        #############################################################################################
+
+        if not matching_iou_thresholds is None:
+            average_precisions_at_thresholds = self.compute_average_precisions_at_thresholds(mode=average_precision_mode,
+                                                                                              num_recall_points=num_recall_points,
+                                                                                              verbose=verbose,
+                                                                                              ret=True)
+            summary = summarize_average_precisions(average_precisions_at_thresholds,
+                                                   matching_iou_thresholds=self.matching_iou_thresholds,
+                                                   area_ranges=area_ranges)
+
         #############################################################################################
 
         # Compile the returns.
-        if return_precisions or return_recalls or return_average_precisions:
+        if return_precisions or return_recalls or return_average_precisions or not matching_iou_thresholds is None:
             ret = [mean_average_precision]
             if return_average_precisions:
                 ret.append(self.average_precisions)
@@ -254,6 +641,8 @@ class Evaluator:
                 ret.append(self.cumulative_precisions)
             if return_recalls:
                 ret.append(self.cumulative_recalls)
+            if not matching_iou_thresholds is None:
+                ret.append(summary)
             return ret
         else:
             return mean_average_precision
@@ -272,6 +661,9 @@ class Evaluator:
                            round_confidences=False,
                            verbose=True,
                            no_annotation=False,
+                           accumulator=None,
+                           weights_path=None,
+                           prediction_cache_dir=None,
                            ret=False):
         '''
         Runs predictions for the given model over the entire dataset given by `data_generator`.
@@ -303,6 +695,16 @@ class Evaluator:
             round_confidences (int, optional): `False` or an integer that is the number of decimals that the prediction
                 confidences will be rounded to. If `False`, the confidences will not be rounded.
             verbose (bool, optional): If `True`, will print out the progress during runtime.
+            accumulator (AveragePrecisionAccumulator, optional): If given, the predictions of each batch are matched by
+                the accumulator instead of being stored, so that the memory does not grow with the dataset. The average
+                precisions are then computed by the accumulator and `prediction_results` is left unchanged.
+            weights_path (str, optional): Only relevant if `prediction_cache_dir` is given. The weights file of the model,
+                whose content hash is part of the key of the cached predictions.
+            prediction_cache_dir (str, optional): Only relevant if the model is in 'training' mode and `data_generator_mode`
+                is 'resize'. If given, the raw predictions of the model are read from the cache of the weights, the image IDs
+                of the dataset and the preprocessing configuration in this directory, e.g. `prediction_cache.DEFAULT_CACHE_DIR`,
+                and written to it if there is none yet. Only the decoding and the matching are then run again when their
+                parameters change, the model is not needed.
             ret (bool, optional): If `True`, returns the predictions.
 
         Returns:
@@ -333,17 +735,6 @@ class Evaluator:
         else:
             raise ValueError("`data_generator_mode` can be either of 'resize' or 'pad', but received '{}'.".format(data_generator_mode))
 
-        # Set the generator parameters.
-        generator = self.data_generator.generate(batch_size=batch_size,
-                                                 shuffle=False,
-                                                 transformations=transformations,
-                                                 label_encoder=None,
-                                                 returns={'processed_images',
-                                                          'image_ids',
-                                                          'inverse_transform'},
-                                                 keep_images_without_gt=True,
-                                                 degenerate_box_handling='remove')
-
         # If we don't have any real image IDs, generate pseudo-image IDs.
         # This is just to make the evaluator compatible both with datasets that do and don't
         # have image IDs.
@@ -351,6 +742,42 @@ class Evaluator:
             print("Doing the range")
             self.data_generator.image_ids = list(range(self.data_generator.get_dataset_size()))
 
+        #############################################################################################
+        # Look up the cached raw predictions.
+        #############################################################################################
+
+        prediction_cache = None
+        prediction_cache_writer = None
+        if not prediction_cache_dir is None:
+            if self.model_mode != 'training':
+                raise ValueError("The raw predictions can only be cached for a model in 'training' mode, but the model is in '{}' mode.".format(self.model_mode))
+            if data_generator_mode != 'resize':
+                raise ValueError("The raw predictions can only be cached with the deterministic 'resize' `data_generator_mode`, but received '{}'.".format(data_generator_mode))
+            if weights_path is None:
+                raise ValueError("`weights_path` is needed to cache the raw predictions.")
+            config = prediction_cache_config(img_height, img_width, data_generator_mode, self.data_generator)
+            cache_path = prediction_cache_path(weights_path, self.data_generator.image_ids, config, prediction_cache_dir)
+            if os.path.isdir(cache_path):
+                prediction_cache = PredictionCache(cache_path)
+                if verbose:
+                    print("Reading the raw predictions from {}".format(cache_path))
+            else:
+                prediction_cache_writer = PredictionCacheWriter(cache_path, self.data_generator.image_ids, config)
+
+        # Set the generator parameters.
+        if prediction_cache is None:
+            generator = self.data_generator.generate(batch_size=batch_size,
+                                                     shuffle=False,
+                                                     transformations=transformations,
+                                                     label_encoder=None,
+                                                     returns={'processed_images',
+                                                              'image_ids',
+                                                              'inverse_transform'},
+                                                     keep_images_without_gt=True,
+                                                     degenerate_box_handling='remove')
+        else:
+            generator = prediction_cache.batches(batch_size, labels_format=self.gt_format)
+
         #############################################################################################
         # Predict over all batches of the dataset and store the predictions.
         #############################################################################################
@@ -375,10 +802,15 @@ class Evaluator:
 
         # Loop over all batches.
         for j in tr:
-            # Generate batch.
-            batch_X, batch_image_ids, batch_inverse_transforms = next(generator)
-            # Predict.
-            y_pred = self.model.predict(batch_X)
+            if prediction_cache is None:
+                # Generate batch.
+                batch_X, batch_image_ids, batch_inverse_transforms = next(generator)
+                # Predict.
+                y_pred = self.model.predict(batch_X)
+                if not prediction_cache_writer is None:
+                    prediction_cache_writer.write(y_pred, batch_image_ids, batch_inverse_transforms, labels_format=self.gt_format)
+            else:
+                y_pred, batch_image_ids, batch_inverse_transforms = next(generator)
             # If the model was created in 'training' mode, the raw predictions need to
             # be decoded and filtered, otherwise that's already taken care of.
             if self.model_mode == 'training':
@@ -401,6 +833,10 @@ class Evaluator:
             # Convert the predicted box coordinates for the original images.
             y_pred = apply_inverse_transforms(y_pred, batch_inverse_transforms)
 
+            if not accumulator is None:
+                accumulator.update(y_pred, batch_image_ids)
+                continue
+
             # Iterate over all batch items.
             for k, batch_item in enumerate(y_pred):
 
@@ -421,10 +857,14 @@ class Evaluator:
                     # Append the predicted box to the results list for its class.
                     results[class_id].append(prediction)
 
-        self.prediction_results = results
+        if not prediction_cache_writer is None:
+            prediction_cache_writer.close()
+
+        if accumulator is None:
+            self.prediction_results = results
 
         if ret:
-            return results
+            return self.prediction_results
 
     def write_predictions_to_txt(self,
                                  classes=None,
@@ -510,63 +950,65 @@ class Evaluator:
             None by default. Optionally, a list containing a count of the number of ground truth boxes for each class across the
             entire dataset.
         '''
-        xmin_gt = self.gt_format['xmin']
-        ymin_gt = self.gt_format['ymin']
-        xmax_gt = self.gt_format['xmax']
-        ymax_gt = self.gt_format['ymax']
 
         if self.data_generator.labels is None:
             raise ValueError("Computing the number of ground truth boxes per class not possible, no ground truth given.")
 
-        num_gt_per_class = np.zeros(shape=(self.n_classes+1), dtype=np.int)
-
-        class_id_index = self.gt_format['class_id']
-
-        ground_truth = self.data_generator.labels
-
         if verbose:
             print('Computing the number of positive ground truth boxes per class.')
-            tr = trange(len(ground_truth), file=sys.stdout)
-        else:
-            tr = range(len(ground_truth))
 
-        # Iterate over the ground truth for all images in the dataset.
-        for i in tr:
+        _, _, gt_class_ids, _, gt_neutral = self.get_ground_truth(ignore_neutral_boxes=ignore_neutral_boxes)
 
-            
-            boxes = []
-            if self.ignore_under_area > 0:
-                for label in self.data_generator.labels[i]:
-                    if (label[ymax_gt] - label[ymin_gt]) * (label[xmax_gt] - label[xmin_gt]) < self.ignore_under_area:
-                        continue
-                    else:
-                        boxes.append(label)
-            else:
-                boxes = self.data_generator.labels[i]
-
-            boxes = np.asarray(boxes)
-
-            # Iterate over all ground truth boxes for the current image.
-            for j in range(boxes.shape[0]):
-
-                if ignore_neutral_boxes and not (self.data_generator.eval_neutral is None):
-                    if not self.data_generator.eval_neutral[i][j]:
-                        # If this box is not supposed to be evaluation-neutral,
-                        # increment the counter for the respective class ID.
-                        class_id = boxes[j, class_id_index]
-                        num_gt_per_class[class_id] += 1
-                else:
-                    # If there is no such thing as evaluation-neutral boxes for
-                    # our dataset, always increment the counter for the respective
-                    # class ID.
-                    class_id = boxes[j, class_id_index]
-                    num_gt_per_class[class_id] += 1
+        num_gt_per_class = np.bincount(gt_class_ids[~gt_neutral], minlength=self.n_classes+1)
 
         self.num_gt_per_class = num_gt_per_class
 
         if ret:
             return num_gt_per_class
 
+    def get_ground_truth(self, ignore_neutral_boxes=True):
+        '''
+        Gathers the ground truth boxes of all images of the dataset into flat arrays, in the order of the images.
+
+        Refer to `get_ground_truth()` at module level for details.
+
+        Arguments:
+            ignore_neutral_boxes (bool, optional): If `True` and the data generator provides annotations indicating whether
+                a ground truth bounding box is supposed to be neutral for the evaluation, the neutral boxes are marked as such.
+                Otherwise, no box is marked as neutral.
+
+        Returns:
+            A dictionary that maps the image IDs, converted to strings, to the indices of the images in the dataset,
+            and four arrays that contain for each ground truth box the index of its image, its class ID,
+            its `(xmin, ymin, xmax, ymax)` coordinates, and whether it is neutral.
+        '''
+
+        return get_ground_truth(self.data_generator,
+                                gt_format=self.gt_format,
+                                ignore_under_area=self.ignore_under_area,
+                                ignore_neutral_boxes=ignore_neutral_boxes)
+
+    def sort_predictions(self, predictions, image_indices, sorting_algorithm='quicksort'):
+        '''
+        Sorts the predictions of a class by decreasing confidence. The confidences and coordinates are stored
+        in single precision, which decides the order of the predictions with close confidences.
+
+        Arguments:
+            predictions (list): The predictions `(image_id, confidence, xmin, ymin, xmax, ymax)` of a class.
+            image_indices (dict): The indices of the images by image ID, as returned by `get_ground_truth()`.
+            sorting_algorithm (str, optional): Which sorting algorithm to use, see `match_predictions()`.
+
+        Returns:
+            A 1D Numpy array with the image index of each prediction and a 2D Numpy array of shape `(m, 4)` with
+            its `(xmin, ymin, xmax, ymax)` coordinates, sorted by decreasing confidence.
+        '''
+
+        confidences = np.array([prediction[1] for prediction in predictions], dtype=np.float32)
+        descending_indices = np.argsort(-confidences, kind=sorting_algorithm)
+        pred_boxes = np.array([prediction[2:6] for prediction in predictions], dtype=np.float32)[descending_indices]
+        pred_image_indices = np.array([image_indices[str(prediction[0])] for prediction in predictions], dtype=np.int64)[descending_indices]
+        return pred_image_indices, pred_boxes
+
     def match_predictions(self,
                           ignore_neutral_boxes=True,
                           matching_iou_threshold=0.5,
@@ -577,6 +1019,12 @@ class Evaluator:
         '''
         Matches predictions to ground truth boxes.
 
+        Each prediction is matched to the ground truth box of the same image and class with which it has the highest IoU.
+        It is a true positive if that overlap is at least `matching_iou_threshold` and no prediction with a higher confidence
+        was matched to the same ground truth box before, and a false positive otherwise, unless the ground truth box is neutral,
+        in which case it is neither. The IoUs of all predictions of a class with the ground truth boxes of the same image and
+        class are computed at once.
+
         Note that `predict_on_dataset()` must be called before calling this method.
 
         Arguments:
@@ -612,35 +1060,10 @@ class Evaluator:
         if self.prediction_results is None:
             raise ValueError("There are no prediction results. You must run `predict_on_dataset()` before calling this method.")
 
-        class_id_gt = self.gt_format['class_id']
-        xmin_gt = self.gt_format['xmin']
-        ymin_gt = self.gt_format['ymin']
-        xmax_gt = self.gt_format['xmax']
-        ymax_gt = self.gt_format['ymax']
-
-        # Convert the ground truth to a more efficient format for what we need
-        # to do, which is access ground truth by image ID repeatedly.
-        ground_truth = {}
-        eval_neutral_available = not (self.data_generator.eval_neutral is None) # Whether or not we have annotations to decide whether ground truth boxes should be neutral or not.
-        for i in range(len(self.data_generator.image_ids)):
-            image_id = str(self.data_generator.image_ids[i])
-            labels = []
-            if self.ignore_under_area > 0:
-                for label in self.data_generator.labels[i]:
-                    if (label[ymax_gt] - label[ymin_gt]) * (label[xmax_gt] - label[xmin_gt]) < self.ignore_under_area:
-                        continue
-                    else:
-                        labels.append(label)
-            else:
-                labels = self.data_generator.labels[i]
-
-            if ignore_neutral_boxes and eval_neutral_available:
-                ground_truth[image_id] = (np.asarray(labels), np.asarray(self.data_generator.eval_neutral[i]))
-            else:
-                ground_truth[image_id] = np.asarray(labels)
+        image_indices, gt_image_indices, gt_class_ids, gt_boxes, gt_neutral = self.get_ground_truth(ignore_neutral_boxes=ignore_neutral_boxes)
 
-        true_positives = [[]] # The false positives for each class, sorted by descending confidence.
-        false_positives = [[]] # The true positives for each class, sorted by descending confidence.
+        true_positives = [[]] # The true positives for each class, sorted by descending confidence.
+        false_positives = [[]] # The false positives for each class, sorted by descending confidence.
         cumulative_true_positives = [[]]
         cumulative_false_positives = [[]]
 
@@ -649,115 +1072,30 @@ class Evaluator:
 
             predictions = self.prediction_results[class_id]
 
-            # Store the matching results in these lists:
-            true_pos = np.zeros(len(predictions), dtype=np.int) # 1 for every prediction that is a true positive, 0 otherwise
-            false_pos = np.zeros(len(predictions), dtype=np.int) # 1 for every prediction that is a false positive, 0 otherwise
-
-            # In case there are no predictions at all for this class, we're done here.
             if len(predictions) == 0:
-                print("No predictions for class {}/{}".format(class_id, self.n_classes))
-                true_positives.append(true_pos)
-                false_positives.append(false_pos)
-                continue
-
-            # Convert the predictions list for this class into a structured array so that we can sort it by confidence.
-
-            # Get the number of characters needed to store the image ID strings in the structured array.
-            num_chars_per_image_id = len(str(predictions[0][0])) + 6 # Keep a few characters buffer in case some image IDs are longer than others.
-            # Create the data type for the structured array.
-            preds_data_type = np.dtype([('image_id', 'U{}'.format(num_chars_per_image_id)),
-                                        ('confidence', 'f4'),
-                                        ('xmin', 'f4'),
-                                        ('ymin', 'f4'),
-                                        ('xmax', 'f4'),
-                                        ('ymax', 'f4')])
-            # Create the structured array
-            predictions = np.array(predictions, dtype=preds_data_type)
+                if verbose:
+                    print("No predictions for class {}/{}".format(class_id, self.n_classes))
+                true_pos = np.zeros(0, dtype=np.int64)
+                false_pos = np.zeros(0, dtype=np.int64)
+            else:
+                if verbose:
+                    print("Matching predictions to ground truth, class {}/{}.".format(class_id, self.n_classes))
 
-            # Sort the detections by decreasing confidence.
-            descending_indices = np.argsort(-predictions['confidence'], kind=sorting_algorithm)
-            predictions_sorted = predictions[descending_indices]
+                pred_image_indices, pred_boxes = self.sort_predictions(predictions, image_indices, sorting_algorithm)
 
-            if verbose:
-                tr = trange(len(predictions), file=sys.stdout)
-                tr.set_description("Matching predictions to ground truth, class {}/{}.".format(class_id, self.n_classes))
-            else:
-                tr = range(len(predictions.shape))
-
-            # Keep track of which ground truth boxes were already matched to a detection.
-            gt_matched = {}
-
-            # Iterate over all predictions.
-            for i in tr:
-
-                prediction = predictions_sorted[i]
-                image_id = prediction['image_id']
-                pred_box = np.asarray(list(prediction[['xmin', 'ymin', 'xmax', 'ymax']])) # Convert the structured array element to a regular array.
-
-                # Get the relevant ground truth boxes for this prediction,
-                # i.e. all ground truth boxes that match the prediction's
-                # image ID and class ID.
-
-                # The ground truth could either be a tuple with `(ground_truth_boxes, eval_neutral_boxes)`
-                # or only `ground_truth_boxes`.
-                if ignore_neutral_boxes and eval_neutral_available:
-                    gt, eval_neutral = ground_truth[image_id]
-                else:
-                    gt = ground_truth[image_id]
-                gt = np.asarray(gt)
-                class_mask = gt[:,class_id_gt] == class_id
-                gt = gt[class_mask]
-                if ignore_neutral_boxes and eval_neutral_available:
-                    eval_neutral = eval_neutral[class_mask]
-
-                if gt.size == 0:
-                    # If the image doesn't contain any objects of this class,
-                    # the prediction becomes a false positive.
-                    false_pos[i] = 1
-                    continue
+                # The ground truth boxes of this class, still in the order of the images.
+                class_gt = np.flatnonzero(gt_class_ids == class_id)
+                gt_match_indices, gt_match_overlaps = match_best_overlaps(pred_image_indices,
+                                                                          pred_boxes,
+                                                                          gt_image_indices[class_gt],
+                                                                          gt_boxes[class_gt],
+                                                                          border_pixels=border_pixels)
 
-                # Compute the IoU of this prediction with all ground truth boxes of the same class.
-                overlaps = iou(boxes1=gt[:,[xmin_gt, ymin_gt, xmax_gt, ymax_gt]],
-                               boxes2=pred_box,
-                               coords='corners',
-                               mode='element-wise',
-                               border_pixels=border_pixels)
-
-                # For each detection, match the ground truth box with the highest overlap.
-                # It's possible that the same ground truth box will be matched to multiple
-                # detections.
-                gt_match_index = np.argmax(overlaps)
-                gt_match_overlap = overlaps[gt_match_index]
-
-                if gt_match_overlap < matching_iou_threshold:
-                    # False positive, IoU threshold violated:
-                    # Those predictions whose matched overlap is below the threshold become
-                    # false positives.
-                    false_pos[i] = 1
-                else:
-                    if not (ignore_neutral_boxes and eval_neutral_available) or (eval_neutral[gt_match_index] == False):
-                        # If this is not a ground truth that is supposed to be evaluation-neutral
-                        # (i.e. should be skipped for the evaluation) or if we don't even have the
-                        # concept of neutral boxes.
-                        if not (image_id in gt_matched):
-                            # True positive:
-                            # If the matched ground truth box for this prediction hasn't been matched to a
-                            # different prediction already, we have a true positive.
-                            true_pos[i] = 1
-                            gt_matched[image_id] = np.zeros(shape=(gt.shape[0]), dtype=np.bool)
-                            gt_matched[image_id][gt_match_index] = True
-                        elif not gt_matched[image_id][gt_match_index]:
-                            # True positive:
-                            # If the matched ground truth box for this prediction hasn't been matched to a
-                            # different prediction already, we have a true positive.
-                            true_pos[i] = 1
-                            gt_matched[image_id][gt_match_index] = True
-                        else:
-                            # False positive, duplicate detection:
-                            # If the matched ground truth box for this prediction has already been matched
-                            # to a different prediction previously, it is a duplicate detection for an
-                            # already detected object, which counts as a false positive.
-                            false_pos[i] = 1
+                # 1 for every prediction that is a true or a false positive, respectively, 0 otherwise.
+                true_pos, false_pos = match_true_positives(gt_match_indices,
+                                                           gt_match_overlaps,
+                                                           gt_neutral[class_gt],
+                                                           matching_iou_threshold=matching_iou_threshold)
 
             true_positives.append(true_pos)
             false_positives.append(false_pos)
@@ -776,6 +1114,164 @@ class Evaluator:
         if ret:
             return true_positives, false_positives, cumulative_true_positives, cumulative_false_positives
 
+    def match_predictions_at_thresholds(self,
+                                        ignore_neutral_boxes=True,
+                                        matching_iou_thresholds=COCO_MATCHING_IOU_THRESHOLDS,
+                                        area_ranges=COCO_AREA_RANGES,
+                                        matching_iou_threshold=0.5,
+                                        border_pixels='include',
+                                        sorting_algorithm='quicksort',
+                                        verbose=True,
+                                        ret=False):
+        '''
+        Matches predictions to ground truth boxes at several matching IoU thresholds and for several ranges of ground truth
+        box areas in one pass, as for the MS COCO mean average precision.
+
+        The IoUs of the predictions of a class with the ground truth boxes are computed once, and each prediction is matched to
+        the ground truth box with which it has the highest IoU as in `match_predictions()`, whatever the threshold. For an area range,
+        the ground truth boxes whose area is out of it are neutral, and so are the unmatched predictions whose area is out of it.
+
+        The true and false positives at `matching_iou_threshold` for the first area range, which should cover all areas, are the
+        ones of `match_predictions()` and are stored as well, so that `compute_precision_recall()` and `compute_average_precisions()`
+        give the Pascal VOC average precisions without matching again.
+
+        Note that `predict_on_dataset()` must be called before calling this method.
+
+        Arguments:
+            ignore_neutral_boxes (bool, optional): If `True`, the neutral boxes are ignored for the evaluation, see `match_predictions()`.
+            matching_iou_thresholds (array, optional): The matching IoU thresholds, 0.5:0.05:0.95 by default.
+            area_ranges (list, optional): The ranges of ground truth box areas as `(name, lower bound, upper bound)`, by default 'all',
+                'small', 'medium' and 'large' with the bounds of MS COCO. The first range should cover all areas.
+            matching_iou_threshold (float, optional): The threshold of the Pascal VOC true and false positives, one of `matching_iou_thresholds`.
+            border_pixels (str, optional): How to treat the border pixels of the bounding boxes, see `match_predictions()`.
+            sorting_algorithm (str, optional): Which sorting algorithm the matching algorithm should use, see `match_predictions()`.
+            verbose (bool, optional): If `True`, will print out the progress during runtime.
+            ret (bool, optional): If `True`, returns the true and false positives.
+
+        Returns:
+            None by default. Optionally, two lists containing for each class an int8 Numpy array of shape
+            `(len(area_ranges), len(matching_iou_thresholds), n_predictions)` with the true and false positives.
+        '''
+
+        if self.data_generator.labels is None:
+            raise ValueError("Matching predictions to ground truth boxes not possible, no ground truth given.")
+
+        if self.prediction_results is None:
+            raise ValueError("There are no prediction results. You must run `predict_on_dataset()` before calling this method.")
+
+        matching_iou_thresholds = np.asarray(matching_iou_thresholds)
+        voc_threshold_index = np.flatnonzero(np.isclose(matching_iou_thresholds, matching_iou_threshold))
+        if len(voc_threshold_index) == 0:
+            raise ValueError("`matching_iou_threshold` {} is not one of the `matching_iou_thresholds` {}.".format(matching_iou_threshold, matching_iou_thresholds))
+        voc_threshold_index = voc_threshold_index[0]
+
+        image_indices, gt_image_indices, gt_class_ids, gt_boxes, gt_neutral = self.get_ground_truth(ignore_neutral_boxes=ignore_neutral_boxes)
+        gt_ignored = gt_neutral | out_of_area_ranges(box_areas(gt_boxes), area_ranges)
+
+        num_gt_per_area_range = np.zeros((len(area_ranges), self.n_classes + 1), dtype=np.int64)
+        for i in range(len(area_ranges)):
+            num_gt_per_area_range[i] = np.bincount(gt_class_ids[~gt_ignored[i]], minlength=self.n_classes+1)[:self.n_classes+1]
+
+        true_positives = [np.zeros((len(area_ranges), len(matching_iou_thresholds), 0), dtype=np.int8)]
+        false_positives = [np.zeros((len(area_ranges), len(matching_iou_thresholds), 0), dtype=np.int8)]
+
+        # Iterate over all classes.
+        for class_id in range(1, self.n_classes + 1):
+
+            predictions = self.prediction_results[class_id]
+
+            if verbose:
+                print("Matching predictions to ground truth at {} thresholds, class {}/{}.".format(len(matching_iou_thresholds), class_id, self.n_classes))
+
+            pred_image_indices, pred_boxes = self.sort_predictions(predictions, image_indices, sorting_algorithm)
+            if len(predictions) == 0:
+                pred_boxes = np.zeros((0, 4), dtype=np.float32)
+
+            class_gt = np.flatnonzero(gt_class_ids == class_id)
+            gt_match_indices, gt_match_overlaps = match_best_overlaps(pred_image_indices,
+                                                                      pred_boxes,
+                                                                      gt_image_indices[class_gt],
+                                                                      gt_boxes[class_gt],
+                                                                      border_pixels=border_pixels)
+            true_pos, false_pos = match_true_positives_at_thresholds(gt_match_indices,
+                                                                     gt_match_overlaps,
+                                                                     gt_ignored[:,class_gt],
+                                                                     matching_iou_thresholds=matching_iou_thresholds,
+                                                                     pred_ignored=out_of_area_ranges(box_areas(pred_boxes), area_ranges))
+
+            true_positives.append(true_pos)
+            false_positives.append(false_pos)
+
+        self.matching_iou_thresholds = matching_iou_thresholds
+        self.area_ranges = area_ranges
+        self.num_gt_per_area_range = num_gt_per_area_range
+        self.true_positives_at_thresholds = true_positives
+        self.false_positives_at_thresholds = false_positives
+
+        # The Pascal VOC slice.
+        self.true_positives = [[]] + [true_pos[0, voc_threshold_index].astype(np.int64) for true_pos in true_positives[1:]]
+        self.false_positives = [[]] + [false_pos[0, voc_threshold_index].astype(np.int64) for false_pos in false_positives[1:]]
+        self.cumulative_true_positives = [[]] + [np.cumsum(true_pos) for true_pos in self.true_positives[1:]]
+        self.cumulative_false_positives = [[]] + [np.cumsum(false_pos) for false_pos in self.false_positives[1:]]
+
+        if ret:
+            return true_positives, false_positives
+
+    def compute_average_precisions_at_thresholds(self, mode='sample', num_recall_points=11, verbose=True, ret=False):
+        '''
+        Computes the average precision for each area range, matching IoU threshold and class.
+
+        The average precision of a class without ground truth box in an area range is NaN.
+
+        Note that `match_predictions_at_thresholds()` must be called before calling this method.
+
+        Arguments:
+            mode (str, optional): Can be either 'sample' or 'integrate'. Refer to `compute_average_precisions()`.
+            num_recall_points (int, optional): Only relevant if mode is 'sample'. The number of points to sample from the
+                precision-recall-curve.
+            verbose (bool, optional): If `True`, will print out the progress during runtime.
+            ret (bool, optional): If `True`, returns the average precisions.
+
+        Returns:
+            None by default. Optionally, a Numpy array of shape `(len(area_ranges), len(matching_iou_thresholds), n_classes + 1)`
+            with the average precisions, the first class being the background.
+        '''
+
+        if self.true_positives_at_thresholds is None:
+            raise ValueError("True and false positives not available. You must run `match_predictions_at_thresholds()` before you call this method.")
+
+        if not (mode in {'sample', 'integrate'}):
+            raise ValueError("`mode` can be either 'sample' or 'integrate', but received '{}'".format(mode))
+
+        n_area_ranges, n_thresholds = self.true_positives_at_thresholds[0].shape[:2]
+        average_precisions = np.full((n_area_ranges, n_thresholds, self.n_classes + 1), np.nan)
+
+        # Iterate over all classes.
+        for class_id in range(1, self.n_classes + 1):
+
+            if verbose:
+                print("Computing average precisions at {} thresholds, class {}/{}".format(n_thresholds, class_id, self.n_classes))
+
+            tp = np.cumsum(self.true_positives_at_thresholds[class_id], axis=-1, dtype=np.int64)
+            fp = np.cumsum(self.false_positives_at_thresholds[class_id], axis=-1, dtype=np.int64)
+            with np.errstate(invalid='ignore'):
+                cumulative_precisions = np.where(tp + fp > 0, tp / (tp + fp), 0)
+
+            for i in range(n_area_ranges):
+                if self.num_gt_per_area_range[i, class_id] == 0:
+                    continue
+                cumulative_recalls = tp[i] / self.num_gt_per_area_range[i, class_id]
+                for j in range(n_thresholds):
+                    average_precisions[i, j, class_id] = compute_average_precision(cumulative_precisions[i, j],
+                                                                                   cumulative_recalls[j],
+                                                                                   mode=mode,
+                                                                                   num_recall_points=num_recall_points)
+
+        self.average_precisions_at_thresholds = average_precisions
+
+        if ret:
+            return average_precisions
+
     def compute_precision_recall(self, verbose=True, ret=False):
         '''
         Computes the precisions and recalls for all classes.
@@ -866,56 +1362,7 @@ class Evaluator:
 
             cumulative_precision = self.cumulative_precisions[class_id]
             cumulative_recall = self.cumulative_recalls[class_id]
-            average_precision = 0.0
-
-            if mode == 'sample':
-
-                for t in np.linspace(start=0, stop=1, num=num_recall_points, endpoint=True):
-
-                    cum_prec_recall_greater_t = cumulative_precision[cumulative_recall >= t]
-
-                    if cum_prec_recall_greater_t.size == 0:
-                        precision = 0.0
-                    else:
-                        precision = np.amax(cum_prec_recall_greater_t)
-
-                    average_precision += precision
-
-                average_precision /= num_recall_points
-
-            elif mode == 'integrate':
-
-                # We will compute the precision at all unique recall values.
-                unique_recalls, unique_recall_indices, unique_recall_counts = np.unique(cumulative_recall, return_index=True, return_counts=True)
-
-                # Store the maximal precision for each recall value and the absolute difference
-                # between any two unique recal values in the lists below. The products of these
-                # two nummbers constitute the rectangular areas whose sum will be our numerical
-                # integral.
-                maximal_precisions = np.zeros_like(unique_recalls)
-                recall_deltas = np.zeros_like(unique_recalls)
-
-                # Iterate over all unique recall values in reverse order. This saves a lot of computation:
-                # For each unique recall value `r`, we want to get the maximal precision value obtained
-                # for any recall value `r* >= r`. Once we know the maximal precision for the last `k` recall
-                # values after a given iteration, then in the next iteration, in order compute the maximal
-                # precisions for the last `l > k` recall values, we only need to compute the maximal precision
-                # for `l - k` recall values and then take the maximum between that and the previously computed
-                # maximum instead of computing the maximum over all `l` values.
-                # We skip the very last recall value, since the precision after between the last recall value
-                # recall 1.0 is defined to be zero.
-                for i in range(len(unique_recalls)-2, -1, -1):
-                    begin = unique_recall_indices[i]
-                    end   = unique_recall_indices[i + 1]
-                    # When computing the maximal precisions, use the maximum of the previous iteration to
-                    # avoid unnecessary repeated computation over the same precision values.
-                    # The maximal precisions are the heights of the rectangle areas of our integral under
-                    # the precision-recall curve.
-                    maximal_precisions[i] = np.maximum(np.amax(cumulative_precision[begin:end]), maximal_precisions[i + 1])
-                    # The differences between two adjacent recall values are the widths of our rectangle areas.
-                    recall_deltas[i] = unique_recalls[i + 1] - unique_recalls[i]
-
-                average_precision = np.sum(maximal_precisions * recall_deltas)
+            average_precision = compute_average_precision(cumulative_precision, cumulative_recall, mode=mode, num_recall_points=num_recall_points)
 
             average_precisions.append(average_precision)
 
@@ -0,0 +1,237 @@
+'''
+A persistent cache of the raw predictions of an SSD model in 'training' mode on an evaluation dataset, so that
+the decoding, the non-maximum suppression and the matching parameters can be changed without running the model again.
+
+A cache is a directory named after the hash of the weights file, of the image IDs of the dataset and of the
+preprocessing configuration. It contains:
+    * `index.json`: the image IDs, the shape of the predictions and the configuration.
+    * `predictions.dat`: the class confidences and the 4 box offsets of every anchor box of every image, a float32
+        `np.memmap` of shape `(n_images, n_boxes, n_classes + 1 + 4)`.
+    * `anchors.npy`: the anchor box coordinates and variances, the last 8 columns of the model output, which are
+        the same for every image and are therefore stored once.
+    * `image_sizes.npy`: the `(height, width)` of every original image, from which the inverse transforms of the
+        'resize' mode of the evaluation are rebuilt.
+
+The directory is written under a temporary name then renamed, so that concurrent jobs never read a partial cache.
+'''
+
+from __future__ import division
+import numpy as np
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+
+from data_generator.object_detection_2d_misc_utils import apply_inverse_transforms
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'ssd_prediction_cache')
+
+INDEX_FILE = 'index.json'
+PREDICTIONS_FILE = 'predictions.dat'
+ANCHORS_FILE = 'anchors.npy'
+IMAGE_SIZES_FILE = 'image_sizes.npy'
+
+def weights_hash(weights_path, chunk_size=1 << 20):
+    '''
+    Returns:
+        The SHA-1 hex digest of the content of the weights file, so that a retrained model never reuses
+        the predictions of the former weights, even under the same file name.
+    '''
+    digest = hashlib.sha1()
+    with open(weights_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def prediction_cache_path(weights_path, image_ids, config, cache_dir=DEFAULT_CACHE_DIR):
+    '''
+    Returns the directory of the cached predictions of the given weights on the given dataset.
+
+    Arguments:
+        weights_path (str): The weights file of the model.
+        image_ids (list): The image IDs of the dataset, in the order of the evaluation.
+        config (dict): The preprocessing configuration, a dictionary of JSON-serializable values, e.g. the input size
+            of the model, the `data_generator_mode` of the evaluation and the class of the data generator.
+        cache_dir (str, optional): The directory of the caches.
+
+    Returns:
+        The path of the cache directory, which may not exist.
+    '''
+    key = json.dumps({'weights': weights_hash(weights_path),
+                      'image_ids': hashlib.sha1('\n'.join(str(image_id) for image_id in image_ids).encode('utf-8')).hexdigest(),
+                      'config': config}, sort_keys=True)
+    return os.path.join(cache_dir, hashlib.sha1(key.encode('utf-8')).hexdigest()[:16])
+
+def prediction_cache_config(img_height, img_width, data_generator_mode, data_generator):
+    '''
+    Returns:
+        The preprocessing configuration of the evaluation that is part of the key of a cache: the input size of
+        the model, the `data_generator_mode` and the class of the data generator, e.g. `DataGeneratorDCT`.
+    '''
+    return {'img_height': int(img_height),
+            'img_width': int(img_width),
+            'data_generator_mode': data_generator_mode,
+            'data_generator': type(data_generator).__name__}
+
+def resize_inverter(image_size, img_height, img_width, labels_format={'xmin': 1, 'ymin': 2, 'xmax': 3, 'ymax': 4}):
+    '''
+    Returns the inverter of the `Resize` transformation of an image of size `image_size` to `(img_height, img_width)`,
+    which scales the decoded predictions back to the original image like the inverter returned by `Resize`.
+
+    Arguments:
+        image_size (tuple): The `(height, width)` of the original image.
+        img_height (int): The input image height for the model.
+        img_width (int): The input image width for the model.
+        labels_format (dict, optional): The indices of the box coordinates in the labels, the predictions having
+            their confidence in the column after the class ID, as for `Resize`.
+    '''
+    height, width = image_size
+    xmin = labels_format['xmin']
+    ymin = labels_format['ymin']
+    xmax = labels_format['xmax']
+    ymax = labels_format['ymax']
+
+    def inverter(labels):
+        labels = np.copy(labels)
+        labels[:, [ymin+1, ymax+1]] = np.round(labels[:, [ymin+1, ymax+1]] * (height / img_height), decimals=0)
+        labels[:, [xmin+1, xmax+1]] = np.round(labels[:, [xmin+1, xmax+1]] * (width / img_width), decimals=0)
+        return labels
+
+    return inverter
+
+def original_image_sizes(inverse_transforms, img_height, img_width, labels_format={'xmin': 1, 'ymin': 2, 'xmax': 3, 'ymax': 4}):
+    '''
+    Returns the sizes of the original images of a batch as an int32 array of shape `(batch_size, 2)` with the
+    `(height, width)` of each image, by applying the inverse transforms of the 'resize' mode to a box that
+    covers the whole model input.
+    '''
+    probe = np.zeros((1, 6))
+    probe[0, [labels_format['xmin']+1, labels_format['xmax']+1]] = img_width
+    probe[0, [labels_format['ymin']+1, labels_format['ymax']+1]] = img_height
+    probes = apply_inverse_transforms([probe] * len(inverse_transforms), inverse_transforms)
+    return np.array([[p[0, labels_format['ymax']+1], p[0, labels_format['xmax']+1]] for p in probes], dtype=np.int32)
+
+class PredictionCache:
+    '''
+    The cached raw predictions of a model on a dataset, read from the memory-mapped files written by
+    `PredictionCacheWriter`.
+    '''
+
+    def __init__(self, path):
+        '''
+        Arguments:
+            path (str): The cache directory.
+        '''
+        with open(os.path.join(path, INDEX_FILE)) as f:
+            self.index = json.load(f)
+        self.path = path
+        self.image_ids = self.index['image_ids']
+        self.config = self.index['config']
+        self.predictions = np.memmap(os.path.join(path, PREDICTIONS_FILE), dtype=np.float32, mode='r',
+                                     shape=(len(self.image_ids), self.index['n_boxes'], self.index['n_columns']))
+        self.anchors = np.load(os.path.join(path, ANCHORS_FILE))
+        self.image_sizes = np.load(os.path.join(path, IMAGE_SIZES_FILE))
+
+    def __len__(self):
+        return len(self.image_ids)
+
+    def get_batch(self, start, stop, labels_format={'xmin': 1, 'ymin': 2, 'xmax': 3, 'ymax': 4}):
+        '''
+        Returns the raw predictions of the images `start:stop` as the model in 'training' mode outputs them.
+
+        Arguments:
+            start (int): The index of the first image.
+            stop (int): The index after the last image.
+            labels_format (dict, optional): The indices of the box coordinates in the labels, see `resize_inverter()`.
+
+        Returns:
+            A float32 array of shape `(stop - start, n_boxes, n_classes + 1 + 4 + 8)` with the raw predictions,
+            the list of the image IDs and the list of the inverse transforms of the images.
+        '''
+        predictions = self.predictions[start:stop]
+        anchors = np.broadcast_to(self.anchors.astype(np.float32), (len(predictions),) + self.anchors.shape)
+        y_pred = np.concatenate([predictions, anchors], axis=-1)
+        inverse_transforms = [[resize_inverter(image_size, self.config['img_height'], self.config['img_width'], labels_format)]
+                              for image_size in self.image_sizes[start:stop]]
+        return y_pred, self.image_ids[start:stop], inverse_transforms
+
+    def batches(self, batch_size, labels_format={'xmin': 1, 'ymin': 2, 'xmax': 3, 'ymax': 4}):
+        '''
+        Yields the batches of `get_batch()` over the whole dataset, in order.
+        '''
+        for start in range(0, len(self), batch_size):
+            yield self.get_batch(start, min(start + batch_size, len(self)), labels_format)
+
+class PredictionCacheWriter:
+    '''
+    Writes the raw predictions of a model on a dataset batch by batch into a temporary directory, which
+    `close()` renames to the cache directory once every image has been written.
+    '''
+
+    def __init__(self, path, image_ids, config):
+        '''
+        Arguments:
+            path (str): The cache directory, e.g. from `prediction_cache_path()`.
+            image_ids (list): The image IDs of the dataset, in the order in which the batches are written.
+            config (dict): The preprocessing configuration, which must contain the 'img_height' and 'img_width' of the model input.
+        '''
+        self.path = path
+        self.image_ids = [str(image_id) for image_id in image_ids]
+        self.config = config
+        self.predictions = None
+        self.anchors = None
+        self.image_sizes = np.zeros((len(self.image_ids), 2), dtype=np.int32)
+        self.n_written = 0
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.temporary_path = tempfile.mkdtemp(dir=os.path.dirname(os.path.abspath(path)), suffix='.tmp')
+
+    def write(self, y_pred, batch_image_ids, batch_inverse_transforms, labels_format={'xmin': 1, 'ymin': 2, 'xmax': 3, 'ymax': 4}):
+        '''
+        Writes the raw predictions of the next batch.
+
+        Arguments:
+            y_pred (array): The output of the model in 'training' mode, of shape `(batch_size, n_boxes, n_classes + 1 + 4 + 8)`.
+            batch_image_ids (list): The image IDs of the batch items.
+            batch_inverse_transforms (list): The inverse transforms of the 'resize' mode of the batch items.
+            labels_format (dict, optional): The indices of the box coordinates in the labels, see `resize_inverter()`.
+        '''
+        stop = self.n_written + len(y_pred)
+        if [str(image_id) for image_id in batch_image_ids] != self.image_ids[self.n_written:stop]:
+            raise ValueError("The batches must be written in the order of the image IDs of the cache.")
+        if self.predictions is None:
+            self.predictions = np.memmap(os.path.join(self.temporary_path, PREDICTIONS_FILE), dtype=np.float32, mode='w+',
+                                         shape=(len(self.image_ids), y_pred.shape[1], y_pred.shape[2] - 8))
+            self.anchors = np.array(y_pred[0, :, -8:])
+        self.predictions[self.n_written:stop] = y_pred[:, :, :-8]
+        self.image_sizes[self.n_written:stop] = original_image_sizes(batch_inverse_transforms,
+                                                                     self.config['img_height'],
+                                                                     self.config['img_width'],
+                                                                     labels_format)
+        self.n_written = stop
+
+    def close(self):
+        '''
+        Moves the complete cache to its directory.
+
+        Returns:
+            The `PredictionCache` of the written predictions.
+        '''
+        if self.n_written != len(self.image_ids):
+            raise ValueError("Only {} of the {} images of the cache were written.".format(self.n_written, len(self.image_ids)))
+        self.predictions.flush()
+        n_boxes, n_columns = self.predictions.shape[1:]
+        del self.predictions
+        np.save(os.path.join(self.temporary_path, ANCHORS_FILE), self.anchors)
+        np.save(os.path.join(self.temporary_path, IMAGE_SIZES_FILE), self.image_sizes)
+        with open(os.path.join(self.temporary_path, INDEX_FILE), 'w') as f:
+            json.dump({'image_ids': self.image_ids,
+                       'n_boxes': n_boxes,
+                       'n_columns': n_columns,
+                       'config': self.config}, f)
+        try:
+            os.replace(self.temporary_path, self.path)
+        except OSError:
+            # Another job has written the same cache in the meantime.
+            shutil.rmtree(self.temporary_path)
+        return PredictionCache(self.path)
@@ -19,7 +19,7 @@ from data_generator.object_detection_2d_data_generator_dct_j2d import DataGenera
 
 from data_generator.object_detection_2d_data_generator import DataGenerator
 
-from eval_utils.average_precision_evaluator import Evaluator
+from eval_utils.average_precision_evaluator import Evaluator, COCO_MATCHING_IOU_THRESHOLDS
 
 from argparse import ArgumentParser
 import os
@@ -39,6 +39,7 @@ parser.add_argument("-p07", "--pascal_2007", action='store_true', default=False)
 parser.add_argument("-mv", "--miisst_val", action='store_true', default=False)
 parser.add_argument("-mt", "--miisst_train", action='store_true', default=False)
 parser.add_argument("-dp", "--dataset_path")
+parser.add_argument("-c", "--coco", action='store_true', default=False, help="Also computes the MS COCO-style mAP@[.5:.95] and the mAP of small, medium and large objects.")
 parser.add_argument("--archi", help="""The network architecture to use, value can be :\n
 * cb5_only : CbCr and Y only go through the conv block 5 of Resnet50\n
 * deconv : deconvolution architecture of Über article\n
@@ -195,14 +196,19 @@ if evaluate_pred:
                         return_precisions=True,
                         return_recalls=True,
                         return_average_precisions=True,
-                        verbose=True)
+                        verbose=True,
+                        matching_iou_thresholds=COCO_MATCHING_IOU_THRESHOLDS if args.coco else None)
 
-    mean_average_precision, average_precisions, precisions, recalls = results
+    mean_average_precision, average_precisions, precisions, recalls = results[:4]
 
     for i in range(1, len(average_precisions)):
         print("{:<14}{:<6}{}".format(classes[i], 'AP', round(average_precisions[i], 3)))
     print()
     print("{:<14}{:<6}{}".format('','mAP', round(mean_average_precision, 3)))
+    if args.coco:
+        print()
+        for name, value in results[4].items():
+            print("{:<14}{}".format(name, round(value, 3)))
 
     if "EXPERIMENTS_OUTPUT_DIRECTORY" in os.environ:
         file_path = os.path.join(os.environ["EXPERIMENTS_OUTPUT_DIRECTORY"], "save/save_results.csv")
@@ -0,0 +1,149 @@
+'''
+Sweeps a grid of decoding and matching parameters of the evaluation of the SSD300 DCT ResNet on a Pascal VOC test set
+and prints the mean average precision of each combination.
+
+The raw predictions of the model are computed once and cached by `Evaluator.predict_on_dataset()` under the hash of the
+weights file, the image IDs and the preprocessing configuration, so that the later sweeps with the same weights and
+dataset only run the decoding, the non-maximum suppression and the matching, without TensorFlow. Each combination of
+confidence threshold, NMS IoU threshold and top-k is decoded once and matched at every matching IoU threshold.
+'''
+
+from argparse import ArgumentParser
+import itertools
+import os
+import time
+
+
+from data_generator.object_detection_2d_data_generator_dct_j2d import DataGeneratorDCT, DataGeneratorDeconvDCT
+from data_generator.object_detection_2d_misc_utils import apply_inverse_transforms
+from ssd_encoder_decoder.ssd_output_decoder import decode_detections_batched
+from eval_utils.average_precision_evaluator import Evaluator
+from eval_utils.average_precision_accumulator import AveragePrecisionAccumulator
+from eval_utils.prediction_cache import DEFAULT_CACHE_DIR, prediction_cache_config, prediction_cache_path, PredictionCache
+
+parser = ArgumentParser(description="Mean average precision of the cached raw predictions for a grid of decoding and matching parameters.")
+parser.add_argument("weights", type=str)
+parser.add_argument("-dp", "--dataset_path", type=str, required=True)
+parser.add_argument("-pv12", "--pascal_val_2012", action='store_true', default=False)
+parser.add_argument("--archi", help="The network architecture of the weights, see evaluation.py.", type=str, default=None)
+parser.add_argument("-cd", "--cache_dir", help="The directory of the cached raw predictions.", type=str, default=DEFAULT_CACHE_DIR)
+parser.add_argument("-bs", "--batch_size", help="The batch size of the predictions and of the decoding.", type=int, default=8)
+parser.add_argument("-ct", "--confidence_thresholds", help="The confidence thresholds of the decoding.", type=float, nargs="+", default=[0.01])
+parser.add_argument("-it", "--iou_thresholds", help="The IoU thresholds of the non-maximum suppression.", type=float, nargs="+", default=[0.45])
+parser.add_argument("-k", "--top_ks", help="The numbers of predictions kept per image after the non-maximum suppression.", type=int, nargs="+", default=[200])
+parser.add_argument("-mt", "--matching_iou_thresholds", help="The IoU thresholds of the matching to the ground truth.", type=float, nargs="+", default=[0.5])
+parser.add_argument("-m", "--average_precision_mode", help="'sample' or 'integrate', see Evaluator.", type=str, default='integrate')
+args = parser.parse_args()
+
+img_height = 300
+img_width = 300
+n_classes = 20
+data_generator_mode = 'resize'
+border_pixels = 'include'
+
+classes = ['background',
+           'aeroplane', 'bicycle', 'bird', 'boat',
+           'bottle', 'bus', 'car', 'cat',
+           'chair', 'cow', 'diningtable', 'dog',
+           'horse', 'motorbike', 'person', 'pottedplant',
+           'sheep', 'sofa', 'train', 'tvmonitor']
+
+if args.pascal_val_2012:
+    dataset_dir = os.path.join(args.dataset_path, 'VOC2012')
+    image_set_filename = os.path.join(dataset_dir, 'ImageSets/Main/val.txt')
+else:
+    dataset_dir = os.path.join(args.dataset_path, 'VOC2007_test')
+    image_set_filename = os.path.join(dataset_dir, 'ImageSets/Main/test.txt')
+
+# The data generator class is part of the cache key, it must be the one of evaluation.py.
+dataset = DataGeneratorDeconvDCT() if args.archi == "deconv" else DataGeneratorDCT()
+dataset.parse_xml(images_dirs=[os.path.join(dataset_dir, 'JPEGImages/')],
+                  image_set_filenames=[image_set_filename],
+                  annotations_dirs=[os.path.join(dataset_dir, 'Annotations/')],
+                  classes=classes,
+                  include_classes='all',
+                  exclude_truncated=False,
+                  exclude_difficult=True,
+                  ret=False)
+
+config = prediction_cache_config(img_height, img_width, data_generator_mode, dataset)
+cache_path = prediction_cache_path(args.weights, dataset.image_ids, config, args.cache_dir)
+
+if not os.path.isdir(cache_path):
+    # The model is only needed to fill the cache.
+    from keras import backend as K
+    from models.keras_ssd300_dct_j2d_resnet import ssd_resnet_EF_layers_identical, ssd_resnet_EF_layers_custom
+
+    K.clear_session()
+    ssd_params = {"image_size": (img_height, img_width, 3),
+                  "n_classes": n_classes,
+                  "mode": 'training',
+                  "l2_regularization": 0.0005,
+                  "scales": [0.1, 0.2, 0.37, 0.54, 0.71, 0.88, 1.05],
+                  "aspect_ratios_per_layer": [[1.0, 2.0, 0.5],
+                                              [1.0, 2.0, 0.5, 3.0, 1.0/3.0],
+                                              [1.0, 2.0, 0.5, 3.0, 1.0/3.0],
+                                              [1.0, 2.0, 0.5, 3.0, 1.0/3.0],
+                                              [1.0, 2.0, 0.5],
+                                              [1.0, 2.0, 0.5]],
+                  "two_boxes_for_ar1": True,
+                  "steps": [8, 16, 32, 64, 100, 300],
+                  "offsets": [0.5, 0.5, 0.5, 0.5, 0.5, 0.5],
+                  "clip_boxes": False,
+                  "variances": [0.1, 0.1, 0.2, 0.2],
+                  "normalize_coords": True,
+                  "subtract_mean": [123, 117, 104],
+                  "swap_channels": [2, 1, 0],
+                  "archi": args.archi}
+    if args.archi == "ssd_custom":
+        model = ssd_resnet_EF_layers_custom(**ssd_params)
+    else:
+        model = ssd_resnet_EF_layers_identical(**ssd_params)
+    model.load_weights(args.weights)
+
+    # The predictions are matched by a throwaway accumulator instead of being stored.
+    evaluator = Evaluator(model=model, n_classes=n_classes, data_generator=dataset, model_mode='training')
+    evaluator.predict_on_dataset(img_height=img_height,
+                                 img_width=img_width,
+                                 batch_size=args.batch_size,
+                                 data_generator_mode=data_generator_mode,
+                                 decoding_border_pixels=border_pixels,
+                                 accumulator=AveragePrecisionAccumulator(n_classes, dataset, border_pixels=border_pixels),
+                                 weights_path=args.weights,
+                                 prediction_cache_dir=args.cache_dir)
+
+cache = PredictionCache(cache_path)
+print("Raw predictions of {} images read from {}".format(len(cache), cache_path))
+print()
+print("{:>10} {:>10} {:>6} {:>10} {:>8} {:>8}".format('conf', 'nms_iou', 'top_k', 'match_iou', 'mAP', 'time (s)'))
+
+results = []
+for confidence_thresh, iou_threshold, top_k in itertools.product(args.confidence_thresholds, args.iou_thresholds, args.top_ks):
+    start = time.time()
+    accumulators = [AveragePrecisionAccumulator(n_classes,
+                                                dataset,
+                                                matching_iou_threshold=matching_iou_threshold,
+                                                border_pixels=border_pixels)
+                    for matching_iou_threshold in args.matching_iou_thresholds]
+    for y_pred, batch_image_ids, batch_inverse_transforms in cache.batches(args.batch_size):
+        y_pred = decode_detections_batched(y_pred,
+                                           confidence_thresh=confidence_thresh,
+                                           iou_threshold=iou_threshold,
+                                           top_k=top_k,
+                                           img_height=img_height,
+                                           img_width=img_width,
+                                           border_pixels=border_pixels)
+        y_pred = apply_inverse_transforms(y_pred, batch_inverse_transforms)
+        for accumulator in accumulators:
+            accumulator.update(y_pred, batch_image_ids)
+    for matching_iou_threshold, accumulator in zip(args.matching_iou_thresholds, accumulators):
+        mean_average_precision = accumulator.compute_mean_average_precision(mode=args.average_precision_mode)
+        results.append((mean_average_precision, confidence_thresh, iou_threshold, top_k, matching_iou_threshold))
+        print("{:>10} {:>10} {:>6} {:>10} {:>8.4f} {:>8.1f}".format(confidence_thresh, iou_threshold, top_k, matching_iou_threshold,
+                                                                   mean_average_precision, time.time() - start))
+
+# The mean average precisions of different matching IoU thresholds are not comparable.
+print()
+for matching_iou_threshold in args.matching_iou_thresholds:
+    best = max(result for result in results if result[4] == matching_iou_threshold)
+    print("Best mAP {:.4f} at match_iou {}: conf {}, nms_iou {}, top_k {}".format(best[0], matching_iou_threshold, *best[1:4]))
@@ -0,0 +1,37 @@
+'''
+Micro-benchmark of the matching of the predictions to the ground truth boxes of `Evaluator`: time of the loop over the
+predictions of each class in the order of decreasing confidence and of `Evaluator.match_predictions()`, which computes
+the IoUs of all predictions of a class with the ground truth boxes of their images at once, on random datasets with
+20 classes and as many predictions per image as the decoders keep at a low confidence threshold.
+'''
+
+import argparse
+import time
+
+import numpy as np
+
+from tests.eval_utils.tests_average_precision_evaluator import match_predictions_by_loop, random_evaluator
+
+parser = argparse.ArgumentParser(description="Time of the matching of the predictions to the ground truth boxes of the evaluator.")
+parser.add_argument("-ni", "--numbersOfImages", help="The numbers of images of the datasets to benchmark.", type=int, nargs="+", default=[100, 1000])
+parser.add_argument("-pb", "--predictionsPerBox", help="The number of predictions around each ground truth box.", type=int, default=10)
+parser.add_argument("-rp", "--randomPredictions", help="The number of predictions anywhere in each image.", type=int, default=150)
+parser.add_argument("-it", "--iouThreshold", help="The matching IoU threshold.", type=float, default=0.5)
+args = parser.parse_args()
+
+random_state = np.random.RandomState(0)
+for n_images in args.numbersOfImages:
+    evaluator = random_evaluator(random_state, n_images, 20, predictions_per_box=args.predictionsPerBox, random_predictions=args.randomPredictions)
+    n_predictions = sum(len(predictions) for predictions in evaluator.prediction_results)
+
+    start = time.time()
+    expected_true_positives, expected_false_positives = match_predictions_by_loop(evaluator, matching_iou_threshold=args.iouThreshold)
+    time_loop = time.time() - start
+
+    start = time.time()
+    true_positives, false_positives, _, _ = evaluator.match_predictions(matching_iou_threshold=args.iouThreshold, verbose=False, ret=True)
+    time_vectorized = time.time() - start
+
+    same = all(np.array_equal(a, b) for a, b in zip(true_positives[1:] + false_positives[1:], expected_true_positives[1:] + expected_false_positives[1:]))
+    print("{} images, {} predictions: loop over the predictions {:.2f} s, match_predictions {:.3f} s ({:.1f}x), same true and false positives: {}".format(
+          n_images, n_predictions, time_loop, time_vectorized, time_loop / time_vectorized, same))
@@ -0,0 +1,41 @@
+'''
+Micro-benchmark of the MS COCO-style matching of `Evaluator`: time of `Evaluator.match_predictions()` run once per matching
+IoU threshold 0.5:0.05:0.95, as ten evaluations would, and of `Evaluator.match_predictions_at_thresholds()`, which computes
+the IoUs of each class once and matches at all thresholds and for all the area ranges 'all', 'small', 'medium' and 'large'
+in one pass, on random datasets with 20 classes.
+'''
+
+import argparse
+import time
+
+import numpy as np
+
+from eval_utils.average_precision_evaluator import COCO_MATCHING_IOU_THRESHOLDS, COCO_AREA_RANGES
+from tests.eval_utils.tests_average_precision_evaluator import random_evaluator
+
+parser = argparse.ArgumentParser(description="Time of the matching of the evaluator at the MS COCO matching IoU thresholds.")
+parser.add_argument("-ni", "--numbersOfImages", help="The numbers of images of the datasets to benchmark.", type=int, nargs="+", default=[100, 1000])
+parser.add_argument("-pb", "--predictionsPerBox", help="The number of predictions around each ground truth box.", type=int, default=10)
+parser.add_argument("-rp", "--randomPredictions", help="The number of predictions anywhere in each image.", type=int, default=150)
+args = parser.parse_args()
+
+random_state = np.random.RandomState(0)
+for n_images in args.numbersOfImages:
+    evaluator = random_evaluator(random_state, n_images, 20, predictions_per_box=args.predictionsPerBox, random_predictions=args.randomPredictions)
+    n_predictions = sum(len(predictions) for predictions in evaluator.prediction_results)
+
+    start = time.time()
+    expected = [evaluator.match_predictions(matching_iou_threshold=matching_iou_threshold, verbose=False, ret=True)[:2]
+                for matching_iou_threshold in COCO_MATCHING_IOU_THRESHOLDS]
+    time_per_threshold = time.time() - start
+
+    start = time.time()
+    true_positives, false_positives = evaluator.match_predictions_at_thresholds(verbose=False, ret=True)
+    time_at_thresholds = time.time() - start
+
+    same = all(np.array_equal(true_positives[class_id][0, i], expected[i][0][class_id]) and
+               np.array_equal(false_positives[class_id][0, i], expected[i][1][class_id])
+               for i in range(len(COCO_MATCHING_IOU_THRESHOLDS)) for class_id in range(1, 21))
+    print("{} images, {} predictions: match_predictions at {} thresholds {:.2f} s, match_predictions_at_thresholds for {} area ranges {:.2f} s ({:.1f}x), same true and false positives: {}".format(
+          n_images, n_predictions, len(COCO_MATCHING_IOU_THRESHOLDS), time_per_threshold, len(COCO_AREA_RANGES), time_at_thresholds,
+          time_per_threshold / time_at_thresholds, same))
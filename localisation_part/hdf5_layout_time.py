@@ -0,0 +1,70 @@
+'''
+Compares the file size and the epoch time of the HDF5 datasets of `DataGeneratorDCT` in the 'pixels'
+layout and in the 'jpeg' layout, both with the images resized to 300x300 when the dataset is created
+(no transformation at generation time), and with the original JPEG files resized at generation time.
+'''
+
+import argparse
+import os
+import time
+
+import numpy as np
+
+from data_generator.object_detection_2d_data_generator_dct_j2d import DataGeneratorDCT
+from data_generator.object_detection_2d_geometric_ops import Resize
+from data_generator.object_detection_2d_photometric_ops import ConvertTo3Channels
+
+parser = argparse.ArgumentParser(description="File size and epoch time of the 'pixels' and 'jpeg' HDF5 layouts.")
+parser.add_argument("images_dir", help="The Pascal VOC JPEGImages directory.")
+parser.add_argument("annotations_dir", help="The Pascal VOC Annotations directory.")
+parser.add_argument("image_set_filename", help="The Pascal VOC image set file, e.g. ImageSets/Main/trainval.txt.")
+parser.add_argument("output_dir", help="The directory where the HDF5 datasets are written.")
+parser.add_argument("-bs", "--batchSize", help="The size of the batches.", type=int, default=32)
+args = parser.parse_args()
+
+classes = ['background',
+           'aeroplane', 'bicycle', 'bird', 'boat',
+           'bottle', 'bus', 'car', 'cat',
+           'chair', 'cow', 'diningtable', 'dog',
+           'horse', 'motorbike', 'person', 'pottedplant',
+           'sheep', 'sofa', 'train', 'tvmonitor']
+
+dataset = DataGeneratorDCT(load_images_into_memory=False, hdf5_dataset_path=None)
+dataset.parse_xml(images_dirs=[args.images_dir],
+                  image_set_filenames=[args.image_set_filename],
+                  annotations_dirs=[args.annotations_dir],
+                  classes=classes,
+                  include_classes='all',
+                  exclude_truncated=False,
+                  exclude_difficult=False,
+                  ret=False)
+
+source_size = sum(os.path.getsize(filename) for filename in dataset.filenames)
+print("Source JPEG files: {:.1f} MB".format(source_size / 1024 ** 2))
+
+layouts = [("pixels, resized", "pixels_300.h5", 'pixels', (300, 300), []),
+           ("jpeg, resized", "jpeg_300.h5", 'jpeg', (300, 300), []),
+           ("jpeg, original files", "jpeg.h5", 'jpeg', False, [ConvertTo3Channels(), Resize(height=300, width=300)])]
+
+for name, filename, image_format, resize, transformations in layouts:
+    file_path = os.path.join(args.output_dir, filename)
+    dataset.create_hdf5_dataset(file_path=file_path,
+                                resize=resize,
+                                variable_image_size=not resize,
+                                image_format=image_format,
+                                verbose=False)
+
+    hdf5_dataset = DataGeneratorDCT(load_images_into_memory=False, hdf5_dataset_path=file_path, verbose=False)
+    box_filter = hdf5_dataset.prepare_generation(transformations=transformations, returns={'processed_images'})
+
+    start = time.time()
+    for batch_start in range(0, hdf5_dataset.get_dataset_size(), args.batchSize):
+        hdf5_dataset.generate_batch(np.arange(batch_start, min(batch_start + args.batchSize, hdf5_dataset.get_dataset_size())),
+                                    transformations=transformations,
+                                    returns={'processed_images'},
+                                    keep_images_without_gt=True,
+                                    box_filter=box_filter)
+    epoch_time = time.time() - start
+    hdf5_dataset.hdf5_dataset.close()
+
+    print("{}: {:.1f} MB, {:.1f} s per epoch".format(name, os.path.getsize(file_path) / 1024 ** 2, epoch_time))
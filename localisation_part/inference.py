@@ -16,7 +16,6 @@ from keras_layers.keras_layer_AnchorBoxes import AnchorBoxes
 from keras_layers.keras_layer_DecodeDetections import DecodeDetections
 from keras_layers.keras_layer_DecodeDetectionsFast import DecodeDetectionsFast
 from keras_layers.keras_layer_L2Normalization import L2Normalization
-import jpegdecoder
 
 from ssd_encoder_decoder.ssd_output_decoder import decode_detections, decode_detections_fast
 
@@ -24,6 +23,7 @@ from data_generator.object_detection_2d_data_generator import DataGenerator
 from data_generator.object_detection_2d_photometric_ops import ConvertTo3Channels
 from data_generator.object_detection_2d_geometric_ops import Resize
 from data_generator.object_detection_2d_misc_utils import apply_inverse_transforms
+from data_generator.object_detection_2d_dct_codec import JPEGCodec
 from data_generator.object_detection_2d_geometric_ops import Resize
 from data_generator.object_detection_2d_photometric_ops import ConvertTo3Channels
 
@@ -129,34 +129,8 @@ with Image.open(img_path) as image:
 input_images = np.array(input_images, dtype=np.float64)
 
 if args.dct:
-    decoder = jpegdecoder.decoder.JPEGDecoder()
-
-    im = Image.fromarray(np.array(img))
-    im.save(os.path.join(os.environ["LOCAL_WORK_DIR"], "1.jpg"), format="jpeg", subsampling=0)
-    while True:
-        try:
-            img = decoder.decode_file(os.path.join(os.environ["LOCAL_WORK_DIR"], "1.jpg"), 2)
-            rows, cols = img.get_component_shape(0)[0:2]
-            if img.get_number_of_component() == 1:
-                input_images[0, :, :, 0] = np.reshape(img.get_data(0), (rows, cols))[
-                    :300, :300]
-                input_images[0, :, :, 1] = input_images[0, :, :, 0]
-                input_images[0, :, :, 2] = input_images[0, :, :, 0]
-            else:
-                input_images[0, :, :, 0] = np.reshape(
-                    img.get_data(0), (rows, cols))[:300, :300]
-                input_images[0, :, :, 1] = np.reshape(
-                    img.get_data(1), (rows, cols))[:300, :300]
-                input_images[0, :, :, 2] = np.reshape(
-                    img.get_data(2), (rows, cols))[:300, :300]
-        except OSError:
-            print("i'am stuck 1.jpg")
-            continue
-        except Exception as e:
-            print(e)
-            print("1.jpg")
-            continue
-        break
+    codec = JPEGCodec()
+    input_images[0] = codec(np.array(img), image_name=img_path)
 model.summary()
 y_pred = model.predict(input_images)
 print(y_pred.shape)
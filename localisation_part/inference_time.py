@@ -0,0 +1,71 @@
+'''
+Benchmark of the inference-mode SSD300 DCT graph on CPU: time per batch of `predict()` of the model whose
+`DecodeDetections` layer performs the non-maximum suppression by nested `tf.map_fn` loops over the batch items and
+classes, and of the same model with `batched_nms=True`, which performs it for all batch items and classes at once.
+Both models have the same weights, so the decoded predictions must be the same. With random weights, almost every
+box meets a low confidence threshold in every class, so pass trained weights to time realistic predictions.
+'''
+
+import argparse
+import os
+import time
+
+os.environ.setdefault("CUDA_VISIBLE_DEVICES", "")
+
+import numpy as np
+from keras import backend as K
+
+from models.keras_ssd300_dct import ssd_300DCT
+
+parser = argparse.ArgumentParser(description="Time per batch of predict() of the inference-mode SSD300 DCT with and without batched NMS.")
+parser.add_argument("-bs", "--batchSizes", help="The batch sizes to benchmark.", type=int, nargs="+", default=[1, 8, 32])
+parser.add_argument("-w", "--weights", help="The path of trained weights to load into both models.", type=str, default=None)
+parser.add_argument("-ct", "--confidenceThreshold", help="The confidence threshold of the decoding layer.", type=float, default=0.01)
+parser.add_argument("-nb", "--numberOfBatches", help="The number of batches to time for each batch size.", type=int, default=10)
+args = parser.parse_args()
+
+img_height, img_width = 300, 300
+parameters = dict(image_size=(img_height, img_width, 3),
+                  n_classes=20,
+                  mode='inference',
+                  scales=[0.1, 0.2, 0.37, 0.54, 0.71, 0.88, 1.05],
+                  aspect_ratios_per_layer=[[1.0, 2.0, 0.5],
+                                           [1.0, 2.0, 0.5, 3.0, 1.0/3.0],
+                                           [1.0, 2.0, 0.5, 3.0, 1.0/3.0],
+                                           [1.0, 2.0, 0.5, 3.0, 1.0/3.0],
+                                           [1.0, 2.0, 0.5],
+                                           [1.0, 2.0, 0.5]],
+                  two_boxes_for_ar1=True,
+                  steps=[8, 16, 32, 64, 100, 300],
+                  offsets=[0.5, 0.5, 0.5, 0.5, 0.5, 0.5],
+                  clip_boxes=False,
+                  variances=[0.1, 0.1, 0.2, 0.2],
+                  normalize_coords=True,
+                  confidence_thresh=args.confidenceThreshold,
+                  iou_threshold=0.45,
+                  top_k=200,
+                  nms_max_output_size=400)
+
+K.clear_session()
+model = ssd_300DCT(**parameters)
+if args.weights is not None:
+    model.load_weights(args.weights, by_name=True)
+batched_model = ssd_300DCT(batched_nms=True, **parameters)
+batched_model.set_weights(model.get_weights())
+
+random_state = np.random.RandomState(0)
+for batch_size in args.batchSizes:
+    images = random_state.randint(0, 256, size=(batch_size, img_height, img_width, 3)).astype(np.float32)
+    times = []
+    outputs = []
+    for m in (model, batched_model):
+        m.predict(images, batch_size=batch_size) # Warm up.
+        start = time.time()
+        for _ in range(args.numberOfBatches):
+            y_pred = m.predict(images, batch_size=batch_size)
+        times.append((time.time() - start) / args.numberOfBatches)
+        outputs.append(y_pred)
+
+    same = outputs[0].shape == outputs[1].shape and np.allclose(outputs[0], outputs[1], atol=1e-4)
+    print("batch size {}: map_fn NMS {:.1f} ms, batched NMS {:.1f} ms ({:.1f}x), {} detections per image, same detections: {}".format(
+          batch_size, times[0] * 1000, times[1] * 1000, times[0] / times[1], np.mean(np.sum(outputs[0][:, :, 1] > 0, axis=1)), same))
@@ -22,7 +22,7 @@ import keras.backend as K
 from keras.engine.topology import InputSpec
 from keras.engine.topology import Layer
 
-from bounding_box_utils.bounding_box_utils import convert_coordinates
+from ssd_encoder_decoder.anchor_set import AnchorSet
 
 class AnchorBoxes(Layer):
     '''
@@ -68,6 +68,8 @@ class AnchorBoxes(Layer):
                  variances=[0.1, 0.1, 0.2, 0.2],
                  coords='centroids',
                  normalize_coords=False,
+                 anchor_set=None,
+                 predictor_index=None,
                  **kwargs):
         '''
         All arguments need to be set to the same values as in the box encoding process, otherwise the behavior is undefined.
@@ -94,6 +96,12 @@ class AnchorBoxes(Layer):
                 'corners' for the format `(xmin, ymin, xmax,  ymax)`, or 'minmax' for the format `(xmin, xmax, ymin, ymax)`.
             normalize_coords (bool, optional): Set to `True` if the model uses relative instead of absolute coordinates,
                 i.e. if the model predicts box coordinates within [0,1] instead of absolute coordinates.
+            anchor_set (AnchorSet, optional): The anchor boxes of all predictor layers of the model, shared with the
+                encoder and the decoders. The anchor boxes of this layer are then those of the predictor layer
+                `predictor_index` of the set, which must have been built with the arguments above and the size
+                of the input tensor, otherwise a `ValueError` is raised. If `None`, the anchor boxes of this layer
+                are taken from `AnchorSet.get()`.
+            predictor_index (int, optional): The index of this predictor layer in `anchor_set`.
         '''
         if K.backend() != 'tensorflow':
             raise TypeError("This layer only supports TensorFlow at the moment, but you are using the {} backend.".format(K.backend()))
@@ -119,6 +127,8 @@ class AnchorBoxes(Layer):
         self.variances = variances
         self.coords = coords
         self.normalize_coords = normalize_coords
+        self.anchor_set = anchor_set
+        self.predictor_index = predictor_index
         # Compute the number of boxes per cell
         if (1 in aspect_ratios) and two_boxes_for_ar1:
             self.n_boxes = len(aspect_ratios) + 1
@@ -147,105 +157,32 @@ class AnchorBoxes(Layer):
                 layer must be the output of the localization predictor layer.
         '''
 
-        # Compute box width and height for each aspect ratio
-        # The shorter side of the image will be used to compute `w` and `h` using `scale` and `aspect_ratios`.
-        size = min(self.img_height, self.img_width)
-        # Compute the box widths and and heights for all aspect ratios
-        wh_list = []
-        for ar in self.aspect_ratios:
-            if (ar == 1):
-                # Compute the regular anchor box for aspect ratio 1.
-                box_height = box_width = self.this_scale * size
-                wh_list.append((box_width, box_height))
-                if self.two_boxes_for_ar1:
-                    # Compute one slightly larger version using the geometric mean of this scale value and the next.
-                    box_height = box_width = np.sqrt(self.this_scale * self.next_scale) * size
-                    wh_list.append((box_width, box_height))
-            else:
-                box_height = self.this_scale * size / np.sqrt(ar)
-                box_width = self.this_scale * size * np.sqrt(ar)
-                wh_list.append((box_width, box_height))
-        wh_list = np.array(wh_list)
-
         # We need the shape of the input tensor
         if K.image_dim_ordering() == 'tf':
             batch_size, feature_map_height, feature_map_width, feature_map_channels = x._keras_shape
         else: # Not yet relevant since TensorFlow is the only supported backend right now, but it can't harm to have this in here for the future
             batch_size, feature_map_channels, feature_map_height, feature_map_width = x._keras_shape
 
-        # Compute the grid of box center points. They are identical for all aspect ratios.
-
-        # Compute the step sizes, i.e. how far apart the anchor box center points will be vertically and horizontally.
-        if (self.this_steps is None):
-            step_height = self.img_height / feature_map_height
-            step_width = self.img_width / feature_map_width
-        else:
-            if isinstance(self.this_steps, (list, tuple)) and (len(self.this_steps) == 2):
-                step_height = self.this_steps[0]
-                step_width = self.this_steps[1]
-            elif isinstance(self.this_steps, (int, float)):
-                step_height = self.this_steps
-                step_width = self.this_steps
-        # Compute the offsets, i.e. at what pixel values the first anchor box center point will be from the top and from the left of the image.
-        if (self.this_offsets is None):
-            offset_height = 0.5
-            offset_width = 0.5
+        # The anchor boxes of this layer, with the variances appended along the last axis, of shape
+        # `(feature_map_height, feature_map_width, n_boxes, 8)`. They are computed by `AnchorSet`, as for the encoder.
+        config = AnchorSet.configuration(self.img_height, self.img_width, [(feature_map_height, feature_map_width)],
+                                         [self.this_scale, self.next_scale], [self.aspect_ratios], self.two_boxes_for_ar1,
+                                         [self.this_steps], [self.this_offsets], self.clip_boxes, self.variances,
+                                         self.coords, self.normalize_coords)
+        if self.anchor_set is None:
+            boxes_tensor = AnchorSet.get(**config).layer_anchors(0, (feature_map_height, feature_map_width))
         else:
-            if isinstance(self.this_offsets, (list, tuple)) and (len(self.this_offsets) == 2):
-                offset_height = self.this_offsets[0]
-                offset_width = self.this_offsets[1]
-            elif isinstance(self.this_offsets, (int, float)):
-                offset_height = self.this_offsets
-                offset_width = self.this_offsets
-        # Now that we have the offsets and step sizes, compute the grid of anchor box center points.
-        cy = np.linspace(offset_height * step_height, (offset_height + feature_map_height - 1) * step_height, feature_map_height)
-        cx = np.linspace(offset_width * step_width, (offset_width + feature_map_width - 1) * step_width, feature_map_width)
-        cx_grid, cy_grid = np.meshgrid(cx, cy)
-        cx_grid = np.expand_dims(cx_grid, -1) # This is necessary for np.tile() to do what we want further down
-        cy_grid = np.expand_dims(cy_grid, -1) # This is necessary for np.tile() to do what we want further down
-
-        # Create a 4D tensor template of shape `(feature_map_height, feature_map_width, n_boxes, 4)`
-        # where the last dimension will contain `(cx, cy, w, h)`
-        boxes_tensor = np.zeros((feature_map_height, feature_map_width, self.n_boxes, 4))
-
-        boxes_tensor[:, :, :, 0] = np.tile(cx_grid, (1, 1, self.n_boxes)) # Set cx
-        boxes_tensor[:, :, :, 1] = np.tile(cy_grid, (1, 1, self.n_boxes)) # Set cy
-        boxes_tensor[:, :, :, 2] = wh_list[:, 0] # Set w
-        boxes_tensor[:, :, :, 3] = wh_list[:, 1] # Set h
-
-        # Convert `(cx, cy, w, h)` to `(xmin, xmax, ymin, ymax)`
-        boxes_tensor = convert_coordinates(boxes_tensor, start_index=0, conversion='centroids2corners')
-
-        # If `clip_boxes` is enabled, clip the coordinates to lie within the image boundaries
-        if self.clip_boxes:
-            x_coords = boxes_tensor[:,:,:,[0, 2]]
-            x_coords[x_coords >= self.img_width] = self.img_width - 1
-            x_coords[x_coords < 0] = 0
-            boxes_tensor[:,:,:,[0, 2]] = x_coords
-            y_coords = boxes_tensor[:,:,:,[1, 3]]
-            y_coords[y_coords >= self.img_height] = self.img_height - 1
-            y_coords[y_coords < 0] = 0
-            boxes_tensor[:,:,:,[1, 3]] = y_coords
-
-        # If `normalize_coords` is enabled, normalize the coordinates to be within [0,1]
-        if self.normalize_coords:
-            boxes_tensor[:, :, :, [0, 2]] /= self.img_width
-            boxes_tensor[:, :, :, [1, 3]] /= self.img_height
-
-        # TODO: Implement box limiting directly for `(cx, cy, w, h)` so that we don't have to unnecessarily convert back and forth.
-        if self.coords == 'centroids':
-            # Convert `(xmin, ymin, xmax, ymax)` back to `(cx, cy, w, h)`.
-            boxes_tensor = convert_coordinates(boxes_tensor, start_index=0, conversion='corners2centroids', border_pixels='half')
-        elif self.coords == 'minmax':
-            # Convert `(xmin, ymin, xmax, ymax)` to `(xmin, xmax, ymin, ymax).
-            boxes_tensor = convert_coordinates(boxes_tensor, start_index=0, conversion='corners2minmax', border_pixels='half')
-
-        # Create a tensor to contain the variances and append it to `boxes_tensor`. This tensor has the same shape
-        # as `boxes_tensor` and simply contains the same 4 variance values for every position in the last axis.
-        variances_tensor = np.zeros_like(boxes_tensor) # Has shape `(feature_map_height, feature_map_width, n_boxes, 4)`
-        variances_tensor += self.variances # Long live broadcasting
-        # Now `boxes_tensor` becomes a tensor of shape `(feature_map_height, feature_map_width, n_boxes, 8)`
-        boxes_tensor = np.concatenate((boxes_tensor, variances_tensor), axis=-1)
+            # The configuration of this layer must be the one of the predictor layer in the anchor set.
+            layer_config = dict(self.anchor_set.config)
+            i = self.predictor_index
+            for name in ('predictor_sizes', 'aspect_ratios_per_layer', 'steps', 'offsets'):
+                layer_config[name] = layer_config[name][i:i+1]
+            layer_config['scales'] = layer_config['scales'][i:i+2]
+            differences = [name for name in sorted(config) if config[name] != layer_config[name]]
+            if differences:
+                raise ValueError("The layer {} does not match the predictor layer {} of the anchor set, the values of {} differ: {} instead of {}.".format(
+                                 self.name, i, differences, [config[name] for name in differences], [layer_config[name] for name in differences]))
+            boxes_tensor = self.anchor_set.layer_anchors(i, (feature_map_height, feature_map_width))
 
         # Now prepend one dimension to `boxes_tensor` to account for the batch size and tile it along
         # The result will be a 5D tensor of shape `(batch_size, feature_map_height, feature_map_width, n_boxes, 8)`
@@ -269,6 +206,8 @@ class AnchorBoxes(Layer):
             'next_scale': self.next_scale,
             'aspect_ratios': list(self.aspect_ratios),
             'two_boxes_for_ar1': self.two_boxes_for_ar1,
+            'this_steps': self.this_steps,
+            'this_offsets': self.this_offsets,
             'clip_boxes': self.clip_boxes,
             'variances': list(self.variances),
             'coords': self.coords,
@@ -24,12 +24,15 @@ import keras.backend as K
 from keras.engine.topology import InputSpec
 from keras.engine.topology import Layer
 
+from ssd_encoder_decoder.anchor_set import AnchorSet
+
 class DecodeDetections(Layer):
     '''
     A Keras layer to decode the raw SSD prediction output.
 
     Input shape:
-        3D tensor of shape `(batch_size, n_boxes, n_classes + 12)`.
+        3D tensor of shape `(batch_size, n_boxes, n_classes + 12)`, or `(batch_size, n_boxes, n_classes + 4)`
+        without the anchor box coordinates and variances if the layer is given an `AnchorSet`.
 
     Output shape:
         3D tensor of shape `(batch_size, top_k, 6)`.
@@ -44,6 +47,9 @@ class DecodeDetections(Layer):
                  normalize_coords=True,
                  img_height=None,
                  img_width=None,
+                 anchor_set=None,
+                 batched_nms=False,
+                 nms_chunk_size=64,
                  **kwargs):
         '''
         All default argument values follow the Caffe implementation.
@@ -60,7 +66,8 @@ class DecodeDetections(Layer):
             top_k (int, optional): The number of highest scoring predictions to be kept for each batch item after the
                 non-maximum suppression stage.
             nms_max_output_size (int, optional): The maximum number of predictions that will be left after performing non-maximum
-                suppression.
+                suppression. With `batched_nms`, the maximum number of highest scoring boxes per class that enter the non-maximum
+                suppression, as the `top_k` of the NMS of the original Caffe implementation, which also bounds the predictions left.
             coords (str, optional): The box coordinate format that the model outputs. Must be 'centroids'
                 i.e. the format `(cx, cy, w, h)` (box center coordinates, width, and height). Other coordinate formats are
                 currently not supported.
@@ -71,6 +78,20 @@ class DecodeDetections(Layer):
                 coordinates. Requires `img_height` and `img_width` if set to `True`.
             img_height (int, optional): The height of the input images. Only needed if `normalize_coords` is `True`.
             img_width (int, optional): The width of the input images. Only needed if `normalize_coords` is `True`.
+            anchor_set (AnchorSet or dict, optional): The anchor boxes of the model, or the configuration of the
+                anchor set as in `AnchorSet.config`. If given, the input tensor contains only the class confidences
+                and the four predicted offsets of every box, and the anchor box coordinates and variances are read
+                from a constant tensor built from the anchor set.
+            batched_nms (bool, optional): If `True`, the non-maximum suppression is performed for all classes and batch items
+                at once instead of by nested loops over the batch items and classes with one `tf.image.non_max_suppression()`
+                per class. The `nms_max_output_size` highest scoring boxes of each class are compared in one IoU matrix per
+                class and batch item, `nms_chunk_size` of them at a time in a tensor of shape `(nms_chunk_size, k, k)` for the largest
+                number `k` of boxes above the confidence threshold of any class, at most `nms_max_output_size`. The output is the same
+                as without `batched_nms` as long as no class has more than `nms_max_output_size` boxes above the threshold.
+            nms_chunk_size (int, optional): Only relevant if `batched_nms` is `True`. The number of pairs of a batch item and a class
+                whose IoU matrices are computed at once. The pairs are processed chunk after chunk, so that the memory of the
+                non-maximum suppression is bounded by `nms_chunk_size * nms_max_output_size**2` floats per intermediate tensor,
+                e.g. 41 MB for the defaults, whatever the batch size and the number of classes.
         '''
         if K.backend() != 'tensorflow':
             raise TypeError("This layer only supports TensorFlow at the moment, but you are using the {} backend.".format(K.backend()))
@@ -81,6 +102,9 @@ class DecodeDetections(Layer):
         if coords != 'centroids':
             raise ValueError("The DetectionOutput layer currently only supports the 'centroids' coordinate format.")
 
+        if nms_chunk_size < 1:
+            raise ValueError("`nms_chunk_size` must be at least 1, but it is {}.".format(nms_chunk_size))
+
         # We need these members for the config.
         self.confidence_thresh = confidence_thresh
         self.iou_threshold = iou_threshold
@@ -90,6 +114,11 @@ class DecodeDetections(Layer):
         self.img_width = img_width
         self.coords = coords
         self.nms_max_output_size = nms_max_output_size
+        self.batched_nms = batched_nms
+        self.nms_chunk_size = nms_chunk_size
+        if isinstance(anchor_set, dict):
+            anchor_set = AnchorSet.get(**anchor_set)
+        self.anchor_set = anchor_set
 
         # We need these members for TensorFlow.
         self.tf_confidence_thresh = tf.constant(self.confidence_thresh, name='confidence_thresh')
@@ -99,11 +128,16 @@ class DecodeDetections(Layer):
         self.tf_img_height = tf.constant(self.img_height, dtype=tf.float32, name='img_height')
         self.tf_img_width = tf.constant(self.img_width, dtype=tf.float32, name='img_width')
         self.tf_nms_max_output_size = tf.constant(self.nms_max_output_size, name='nms_max_output_size')
+        self.tf_nms_chunk_size = tf.constant(self.nms_chunk_size, name='nms_chunk_size')
+        if self.anchor_set is not None:
+            self.tf_anchors = tf.constant(self.anchor_set.anchors, dtype=tf.float32, name='anchors')
 
         super(DecodeDetections, self).__init__(**kwargs)
 
     def build(self, input_shape):
         self.input_spec = [InputSpec(shape=input_shape)]
+        if self.anchor_set is not None and input_shape[1] is not None and input_shape[1] != len(self.anchor_set):
+            raise ValueError("The anchor set has {} anchor boxes, but the model predicts {} boxes.".format(len(self.anchor_set), input_shape[1]))
         super(DecodeDetections, self).build(input_shape)
 
     def call(self, y_pred, mask=None):
@@ -120,11 +154,17 @@ class DecodeDetections(Layer):
         #    absolute coordinates
         #####################################################################################
 
+        # Split the input into the class confidences, the predicted offsets, and the anchor boxes and variances.
+        if self.anchor_set is None:
+            classes, offsets, anchors = y_pred[...,:-12], y_pred[...,-12:-8], y_pred[...,-8:]
+        else:
+            classes, offsets, anchors = y_pred[...,:-4], y_pred[...,-4:], self.tf_anchors
+
         # Convert anchor box offsets to image offsets.
-        cx = y_pred[...,-12] * y_pred[...,-4] * y_pred[...,-6] + y_pred[...,-8] # cx = cx_pred * cx_variance * w_anchor + cx_anchor
-        cy = y_pred[...,-11] * y_pred[...,-3] * y_pred[...,-5] + y_pred[...,-7] # cy = cy_pred * cy_variance * h_anchor + cy_anchor
-        w = tf.exp(y_pred[...,-10] * y_pred[...,-2]) * y_pred[...,-6] # w = exp(w_pred * variance_w) * w_anchor
-        h = tf.exp(y_pred[...,-9] * y_pred[...,-1]) * y_pred[...,-5] # h = exp(h_pred * variance_h) * h_anchor
+        cx = offsets[...,0] * anchors[...,4] * anchors[...,2] + anchors[...,0] # cx = cx_pred * cx_variance * w_anchor + cx_anchor
+        cy = offsets[...,1] * anchors[...,5] * anchors[...,3] + anchors[...,1] # cy = cy_pred * cy_variance * h_anchor + cy_anchor
+        w = tf.exp(offsets[...,2] * anchors[...,6]) * anchors[...,2] # w = exp(w_pred * variance_w) * w_anchor
+        h = tf.exp(offsets[...,3] * anchors[...,7]) * anchors[...,3] # h = exp(h_pred * variance_h) * h_anchor
 
         # Convert 'centroids' to 'corners'.
         xmin = cx - 0.5 * w
@@ -146,7 +186,7 @@ class DecodeDetections(Layer):
         xmin, ymin, xmax, ymax = tf.cond(self.tf_normalize_coords, normalized_coords, non_normalized_coords)
 
         # Concatenate the one-hot class confidences and the converted box coordinates to form the decoded predictions tensor.
-        y_pred = tf.concat(values=[y_pred[...,:-12], xmin, ymin, xmax, ymax], axis=-1)
+        y_pred = tf.concat(values=[classes, xmin, ymin, xmax, ymax], axis=-1)
 
         #####################################################################################
         # 2. Perform confidence thresholding, per-class non-maximum suppression, and
@@ -252,6 +292,111 @@ class DecodeDetections(Layer):
 
             return top_k_boxes
 
+        # Alternatively, filter the predictions of all batch items and classes at once. Specifically, it performs:
+        # - confidence thresholding and selection of the `nms_max_output_size` highest scoring boxes of each class
+        # - greedy non-maximum suppression of these boxes in one IoU matrix per batch item and class, `nms_chunk_size` matrices at a time
+        # - top-k filtering
+        def filter_all_predictions():
+
+            # The confidences of the positive classes, a tensor of shape (batch_size, n_classes - 1, n_boxes).
+            confidences = tf.transpose(y_pred[...,1:-4], perm=[0, 2, 1])
+            n_positive_classes = tf.shape(confidences)[1]
+
+            # Keep the `n_candidates` highest scoring boxes of each class, where `n_candidates` is the largest number of boxes
+            # that meet the confidence threshold in any class, at most `self.nms_max_output_size`. The candidates of each class
+            # are sorted by decreasing confidence.
+            n_candidates = tf.reduce_max(tf.reduce_sum(tf.to_int32(confidences > self.tf_confidence_thresh), axis=-1))
+            n_candidates = tf.maximum(tf.minimum(n_candidates, self.tf_nms_max_output_size), 1)
+            scores, box_indices = tf.nn.top_k(confidences, k=n_candidates, sorted=True)
+            threshold_met = scores > self.tf_confidence_thresh
+
+            batch_indices = tf.tile(tf.reshape(tf.range(batch_size), [-1, 1, 1]), [1, n_positive_classes, n_candidates])
+            boxes = tf.gather_nd(params=y_pred[...,-4:],
+                                 indices=tf.stack([batch_indices, box_indices], axis=-1)) # Shape (batch_size, n_classes - 1, n_candidates, 4)
+
+            # Greedy NMS of the candidates of the pairs of a batch item and a class of one chunk, given their boxes, a tensor of
+            # shape (chunk_size, n_candidates, 4), and whether they meet the confidence threshold, of shape (chunk_size, n_candidates).
+            def suppress_chunk(chunk):
+                boxes, threshold_met = chunk
+
+                # The IoU similarities of the candidates of each pair, a tensor of shape (chunk_size, n_candidates, n_candidates),
+                # computed as by `tf.image.non_max_suppression()`, which considers boxes without area not to overlap.
+                xmin, ymin, xmax, ymax = boxes[...,0], boxes[...,1], boxes[...,2], boxes[...,3]
+                areas = (xmax - xmin) * (ymax - ymin)
+                intersection_widths = tf.maximum(tf.minimum(tf.expand_dims(xmax, axis=-1), tf.expand_dims(xmax, axis=-2)) - tf.maximum(tf.expand_dims(xmin, axis=-1), tf.expand_dims(xmin, axis=-2)), 0.0)
+                intersection_heights = tf.maximum(tf.minimum(tf.expand_dims(ymax, axis=-1), tf.expand_dims(ymax, axis=-2)) - tf.maximum(tf.expand_dims(ymin, axis=-1), tf.expand_dims(ymin, axis=-2)), 0.0)
+                intersections = intersection_widths * intersection_heights
+                ious = intersections / (tf.expand_dims(areas, axis=-1) + tf.expand_dims(areas, axis=-2) - intersections)
+
+                # A candidate can only be suppressed by a candidate with a higher score, i.e. an earlier one, of the same pair.
+                comparable = tf.logical_and(threshold_met, areas > 0)
+                earlier = tf.cast(tf.matrix_band_part(tf.ones([n_candidates, n_candidates]), 0, -1) - tf.matrix_band_part(tf.ones([n_candidates, n_candidates]), 0, 0), tf.bool)
+                suppresses = tf.logical_and(tf.logical_and(ious > self.iou_threshold, earlier),
+                                            tf.logical_and(tf.expand_dims(comparable, axis=-1), tf.expand_dims(comparable, axis=-2)))
+                suppresses = tf.to_float(suppresses)
+
+                # Greedy NMS keeps a candidate if no kept candidate before it suppresses it. Starting from all candidates kept,
+                # applying this rule to all candidates at once is exact for the first `i` candidates of each pair after `i`
+                # iterations, so it reaches the result of greedy NMS after at most `n_candidates` iterations, usually a few.
+                def apply_suppression(keep):
+                    n_suppressing = tf.matmul(tf.expand_dims(tf.to_float(keep), axis=-2), suppresses)[...,0,:]
+                    return tf.logical_and(threshold_met, tf.equal(n_suppressing, 0.0))
+
+                def not_converged(keep, previous_keep, i):
+                    return tf.logical_and(tf.reduce_any(tf.not_equal(keep, previous_keep)), i < n_candidates)
+
+                keep, _, _ = tf.while_loop(cond=not_converged,
+                                           body=lambda keep, previous_keep, i: (apply_suppression(keep), keep, i + 1),
+                                           loop_vars=[apply_suppression(threshold_met), threshold_met, tf.constant(1)],
+                                           back_prop=False,
+                                           name='greedy_nms')
+                return keep
+
+            # Split the pairs of a batch item and a class into chunks of at most `self.nms_chunk_size` pairs, the last chunk being
+            # padded with candidates that do not meet the threshold, and suppress the candidates chunk after chunk.
+            n_pairs = batch_size * n_positive_classes
+            chunk_size = tf.minimum(self.tf_nms_chunk_size, n_pairs)
+            n_chunks = (n_pairs + chunk_size - 1) // chunk_size
+            chunk_boxes = tf.pad(tensor=tf.reshape(boxes, [n_pairs, n_candidates, 4]),
+                                 paddings=[[0, n_chunks * chunk_size - n_pairs], [0, 0], [0, 0]],
+                                 mode='CONSTANT',
+                                 constant_values=0.0)
+            chunk_threshold_met = tf.pad(tensor=tf.reshape(threshold_met, [n_pairs, n_candidates]),
+                                         paddings=[[0, n_chunks * chunk_size - n_pairs], [0, 0]],
+                                         mode='CONSTANT',
+                                         constant_values=False)
+            keep = tf.map_fn(fn=suppress_chunk,
+                             elems=(tf.reshape(chunk_boxes, [n_chunks, chunk_size, n_candidates, 4]),
+                                    tf.reshape(chunk_threshold_met, [n_chunks, chunk_size, n_candidates])),
+                             dtype=tf.bool,
+                             parallel_iterations=1, # More than one chunk at a time would defeat the memory bound.
+                             back_prop=False,
+                             swap_memory=False,
+                             infer_shape=False,
+                             name='loop_over_chunks')
+            keep = tf.reshape(tf.reshape(keep, [-1, n_candidates])[:n_pairs], [batch_size, n_positive_classes, n_candidates])
+
+            # The maxima of all classes in the format `[class_id, confidence, xmin, ymin, xmax, ymax]`, in the order of the classes
+            # and, within each class, of decreasing confidence. The suppressed candidates become zero rows, as the padding of the
+            # maxima of each class above.
+            class_ids = tf.tile(tf.reshape(tf.to_float(tf.range(1, n_positive_classes + 1)), [1, -1, 1, 1]), [batch_size, 1, n_candidates, 1])
+            maxima = tf.concat([class_ids, tf.expand_dims(scores, axis=-1), boxes], axis=-1)
+            maxima = maxima * tf.expand_dims(tf.to_float(keep), axis=-1)
+            maxima = tf.reshape(maxima, [batch_size, -1, 6])
+
+            # Perform top-k filtering for all batch items, padding them with zeros if there are fewer than `self.top_k`.
+            maxima = tf.pad(tensor=maxima,
+                            paddings=[[0, 0], [0, tf.maximum(self.tf_top_k - tf.shape(maxima)[1], 0)], [0, 0]],
+                            mode='CONSTANT',
+                            constant_values=0.0)
+            top_k_indices = tf.nn.top_k(maxima[...,1], k=self.tf_top_k, sorted=True).indices
+            top_k_batch_indices = tf.tile(tf.expand_dims(tf.range(batch_size), axis=-1), [1, self.tf_top_k])
+            return tf.gather_nd(params=maxima,
+                                indices=tf.stack([top_k_batch_indices, top_k_indices], axis=-1))
+
+        if self.batched_nms:
+            return filter_all_predictions()
+
         # Iterate `filter_predictions()` over all batch items.
         output_tensor = tf.map_fn(fn=lambda x: filter_predictions(x),
                                   elems=y_pred,
@@ -278,6 +423,9 @@ class DecodeDetections(Layer):
             'normalize_coords': self.normalize_coords,
             'img_height': self.img_height,
             'img_width': self.img_width,
+            'anchor_set': None if self.anchor_set is None else self.anchor_set.config,
+            'batched_nms': self.batched_nms,
+            'nms_chunk_size': self.nms_chunk_size,
         }
         base_config = super(DecodeDetections, self).get_config()
         return dict(list(base_config.items()) + list(config.items()))
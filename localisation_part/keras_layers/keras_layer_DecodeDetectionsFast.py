@@ -26,12 +26,15 @@ import keras.backend as K
 from keras.engine.topology import InputSpec
 from keras.engine.topology import Layer
 
+from ssd_encoder_decoder.anchor_set import AnchorSet
+
 class DecodeDetectionsFast(Layer):
     '''
     A Keras layer to decode the raw SSD prediction output.
 
     Input shape:
-        3D tensor of shape `(batch_size, n_boxes, n_classes + 12)`.
+        3D tensor of shape `(batch_size, n_boxes, n_classes + 12)`, or `(batch_size, n_boxes, n_classes + 4)`
+        without the anchor box coordinates and variances if the layer is given an `AnchorSet`.
 
     Output shape:
         3D tensor of shape `(batch_size, top_k, 6)`.
@@ -46,6 +49,7 @@ class DecodeDetectionsFast(Layer):
                  normalize_coords=True,
                  img_height=None,
                  img_width=None,
+                 anchor_set=None,
                  **kwargs):
         '''
         All default argument values follow the Caffe implementation.
@@ -73,6 +77,10 @@ class DecodeDetectionsFast(Layer):
                 coordinates. Requires `img_height` and `img_width` if set to `True`.
             img_height (int, optional): The height of the input images. Only needed if `normalize_coords` is `True`.
             img_width (int, optional): The width of the input images. Only needed if `normalize_coords` is `True`.
+            anchor_set (AnchorSet or dict, optional): The anchor boxes of the model, or the configuration of the
+                anchor set as in `AnchorSet.config`. If given, the input tensor contains only the class confidences
+                and the four predicted offsets of every box, and the anchor box coordinates and variances are read
+                from a constant tensor built from the anchor set.
         '''
         if K.backend() != 'tensorflow':
             raise TypeError("This layer only supports TensorFlow at the moment, but you are using the {} backend.".format(K.backend()))
@@ -92,6 +100,9 @@ class DecodeDetectionsFast(Layer):
         self.img_width = img_width
         self.coords = coords
         self.nms_max_output_size = nms_max_output_size
+        if isinstance(anchor_set, dict):
+            anchor_set = AnchorSet.get(**anchor_set)
+        self.anchor_set = anchor_set
 
         # We need these members for TensorFlow.
         self.tf_confidence_thresh = tf.constant(self.confidence_thresh, name='confidence_thresh')
@@ -101,11 +112,15 @@ class DecodeDetectionsFast(Layer):
         self.tf_img_height = tf.constant(self.img_height, dtype=tf.float32, name='img_height')
         self.tf_img_width = tf.constant(self.img_width, dtype=tf.float32, name='img_width')
         self.tf_nms_max_output_size = tf.constant(self.nms_max_output_size, name='nms_max_output_size')
+        if self.anchor_set is not None:
+            self.tf_anchors = tf.constant(self.anchor_set.anchors, dtype=tf.float32, name='anchors')
 
         super(DecodeDetectionsFast, self).__init__(**kwargs)
 
     def build(self, input_shape):
         self.input_spec = [InputSpec(shape=input_shape)]
+        if self.anchor_set is not None and input_shape[1] is not None and input_shape[1] != len(self.anchor_set):
+            raise ValueError("The anchor set has {} anchor boxes, but the model predicts {} boxes.".format(len(self.anchor_set), input_shape[1]))
         super(DecodeDetectionsFast, self).build(input_shape)
 
     def call(self, y_pred, mask=None):
@@ -122,16 +137,22 @@ class DecodeDetectionsFast(Layer):
         #    absolute coordinates
         #####################################################################################
 
+        # Split the input into the class confidences, the predicted offsets, and the anchor boxes and variances.
+        if self.anchor_set is None:
+            classes, offsets, anchors = y_pred[...,:-12], y_pred[...,-12:-8], y_pred[...,-8:]
+        else:
+            classes, offsets, anchors = y_pred[...,:-4], y_pred[...,-4:], self.tf_anchors
+
         # Extract the predicted class IDs as the indices of the highest confidence values.
-        class_ids = tf.expand_dims(tf.to_float(tf.argmax(y_pred[...,:-12], axis=-1)), axis=-1)
+        class_ids = tf.expand_dims(tf.to_float(tf.argmax(classes, axis=-1)), axis=-1)
         # Extract the confidences of the maximal classes.
-        confidences = tf.reduce_max(y_pred[...,:-12], axis=-1, keep_dims=True)
+        confidences = tf.reduce_max(classes, axis=-1, keep_dims=True)
 
         # Convert anchor box offsets to image offsets.
-        cx = y_pred[...,-12] * y_pred[...,-4] * y_pred[...,-6] + y_pred[...,-8] # cx = cx_pred * cx_variance * w_anchor + cx_anchor
-        cy = y_pred[...,-11] * y_pred[...,-3] * y_pred[...,-5] + y_pred[...,-7] # cy = cy_pred * cy_variance * h_anchor + cy_anchor
-        w = tf.exp(y_pred[...,-10] * y_pred[...,-2]) * y_pred[...,-6] # w = exp(w_pred * variance_w) * w_anchor
-        h = tf.exp(y_pred[...,-9] * y_pred[...,-1]) * y_pred[...,-5] # h = exp(h_pred * variance_h) * h_anchor
+        cx = offsets[...,0] * anchors[...,4] * anchors[...,2] + anchors[...,0] # cx = cx_pred * cx_variance * w_anchor + cx_anchor
+        cy = offsets[...,1] * anchors[...,5] * anchors[...,3] + anchors[...,1] # cy = cy_pred * cy_variance * h_anchor + cy_anchor
+        w = tf.exp(offsets[...,2] * anchors[...,6]) * anchors[...,2] # w = exp(w_pred * variance_w) * w_anchor
+        h = tf.exp(offsets[...,3] * anchors[...,7]) * anchors[...,3] # h = exp(h_pred * variance_h) * h_anchor
 
         # Convert 'centroids' to 'corners'.
         xmin = cx - 0.5 * w
@@ -261,6 +282,7 @@ class DecodeDetectionsFast(Layer):
             'normalize_coords': self.normalize_coords,
             'img_height': self.img_height,
             'img_width': self.img_width,
+            'anchor_set': None if self.anchor_set is None else self.anchor_set.config,
         }
         base_config = super(DecodeDetectionsFast, self).get_config()
         return dict(list(base_config.items()) + list(config.items()))
@@ -27,7 +27,8 @@ class SSDLoss:
     def __init__(self,
                  neg_pos_ratio=3,
                  n_neg_min=0,
-                 alpha=1.0):
+                 alpha=1.0,
+                 sparse_targets=False):
         '''
         Arguments:
             neg_pos_ratio (int, optional): The maximum ratio of negative (i.e. background)
@@ -45,10 +46,16 @@ class SSDLoss:
                 stands in reasonable proportion to the batch size used for training.
             alpha (float, optional): A factor to weight the localization loss in the
                 computation of the total loss. Defaults to 1.0 following the paper.
+            sparse_targets (bool, optional): If `True`, `y_true` is in the sparse format of
+                `SSDInputEncoder.sparse_encoding()`, i.e. has shape `(batch_size, #boxes, 5)` with the
+                class ID of every box, -1 for the boxes to ignore, followed by the 4 ground truth box
+                coordinate offsets. The one-hot class vectors are built in the graph, the loss is the
+                same as with the dense `y_true`.
         '''
         self.neg_pos_ratio = neg_pos_ratio
         self.n_neg_min = n_neg_min
         self.alpha = alpha
+        self.sparse_targets = sparse_targets
 
     def smooth_L1_loss(self, y_true, y_pred):
         '''
@@ -112,7 +119,8 @@ class SSDLoss:
                 where the last four entries of the last axis contain the anchor box
                 coordinates, which are needed during inference. Important: Boxes that
                 you want the cost function to ignore need to have a one-hot
-                class vector of all zeros.
+                class vector of all zeros. With `sparse_targets`, a Numpy array of shape `(batch_size, #boxes, 5)`
+                instead, see `__init__()`.
             y_pred (Keras tensor): The model prediction. The shape is identical
                 to that of `y_true`, i.e. `(batch_size, #boxes, #classes + 12)`.
                 The last axis must contain entries in the format
@@ -128,16 +136,27 @@ class SSDLoss:
         batch_size = tf.shape(y_pred)[0] # Output dtype: tf.int32
         n_boxes = tf.shape(y_pred)[1] # Output dtype: tf.int32, note that `n_boxes` in this context denotes the total number of boxes per image, not the number of boxes per cell.
 
+        # 0: Get the one-hot ground truth classes and the ground truth box coordinate offsets.
+
+        if self.sparse_targets:
+            # The class ID -1 of the boxes to ignore gives a one-hot vector of all zeros.
+            class_ids = tf.to_int32(tf.round(y_true[:,:,0])) # Tensor of shape (batch_size, n_boxes)
+            y_true_classes = tf.one_hot(class_ids, depth=tf.shape(y_pred)[2] - 12, dtype=y_pred.dtype) # Tensor of shape (batch_size, n_boxes, n_classes)
+            y_true_offsets = tf.cast(y_true[:,:,1:5], y_pred.dtype) # Tensor of shape (batch_size, n_boxes, 4)
+        else:
+            y_true_classes = y_true[:,:,:-12]
+            y_true_offsets = y_true[:,:,-12:-8]
+
         # 1: Compute the losses for class and box predictions for every box.
 
-        classification_loss = tf.to_float(self.log_loss(y_true[:,:,:-12], y_pred[:,:,:-12])) # Output shape: (batch_size, n_boxes)
-        localization_loss = tf.to_float(self.smooth_L1_loss(y_true[:,:,-12:-8], y_pred[:,:,-12:-8])) # Output shape: (batch_size, n_boxes)
+        classification_loss = tf.to_float(self.log_loss(y_true_classes, y_pred[:,:,:-12])) # Output shape: (batch_size, n_boxes)
+        localization_loss = tf.to_float(self.smooth_L1_loss(y_true_offsets, y_pred[:,:,-12:-8])) # Output shape: (batch_size, n_boxes)
 
         # 2: Compute the classification losses for the positive and negative targets.
 
         # Create masks for the positive and negative ground truth classes.
-        negatives = y_true[:,:,0] # Tensor of shape (batch_size, n_boxes)
-        positives = tf.to_float(tf.reduce_max(y_true[:,:,1:-12], axis=-1)) # Tensor of shape (batch_size, n_boxes)
+        negatives = y_true_classes[:,:,0] # Tensor of shape (batch_size, n_boxes)
+        positives = tf.to_float(tf.reduce_max(y_true_classes[:,:,1:], axis=-1)) # Tensor of shape (batch_size, n_boxes)
 
         # Count the number of positive boxes (classes 1 to n) in y_true across the whole batch.
         n_positive = tf.reduce_sum(positives)
@@ -56,7 +56,9 @@ def ssd_300DCT(image_size,
             iou_threshold=0.45,
             top_k=200,
             nms_max_output_size=400,
-            return_predictor_sizes=False):
+            return_predictor_sizes=False,
+            anchor_set=None,
+            batched_nms=False):
     '''
     Build a Keras model with SSD300 architecture, see references.
 
@@ -78,12 +80,14 @@ def ssd_300DCT(image_size,
     Arguments:
         image_size (tuple): The input image size in the format `(height, width, channels)`.
         n_classes (int): The number of positive classes, e.g. 20 for Pascal VOC, 80 for MS COCO.
-        mode (str, optional): One of 'training', 'inference' and 'inference_fast'. In 'training' mode,
+        mode (str, optional): One of 'training', 'inference', 'inference_fast' and 'compact'. In 'training' mode,
             the model outputs the raw prediction tensor, while in 'inference' and 'inference_fast' modes,
             the raw predictions are decoded into absolute coordinates and filtered via confidence thresholding,
             non-maximum suppression, and top-k filtering. The difference between latter two modes is that
             'inference' follows the exact procedure of the original Caffe implementation, while
-            'inference_fast' uses a faster prediction decoding procedure.
+            'inference_fast' uses a faster prediction decoding procedure. In 'compact' mode, the model outputs
+            the raw prediction tensor without the anchor box coordinates and variances, which the decoders then
+            read from an `AnchorSet`. The inference modes also leave them out if `anchor_set` is given.
         l2_regularization (float, optional): The L2-regularization rate. Applies to all convolutional layers.
             Set to zero to deactivate L2-regularization.
         min_scale (float, optional): The smallest scaling factor for the size of the anchor boxes as a fraction
@@ -157,6 +161,11 @@ def ssd_300DCT(image_size,
             you can always get their sizes easily via the Keras API, but it's convenient and less error-prone
             to get them this way. They are only relevant for training anyway (SSDBoxEncoder needs to know the
             spatial dimensions of the predictor layers), for inference you don't need them.
+        anchor_set (AnchorSet, optional): The anchor boxes of the model, shared with the `SSDInputEncoder` and the
+            decoders. If `None`, every `AnchorBoxes` layer generates its own anchor boxes. If given, it must have been
+            built with the same anchor box parameters as this model.
+        batched_nms (bool, optional): If `True`, the `DecodeDetections` layer of the 'inference' mode performs the
+            non-maximum suppression of all classes and batch items at once, see `DecodeDetections`.
 
     Returns:
         model: The Keras SSD300 model.
@@ -326,22 +335,28 @@ def ssd_300DCT(image_size,
     # Output shape of anchors: `(batch, height, width, n_boxes, 8)`
     conv4_3_norm_mbox_priorbox = AnchorBoxes(img_height, img_width, this_scale=scales[0], next_scale=scales[1], aspect_ratios=aspect_ratios[0],
                                              two_boxes_for_ar1=two_boxes_for_ar1, this_steps=steps[0], this_offsets=offsets[0], clip_boxes=clip_boxes,
-                                             variances=variances, coords=coords, normalize_coords=normalize_coords, name='conv4_3_norm_mbox_priorbox')(conv4_3_norm_mbox_loc)
+                                             variances=variances, coords=coords, normalize_coords=normalize_coords,
+                                             anchor_set=anchor_set, predictor_index=0, name='conv4_3_norm_mbox_priorbox')(conv4_3_norm_mbox_loc)
     fc7_mbox_priorbox = AnchorBoxes(img_height, img_width, this_scale=scales[1], next_scale=scales[2], aspect_ratios=aspect_ratios[1],
                                     two_boxes_for_ar1=two_boxes_for_ar1, this_steps=steps[1], this_offsets=offsets[1], clip_boxes=clip_boxes,
-                                    variances=variances, coords=coords, normalize_coords=normalize_coords, name='fc7_mbox_priorbox')(fc7_mbox_loc)
+                                    variances=variances, coords=coords, normalize_coords=normalize_coords,
+                                    anchor_set=anchor_set, predictor_index=1, name='fc7_mbox_priorbox')(fc7_mbox_loc)
     conv6_2_mbox_priorbox = AnchorBoxes(img_height, img_width, this_scale=scales[2], next_scale=scales[3], aspect_ratios=aspect_ratios[2],
                                         two_boxes_for_ar1=two_boxes_for_ar1, this_steps=steps[2], this_offsets=offsets[2], clip_boxes=clip_boxes,
-                                        variances=variances, coords=coords, normalize_coords=normalize_coords, name='conv6_2_mbox_priorbox')(conv6_2_mbox_loc)
+                                        variances=variances, coords=coords, normalize_coords=normalize_coords,
+                                        anchor_set=anchor_set, predictor_index=2, name='conv6_2_mbox_priorbox')(conv6_2_mbox_loc)
     conv7_2_mbox_priorbox = AnchorBoxes(img_height, img_width, this_scale=scales[3], next_scale=scales[4], aspect_ratios=aspect_ratios[3],
                                         two_boxes_for_ar1=two_boxes_for_ar1, this_steps=steps[3], this_offsets=offsets[3], clip_boxes=clip_boxes,
-                                        variances=variances, coords=coords, normalize_coords=normalize_coords, name='conv7_2_mbox_priorbox')(conv7_2_mbox_loc)
+                                        variances=variances, coords=coords, normalize_coords=normalize_coords,
+                                        anchor_set=anchor_set, predictor_index=3, name='conv7_2_mbox_priorbox')(conv7_2_mbox_loc)
     conv8_2_mbox_priorbox = AnchorBoxes(img_height, img_width, this_scale=scales[4], next_scale=scales[5], aspect_ratios=aspect_ratios[4],
                                         two_boxes_for_ar1=two_boxes_for_ar1, this_steps=steps[4], this_offsets=offsets[4], clip_boxes=clip_boxes,
-                                        variances=variances, coords=coords, normalize_coords=normalize_coords, name='conv8_2_mbox_priorbox')(conv8_2_mbox_loc)
+                                        variances=variances, coords=coords, normalize_coords=normalize_coords,
+                                        anchor_set=anchor_set, predictor_index=4, name='conv8_2_mbox_priorbox')(conv8_2_mbox_loc)
     conv9_2_mbox_priorbox = AnchorBoxes(img_height, img_width, this_scale=scales[5], next_scale=scales[6], aspect_ratios=aspect_ratios[5],
                                         two_boxes_for_ar1=two_boxes_for_ar1, this_steps=steps[5], this_offsets=offsets[5], clip_boxes=clip_boxes,
-                                        variances=variances, coords=coords, normalize_coords=normalize_coords, name='conv9_2_mbox_priorbox')(conv9_2_mbox_loc)
+                                        variances=variances, coords=coords, normalize_coords=normalize_coords,
+                                        anchor_set=anchor_set, predictor_index=5, name='conv9_2_mbox_priorbox')(conv9_2_mbox_loc)
 
     ### Reshape
 
@@ -403,9 +418,14 @@ def ssd_300DCT(image_size,
 
     # Concatenate the class and box predictions and the anchors to one large predictions vector
     # Output shape of `predictions`: (batch, n_boxes_total, n_classes + 4 + 8)
-    predictions = Concatenate(axis=2, name='predictions_ssd')([mbox_conf_softmax, mbox_loc, mbox_priorbox])
+    if mode == 'compact' or (anchor_set is not None and mode != 'training'):
+        # Without the anchors, which the decoders read from the anchor set instead.
+        # Output shape of `predictions`: (batch, n_boxes_total, n_classes + 4)
+        predictions = Concatenate(axis=2, name='predictions_ssd')([mbox_conf_softmax, mbox_loc])
+    else:
+        predictions = Concatenate(axis=2, name='predictions_ssd')([mbox_conf_softmax, mbox_loc, mbox_priorbox])
 
-    if mode == 'training':
+    if mode == 'training' or mode == 'compact':
         model = Model(inputs=input_layer, outputs=predictions)
     elif mode == 'inference':
         decoded_predictions = DecodeDetections(confidence_thresh=confidence_thresh,
@@ -416,6 +436,8 @@ def ssd_300DCT(image_size,
                                                normalize_coords=normalize_coords,
                                                img_height=img_height,
                                                img_width=img_width,
+                                               anchor_set=anchor_set,
+                                               batched_nms=batched_nms,
                                                name='decoded_predictions')(predictions)
         model = Model(inputs=input_layer, outputs=decoded_predictions)
     elif mode == 'inference_fast':
@@ -427,10 +449,11 @@ def ssd_300DCT(image_size,
                                                    normalize_coords=normalize_coords,
                                                    img_height=img_height,
                                                    img_width=img_width,
+                                                   anchor_set=anchor_set,
                                                    name='decoded_predictions')(predictions)
         model = Model(inputs=input_layer, outputs=decoded_predictions)
     else:
-        raise ValueError("`mode` must be one of 'training', 'inference' or 'inference_fast', but received '{}'.".format(mode))
+        raise ValueError("`mode` must be one of 'training', 'inference', 'inference_fast' or 'compact', but received '{}'.".format(mode))
 
     if return_predictor_sizes:
         predictor_sizes = np.array([conv4_3_norm_mbox_conf._keras_shape[1:3],
@@ -196,6 +196,8 @@ def ssd_resnet_EF_layers_custom(
     top_k=200,
     nms_max_output_size=400,
     return_predictor_sizes=False,
+    anchor_set=None,
+    batched_nms=False,
     archi="ssd_custom"
 ):
     """
@@ -219,12 +221,14 @@ def ssd_resnet_EF_layers_custom(
     Arguments:
         image_size (tuple): The input image size in the format `(height, width, channels)`.
         n_classes (int): The number of positive classes, e.g. 20 for Pascal VOC, 80 for MS COCO.
-        mode (str, optional): One of 'training', 'inference' and 'inference_fast'. In 'training' mode,
+        mode (str, optional): One of 'training', 'inference', 'inference_fast' and 'compact'. In 'training' mode,
             the model outputs the raw prediction tensor, while in 'inference' and 'inference_fast' modes,
             the raw predictions are decoded into absolute coordinates and filtered via confidence thresholding,
             non-maximum suppression, and top-k filtering. The difference between latter two modes is that
             'inference' follows the exact procedure of the original Caffe implementation, while
-            'inference_fast' uses a faster prediction decoding procedure.
+            'inference_fast' uses a faster prediction decoding procedure. In 'compact' mode, the model outputs
+            the raw prediction tensor without the anchor box coordinates and variances, which the decoders then
+            read from an `AnchorSet`. The inference modes also leave them out if `anchor_set` is given.
         l2_regularization (float, optional): The L2-regularization rate. Applies to all convolutional layers.
             Set to zero to deactivate L2-regularization.
         min_scale (float, optional): The smallest scaling factor for the size of the anchor boxes as a fraction
@@ -298,6 +302,11 @@ def ssd_resnet_EF_layers_custom(
             you can always get their sizes easily via the Keras API, but it's convenient and less error-prone
             to get them this way. They are only relevant for training anyway (SSDBoxEncoder needs to know the
             spatial dimensions of the predictor layers), for inference you don't need them.
+        anchor_set (AnchorSet, optional): The anchor boxes of the model, shared with the `SSDInputEncoder` and the
+            decoders. If `None`, every `AnchorBoxes` layer generates its own anchor boxes. If given, it must have been
+            built with the same anchor box parameters as this model.
+        batched_nms (bool, optional): If `True`, the `DecodeDetections` layer of the 'inference' mode performs the
+            non-maximum suppression of all classes and batch items at once, see `DecodeDetections`.
 
     Returns:
         model: The Keras SSD300 model.
@@ -690,6 +699,8 @@ def ssd_resnet_EF_layers_custom(
         variances=variances,
         coords=coords,
         normalize_coords=normalize_coords,
+        anchor_set=anchor_set,
+        predictor_index=0,
         name="conv4_3_norm_mbox_priorbox",
     )(conv4_3_norm_mbox_loc)
     fc7_mbox_priorbox = AnchorBoxes(
@@ -705,6 +716,8 @@ def ssd_resnet_EF_layers_custom(
         variances=variances,
         coords=coords,
         normalize_coords=normalize_coords,
+        anchor_set=anchor_set,
+        predictor_index=1,
         name="fc7_mbox_priorbox",
     )(fc7_mbox_loc)
     conv6_2_mbox_priorbox = AnchorBoxes(
@@ -720,6 +733,8 @@ def ssd_resnet_EF_layers_custom(
         variances=variances,
         coords=coords,
         normalize_coords=normalize_coords,
+        anchor_set=anchor_set,
+        predictor_index=2,
         name="conv6_2_mbox_priorbox",
     )(conv6_2_mbox_loc)
     conv7_2_mbox_priorbox = AnchorBoxes(
@@ -735,6 +750,8 @@ def ssd_resnet_EF_layers_custom(
         variances=variances,
         coords=coords,
         normalize_coords=normalize_coords,
+        anchor_set=anchor_set,
+        predictor_index=3,
         name="conv7_2_mbox_priorbox",
     )(conv7_2_mbox_loc)
     conv8_2_mbox_priorbox = AnchorBoxes(
@@ -750,6 +767,8 @@ def ssd_resnet_EF_layers_custom(
         variances=variances,
         coords=coords,
         normalize_coords=normalize_coords,
+        anchor_set=anchor_set,
+        predictor_index=4,
         name="conv8_2_mbox_priorbox",
     )(conv8_2_mbox_loc)
     conv9_2_mbox_priorbox = AnchorBoxes(
@@ -765,6 +784,8 @@ def ssd_resnet_EF_layers_custom(
         variances=variances,
         coords=coords,
         normalize_coords=normalize_coords,
+        anchor_set=anchor_set,
+        predictor_index=5,
         name="conv9_2_mbox_priorbox",
     )(conv9_2_mbox_loc)
 
@@ -874,11 +895,18 @@ def ssd_resnet_EF_layers_custom(
 
     # Concatenate the class and box predictions and the anchors to one large predictions vector
     # Output shape of `predictions`: (batch, n_boxes_total, n_classes + 4 + 8)
-    predictions = Concatenate(axis=2, name="predictions_ssd")(
-        [mbox_conf_softmax, mbox_loc, mbox_priorbox]
-    )
+    if mode == "compact" or (anchor_set is not None and mode != "training"):
+        # Without the anchors, which the decoders read from the anchor set instead.
+        # Output shape of `predictions`: (batch, n_boxes_total, n_classes + 4)
+        predictions = Concatenate(axis=2, name="predictions_ssd")(
+            [mbox_conf_softmax, mbox_loc]
+        )
+    else:
+        predictions = Concatenate(axis=2, name="predictions_ssd")(
+            [mbox_conf_softmax, mbox_loc, mbox_priorbox]
+        )
 
-    if mode == "training":
+    if mode == "training" or mode == "compact":
         model = Model(inputs=[input_y, input_cbcr], outputs=predictions)
 
     elif mode == "inference":
@@ -891,6 +919,8 @@ def ssd_resnet_EF_layers_custom(
             normalize_coords=normalize_coords,
             img_height=img_height,
             img_width=img_width,
+            anchor_set=anchor_set,
+            batched_nms=batched_nms,
             name="decoded_predictions",
         )(predictions)
         model = Model(inputs=[input_y, input_cbcr], outputs=decoded_predictions)
@@ -905,13 +935,14 @@ def ssd_resnet_EF_layers_custom(
             normalize_coords=normalize_coords,
             img_height=img_height,
             img_width=img_width,
+            anchor_set=anchor_set,
             name="decoded_predictions",
         )(predictions)
         model = Model(inputs=[input_y, input_cbcr], outputs=decoded_predictions)
 
     else:
         raise ValueError(
-            "`mode` must be one of 'training', 'inference' or 'inference_fast', but received '{}'.".format(
+            "`mode` must be one of 'training', 'inference', 'inference_fast' or 'compact', but received '{}'.".format(
                 mode
             )
         )
@@ -964,6 +995,8 @@ def ssd_resnet_EF_layers_identical(
     top_k=200,
     nms_max_output_size=400,
     return_predictor_sizes=False,
+    anchor_set=None,
+    batched_nms=False,
     archi="deconv"
 ):
 
@@ -1339,6 +1372,8 @@ def ssd_resnet_EF_layers_identical(
         variances=variances,
         coords=coords,
         normalize_coords=normalize_coords,
+        anchor_set=anchor_set,
+        predictor_index=0,
         name="conv4_3_norm_mbox_priorbox",
     )(conv4_3_norm_mbox_loc)
     fc7_mbox_priorbox = AnchorBoxes(
@@ -1354,6 +1389,8 @@ def ssd_resnet_EF_layers_identical(
         variances=variances,
         coords=coords,
         normalize_coords=normalize_coords,
+        anchor_set=anchor_set,
+        predictor_index=1,
         name="fc7_mbox_priorbox",
     )(fc7_mbox_loc)
     conv6_2_mbox_priorbox = AnchorBoxes(
@@ -1369,6 +1406,8 @@ def ssd_resnet_EF_layers_identical(
         variances=variances,
         coords=coords,
         normalize_coords=normalize_coords,
+        anchor_set=anchor_set,
+        predictor_index=2,
         name="conv6_2_mbox_priorbox",
     )(conv6_2_mbox_loc)
     conv7_2_mbox_priorbox = AnchorBoxes(
@@ -1384,6 +1423,8 @@ def ssd_resnet_EF_layers_identical(
         variances=variances,
         coords=coords,
         normalize_coords=normalize_coords,
+        anchor_set=anchor_set,
+        predictor_index=3,
         name="conv7_2_mbox_priorbox",
     )(conv7_2_mbox_loc)
     conv8_2_mbox_priorbox = AnchorBoxes(
@@ -1399,6 +1440,8 @@ def ssd_resnet_EF_layers_identical(
         variances=variances,
         coords=coords,
         normalize_coords=normalize_coords,
+        anchor_set=anchor_set,
+        predictor_index=4,
         name="conv8_2_mbox_priorbox",
     )(conv8_2_mbox_loc)
     conv9_2_mbox_priorbox = AnchorBoxes(
@@ -1414,6 +1457,8 @@ def ssd_resnet_EF_layers_identical(
         variances=variances,
         coords=coords,
         normalize_coords=normalize_coords,
+        anchor_set=anchor_set,
+        predictor_index=5,
         name="conv9_2_mbox_priorbox",
     )(conv9_2_mbox_loc)
 
@@ -1523,11 +1568,18 @@ def ssd_resnet_EF_layers_identical(
 
     # Concatenate the class and box predictions and the anchors to one large predictions vector
     # Output shape of `predictions`: (batch, n_boxes_total, n_classes + 4 + 8)
-    predictions = Concatenate(axis=2, name="predictions_ssd")(
-        [mbox_conf_softmax, mbox_loc, mbox_priorbox]
-    )
+    if mode == "compact" or (anchor_set is not None and mode != "training"):
+        # Without the anchors, which the decoders read from the anchor set instead.
+        # Output shape of `predictions`: (batch, n_boxes_total, n_classes + 4)
+        predictions = Concatenate(axis=2, name="predictions_ssd")(
+            [mbox_conf_softmax, mbox_loc]
+        )
+    else:
+        predictions = Concatenate(axis=2, name="predictions_ssd")(
+            [mbox_conf_softmax, mbox_loc, mbox_priorbox]
+        )
 
-    if mode == "training":
+    if mode == "training" or mode == "compact":
         if input_cr is None:
             model = Model(inputs=[input_y, input_cbcr], outputs=predictions)
         else:
@@ -1543,6 +1595,8 @@ def ssd_resnet_EF_layers_identical(
             normalize_coords=normalize_coords,
             img_height=img_height,
             img_width=img_width,
+            anchor_set=anchor_set,
+            batched_nms=batched_nms,
             name="decoded_predictions",
         )(predictions)
         if input_cr is None:
@@ -1559,6 +1613,7 @@ def ssd_resnet_EF_layers_identical(
             normalize_coords=normalize_coords,
             img_height=img_height,
             img_width=img_width,
+            anchor_set=anchor_set,
             name="decoded_predictions",
         )(predictions)
         if input_cr is None:
@@ -1567,7 +1622,7 @@ def ssd_resnet_EF_layers_identical(
             model = Model(inputs=[input_y, input_cb, input_cr], outputs=decoded_predictions)
     else:
         raise ValueError(
-            "`mode` must be one of 'training', 'inference' or 'inference_fast', but received '{}'.".format(
+            "`mode` must be one of 'training', 'inference', 'inference_fast' or 'compact', but received '{}'.".format(
                 mode
             )
         )
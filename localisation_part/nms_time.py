@@ -0,0 +1,37 @@
+'''
+Micro-benchmark of the greedy non-maximum suppression of the decoders: time per call of the rounds of `argmax`
+and `np.delete` over the boxes left and of `greedy_nms_indices()`, which sorts the boxes once and marks the
+suppressed boxes in blocks, for 100, 1,000 and 8,000 candidate boxes clustered around objects, as the boxes of one
+class left after a low confidence threshold.
+'''
+
+import argparse
+import time
+
+import numpy as np
+
+from ssd_encoder_decoder.nms_utils import greedy_nms_indices
+from tests.ssd_encoder_decoder.tests_nms_utils import greedy_nms_by_rounds, random_predictions
+
+parser = argparse.ArgumentParser(description="Time per call of the greedy non-maximum suppression.")
+parser.add_argument("-nb", "--numbersOfBoxes", help="The numbers of candidate boxes to benchmark.", type=int, nargs="+", default=[100, 1000, 8000])
+parser.add_argument("-it", "--iouThreshold", help="The IoU threshold of the non-maximum suppression.", type=float, default=0.45)
+parser.add_argument("-bs", "--blockSize", help="The block size of `greedy_nms_indices()`.", type=int, default=256)
+parser.add_argument("-nc", "--numberOfCalls", help="The number of calls to time for each number of boxes.", type=int, default=5)
+args = parser.parse_args()
+
+random_state = np.random.RandomState(0)
+for n_boxes in args.numbersOfBoxes:
+    predictions = [random_predictions(random_state, n_boxes) for _ in range(args.numberOfCalls)]
+
+    start = time.time()
+    expected = [greedy_nms_by_rounds(p, 0, iou_threshold=args.iouThreshold) for p in predictions]
+    time_rounds = (time.time() - start) / args.numberOfCalls
+
+    start = time.time()
+    maxima = [p[greedy_nms_indices(p[:,1:], p[:,0], iou_threshold=args.iouThreshold, block_size=args.blockSize)] for p in predictions]
+    time_blocks = (time.time() - start) / args.numberOfCalls
+
+    same = all(np.array_equal(a, b) for a, b in zip(expected, maxima))
+    print("{} boxes ({:.0f} kept): rounds of argmax {:.2f} ms, sorted blocks {:.2f} ms ({:.1f}x), identical maxima: {}".format(
+          n_boxes, np.mean([len(m) for m in maxima]), time_rounds * 1000, time_blocks * 1000, time_rounds / time_blocks, same))
@@ -0,0 +1,69 @@
+'''
+Benchmark of the SSD300 raw prediction output on CPU: time per batch of `predict()` and bytes per batch of the
+output of the model built in 'training' mode, which outputs the anchor box coordinates and variances of every box,
+and of the same model built in 'compact' mode, whose output is decoded with the anchor boxes of an `AnchorSet`.
+Both models have the same random weights, so the decoded predictions must be the same.
+'''
+
+import argparse
+import os
+import time
+
+os.environ.setdefault("CUDA_VISIBLE_DEVICES", "")
+
+import numpy as np
+from keras import backend as K
+
+from models.keras_ssd300 import ssd_300
+from ssd_encoder_decoder.anchor_set import AnchorSet
+from ssd_encoder_decoder.ssd_output_decoder import decode_detections
+
+parser = argparse.ArgumentParser(description="Time per batch and output size of predict() with and without the anchor box columns.")
+parser.add_argument("-bs", "--batchSizes", help="The batch sizes to benchmark.", type=int, nargs="+", default=[1, 8, 32])
+parser.add_argument("-nc", "--numberOfClasses", help="The number of positive classes.", type=int, default=20)
+parser.add_argument("-nb", "--numberOfBatches", help="The number of batches to time for each batch size.", type=int, default=10)
+args = parser.parse_args()
+
+img_height, img_width = 300, 300
+parameters = dict(scales=[0.1, 0.2, 0.37, 0.54, 0.71, 0.88, 1.05],
+                  aspect_ratios_per_layer=[[1.0, 2.0, 0.5],
+                                           [1.0, 2.0, 0.5, 3.0, 1.0/3.0],
+                                           [1.0, 2.0, 0.5, 3.0, 1.0/3.0],
+                                           [1.0, 2.0, 0.5, 3.0, 1.0/3.0],
+                                           [1.0, 2.0, 0.5],
+                                           [1.0, 2.0, 0.5]],
+                  two_boxes_for_ar1=True,
+                  steps=[8, 16, 32, 64, 100, 300],
+                  offsets=[0.5, 0.5, 0.5, 0.5, 0.5, 0.5],
+                  clip_boxes=False,
+                  variances=[0.1, 0.1, 0.2, 0.2],
+                  normalize_coords=True)
+
+K.clear_session()
+model, predictor_sizes = ssd_300(image_size=(img_height, img_width, 3), n_classes=args.numberOfClasses, mode='training',
+                                 return_predictor_sizes=True, **parameters)
+anchor_set = AnchorSet.get(img_height=img_height, img_width=img_width, predictor_sizes=predictor_sizes, **parameters)
+compact_model = ssd_300(image_size=(img_height, img_width, 3), n_classes=args.numberOfClasses, mode='compact',
+                        anchor_set=anchor_set, **parameters)
+compact_model.set_weights(model.get_weights())
+
+random_state = np.random.RandomState(0)
+for batch_size in args.batchSizes:
+    images = random_state.randint(0, 256, size=(batch_size, img_height, img_width, 3)).astype(np.float32)
+    times = []
+    for m in (model, compact_model):
+        m.predict(images, batch_size=batch_size) # Warm up.
+        start = time.time()
+        for _ in range(args.numberOfBatches):
+            y_pred = m.predict(images, batch_size=batch_size)
+        times.append((time.time() - start) / args.numberOfBatches)
+        if m is model:
+            y_pred_full = y_pred
+    y_pred_compact = y_pred
+
+    decoded = decode_detections(y_pred_full, confidence_thresh=0.01, img_height=img_height, img_width=img_width)
+    decoded_compact = decode_detections(y_pred_compact, confidence_thresh=0.01, img_height=img_height, img_width=img_width, anchor_set=anchor_set)
+    same = all(np.allclose(a, b) for a, b in zip(decoded, decoded_compact))
+    print("batch size {}: predict() {:.1f} ms -> {:.1f} ms ({:.1f}% less), output {:.2f} MB -> {:.2f} MB ({:.1f}% less), same detections: {}".format(
+          batch_size, times[0] * 1000, times[1] * 1000, 100 * (1 - times[1] / times[0]),
+          y_pred_full.nbytes / 1e6, y_pred_compact.nbytes / 1e6, 100 * (1 - y_pred_compact.nbytes / y_pred_full.nbytes), same))
@@ -0,0 +1,140 @@
+'''
+A spatial index of the anchor boxes of an SSD model, to find the anchor boxes that can overlap a ground truth box
+without computing its IoU similarity with all of them.
+'''
+
+from __future__ import division
+import numpy as np
+
+class AnchorIndex:
+    '''
+    Indexes the anchor boxes of every predictor layer by their grid cell and by their size.
+
+    The anchor boxes of a predictor layer form a grid of `(feature_map_height, feature_map_width)` cells with
+    `n_boxes` boxes per cell, the boxes of a given index in the cells having the same size unless they were clipped.
+    For every box index and every column of the grid, the index stores the smallest `xmin` and the largest `xmax`
+    of the boxes, and for every row the smallest `ymin` and the largest `ymax`. Made monotonic along the grid, these
+    bounds give with binary searches the range of rows and columns whose boxes can intersect a given box.
+
+    The candidates can further be limited to the anchor boxes whose IoU with the box can reach a given value: the IoU
+    of two boxes is at most the ratio of the smaller to the larger of their areas. This test is done once for all the
+    boxes of a given index of a layer, from the range of their areas. The intersection must then also be large enough,
+    which narrows the range of rows and columns.
+    '''
+
+    def __init__(self, boxes_list, border_pixels='half'):
+        '''
+        Arguments:
+            boxes_list (list): The anchor boxes of every predictor layer in the format `(xmin, ymin, xmax, ymax)`,
+                arrays of shape `(feature_map_height, feature_map_width, n_boxes, 4)` in the order of the model output.
+            border_pixels (str, optional): How the IoU similarities treat the border pixels of the boxes, see `iou()`.
+                The bound on the IoU from the areas does not hold with 'exclude', for which it is not used.
+        '''
+        if border_pixels == 'half':
+            self.d = 0
+        elif border_pixels == 'include':
+            self.d = 1
+        elif border_pixels == 'exclude':
+            self.d = -1
+
+        # One entry for every box index of every predictor layer.
+        self.slots = []
+        offset = 0
+        for boxes in boxes_list:
+            height, width, n_boxes = boxes.shape[:3]
+            areas = (boxes[:,:,:,2] - boxes[:,:,:,0] + self.d) * (boxes[:,:,:,3] - boxes[:,:,:,1] + self.d)
+            for k in range(n_boxes):
+                # The suffix minimum of the lower bounds and the prefix maximum of the upper bounds are nondecreasing,
+                # also when the anchor boxes were clipped to the image.
+                column_xmin = np.minimum.accumulate(np.amin(boxes[:,:,k,0], axis=0)[::-1])[::-1]
+                column_xmax = np.maximum.accumulate(np.amax(boxes[:,:,k,2], axis=0))
+                row_ymin = np.minimum.accumulate(np.amin(boxes[:,:,k,1], axis=1)[::-1])[::-1]
+                row_ymax = np.maximum.accumulate(np.amax(boxes[:,:,k,3], axis=1))
+                self.slots.append({'first_anchor': offset + k,
+                                   'width': width,
+                                   'n_boxes': n_boxes,
+                                   'column_xmin': column_xmin,
+                                   'column_xmax': column_xmax,
+                                   'row_ymin': row_ymin,
+                                   'row_ymax': row_ymax,
+                                   'min_area': np.amin(areas[:,:,k]),
+                                   'max_area': np.amax(areas[:,:,k]),
+                                   'max_width': np.amax(boxes[:,:,k,2] - boxes[:,:,k,0]) + self.d,
+                                   'max_height': np.amax(boxes[:,:,k,3] - boxes[:,:,k,1]) + self.d})
+            offset += height * width * n_boxes
+
+        self.n_anchors = offset
+
+    def candidates(self, boxes, valid, min_iou=0):
+        '''
+        Finds the anchor boxes that can overlap the given boxes of every batch item.
+
+        Every anchor box that intersects a valid box and whose IoU with that box can be at least the `min_iou` of the box
+        is a candidate for the box. Candidates may have a lower IoU with the box.
+
+        Arguments:
+            boxes (array): An array of shape `(batch_size, m, 4)` of boxes in the format `(xmin, ymin, xmax, ymax)`,
+                with the same coordinate scale as the anchor boxes.
+            valid (array): A boolean array of shape `(batch_size, m)` of the boxes to consider.
+            min_iou (float or array, optional): The IoU that the candidates must be able to reach, either for all
+                boxes or as an array of shape `(batch_size, m)` with one value per box.
+
+        Returns:
+            Three int64 arrays of the same length with, for every candidate of every box, the batch item and the index
+            of the box and the index of the anchor box. The candidates of a box are unique.
+        '''
+        items, box_indices = np.nonzero(valid)
+        boxes = boxes[items, box_indices]
+        areas = (boxes[:,2] - boxes[:,0] + self.d) * (boxes[:,3] - boxes[:,1] + self.d)
+        # The ratio of the areas that the candidates of every box must reach, with a margin for the rounding errors
+        # of the IoU similarities so that no candidate is missed.
+        min_ratios = np.broadcast_to(min_iou, valid.shape)[items, box_indices] * (1 - 1e-6)
+        use_areas = self.d >= 0 and np.any(min_ratios > 0)
+
+        # The range of grid cells of every box for every box index of every layer, found one box index at a time.
+        owners, first_anchors, strides, n_boxes, first_columns, n_columns, first_rows, n_rows = [], [], [], [], [], [], [], []
+        for slot in self.slots:
+
+            if use_areas:
+                # The largest ratio of the area of a box to the areas of the anchor boxes must reach `min_ratios`.
+                slot_owners = np.nonzero(np.minimum(areas, slot['max_area']) >= min_ratios * np.maximum(areas, slot['min_area']))[0]
+            else:
+                slot_owners = np.arange(len(boxes))
+            slot_boxes = boxes[slot_owners]
+
+            if use_areas:
+                # The intersection is at least `min_ratios` times the larger area, so the overlap of the sides of
+                # the boxes must be at least that area divided by the longest possible overlap of the other sides.
+                slot_ratios = min_ratios[slot_owners] * np.maximum(areas[slot_owners], slot['min_area'])
+                x_overlaps = slot_ratios / np.minimum(slot_boxes[:,3] - slot_boxes[:,1] + self.d, slot['max_height']) - self.d
+                y_overlaps = slot_ratios / np.minimum(slot_boxes[:,2] - slot_boxes[:,0] + self.d, slot['max_width']) - self.d
+            else:
+                x_overlaps = y_overlaps = 0
+
+            first_column = np.searchsorted(slot['column_xmax'], slot_boxes[:,0] + x_overlaps, side='left')
+            last_column = np.searchsorted(slot['column_xmin'], slot_boxes[:,2] - x_overlaps, side='right')
+            first_row = np.searchsorted(slot['row_ymax'], slot_boxes[:,1] + y_overlaps, side='left')
+            last_row = np.searchsorted(slot['row_ymin'], slot_boxes[:,3] - y_overlaps, side='right')
+
+            owners.append(slot_owners)
+            first_anchors.append(np.full(len(slot_owners), slot['first_anchor']))
+            strides.append(np.full(len(slot_owners), slot['width']))
+            n_boxes.append(np.full(len(slot_owners), slot['n_boxes']))
+            first_columns.append(first_column)
+            n_columns.append(np.maximum(last_column - first_column, 0))
+            first_rows.append(first_row)
+            n_rows.append(np.maximum(last_row - first_row, 0))
+
+        owners, first_anchors, strides, n_boxes, first_columns, n_columns, first_rows, n_rows = [np.concatenate(values) for values in
+            (owners, first_anchors, strides, n_boxes, first_columns, n_columns, first_rows, n_rows)]
+
+        # The anchor boxes of all the ranges of grid cells.
+        n_cells = n_rows * n_columns
+        ranges = np.repeat(np.arange(len(owners)), n_cells)
+        positions = np.arange(len(ranges)) - np.repeat(np.cumsum(n_cells) - n_cells, n_cells)
+        rows = first_rows[ranges] + positions // n_columns[ranges]
+        columns = first_columns[ranges] + positions % n_columns[ranges]
+        anchors = first_anchors[ranges] + (rows * strides[ranges] + columns) * n_boxes[ranges]
+
+        owners = owners[ranges]
+        return items[owners], box_indices[owners], anchors
@@ -33,9 +33,15 @@ def match_bipartite_greedy(weight_matrix):
     with any of the remaining anchor boxes will be matched second, and
     so on. That is, the ground truth boxes will be matched in descending
     order by maximum similarity with any of the respectively remaining
-    anchor boxes.
-    The runtime complexity is O(m^2 * n), where `m` is the number of
-    ground truth boxes and `n` is the number of anchor boxes.
+    anchor boxes. Ties go to the ground truth box and then to the anchor
+    box with the lowest index.
+
+    Instead of setting the column of the matched anchor box to zero and
+    reducing over the whole weight matrix in every round, the best anchor box
+    of every ground truth box is kept: Setting a column to zero only changes
+    the best anchor box of the ground truth boxes whose best anchor box it was,
+    or that have a negative weight in it, and only their rows are reduced again.
+    The runtime complexity is O(m * n) plus O(n) for every such row.
 
     Arguments:
         weight_matrix (array): A 2D Numpy array that represents the weight matrix
@@ -50,31 +56,47 @@ def match_bipartite_greedy(weight_matrix):
         along the first axis.
     '''
 
-    weight_matrix = np.copy(weight_matrix) # We'll modify this array.
     num_ground_truth_boxes = weight_matrix.shape[0]
     all_gt_indices = list(range(num_ground_truth_boxes)) # Only relevant for fancy-indexing below.
 
     # This 1D array will contain for each ground truth box the index of
     # the matched anchor box.
-    matches = np.zeros(num_ground_truth_boxes, dtype=np.int)
+    matches = np.zeros(num_ground_truth_boxes, dtype=np.int64)
+    if num_ground_truth_boxes == 0:
+        return matches
+
+    # The best anchor box of every ground truth box and its weight, with the rows of the
+    # matched ground truth boxes and the columns of the matched anchor boxes set to zero.
+    anchor_indices = np.argmax(weight_matrix, axis=1) # Reduce along the anchor box axis.
+    overlaps = weight_matrix[all_gt_indices, anchor_indices]
+    matched = np.zeros(num_ground_truth_boxes, dtype=np.bool_)
+    matched_anchors = []
 
     # In each iteration of the loop below, exactly one ground truth box
     # will be matched to one anchor box.
     for _ in range(num_ground_truth_boxes):
 
-        # Find the maximal anchor-ground truth pair in two steps: First, reduce
-        # over the anchor boxes and then reduce over the ground truth boxes.
-        anchor_indices = np.argmax(weight_matrix, axis=1) # Reduce along the anchor box axis.
-        overlaps = weight_matrix[all_gt_indices, anchor_indices]
-        ground_truth_index = np.argmax(overlaps) # Reduce along the ground truth box axis.
+        # Reduce over the ground truth boxes.
+        ground_truth_index = np.argmax(overlaps)
         anchor_index = anchor_indices[ground_truth_index]
         matches[ground_truth_index] = anchor_index # Set the match.
 
-        # Set the row of the matched ground truth box and the column of the matched
-        # anchor box to all zeros. This ensures that those boxes will not be matched again,
-        # because they will never be the best matches for any other boxes.
-        weight_matrix[ground_truth_index] = 0
-        weight_matrix[:,anchor_index] = 0
+        # The row of the matched ground truth box is all zeros from now on. A ground truth
+        # box that was already matched may be matched again once no weight is positive.
+        matched[ground_truth_index] = True
+        anchor_indices[ground_truth_index] = 0
+        overlaps[ground_truth_index] = 0
+        if not anchor_index in matched_anchors:
+            matched_anchors.append(anchor_index)
+
+        # Reduce again the rows whose best anchor box changes when the column of the matched
+        # anchor box is set to zero.
+        stale = np.nonzero(~matched & ((anchor_indices == anchor_index) | (weight_matrix[:, anchor_index] < 0)))[0]
+        if len(stale) > 0:
+            rows = weight_matrix[stale] # A copy, since `stale` is an integer array.
+            rows[:, matched_anchors] = 0
+            anchor_indices[stale] = np.argmax(rows, axis=1)
+            overlaps[stale] = rows[np.arange(len(stale)), anchor_indices[stale]]
 
     return matches
 
@@ -0,0 +1,159 @@
+'''
+Greedy non-maximum suppression that sorts the boxes once and only marks the suppressed boxes, for the decoders.
+'''
+
+from __future__ import division
+import numpy as np
+
+from bounding_box_utils.bounding_box_utils import convert_coordinates
+
+def greedy_nms_indices(boxes, scores, iou_threshold=0.45, coords='corners', border_pixels='half', block_size=256, groups=None):
+    '''
+    Returns the indices of the boxes that greedy non-maximum suppression keeps, in the order in which it selects them.
+
+    Greedy NMS selects the box with the highest score, removes all boxes whose IoU similarity with it is greater
+    than `iou_threshold`, and repeats with the boxes that are left over. The boxes are sorted once by decreasing
+    score, ties in the order of `boxes` as with `np.argmax`, so a box can only be removed by the boxes before it.
+    The sorted boxes are processed in blocks of `block_size` boxes: the boxes of a block are first compared with
+    the boxes selected in the previous blocks in one IoU matrix, then the boxes left in the block with each other
+    in another one, from which the selection within the block only reads. The suppressed boxes are marked in
+    a mask, no box array is copied or shrunk during the selection, and the boxes of a block that overlap no other
+    box of the block are selected without visiting them one by one.
+
+    The IoU similarities are computed as by `iou()`, so that the same boxes are selected as when comparing the
+    boxes left with `iou()` round after round.
+
+    If `groups` is given, the boxes of each group are suppressed independently of the other groups, as if greedy
+    NMS was run on each group separately, but in one call for all groups: the boxes are sorted by group first.
+    The groups of more than `block_size` boxes are processed in blocks one after the other, the smaller groups
+    many at once, padded to the same number of boxes, with one IoU matrix per group and one greedy selection
+    for all of them.
+
+    Arguments:
+        boxes (array): An array of shape `(n, 4)` of boxes in the format `coords`.
+        scores (array): An array of shape `(n,)` of the scores of the boxes.
+        iou_threshold (float, optional): Boxes with an IoU similarity greater than `iou_threshold` with a selected
+            box are removed. Like boxes with an undefined IoU similarity, as between two boxes without area.
+        coords (str, optional): The coordinate format of `boxes`, one of the formats supported by `iou()`.
+        border_pixels (str, optional): How to treat the border pixels of the bounding boxes, see `iou()`.
+        block_size (int, optional): The number of sorted boxes processed at once.
+        groups (array, optional): An integer array of shape `(n,)` of the groups of the boxes, for example
+            their class IDs.
+
+    Returns:
+        An int64 array of the indices of the selected boxes in `boxes`, in the order of selection. If `groups`
+        is given, the selected boxes are ordered by increasing group, in the order of selection within each group.
+    '''
+    if coords == 'centroids':
+        boxes = convert_coordinates(boxes, start_index=0, conversion='centroids2corners')
+        coords = 'corners'
+    if coords == 'corners':
+        xmin, ymin, xmax, ymax = 0, 1, 2, 3
+    elif coords == 'minmax':
+        xmin, xmax, ymin, ymax = 0, 1, 2, 3
+    else:
+        raise ValueError("Unexpected value for `coords`. Supported values are 'minmax', 'corners' and 'centroids'.")
+
+    if border_pixels == 'half':
+        d = 0
+    elif border_pixels == 'include':
+        d = 1
+    elif border_pixels == 'exclude':
+        d = -1
+
+    if groups is None:
+        order = np.argsort(-scores, kind='stable')
+    else:
+        order = np.lexsort((-scores, groups))
+    boxes = boxes[order]
+    n_boxes = boxes.shape[0]
+
+    # The coordinates and areas of the sorted boxes, computed once.
+    x1, y1, x2, y2 = [np.ascontiguousarray(boxes[:,k]) for k in (xmin, ymin, xmax, ymax)]
+    areas = (x2 - x1 + d) * (y2 - y1 + d)
+
+    def pair_overlaps(rows, columns):
+        # Whether the IoU similarities of the pairs of boxes `rows` and `columns` do not stay within `iou_threshold`.
+        # The intersection areas do not depend on `border_pixels`, as in `iou()`.
+        widths = np.maximum(0, np.minimum(x2[rows], x2[columns]) - np.maximum(x1[rows], x1[columns]))
+        heights = np.maximum(0, np.minimum(y2[rows], y2[columns]) - np.maximum(y1[rows], y1[columns]))
+        intersections = widths * heights
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return ~(intersections / (areas[rows] + areas[columns] - intersections) <= iou_threshold)
+
+    # Boxes that do not intersect have an IoU similarity of zero if their areas are positive, so with a threshold
+    # of at least zero, only the IoU similarities of the intersecting boxes need to be computed.
+    intersecting_only = iou_threshold >= 0 and np.all(areas > 0)
+
+    def overlaps(rows, columns):
+        # The `pair_overlaps()` of the boxes `rows` and `columns`, two index arrays broadcast against each other.
+        if not intersecting_only:
+            return pair_overlaps(rows, columns)
+        intersecting = ((x1[rows] < x2[columns]) & (x1[columns] < x2[rows]) &
+                        (y1[rows] < y2[columns]) & (y1[columns] < y2[rows]))
+        pairs = np.nonzero(intersecting)
+        intersecting[pairs] = pair_overlaps(np.broadcast_to(rows, intersecting.shape)[pairs], np.broadcast_to(columns, intersecting.shape)[pairs])
+        return intersecting
+
+    def select_blocks(first, last):
+        # The positions of the boxes selected among the sorted boxes `first` to `last - 1`, in increasing order.
+        suppressed = np.zeros(last - first, dtype=np.bool_)
+        maxima = []
+        for start in range(first, last, block_size):
+            stop = min(start + block_size, last)
+
+            # Remove the boxes of the block that overlap a box selected in a previous block.
+            if maxima:
+                suppressed[start-first:stop-first] = np.any(overlaps(np.array(maxima)[:,np.newaxis], np.arange(start, stop)), axis=0)
+
+            # Select the boxes left in the block in order, each one removing the following boxes that overlap it.
+            # The overlaps are symmetric, and a box that overlaps no other box of the block is always selected,
+            # so only the boxes that overlap another one are visited in order.
+            candidates = start + np.flatnonzero(~suppressed[start-first:stop-first])
+            if len(candidates) == 0:
+                continue
+            candidate_overlaps = overlaps(candidates[:,np.newaxis], candidates)
+            np.fill_diagonal(candidate_overlaps, False)
+            removed = np.zeros(len(candidates), dtype=np.bool_)
+            for i in np.flatnonzero(np.any(candidate_overlaps, axis=1)):
+                if not removed[i]:
+                    removed[i+1:] |= candidate_overlaps[i,i+1:]
+            maxima.extend(candidates[~removed])
+        return maxima
+
+    if groups is None:
+        return order[np.array(select_blocks(0, n_boxes), dtype=np.int64)]
+
+    groups = groups[order]
+    group_starts = np.flatnonzero(np.r_[True, groups[1:] != groups[:-1]]) if n_boxes > 0 else np.zeros(0, dtype=np.int64)
+    group_sizes = np.diff(np.r_[group_starts, n_boxes])
+    selected = np.zeros(n_boxes, dtype=np.bool_)
+
+    # The groups of more than `block_size` boxes are processed one after the other, in blocks.
+    for first, size in zip(group_starts[group_sizes > block_size], group_sizes[group_sizes > block_size]):
+        selected[select_blocks(first, first + size)] = True
+
+    # The smaller groups are processed together, sorted by size, as many at once as fit in 16 blocks of box pairs:
+    # the boxes of each group are padded to the size of the largest group, and the greedy selection goes through
+    # the sorted positions once for all groups. The padding boxes are removed from the start.
+    small_groups = np.flatnonzero(group_sizes <= block_size)
+    small_groups = small_groups[np.argsort(group_sizes[small_groups], kind='stable')]
+    first_group = 0
+    while first_group < len(small_groups):
+        size = group_sizes[small_groups[first_group]]
+        last_group = first_group + 1
+        while last_group < len(small_groups) and (last_group - first_group + 1) * group_sizes[small_groups[last_group]] ** 2 <= 16 * block_size ** 2:
+            size = group_sizes[small_groups[last_group]]
+            last_group += 1
+        chunk = small_groups[first_group:last_group]
+        first_group = last_group
+
+        padding = np.arange(size) >= group_sizes[chunk,np.newaxis] # The positions after the end of each group, of shape `(groups, size)`
+        positions = np.where(padding, group_starts[chunk,np.newaxis], group_starts[chunk,np.newaxis] + np.arange(size))
+        chunk_overlaps = overlaps(positions[:,:,np.newaxis], positions[:,np.newaxis,:])
+        removed = padding.copy()
+        for k in range(size - 1):
+            removed[:,k+1:] |= chunk_overlaps[:,k,k+1:] & ~removed[:,k,np.newaxis]
+        selected[positions[~removed]] = True
+
+    return order[np.flatnonzero(selected)]
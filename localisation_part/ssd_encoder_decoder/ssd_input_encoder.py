@@ -19,8 +19,37 @@ limitations under the License.
 from __future__ import division
 import numpy as np
 
-from bounding_box_utils.bounding_box_utils import iou, convert_coordinates
+from bounding_box_utils.bounding_box_utils import iou, iou_batch, convert_coordinates
 from ssd_encoder_decoder.matching_utils import match_bipartite_greedy, match_multi
+from ssd_encoder_decoder.anchor_index import AnchorIndex
+from ssd_encoder_decoder.anchor_set import AnchorSet, generate_anchor_boxes_for_layer
+from data_generator.object_detection_2d_batch_buffers import BatchBufferRing
+
+# The batched matching processes the batch items in chunks whose IoU similarities take at most about this many bytes.
+# The whole batch at once is slower, since its arrays of shape `(batch_size, max_n_ground_truth, #boxes)` do not fit in the CPU caches.
+BATCH_SIMILARITIES_BYTES = 4 * 1024 ** 2
+
+def _segment_indices(starts, stops):
+    '''
+    Returns the indices of the concatenated ranges `[start, stop)`.
+    '''
+    lengths = stops - starts
+    return np.arange(lengths.sum()) + np.repeat(starts - (np.cumsum(lengths) - lengths), lengths)
+
+def _segment_argmax(values, lengths):
+    '''
+    Returns the maximum of every segment of `values`, whose lengths are `lengths`, and the index in `values` of its first
+    occurrence, zero and -1 for the empty segments. The values must not be negative.
+    '''
+    maxima = np.zeros(len(lengths))
+    first_indices = np.full(len(lengths), -1, dtype=np.int64)
+    non_empty = np.nonzero(lengths)[0]
+    if len(non_empty) > 0:
+        offsets = (np.cumsum(lengths) - lengths)[non_empty]
+        maxima[non_empty] = np.maximum.reduceat(values, offsets)
+        is_maximum = values == np.repeat(maxima, lengths)
+        first_indices[non_empty] = np.minimum.reduceat(np.where(is_maximum, np.arange(len(values)), len(values)), offsets)
+    return maxima, first_indices
 
 class SSDInputEncoder:
     '''
@@ -54,7 +83,15 @@ class SSDInputEncoder:
                  border_pixels='half',
                  coords='centroids',
                  normalize_coords=True,
-                 background_id=0):
+                 background_id=0,
+                 batched=False,
+                 index_anchors=False,
+                 iou_dtype=np.float64,
+                 dtype=np.float64,
+                 sparse_targets=False,
+                 sparse_dtype=np.float16,
+                 buffer_ring_size=0,
+                 anchor_set=None):
         '''
         Arguments:
             img_height (int): The height of the input images.
@@ -130,6 +167,31 @@ class SSDInputEncoder:
                 This means instead of using absolute tartget coordinates, the encoder will scale all coordinates to be within [0,1].
                 This way learning becomes independent of the input image size.
             background_id (int, optional): Determines which class ID is for the background class.
+            batched (bool, optional): If `True`, the ground truth boxes of all batch items are matched at once
+                by `match_batch()`, otherwise they are matched one batch item after the other. Both give the same
+                targets, the batched matching is faster. Defaults to `False`, the training scripts enable it.
+            index_anchors (bool, optional): If `True`, the batched matching computes the IoU similarities of the ground
+                truth boxes of every batch item only with the anchor boxes that can overlap them enough to be matched or
+                neutral, found by an `AnchorIndex` built once. The targets are the same, the matching is faster, in particular
+                with many small ground truth boxes. Not used if `pos_iou_threshold` or `neg_iou_limit` is not positive,
+                nor with an `iou_dtype` other than `np.float64`, whose rounding errors on small boxes could make an anchor
+                box that the index leaves out win a tie. Defaults to `False`.
+            iou_dtype (type, optional): The floating point type of the IoU similarities of the batched matching.
+                With `np.float32`, the similarities take half the memory and time, but IoU values that are equal or
+                very close to `pos_iou_threshold` or `neg_iou_limit` may be rounded to the other side of the threshold,
+                and close values may become ties, so the targets may differ slightly from the ones of `np.float64`.
+            dtype (type, optional): The floating point type of the encoded labels. The matching is always done on
+                float64 boxes, but with `np.float32` the anchor box offsets are computed in float32.
+            sparse_targets (bool, optional): If `True`, the encoded labels are returned in the sparse format of
+                `sparse_encoding()`, to be used with `SSDLoss(sparse_targets=True)`. In float16, they are about
+                25 times smaller than the float64 labels.
+            sparse_dtype (type, optional): The floating point type of the labels in the sparse format. With
+                `np.float16`, the class IDs are exact but the anchor box offsets are rounded to about three decimals.
+            buffer_ring_size (int, optional): If greater than 0, the labels are encoded in place into a ring of that many
+                preallocated batch buffers instead of a new array for every batch. See `BatchBufferRing` for the size to use.
+            anchor_set (AnchorSet, optional): The anchor boxes, which must have been built for the same configuration,
+                e.g. the anchor set of the model. If `None`, the anchor set of the configuration is taken from
+                `AnchorSet.get()`, built only once per configuration.
         '''
         predictor_sizes = np.array(predictor_sizes)
         if predictor_sizes.ndim == 1:
@@ -223,6 +285,14 @@ class SSDInputEncoder:
         self.coords = coords
         self.normalize_coords = normalize_coords
         self.background_id = background_id
+        self.batched = batched
+        self.index_anchors = index_anchors
+        self.iou_dtype = iou_dtype
+        self.dtype = dtype
+        self.sparse_targets = sparse_targets
+        self.sparse_dtype = sparse_dtype
+        self.buffer_ring_size = buffer_ring_size
+        self.buffer_ring = None # Built on the first batch, since it depends on the batch size.
 
         # Compute the number of boxes per spatial location for each predictor layer.
         # For example, if a predictor layer has three different aspect ratios, [1.0, 0.5, 2.0], and is
@@ -250,29 +320,50 @@ class SSDInputEncoder:
         # For each predictor layer (i.e. for each scaling factor) the tensors for that layer's
         # anchor boxes will have the shape `(feature_map_height, feature_map_width, n_boxes, 4)`.
 
-        self.boxes_list = [] # This will store the anchor boxes for each predicotr layer.
+        # The anchor boxes are shared with the other encoders, the model layers and the decoders of the same configuration.
+        anchor_config = AnchorSet.configuration(self.img_height, self.img_width, self.predictor_sizes, self.scales, self.aspect_ratios,
+                                                self.two_boxes_for_ar1, self.steps, self.offsets, self.clip_boxes, self.variances,
+                                                self.coords, self.normalize_coords)
+        if anchor_set is None:
+            anchor_set = AnchorSet.get(**anchor_config)
+        else:
+            anchor_set.check(anchor_config)
+        self.anchor_set = anchor_set
+
+        self.boxes_list = anchor_set.boxes_list # The anchor boxes for each predictor layer.
 
         # The following lists just store diagnostic information. Sometimes it's handy to have the
         # boxes' center points, heights, widths, etc. in a list.
-        self.wh_list_diag = [] # Box widths and heights for each predictor layer
-        self.steps_diag = [] # Horizontal and vertical distances between any two boxes for each predictor layer
-        self.offsets_diag = [] # Offsets for each predictor layer
-        self.centers_diag = [] # Anchor box center points as `(cy, cx)` for each predictor layer
-
-        # Iterate over all predictor layers and compute the anchor boxes for each one.
-        for i in range(len(self.predictor_sizes)):
-            boxes, center, wh, step, offset = self.generate_anchor_boxes_for_layer(feature_map_size=self.predictor_sizes[i],
-                                                                                   aspect_ratios=self.aspect_ratios[i],
-                                                                                   this_scale=self.scales[i],
-                                                                                   next_scale=self.scales[i+1],
-                                                                                   this_steps=self.steps[i],
-                                                                                   this_offsets=self.offsets[i],
-                                                                                   diagnostics=True)
-            self.boxes_list.append(boxes)
-            self.wh_list_diag.append(wh)
-            self.steps_diag.append(step)
-            self.offsets_diag.append(offset)
-            self.centers_diag.append(center)
+        self.wh_list_diag = anchor_set.wh_list_diag # Box widths and heights for each predictor layer
+        self.steps_diag = anchor_set.steps_diag # Horizontal and vertical distances between any two boxes for each predictor layer
+        self.offsets_diag = anchor_set.offsets_diag # Offsets for each predictor layer
+        self.centers_diag = anchor_set.centers_diag # Anchor box center points as `(cy, cx)` for each predictor layer
+
+        # The part of the encoding template that is the same for all images and all batches: the anchor boxes, the
+        # anchor boxes again as a space filler (see `generate_encoding_template()`) and the variances, of shape `(#boxes, 12)`.
+        anchor_boxes = anchor_set.anchor_boxes
+        self.anchor_template = np.concatenate([anchor_boxes, anchor_boxes, np.tile(self.variances, (len(anchor_boxes), 1))], axis=1)
+        self.class_vectors = np.eye(self.n_classes) # An identity matrix that we'll use as one-hot class vectors
+
+        # The anchor boxes with an IoU below both `pos_iou_threshold` and `neg_iou_limit` with all ground truth boxes
+        # do not need to be matched, see `_match_indexed()`. The index finds the others from the corners of the anchor
+        # boxes, computed as `iou()` computes them.
+        if self.matching_type == 'multi':
+            self.anchor_index_min_iou = min(self.pos_iou_threshold, self.neg_iou_limit)
+        else:
+            self.anchor_index_min_iou = self.neg_iou_limit
+        if self.index_anchors and self.anchor_index_min_iou > 0 and np.dtype(self.iou_dtype) == np.float64:
+            if self.coords == 'centroids':
+                anchor_corners = convert_coordinates(anchor_boxes, start_index=0, conversion='centroids2corners')
+            elif self.coords == 'minmax':
+                anchor_corners = anchor_boxes[:,[0,2,1,3]]
+            else:
+                anchor_corners = anchor_boxes
+            layer_ends = np.cumsum([boxes[...,0].size for boxes in self.boxes_list])
+            self.anchor_index = AnchorIndex([np.reshape(layer_corners, boxes.shape) for layer_corners, boxes in zip(np.split(anchor_corners, layer_ends[:-1]), self.boxes_list)],
+                                            border_pixels=self.border_pixels)
+        else:
+            self.anchor_index = None
 
     def __call__(self, ground_truth_labels, diagnostics=False):
         '''
@@ -294,7 +385,8 @@ class SSDInputEncoder:
             ground truth label tensor for training, where `#boxes` is the total number of boxes predicted by the
             model per image, and the classes are one-hot-encoded. The four elements after the class vecotrs in
             the last axis are the box coordinates, the next four elements after that are just dummy elements, and
-            the last four elements are the variances.
+            the last four elements are the variances. With `sparse_targets`, `y_encoded` is in the format of
+            `sparse_encoding()` instead, while the copy of the diagnostics is in the format above.
         '''
 
         # Mapping to define which indices represent which coordinates in the ground truth.
@@ -310,7 +402,19 @@ class SSDInputEncoder:
         # Generate the template for y_encoded.
         ##################################################################################
 
-        y_encoded = self.generate_encoding_template(batch_size=batch_size, diagnostics=False)
+        if self.buffer_ring_size > 0:
+            if self.buffer_ring is None or len(self.buffer_ring.buffers[0][0]) < batch_size:
+                shapes = [(batch_size, len(self.anchor_template), self.n_classes + 12)]
+                dtypes = [self.dtype]
+                if self.sparse_targets:
+                    shapes.append((batch_size, len(self.anchor_template), 5))
+                    dtypes.append(self.sparse_dtype)
+                self.buffer_ring = BatchBufferRing(self.buffer_ring_size, shapes, dtypes)
+            buffers = self.buffer_ring.get(batch_size)
+            y_encoded = self.generate_encoding_template(batch_size=batch_size, out=buffers[0])
+        else:
+            buffers = None
+            y_encoded = self.generate_encoding_template(batch_size=batch_size)
 
         ##################################################################################
         # Match ground truth boxes to anchor boxes.
@@ -322,101 +426,518 @@ class SSDInputEncoder:
 
         y_encoded[:, :, self.background_id] = 1 # All boxes are background boxes by default.
         n_boxes = y_encoded.shape[1] # The total number of boxes that the model predicts per batch item
-        class_vectors = np.eye(self.n_classes) # An identity matrix that we'll use as one-hot class vectors
+        class_vectors = self.class_vectors # An identity matrix that we'll use as one-hot class vectors
 
-        for i in range(batch_size): # For each batch item...
+        if self.batched:
+            self.match_batch(y_encoded, ground_truth_labels, class_vectors)
+        else:
+            for i in range(batch_size): # For each batch item...
 
-            if ground_truth_labels[i].size == 0: continue # If there is no ground truth for this batch item, there is nothing to match.
-            labels = ground_truth_labels[i].astype(np.float) # The labels for this batch item
+                if ground_truth_labels[i].size == 0: continue # If there is no ground truth for this batch item, there is nothing to match.
+                labels = ground_truth_labels[i].astype(np.float64) # The labels for this batch item
 
-            # Check for degenerate ground truth bounding boxes before attempting any computations.
-            if np.any(labels[:,[xmax]] - labels[:,[xmin]] <= 0) or np.any(labels[:,[ymax]] - labels[:,[ymin]] <= 0):
-                raise DegenerateBoxError("SSDInputEncoder detected degenerate ground truth bounding boxes for batch item {} with bounding boxes {}, ".format(i, labels) +
-                                         "i.e. bounding boxes where xmax <= xmin and/or ymax <= ymin. Degenerate ground truth " +
-                                         "bounding boxes will lead to NaN errors during the training.")
+                # Check for degenerate ground truth bounding boxes before attempting any computations.
+                if np.any(labels[:,[xmax]] - labels[:,[xmin]] <= 0) or np.any(labels[:,[ymax]] - labels[:,[ymin]] <= 0):
+                    raise DegenerateBoxError("SSDInputEncoder detected degenerate ground truth bounding boxes for batch item {} with bounding boxes {}, ".format(i, labels) +
+                                             "i.e. bounding boxes where xmax <= xmin and/or ymax <= ymin. Degenerate ground truth " +
+                                             "bounding boxes will lead to NaN errors during the training.")
 
-            # Maybe normalize the box coordinates.
-            if self.normalize_coords:
-                labels[:,[ymin,ymax]] /= self.img_height # Normalize ymin and ymax relative to the image height
-                labels[:,[xmin,xmax]] /= self.img_width # Normalize xmin and xmax relative to the image width
+                # Maybe normalize the box coordinates.
+                if self.normalize_coords:
+                    labels[:,[ymin,ymax]] /= self.img_height # Normalize ymin and ymax relative to the image height
+                    labels[:,[xmin,xmax]] /= self.img_width # Normalize xmin and xmax relative to the image width
 
-            # Maybe convert the box coordinate format.
-            if self.coords == 'centroids':
-                labels = convert_coordinates(labels, start_index=xmin, conversion='corners2centroids', border_pixels=self.border_pixels)
-            elif self.coords == 'minmax':
-                labels = convert_coordinates(labels, start_index=xmin, conversion='corners2minmax')
+                # Maybe convert the box coordinate format.
+                if self.coords == 'centroids':
+                    labels = convert_coordinates(labels, start_index=xmin, conversion='corners2centroids', border_pixels=self.border_pixels)
+                elif self.coords == 'minmax':
+                    labels = convert_coordinates(labels, start_index=xmin, conversion='corners2minmax')
 
-            classes_one_hot = class_vectors[labels[:, class_id].astype(np.int)] # The one-hot class IDs for the ground truth boxes of this batch item
-            labels_one_hot = np.concatenate([classes_one_hot, labels[:, [xmin,ymin,xmax,ymax]]], axis=-1) # The one-hot version of the labels for this batch item
+                classes_one_hot = class_vectors[labels[:, class_id].astype(np.int64)] # The one-hot class IDs for the ground truth boxes of this batch item
+                labels_one_hot = np.concatenate([classes_one_hot, labels[:, [xmin,ymin,xmax,ymax]]], axis=-1) # The one-hot version of the labels for this batch item
 
-            # Compute the IoU similarities between all anchor boxes and all ground truth boxes for this batch item.
-            # This is a matrix of shape `(num_ground_truth_boxes, num_anchor_boxes)`.
-            similarities = iou(labels[:,[xmin,ymin,xmax,ymax]], y_encoded[i,:,-12:-8], coords=self.coords, mode='outer_product', border_pixels=self.border_pixels)
+                # Compute the IoU similarities between all anchor boxes and all ground truth boxes for this batch item.
+                # This is a matrix of shape `(num_ground_truth_boxes, num_anchor_boxes)`.
+                similarities = iou(labels[:,[xmin,ymin,xmax,ymax]], self.anchor_template[:,:4], coords=self.coords, mode='outer_product', border_pixels=self.border_pixels)
 
-            # First: Do bipartite matching, i.e. match each ground truth box to the one anchor box with the highest IoU.
-            #        This ensures that each ground truth box will have at least one good match.
+                # First: Do bipartite matching, i.e. match each ground truth box to the one anchor box with the highest IoU.
+                #        This ensures that each ground truth box will have at least one good match.
 
-            # For each ground truth box, get the anchor box to match with it.
-            bipartite_matches = match_bipartite_greedy(weight_matrix=similarities)
+                # For each ground truth box, get the anchor box to match with it.
+                bipartite_matches = match_bipartite_greedy(weight_matrix=similarities)
 
-            # Write the ground truth data to the matched anchor boxes.
-            y_encoded[i, bipartite_matches, :-8] = labels_one_hot
+                # Write the ground truth data to the matched anchor boxes.
+                y_encoded[i, bipartite_matches, :-8] = labels_one_hot
 
-            # Set the columns of the matched anchor boxes to zero to indicate that they were matched.
-            similarities[:, bipartite_matches] = 0
+                # Set the columns of the matched anchor boxes to zero to indicate that they were matched.
+                similarities[:, bipartite_matches] = 0
 
-            # Second: Maybe do 'multi' matching, where each remaining anchor box will be matched to its most similar
-            #         ground truth box with an IoU of at least `pos_iou_threshold`, or not matched if there is no
-            #         such ground truth box.
+                # Second: Maybe do 'multi' matching, where each remaining anchor box will be matched to its most similar
+                #         ground truth box with an IoU of at least `pos_iou_threshold`, or not matched if there is no
+                #         such ground truth box.
 
-            if self.matching_type == 'multi':
+                if self.matching_type == 'multi':
 
-                # Get all matches that satisfy the IoU threshold.
-                matches = match_multi(weight_matrix=similarities, threshold=self.pos_iou_threshold)
+                    # Get all matches that satisfy the IoU threshold.
+                    matches = match_multi(weight_matrix=similarities, threshold=self.pos_iou_threshold)
 
-                # Write the ground truth data to the matched anchor boxes.
-                y_encoded[i, matches[1], :-8] = labels_one_hot[matches[0]]
+                    # Write the ground truth data to the matched anchor boxes.
+                    y_encoded[i, matches[1], :-8] = labels_one_hot[matches[0]]
 
-                # Set the columns of the matched anchor boxes to zero to indicate that they were matched.
-                similarities[:, matches[1]] = 0
+                    # Set the columns of the matched anchor boxes to zero to indicate that they were matched.
+                    similarities[:, matches[1]] = 0
 
-            # Third: Now after the matching is done, all negative (background) anchor boxes that have
-            #        an IoU of `neg_iou_limit` or more with any ground truth box will be set to netral,
-            #        i.e. they will no longer be background boxes. These anchors are "too close" to a
-            #        ground truth box to be valid background boxes.
+                # Third: Now after the matching is done, all negative (background) anchor boxes that have
+                #        an IoU of `neg_iou_limit` or more with any ground truth box will be set to netral,
+                #        i.e. they will no longer be background boxes. These anchors are "too close" to a
+                #        ground truth box to be valid background boxes.
 
-            max_background_similarities = np.amax(similarities, axis=0)
-            neutral_boxes = np.nonzero(max_background_similarities >= self.neg_iou_limit)[0]
-            y_encoded[i, neutral_boxes, self.background_id] = 0
+                max_background_similarities = np.amax(similarities, axis=0)
+                neutral_boxes = np.nonzero(max_background_similarities >= self.neg_iou_limit)[0]
+                y_encoded[i, neutral_boxes, self.background_id] = 0
 
         ##################################################################################
         # Convert box coordinates to anchor box offsets.
         ##################################################################################
 
+        # The ground truth coordinates of the anchor boxes that were not matched are still the anchor box coordinates of the
+        # template, so their offsets are zero and only the offsets of the anchor boxes that are not background boxes are computed.
+        # These are the matched boxes and the neutral boxes, whose offsets are zero too. The offsets are computed in float64.
+        items, anchors = np.nonzero(y_encoded[:,:,self.background_id] == 0)
+        offsets = y_encoded[items, anchors, -12:-8].astype(np.float64) # The ground truth coordinates, then the offsets
+        anchor_boxes = self.anchor_template[anchors, :4]
+        variances = self.anchor_template[anchors, 8:]
+
         if self.coords == 'centroids':
-            y_encoded[:,:,[-12,-11]] -= y_encoded[:,:,[-8,-7]] # cx(gt) - cx(anchor), cy(gt) - cy(anchor)
-            y_encoded[:,:,[-12,-11]] /= y_encoded[:,:,[-6,-5]] * y_encoded[:,:,[-4,-3]] # (cx(gt) - cx(anchor)) / w(anchor) / cx_variance, (cy(gt) - cy(anchor)) / h(anchor) / cy_variance
-            y_encoded[:,:,[-10,-9]] /= y_encoded[:,:,[-6,-5]] # w(gt) / w(anchor), h(gt) / h(anchor)
-            y_encoded[:,:,[-10,-9]] = np.log(y_encoded[:,:,[-10,-9]]) / y_encoded[:,:,[-2,-1]] # ln(w(gt) / w(anchor)) / w_variance, ln(h(gt) / h(anchor)) / h_variance (ln == natural logarithm)
+            offsets[:,[0,1]] -= anchor_boxes[:,[0,1]] # cx(gt) - cx(anchor), cy(gt) - cy(anchor)
+            offsets[:,[0,1]] /= anchor_boxes[:,[2,3]] * variances[:,[0,1]] # (cx(gt) - cx(anchor)) / w(anchor) / cx_variance, (cy(gt) - cy(anchor)) / h(anchor) / cy_variance
+            offsets[:,[2,3]] /= anchor_boxes[:,[2,3]] # w(gt) / w(anchor), h(gt) / h(anchor)
+            offsets[:,[2,3]] = np.log(offsets[:,[2,3]]) / variances[:,[2,3]] # ln(w(gt) / w(anchor)) / w_variance, ln(h(gt) / h(anchor)) / h_variance (ln == natural logarithm)
         elif self.coords == 'corners':
-            y_encoded[:,:,-12:-8] -= y_encoded[:,:,-8:-4] # (gt - anchor) for all four coordinates
-            y_encoded[:,:,[-12,-10]] /= np.expand_dims(y_encoded[:,:,-6] - y_encoded[:,:,-8], axis=-1) # (xmin(gt) - xmin(anchor)) / w(anchor), (xmax(gt) - xmax(anchor)) / w(anchor)
-            y_encoded[:,:,[-11,-9]] /= np.expand_dims(y_encoded[:,:,-5] - y_encoded[:,:,-7], axis=-1) # (ymin(gt) - ymin(anchor)) / h(anchor), (ymax(gt) - ymax(anchor)) / h(anchor)
-            y_encoded[:,:,-12:-8] /= y_encoded[:,:,-4:] # (gt - anchor) / size(anchor) / variance for all four coordinates, where 'size' refers to w and h respectively
+            offsets -= anchor_boxes # (gt - anchor) for all four coordinates
+            offsets[:,[0,2]] /= np.expand_dims(anchor_boxes[:,2] - anchor_boxes[:,0], axis=-1) # (xmin(gt) - xmin(anchor)) / w(anchor), (xmax(gt) - xmax(anchor)) / w(anchor)
+            offsets[:,[1,3]] /= np.expand_dims(anchor_boxes[:,3] - anchor_boxes[:,1], axis=-1) # (ymin(gt) - ymin(anchor)) / h(anchor), (ymax(gt) - ymax(anchor)) / h(anchor)
+            offsets /= variances # (gt - anchor) / size(anchor) / variance for all four coordinates, where 'size' refers to w and h respectively
         elif self.coords == 'minmax':
-            y_encoded[:,:,-12:-8] -= y_encoded[:,:,-8:-4] # (gt - anchor) for all four coordinates
-            y_encoded[:,:,[-12,-11]] /= np.expand_dims(y_encoded[:,:,-7] - y_encoded[:,:,-8], axis=-1) # (xmin(gt) - xmin(anchor)) / w(anchor), (xmax(gt) - xmax(anchor)) / w(anchor)
-            y_encoded[:,:,[-10,-9]] /= np.expand_dims(y_encoded[:,:,-5] - y_encoded[:,:,-6], axis=-1) # (ymin(gt) - ymin(anchor)) / h(anchor), (ymax(gt) - ymax(anchor)) / h(anchor)
-            y_encoded[:,:,-12:-8] /= y_encoded[:,:,-4:] # (gt - anchor) / size(anchor) / variance for all four coordinates, where 'size' refers to w and h respectively
+            offsets -= anchor_boxes # (gt - anchor) for all four coordinates
+            offsets[:,[0,1]] /= np.expand_dims(anchor_boxes[:,1] - anchor_boxes[:,0], axis=-1) # (xmin(gt) - xmin(anchor)) / w(anchor), (xmax(gt) - xmax(anchor)) / w(anchor)
+            offsets[:,[2,3]] /= np.expand_dims(anchor_boxes[:,3] - anchor_boxes[:,2], axis=-1) # (ymin(gt) - ymin(anchor)) / h(anchor), (ymax(gt) - ymax(anchor)) / h(anchor)
+            offsets /= variances # (gt - anchor) / size(anchor) / variance for all four coordinates, where 'size' refers to w and h respectively
+
+        y_encoded[:,:,-12:-8] = 0
+        y_encoded[items, anchors, -12:-8] = offsets
 
         if diagnostics:
             # Here we'll save the matched anchor boxes (i.e. anchor boxes that were matched to a ground truth box, but keeping the anchor box coordinates).
             y_matched_anchors = np.copy(y_encoded)
             y_matched_anchors[:,:,-12:-8] = 0 # Keeping the anchor box coordinates means setting the offsets to zero.
+
+        if self.sparse_targets:
+            y_encoded = self.sparse_encoding(y_encoded, out=None if buffers is None else buffers[1])
+
+        if diagnostics:
             return y_encoded, y_matched_anchors
         else:
             return y_encoded
 
+    def sparse_encoding(self, y_encoded, out=None):
+        '''
+        Converts encoded labels to the sparse format that `SSDLoss(sparse_targets=True)` takes, which only keeps
+        what the loss reads: The class of every anchor box and the offsets of the positive anchor boxes.
+
+        Arguments:
+            y_encoded (array): Encoded labels of shape `(batch_size, #boxes, #classes + 12)`, as returned by `__call__()`
+                without `sparse_targets`.
+            out (array, optional): An array of shape `(batch_size, #boxes, 5)` to write the sparse labels into.
+                If `None`, a new array of type `self.sparse_dtype` is returned.
+
+        Returns:
+            A Numpy array of shape `(batch_size, #boxes, 5)`. The first element of the last axis is the class ID of
+            the anchor box, `background_id` for the negative boxes and -1 for the neutral boxes, whose one-hot
+            class vector is all zeros, the four others are the ground truth box offsets, zero for all anchor boxes
+            but the positive ones.
+        '''
+        if out is None:
+            out = np.empty(y_encoded.shape[:2] + (5,), dtype=self.sparse_dtype)
+
+        classes = y_encoded[:,:,:-12]
+        out[:,:,0] = np.where(np.any(classes > 0, axis=-1), np.argmax(classes, axis=-1), -1)
+        out[:,:,1:] = y_encoded[:,:,-12:-8]
+        return out
+
+    def match_batch(self, y_encoded, ground_truth_labels, class_vectors):
+        '''
+        Matches the ground truth boxes of all batch items to the anchor boxes at once and writes the matched
+        ground truth data into `y_encoded`, with the same results as the per batch item matching of `__call__()`.
+
+        The ground truth boxes are padded to the largest number of boxes of the batch items, so that the IoU
+        similarities of the batch items are computed by one call to `iou_batch()`. The greedy bipartite matching,
+        the multi matching and the marking of the neutral boxes are then done on all batch items together
+        with masked array operations. Large batches are processed in chunks of batch items whose similarities
+        take about `BATCH_SIMILARITIES_BYTES`.
+
+        Arguments:
+            y_encoded (array): The encoding template returned by `generate_encoding_template()`, with the
+                background class set for all boxes. It is modified in place.
+            ground_truth_labels (list): The ground truth labels, see `__call__()`.
+            class_vectors (array): The one-hot class vectors, an identity matrix of size `#classes`.
+        '''
+
+        # Mapping to define which indices represent which coordinates in the ground truth.
+        xmin = 1
+        ymin = 2
+        xmax = 3
+        ymax = 4
+
+        batch_size = len(ground_truth_labels)
+        n_ground_truth = [labels.shape[0] if labels.size > 0 else 0 for labels in ground_truth_labels]
+
+        # Check for degenerate ground truth bounding boxes before attempting any computations.
+        for i in range(batch_size):
+            if n_ground_truth[i] == 0: continue
+            labels = ground_truth_labels[i]
+            if np.any(labels[:,[xmax]] - labels[:,[xmin]] <= 0) or np.any(labels[:,[ymax]] - labels[:,[ymin]] <= 0):
+                raise DegenerateBoxError("SSDInputEncoder detected degenerate ground truth bounding boxes for batch item {} with bounding boxes {}, ".format(i, labels.astype(np.float64)) +
+                                         "i.e. bounding boxes where xmax <= xmin and/or ymax <= ymin. Degenerate ground truth " +
+                                         "bounding boxes will lead to NaN errors during the training.")
+
+        max_n_ground_truth = max(n_ground_truth + [1])
+        chunk_size = max(1, BATCH_SIMILARITIES_BYTES // (max_n_ground_truth * y_encoded.shape[1] * np.dtype(self.iou_dtype).itemsize))
+        if self.anchor_index is None:
+            for start in range(0, batch_size, chunk_size):
+                self._match_chunk(y_encoded[start:start+chunk_size], ground_truth_labels[start:start+chunk_size], class_vectors)
+        else:
+            # The batch items whose matching on the candidate anchor boxes may differ are matched with all anchor boxes.
+            dense_items = self._match_indexed(y_encoded, ground_truth_labels, class_vectors)
+            for start in range(0, len(dense_items), chunk_size):
+                chunk = dense_items[start:start+chunk_size]
+                y_chunk = y_encoded[chunk]
+                self._match_chunk(y_chunk, [ground_truth_labels[i] for i in chunk], class_vectors)
+                y_encoded[chunk] = y_chunk
+
+    def _pad_labels(self, ground_truth_labels, class_vectors):
+        '''
+        Pads the ground truth labels of the batch items to the largest number of ground truth boxes and prepares
+        them as the per batch item matching of `__call__()` does.
+
+        Returns:
+            The number of ground truth boxes of every batch item, a boolean array of shape `(batch_size, max_n_ground_truth)`
+            that marks the ground truth boxes that are not padding, the one-hot labels of shape
+            `(batch_size, max_n_ground_truth, #classes + 4)` and the ground truth boxes in the coordinate format of the
+            encoder, of shape `(batch_size, max_n_ground_truth, 4)`.
+        '''
+
+        # Mapping to define which indices represent which coordinates in the ground truth.
+        class_id = 0
+        xmin = 1
+        ymin = 2
+        xmax = 3
+        ymax = 4
+
+        batch_size = len(ground_truth_labels)
+        n_ground_truth = np.array([labels.shape[0] if labels.size > 0 else 0 for labels in ground_truth_labels], dtype=np.int64)
+        max_n_ground_truth = n_ground_truth.max() if batch_size > 0 else 0
+
+        # `valid` marks the ground truth boxes that are not padding.
+        valid = np.arange(max_n_ground_truth) < n_ground_truth[:, np.newaxis]
+
+        labels = np.zeros((batch_size, max_n_ground_truth, 5))
+        for i in np.nonzero(n_ground_truth)[0]:
+            labels[i, :n_ground_truth[i]] = ground_truth_labels[i][:, :5]
+
+        # Maybe normalize the box coordinates.
+        if self.normalize_coords:
+            labels[:,:,[ymin,ymax]] /= self.img_height # Normalize ymin and ymax relative to the image height
+            labels[:,:,[xmin,xmax]] /= self.img_width # Normalize xmin and xmax relative to the image width
+
+        # Maybe convert the box coordinate format.
+        if self.coords == 'centroids':
+            labels = convert_coordinates(labels, start_index=xmin, conversion='corners2centroids', border_pixels=self.border_pixels)
+        elif self.coords == 'minmax':
+            labels = convert_coordinates(labels, start_index=xmin, conversion='corners2minmax')
+
+        classes_one_hot = class_vectors[labels[:,:,class_id].astype(np.int64)] # The one-hot class IDs of shape `(batch_size, max_n_ground_truth, #classes)`
+        labels_one_hot = np.concatenate([classes_one_hot, labels[:,:,[xmin,ymin,xmax,ymax]]], axis=-1)
+
+        return n_ground_truth, valid, labels_one_hot, labels[:,:,[xmin,ymin,xmax,ymax]]
+
+    def _match_chunk(self, y_encoded, ground_truth_labels, class_vectors):
+        '''
+        Does the work of `match_batch()` for one chunk of batch items.
+        '''
+
+        n_ground_truth, valid, labels_one_hot, boxes = self._pad_labels(ground_truth_labels, class_vectors)
+        batch_size, max_n_ground_truth = valid.shape
+        if max_n_ground_truth == 0: return # If there is no ground truth in the chunk, there is nothing to match.
+        has_ground_truth = n_ground_truth > 0
+
+        # The IoU similarities of shape `(batch_size, max_n_ground_truth, #boxes)`. The anchor boxes are the same for all batch items.
+        similarities = iou_batch(boxes, self.anchor_template[:,:4], coords=self.coords, border_pixels=self.border_pixels, dtype=self.iou_dtype)
+        # The padding boxes never overlap. Since they come after the real boxes, they lose all ties in the `argmax` below.
+        similarities[~valid] = 0
+
+        ##################################################################################
+        # First: Greedy bipartite matching of all batch items.
+        ##################################################################################
+
+        # This is `match_bipartite_greedy()` run on all batch items together, where batch item `i` takes part in the
+        # first `n_ground_truth[i]` rounds only. Instead of zeroing the weight matrix, the best anchor box of every ground
+        # truth box is kept up to date: Zeroing the column of the matched anchor box only changes the best anchor box of
+        # the ground truth boxes whose best anchor box it was, and only these are recomputed.
+        batch_indices = np.arange(batch_size)
+        best_anchors = np.argmax(similarities, axis=2) # Array of shape `(batch_size, max_n_ground_truth)`
+        best_overlaps = np.take_along_axis(similarities, best_anchors[:,:,np.newaxis], axis=2)[:,:,0]
+        # The matched (and padding) rows are all zeros in `match_bipartite_greedy()`.
+        matched = ~valid
+        best_anchors[matched] = 0
+        best_overlaps[matched] = 0
+
+        bipartite_matches = np.zeros((batch_size, max_n_ground_truth), dtype=np.int64)
+        matched_anchors = np.zeros((batch_size, max_n_ground_truth), dtype=np.int64) # The anchor box matched in each round
+
+        for r in range(max_n_ground_truth):
+
+            active = n_ground_truth > r # The batch items that still have unmatched ground truth boxes
+            active_items = batch_indices[active]
+
+            ground_truth_index = np.argmax(best_overlaps[active_items], axis=1)
+            anchor_index = best_anchors[active_items, ground_truth_index]
+            bipartite_matches[active_items, ground_truth_index] = anchor_index
+            matched_anchors[active_items, r] = anchor_index
+
+            # Zero the row of the matched ground truth box.
+            matched[active_items, ground_truth_index] = True
+            best_anchors[active_items, ground_truth_index] = 0
+            best_overlaps[active_items, ground_truth_index] = 0
+
+            # Zero the column of the matched anchor box, i.e. recompute the best anchor boxes that were this anchor box.
+            stale = ~matched[active_items] & (best_anchors[active_items] == anchor_index[:, np.newaxis])
+            stale_items, stale_ground_truth = np.nonzero(stale)
+            if len(stale_items) > 0:
+                stale_items = active_items[stale_items]
+                rows = similarities[stale_items, stale_ground_truth]
+                rows[np.arange(len(rows))[:, np.newaxis], matched_anchors[stale_items, :r+1]] = 0
+                best_anchors[stale_items, stale_ground_truth] = np.argmax(rows, axis=1)
+                best_overlaps[stale_items, stale_ground_truth] = rows[np.arange(len(rows)), best_anchors[stale_items, stale_ground_truth]]
+
+        # For every anchor box, the index of the ground truth box it is matched to, or -1.
+        # The later writes win, as in `__call__()`.
+        assignments = np.full(similarities.shape[::2], -1, dtype=np.int64)
+        valid_items, valid_ground_truth = np.nonzero(valid)
+        assignments[valid_items, bipartite_matches[valid]] = valid_ground_truth
+
+        # The maximal similarity of every anchor box with any ground truth box, of shape `(batch_size, #boxes)`.
+        # The columns of the anchor boxes matched above are set to zero to indicate that they were matched.
+        overlaps = np.amax(similarities, axis=1)
+        overlaps[valid_items, bipartite_matches[valid]] = 0
+
+        ##################################################################################
+        # Second: Maybe do 'multi' matching.
+        ##################################################################################
+
+        if self.matching_type == 'multi':
+
+            # Only the anchor boxes that meet the threshold need their most similar ground truth box.
+            multi_items, multi_anchors = np.nonzero(has_ground_truth[:, np.newaxis] & (overlaps >= self.pos_iou_threshold))
+            multi_similarities = similarities[multi_items, :, multi_anchors] # Array of shape `(n_matches, max_n_ground_truth)`
+            # A bipartite match meets the threshold only if the threshold is not positive, its column is then all zeros.
+            bipartite = assignments[multi_items, multi_anchors] >= 0
+            multi_similarities[bipartite] = 0
+            assignments[multi_items, multi_anchors] = np.argmax(multi_similarities, axis=1)
+
+            # Setting the columns of the matched anchor boxes to zero sets their maximal similarity to zero.
+            overlaps[multi_items, multi_anchors] = 0
+
+        positive_items, positive_anchors = np.nonzero(assignments >= 0)
+        y_encoded[positive_items, positive_anchors, :-8] = labels_one_hot[positive_items, assignments[positive_items, positive_anchors]]
+
+        ##################################################################################
+        # Third: Mark the neutral boxes.
+        ##################################################################################
+
+        neutral_items, neutral_anchors = np.nonzero(has_ground_truth[:, np.newaxis] & (overlaps >= self.neg_iou_limit))
+        y_encoded[neutral_items, neutral_anchors, self.background_id] = 0
+
+    def _match_indexed(self, y_encoded, ground_truth_labels, class_vectors):
+        '''
+        Matches the ground truth boxes of all batch items to their candidate anchor boxes of the anchor index and writes
+        the matched ground truth data into `y_encoded` for the batch items whose matching is the same as with all anchor boxes.
+
+        The IoU similarities are only computed for the pairs of a ground truth box and one of its candidates, the other
+        anchor boxes having an IoU below the `min_iou` of the ground truth box, which is at most both thresholds. These
+        anchor boxes can then neither be positive nor neutral. The bipartite matching on the pairs is the same as on all
+        anchor boxes if every bipartite match has a positive IoU of at least the `min_iou` of the ground truth boxes that
+        are not matched yet, since no other anchor box can then win an `argmax`. The batch items for which this does not
+        hold are matched again with lower `min_iou`, then if the matching still may differ, left to the caller.
+
+        Arguments:
+            y_encoded (array): The encoding template, see `match_batch()`. It is modified in place.
+            ground_truth_labels (list): The ground truth labels, see `__call__()`.
+            class_vectors (array): The one-hot class vectors, an identity matrix of size `#classes`.
+
+        Returns:
+            The indices of the batch items that are left to match with all anchor boxes.
+        '''
+
+        n_ground_truth, valid, labels_one_hot, boxes = self._pad_labels(ground_truth_labels, class_vectors)
+
+        # The corners of the ground truth boxes as `iou()` computes them.
+        if self.coords == 'centroids':
+            corners = convert_coordinates(boxes, start_index=0, conversion='centroids2corners')
+        elif self.coords == 'minmax':
+            corners = boxes[:,:,[0,2,1,3]]
+        else:
+            corners = boxes
+
+        items = np.nonzero(n_ground_truth)[0]
+        min_iou = np.full((len(items), valid.shape[1]), self.anchor_index_min_iou)
+
+        for _ in range(2):
+            if len(items) == 0: break
+            max_n_ground_truth = n_ground_truth[items].max()
+            min_iou = min_iou[:, :max_n_ground_truth]
+
+            pair_items, pair_ground_truth, pair_anchors = self.anchor_index.candidates(corners[items, :max_n_ground_truth], valid[items, :max_n_ground_truth], min_iou=min_iou)
+            similarities = iou(boxes[items[pair_items], pair_ground_truth],
+                               self.anchor_template[pair_anchors, :4],
+                               coords=self.coords,
+                               mode='element-wise',
+                               border_pixels=self.border_pixels)
+
+            positives, neutrals, matched_ground_truth, matched_overlaps = self._match_pairs(pair_items, pair_ground_truth, pair_anchors, similarities, n_ground_truth[items])
+
+            # The largest `min_iou` of the ground truth boxes that are not matched before each round of the bipartite matching.
+            rounds = np.arange(max_n_ground_truth) < n_ground_truth[items][:, np.newaxis]
+            unmatched_min_iou = np.where(rounds, np.take_along_axis(min_iou, matched_ground_truth, axis=1), 0)
+            unmatched_min_iou = np.maximum.accumulate(unmatched_min_iou[:, ::-1], axis=1)[:, ::-1]
+            exact = np.all((matched_overlaps >= unmatched_min_iou) & (matched_overlaps > 0), axis=1)
+
+            positive_items, positive_anchors, positive_ground_truth = [array[exact[positives[0]]] for array in positives]
+            y_encoded[items[positive_items], positive_anchors, :-8] = labels_one_hot[items[positive_items], positive_ground_truth]
+
+            neutral_items, neutral_anchors = [array[exact[neutrals[0]]] for array in neutrals]
+            y_encoded[items[neutral_items], neutral_anchors, self.background_id] = 0
+
+            # The `min_iou` of a ground truth box is lowered to the lowest IoU of the bipartite matches up to its round. A ground
+            # truth box that was not matched, since a round without any overlap matched a ground truth box again, gets the lowest IoU.
+            lowest_overlaps = np.minimum.accumulate(matched_overlaps, axis=1)
+            box_lowest_overlaps = np.full(min_iou.shape, np.inf)
+            round_items, round_indices = np.nonzero(rounds)
+            np.minimum.at(box_lowest_overlaps, (round_items, matched_ground_truth[round_items, round_indices]), lowest_overlaps[round_items, round_indices])
+            box_lowest_overlaps = np.where(np.isinf(box_lowest_overlaps), lowest_overlaps[:, -1:], box_lowest_overlaps)
+
+            items = items[~exact]
+            min_iou = np.minimum(min_iou, box_lowest_overlaps)[~exact]
+
+        return items
+
+    def _match_pairs(self, pair_items, pair_ground_truth, pair_anchors, similarities, n_ground_truth):
+        '''
+        Matches the ground truth boxes of a batch to the anchor boxes given the IoU similarities of some pairs of a ground
+        truth box and an anchor box, as the matching of `_match_chunk()` does with the similarities of the other pairs zero.
+
+        Arguments:
+            pair_items (array): The batch item of every pair.
+            pair_ground_truth (array): The index of the ground truth box of every pair in its batch item.
+            pair_anchors (array): The index of the anchor box of every pair. The pairs must be unique.
+            similarities (array): The IoU similarity of every pair.
+            n_ground_truth (array): The number of ground truth boxes of every batch item.
+
+        Returns:
+            The batch items, anchor boxes and ground truth boxes of the positive anchor boxes, the batch items and anchor
+            boxes of the neutral anchor boxes, and two arrays of shape `(batch_size, max_n_ground_truth)` with the ground
+            truth box bipartite matched in every round and the similarity of the match, infinite for the rounds after the
+            last ground truth box of a batch item.
+        '''
+
+        batch_size = len(n_ground_truth)
+        max_n_ground_truth = n_ground_truth.max()
+        n_anchors = len(self.anchor_template)
+
+        ##################################################################################
+        # First: Greedy bipartite matching of all batch items.
+        ##################################################################################
+
+        # The pairs sorted by ground truth box, i.e. the rows of the weight matrix of `match_bipartite_greedy()`, then
+        # by anchor box, so that the first pair with the largest similarity of a row is the one `argmax` picks.
+        order = np.argsort((pair_items * max_n_ground_truth + pair_ground_truth) * n_anchors + pair_anchors)
+        row_items, row_ground_truth, row_anchors, row_similarities = pair_items[order], pair_ground_truth[order], pair_anchors[order], similarities[order]
+        row_starts = np.searchsorted(row_items * max_n_ground_truth + row_ground_truth, np.arange(batch_size * max_n_ground_truth + 1))
+
+        # The best anchor box of every ground truth box, -1 if it has no pair. It is kept up to date as in `_match_chunk()`.
+        best_overlaps, best_pairs = _segment_argmax(row_similarities, np.diff(row_starts))
+        best_overlaps = np.reshape(best_overlaps, (batch_size, max_n_ground_truth))
+        best_anchors = np.reshape(np.where(best_pairs >= 0, row_anchors[best_pairs], -1), (batch_size, max_n_ground_truth))
+
+        batch_indices = np.arange(batch_size)
+        matched = ~(np.arange(max_n_ground_truth) < n_ground_truth[:, np.newaxis]) # The padding rows are never matched.
+        is_bipartite_match = np.zeros((batch_size, n_anchors), dtype=np.bool_) # The zeroed columns
+        bipartite_matches = np.full((batch_size, max_n_ground_truth), -1, dtype=np.int64)
+        matched_ground_truth = np.zeros((batch_size, max_n_ground_truth), dtype=np.int64) # The ground truth box matched in each round
+        matched_overlaps = np.full((batch_size, max_n_ground_truth), np.inf)
+
+        for r in range(max_n_ground_truth):
+
+            active_items = batch_indices[n_ground_truth > r] # The batch items that still have unmatched ground truth boxes
+
+            ground_truth_index = np.argmax(best_overlaps[active_items], axis=1)
+            anchor_index = best_anchors[active_items, ground_truth_index]
+            bipartite_matches[active_items, ground_truth_index] = anchor_index
+            matched_ground_truth[active_items, r] = ground_truth_index
+            matched_overlaps[active_items, r] = best_overlaps[active_items, ground_truth_index]
+
+            # Zero the row of the matched ground truth box.
+            matched[active_items, ground_truth_index] = True
+            best_anchors[active_items, ground_truth_index] = -1
+            best_overlaps[active_items, ground_truth_index] = 0
+
+            # Zero the column of the matched anchor box, i.e. recompute the best anchor boxes that were this anchor box.
+            is_bipartite_match[active_items[anchor_index >= 0], anchor_index[anchor_index >= 0]] = True
+            stale = ~matched[active_items] & (best_anchors[active_items] == anchor_index[:, np.newaxis]) & (anchor_index[:, np.newaxis] >= 0)
+            stale_items, stale_ground_truth = np.nonzero(stale)
+            if len(stale_items) > 0:
+                stale_items = active_items[stale_items]
+                stale_rows = stale_items * max_n_ground_truth + stale_ground_truth
+                indices = _segment_indices(row_starts[stale_rows], row_starts[stale_rows + 1])
+                values = np.where(is_bipartite_match[row_items[indices], row_anchors[indices]], 0, row_similarities[indices])
+                stale_overlaps, stale_pairs = _segment_argmax(values, row_starts[stale_rows + 1] - row_starts[stale_rows])
+                best_overlaps[stale_items, stale_ground_truth] = stale_overlaps
+                best_anchors[stale_items, stale_ground_truth] = np.where(stale_pairs >= 0, row_anchors[indices[stale_pairs]], -1)
+
+        valid_items, valid_ground_truth = np.nonzero(bipartite_matches >= 0)
+        positives = [valid_items, bipartite_matches[valid_items, valid_ground_truth], valid_ground_truth]
+
+        # The pairs sorted by anchor box, i.e. the columns of the weight matrix, then by ground truth box. `overlaps` is the
+        # maximal similarity of every anchor box of a pair with any ground truth box, zero for the bipartite matches.
+        order = np.argsort((pair_items * n_anchors + pair_anchors) * max_n_ground_truth + pair_ground_truth)
+        column_items, column_ground_truth, column_anchors, column_similarities = pair_items[order], pair_ground_truth[order], pair_anchors[order], similarities[order]
+        column_keys = column_items * n_anchors + column_anchors
+        column_starts = np.nonzero(np.concatenate([[True], column_keys[1:] != column_keys[:-1]]))[0]
+        overlaps, overlap_pairs = _segment_argmax(column_similarities, np.diff(np.append(column_starts, len(column_keys))))
+        overlap_items, overlap_anchors = column_items[column_starts], column_anchors[column_starts]
+        overlaps[is_bipartite_match[overlap_items, overlap_anchors]] = 0
+
+        ##################################################################################
+        # Second: Maybe do 'multi' matching.
+        ##################################################################################
+
+        if self.matching_type == 'multi':
+
+            # Every anchor box that meets the threshold is matched to the first of its most similar ground truth boxes.
+            multi = np.nonzero(overlaps >= self.pos_iou_threshold)[0]
+            positives = [np.concatenate([positive, multi_positive]) for positive, multi_positive in
+                         zip(positives, (overlap_items[multi], overlap_anchors[multi], column_ground_truth[overlap_pairs[multi]]))]
+            overlaps[multi] = 0
+
+        ##################################################################################
+        # Third: Mark the neutral boxes.
+        ##################################################################################
+
+        neutral = np.nonzero(overlaps >= self.neg_iou_limit)[0]
+        neutrals = [overlap_items[neutral], overlap_anchors[neutral]]
+
+        return positives, neutrals, matched_ground_truth, matched_overlaps
+
     def generate_anchor_boxes_for_layer(self,
                                         feature_map_size,
                                         aspect_ratios,
@@ -453,101 +974,25 @@ class SSDInputEncoder:
             A 4D Numpy tensor of shape `(feature_map_height, feature_map_width, n_boxes_per_cell, 4)` where the
             last dimension contains `(xmin, xmax, ymin, ymax)` for each anchor box in each cell of the feature map.
         '''
-        # Compute box width and height for each aspect ratio.
-
-        # The shorter side of the image will be used to compute `w` and `h` using `scale` and `aspect_ratios`.
-        size = min(self.img_height, self.img_width)
-        # Compute the box widths and and heights for all aspect ratios
-        wh_list = []
-        for ar in aspect_ratios:
-            if (ar == 1):
-                # Compute the regular anchor box for aspect ratio 1.
-                box_height = box_width = this_scale * size
-                wh_list.append((box_width, box_height))
-                if self.two_boxes_for_ar1:
-                    # Compute one slightly larger version using the geometric mean of this scale value and the next.
-                    box_height = box_width = np.sqrt(this_scale * next_scale) * size
-                    wh_list.append((box_width, box_height))
-            else:
-                box_width = this_scale * size * np.sqrt(ar)
-                box_height = this_scale * size / np.sqrt(ar)
-                wh_list.append((box_width, box_height))
-        wh_list = np.array(wh_list)
-        n_boxes = len(wh_list)
-
-        # Compute the grid of box center points. They are identical for all aspect ratios.
-
-        # Compute the step sizes, i.e. how far apart the anchor box center points will be vertically and horizontally.
-        if (this_steps is None):
-            step_height = self.img_height / feature_map_size[0]
-            step_width = self.img_width / feature_map_size[1]
-        else:
-            if isinstance(this_steps, (list, tuple)) and (len(this_steps) == 2):
-                step_height = this_steps[0]
-                step_width = this_steps[1]
-            elif isinstance(this_steps, (int, float)):
-                step_height = this_steps
-                step_width = this_steps
-        # Compute the offsets, i.e. at what pixel values the first anchor box center point will be from the top and from the left of the image.
-        if (this_offsets is None):
-            offset_height = 0.5
-            offset_width = 0.5
-        else:
-            if isinstance(this_offsets, (list, tuple)) and (len(this_offsets) == 2):
-                offset_height = this_offsets[0]
-                offset_width = this_offsets[1]
-            elif isinstance(this_offsets, (int, float)):
-                offset_height = this_offsets
-                offset_width = this_offsets
-        # Now that we have the offsets and step sizes, compute the grid of anchor box center points.
-        cy = np.linspace(offset_height * step_height, (offset_height + feature_map_size[0] - 1) * step_height, feature_map_size[0])
-        cx = np.linspace(offset_width * step_width, (offset_width + feature_map_size[1] - 1) * step_width, feature_map_size[1])
-        cx_grid, cy_grid = np.meshgrid(cx, cy)
-        cx_grid = np.expand_dims(cx_grid, -1) # This is necessary for np.tile() to do what we want further down
-        cy_grid = np.expand_dims(cy_grid, -1) # This is necessary for np.tile() to do what we want further down
-
-        # Create a 4D tensor template of shape `(feature_map_height, feature_map_width, n_boxes, 4)`
-        # where the last dimension will contain `(cx, cy, w, h)`
-        boxes_tensor = np.zeros((feature_map_size[0], feature_map_size[1], n_boxes, 4))
-
-        boxes_tensor[:, :, :, 0] = np.tile(cx_grid, (1, 1, n_boxes)) # Set cx
-        boxes_tensor[:, :, :, 1] = np.tile(cy_grid, (1, 1, n_boxes)) # Set cy
-        boxes_tensor[:, :, :, 2] = wh_list[:, 0] # Set w
-        boxes_tensor[:, :, :, 3] = wh_list[:, 1] # Set h
-
-        # Convert `(cx, cy, w, h)` to `(xmin, ymin, xmax, ymax)`
-        boxes_tensor = convert_coordinates(boxes_tensor, start_index=0, conversion='centroids2corners')
-
-        # If `clip_boxes` is enabled, clip the coordinates to lie within the image boundaries
-        if self.clip_boxes:
-            x_coords = boxes_tensor[:,:,:,[0, 2]]
-            x_coords[x_coords >= self.img_width] = self.img_width - 1
-            x_coords[x_coords < 0] = 0
-            boxes_tensor[:,:,:,[0, 2]] = x_coords
-            y_coords = boxes_tensor[:,:,:,[1, 3]]
-            y_coords[y_coords >= self.img_height] = self.img_height - 1
-            y_coords[y_coords < 0] = 0
-            boxes_tensor[:,:,:,[1, 3]] = y_coords
-
-        # `normalize_coords` is enabled, normalize the coordinates to be within [0,1]
-        if self.normalize_coords:
-            boxes_tensor[:, :, :, [0, 2]] /= self.img_width
-            boxes_tensor[:, :, :, [1, 3]] /= self.img_height
-
-        # TODO: Implement box limiting directly for `(cx, cy, w, h)` so that we don't have to unnecessarily convert back and forth.
-        if self.coords == 'centroids':
-            # Convert `(xmin, ymin, xmax, ymax)` back to `(cx, cy, w, h)`.
-            boxes_tensor = convert_coordinates(boxes_tensor, start_index=0, conversion='corners2centroids', border_pixels='half')
-        elif self.coords == 'minmax':
-            # Convert `(xmin, ymin, xmax, ymax)` to `(xmin, xmax, ymin, ymax).
-            boxes_tensor = convert_coordinates(boxes_tensor, start_index=0, conversion='corners2minmax', border_pixels='half')
-
+        # The anchor boxes are computed by `anchor_set.generate_anchor_boxes_for_layer()` with the configuration of the encoder.
+        boxes_tensor, center, wh, step, offset = generate_anchor_boxes_for_layer(self.img_height,
+                                                                                 self.img_width,
+                                                                                 feature_map_size=feature_map_size,
+                                                                                 aspect_ratios=aspect_ratios,
+                                                                                 this_scale=this_scale,
+                                                                                 next_scale=next_scale,
+                                                                                 two_boxes_for_ar1=self.two_boxes_for_ar1,
+                                                                                 this_steps=this_steps,
+                                                                                 this_offsets=this_offsets,
+                                                                                 clip_boxes=self.clip_boxes,
+                                                                                 coords=self.coords,
+                                                                                 normalize_coords=self.normalize_coords)
         if diagnostics:
-            return boxes_tensor, (cy, cx), wh_list, (step_height, step_width), (offset_height, offset_width)
+            return boxes_tensor, center, wh, step, offset
         else:
             return boxes_tensor
 
-    def generate_encoding_template(self, batch_size, diagnostics=False):
+    def generate_encoding_template(self, batch_size, diagnostics=False, out=None):
         '''
         Produces an encoding template for the ground truth label tensor for a given batch.
 
@@ -560,10 +1005,15 @@ class SSDInputEncoder:
         positions and scales of the boxes predicted by the model. The sequence of operations here ensures that `y_encoded`
         has this specific form.
 
+        The anchor boxes and variances are the same for all batches, they are concatenated once in `self.anchor_template`
+        by the constructor and only copied here.
+
         Arguments:
             batch_size (int): The batch size.
             diagnostics (bool, optional): See the documnentation for `generate_anchor_boxes()`. The diagnostic output
                 here is similar, just for all predictor conv layers.
+            out (array, optional): An array of shape `(batch_size, #boxes, #classes + 12)` to write the template into.
+                If `None`, a new array of type `self.dtype` is returned.
 
         Returns:
             A Numpy array of shape `(batch_size, #boxes, #classes + 12)`, the template into which to encode
@@ -571,44 +1021,18 @@ class SSDInputEncoder:
             output contains not only the 4 predicted box coordinate offsets, but also the 4 coordinates for
             the anchor boxes and the 4 variance values.
         '''
-        # Tile the anchor boxes for each predictor layer across all batch items.
-        boxes_batch = []
-        for boxes in self.boxes_list:
-            # Prepend one dimension to `self.boxes_list` to account for the batch size and tile it along.
-            # The result will be a 5D tensor of shape `(batch_size, feature_map_height, feature_map_width, n_boxes, 4)`
-            boxes = np.expand_dims(boxes, axis=0)
-            boxes = np.tile(boxes, (batch_size, 1, 1, 1, 1))
-
-            # Now reshape the 5D tensor above into a 3D tensor of shape
-            # `(batch, feature_map_height * feature_map_width * n_boxes, 4)`. The resulting
-            # order of the tensor content will be identical to the order obtained from the reshaping operation
-            # in our Keras model (we're using the Tensorflow backend, and tf.reshape() and np.reshape()
-            # use the same default index order, which is C-like index ordering)
-            boxes = np.reshape(boxes, (batch_size, -1, 4))
-            boxes_batch.append(boxes)
-
-        # Concatenate the anchor tensors from the individual layers to one.
-        boxes_tensor = np.concatenate(boxes_batch, axis=1)
-
-        # 3: Create a template tensor to hold the one-hot class encodings of shape `(batch, #boxes, #classes)`
-        #    It will contain all zeros for now, the classes will be set in the matching process that follows
-        classes_tensor = np.zeros((batch_size, boxes_tensor.shape[1], self.n_classes))
-
-        # 4: Create a tensor to contain the variances. This tensor has the same shape as `boxes_tensor` and simply
-        #    contains the same 4 variance values for every position in the last axis.
-        variances_tensor = np.zeros_like(boxes_tensor)
-        variances_tensor += self.variances # Long live broadcasting
-
-        # 4: Concatenate the classes, boxes and variances tensors to get our final template for y_encoded. We also need
-        #    another tensor of the shape of `boxes_tensor` as a space filler so that `y_encoding_template` has the same
-        #    shape as the SSD model output tensor. The content of this tensor is irrelevant, we'll just use
-        #    `boxes_tensor` a second time.
-        y_encoding_template = np.concatenate((classes_tensor, boxes_tensor, boxes_tensor, variances_tensor), axis=2)
+        if out is None:
+            out = np.empty((batch_size, len(self.anchor_template), self.n_classes + 12), dtype=self.dtype)
+
+        # The one-hot class encodings contain all zeros for now, the classes will be set in the matching process that follows.
+        out[:, :, :self.n_classes] = 0
+        # The anchor boxes, the space filler and the variances are broadcast over the batch items.
+        out[:, :, self.n_classes:] = self.anchor_template
 
         if diagnostics:
-            return y_encoding_template, self.centers_diag, self.wh_list_diag, self.steps_diag, self.offsets_diag
+            return out, self.centers_diag, self.wh_list_diag, self.steps_diag, self.offsets_diag
         else:
-            return y_encoding_template
+            return out
 
 class DegenerateBoxError(Exception):
     '''
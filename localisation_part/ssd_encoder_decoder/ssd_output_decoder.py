@@ -22,7 +22,8 @@ limitations under the License.
 from __future__ import division
 import numpy as np
 
-from bounding_box_utils.bounding_box_utils import iou, convert_coordinates
+from bounding_box_utils.bounding_box_utils import convert_coordinates
+from ssd_encoder_decoder.nms_utils import greedy_nms_indices
 
 def greedy_nms(y_pred_decoded, iou_threshold=0.45, coords='corners', border_pixels='half'):
     '''
@@ -60,53 +61,83 @@ def greedy_nms(y_pred_decoded, iou_threshold=0.45, coords='corners', border_pixe
     '''
     y_pred_decoded_nms = []
     for batch_item in y_pred_decoded: # For the labels of each batch item...
-        boxes_left = np.copy(batch_item)
-        maxima = [] # This is where we store the boxes that make it through the non-maximum suppression
-        while boxes_left.shape[0] > 0: # While there are still boxes left to compare...
-            maximum_index = np.argmax(boxes_left[:,1]) # ...get the index of the next box with the highest confidence...
-            maximum_box = np.copy(boxes_left[maximum_index]) # ...copy that box and...
-            maxima.append(maximum_box) # ...append it to `maxima` because we'll definitely keep it
-            boxes_left = np.delete(boxes_left, maximum_index, axis=0) # Now remove the maximum box from `boxes_left`
-            if boxes_left.shape[0] == 0: break # If there are no boxes left after this step, break. Otherwise...
-            similarities = iou(boxes_left[:,2:], maximum_box[2:], coords=coords, mode='element-wise', border_pixels=border_pixels) # ...compare (IoU) the other left over boxes to the maximum box...
-            boxes_left = boxes_left[similarities <= iou_threshold] # ...so that we can remove the ones that overlap too much with the maximum box
-        y_pred_decoded_nms.append(np.array(maxima))
+        y_pred_decoded_nms.append(_greedy_nms_rows(batch_item, 1, iou_threshold=iou_threshold, coords=coords, border_pixels=border_pixels))
 
     return y_pred_decoded_nms
 
+def _greedy_nms_rows(predictions, score_index, iou_threshold=0.45, coords='corners', border_pixels='half'):
+    '''
+    Returns the rows of `predictions` that greedy non-maximum suppression keeps, in the order of selection, for the
+    scores in the column `score_index` and the box coordinates in the columns after it. See `greedy_nms_indices()`.
+    '''
+    if predictions.shape[0] == 0:
+        return np.array([])
+    maxima = greedy_nms_indices(predictions[:,score_index+1:], predictions[:,score_index], iou_threshold=iou_threshold, coords=coords, border_pixels=border_pixels)
+    return predictions[maxima]
+
 def _greedy_nms(predictions, iou_threshold=0.45, coords='corners', border_pixels='half'):
     '''
     The same greedy non-maximum suppression algorithm as above, but slightly modified for use as an internal
     function for per-class NMS in `decode_detections()`.
     '''
-    boxes_left = np.copy(predictions)
-    maxima = [] # This is where we store the boxes that make it through the non-maximum suppression
-    while boxes_left.shape[0] > 0: # While there are still boxes left to compare...
-        maximum_index = np.argmax(boxes_left[:,0]) # ...get the index of the next box with the highest confidence...
-        maximum_box = np.copy(boxes_left[maximum_index]) # ...copy that box and...
-        maxima.append(maximum_box) # ...append it to `maxima` because we'll definitely keep it
-        boxes_left = np.delete(boxes_left, maximum_index, axis=0) # Now remove the maximum box from `boxes_left`
-        if boxes_left.shape[0] == 0: break # If there are no boxes left after this step, break. Otherwise...
-        similarities = iou(boxes_left[:,1:], maximum_box[1:], coords=coords, mode='element-wise', border_pixels=border_pixels) # ...compare (IoU) the other left over boxes to the maximum box...
-        boxes_left = boxes_left[similarities <= iou_threshold] # ...so that we can remove the ones that overlap too much with the maximum box
-    return np.array(maxima)
+    return _greedy_nms_rows(predictions, 0, iou_threshold=iou_threshold, coords=coords, border_pixels=border_pixels)
 
 def _greedy_nms2(predictions, iou_threshold=0.45, coords='corners', border_pixels='half'):
     '''
     The same greedy non-maximum suppression algorithm as above, but slightly modified for use as an internal
     function in `decode_detections_fast()`.
     '''
-    boxes_left = np.copy(predictions)
-    maxima = [] # This is where we store the boxes that make it through the non-maximum suppression
-    while boxes_left.shape[0] > 0: # While there are still boxes left to compare...
-        maximum_index = np.argmax(boxes_left[:,1]) # ...get the index of the next box with the highest confidence...
-        maximum_box = np.copy(boxes_left[maximum_index]) # ...copy that box and...
-        maxima.append(maximum_box) # ...append it to `maxima` because we'll definitely keep it
-        boxes_left = np.delete(boxes_left, maximum_index, axis=0) # Now remove the maximum box from `boxes_left`
-        if boxes_left.shape[0] == 0: break # If there are no boxes left after this step, break. Otherwise...
-        similarities = iou(boxes_left[:,2:], maximum_box[2:], coords=coords, mode='element-wise', border_pixels=border_pixels) # ...compare (IoU) the other left over boxes to the maximum box...
-        boxes_left = boxes_left[similarities <= iou_threshold] # ...so that we can remove the ones that overlap too much with the maximum box
-    return np.array(maxima)
+    return _greedy_nms_rows(predictions, 1, iou_threshold=iou_threshold, coords=coords, border_pixels=border_pixels)
+
+def _split_anchors(y_pred, anchor_set=None):
+    '''
+    Splits the model output `y_pred` into the class confidences and predicted offsets of shape `(batch_size, #boxes, #classes + 4)`
+    and the anchor box coordinates and variances of shape `(batch_size or 1, #boxes, 8)`. These are the last 8 columns of `y_pred`
+    or, if `anchor_set` is given, are read from `anchor_set` and `y_pred` must not contain them.
+    '''
+    if anchor_set is None:
+        return y_pred[:,:,:-8], y_pred[:,:,-8:]
+    if len(anchor_set) != y_pred.shape[1]:
+        raise ValueError("The anchor set has {} anchor boxes, but the model predicts {} boxes.".format(len(anchor_set), y_pred.shape[1]))
+    return y_pred, anchor_set.anchors[np.newaxis]
+
+def _decode_boxes(y_pred, anchors, input_coords, normalize_coords, img_height, img_width):
+    '''
+    Converts the predicted offsets of `y_pred`, an array of shape `(batch_size, #boxes, #classes + 4)`, to box coordinates
+    in the format `(xmin, ymin, xmax, ymax)`, absolute if `normalize_coords` is `True`, for `decode_detections()` and
+    `decode_detections_batched()`. Returns a new array of the same shape, with the class confidences unchanged.
+    '''
+    # 1: Convert the box coordinates from the predicted anchor box offsets to predicted absolute coordinates
+
+    y_pred_decoded_raw = np.copy(y_pred) # The classes and the four offsets, without the anchor coordinates and variances, a tensor of shape `[batch, n_boxes, n_classes + 4 coordinates]`
+
+    if input_coords == 'centroids':
+        y_pred_decoded_raw[:,:,[-2,-1]] = np.exp(y_pred_decoded_raw[:,:,[-2,-1]] * anchors[:,:,[6,7]]) # exp(ln(w(pred)/w(anchor)) / w_variance * w_variance) == w(pred) / w(anchor), exp(ln(h(pred)/h(anchor)) / h_variance * h_variance) == h(pred) / h(anchor)
+        y_pred_decoded_raw[:,:,[-2,-1]] *= anchors[:,:,[2,3]] # (w(pred) / w(anchor)) * w(anchor) == w(pred), (h(pred) / h(anchor)) * h(anchor) == h(pred)
+        y_pred_decoded_raw[:,:,[-4,-3]] *= anchors[:,:,[4,5]] * anchors[:,:,[2,3]] # (delta_cx(pred) / w(anchor) / cx_variance) * cx_variance * w(anchor) == delta_cx(pred), (delta_cy(pred) / h(anchor) / cy_variance) * cy_variance * h(anchor) == delta_cy(pred)
+        y_pred_decoded_raw[:,:,[-4,-3]] += anchors[:,:,[0,1]] # delta_cx(pred) + cx(anchor) == cx(pred), delta_cy(pred) + cy(anchor) == cy(pred)
+        y_pred_decoded_raw = convert_coordinates(y_pred_decoded_raw, start_index=-4, conversion='centroids2corners')
+    elif input_coords == 'minmax':
+        y_pred_decoded_raw[:,:,-4:] *= anchors[:,:,4:] # delta(pred) / size(anchor) / variance * variance == delta(pred) / size(anchor) for all four coordinates, where 'size' refers to w or h, respectively
+        y_pred_decoded_raw[:,:,[-4,-3]] *= np.expand_dims(anchors[:,:,1] - anchors[:,:,0], axis=-1) # delta_xmin(pred) / w(anchor) * w(anchor) == delta_xmin(pred), delta_xmax(pred) / w(anchor) * w(anchor) == delta_xmax(pred)
+        y_pred_decoded_raw[:,:,[-2,-1]] *= np.expand_dims(anchors[:,:,3] - anchors[:,:,2], axis=-1) # delta_ymin(pred) / h(anchor) * h(anchor) == delta_ymin(pred), delta_ymax(pred) / h(anchor) * h(anchor) == delta_ymax(pred)
+        y_pred_decoded_raw[:,:,-4:] += anchors[:,:,:4] # delta(pred) + anchor == pred for all four coordinates
+        y_pred_decoded_raw = convert_coordinates(y_pred_decoded_raw, start_index=-4, conversion='minmax2corners')
+    elif input_coords == 'corners':
+        y_pred_decoded_raw[:,:,-4:] *= anchors[:,:,4:] # delta(pred) / size(anchor) / variance * variance == delta(pred) / size(anchor) for all four coordinates, where 'size' refers to w or h, respectively
+        y_pred_decoded_raw[:,:,[-4,-2]] *= np.expand_dims(anchors[:,:,2] - anchors[:,:,0], axis=-1) # delta_xmin(pred) / w(anchor) * w(anchor) == delta_xmin(pred), delta_xmax(pred) / w(anchor) * w(anchor) == delta_xmax(pred)
+        y_pred_decoded_raw[:,:,[-3,-1]] *= np.expand_dims(anchors[:,:,3] - anchors[:,:,1], axis=-1) # delta_ymin(pred) / h(anchor) * h(anchor) == delta_ymin(pred), delta_ymax(pred) / h(anchor) * h(anchor) == delta_ymax(pred)
+        y_pred_decoded_raw[:,:,-4:] += anchors[:,:,:4] # delta(pred) + anchor == pred for all four coordinates
+    else:
+        raise ValueError("Unexpected value for `input_coords`. Supported input coordinate formats are 'minmax', 'corners' and 'centroids'.")
+
+    # 2: If the model predicts normalized box coordinates and they are supposed to be converted back to absolute coordinates, do that
+
+    if normalize_coords:
+        y_pred_decoded_raw[:,:,[-4,-2]] *= img_width # Convert xmin, xmax back to absolute coordinates
+        y_pred_decoded_raw[:,:,[-3,-1]] *= img_height # Convert ymin, ymax back to absolute coordinates
+
+    return y_pred_decoded_raw
 
 def decode_detections(y_pred,
                       confidence_thresh=0.01,
@@ -116,7 +147,8 @@ def decode_detections(y_pred,
                       normalize_coords=True,
                       img_height=None,
                       img_width=None,
-                      border_pixels='half'):
+                      border_pixels='half',
+                      anchor_set=None):
     '''
     Convert model prediction output back to a format that contains only the positive box predictions
     (i.e. the same format that `SSDInputEncoder` takes as input).
@@ -133,6 +165,7 @@ def decode_detections(y_pred,
             of shape `(batch_size, #boxes, #classes + 4 + 4 + 4)`, where `#boxes` is the total number of
             boxes predicted by the model per image and the last axis contains
             `[one-hot vector for the classes, 4 predicted coordinate offsets, 4 anchor box coordinates, 4 variances]`.
+            If `anchor_set` is given, the last axis contains only the classes and the 4 predicted coordinate offsets.
         confidence_thresh (float, optional): A float in [0,1), the minimum classification confidence in a specific
             positive class in order to be considered for the non-maximum suppression stage for the respective class.
             A lower value will result in a larger part of the selection process being done by the non-maximum suppression
@@ -158,6 +191,8 @@ def decode_detections(y_pred,
             to the boxes. If 'exclude', the border pixels do not belong to the boxes.
             If 'half', then one of each of the two horizontal and vertical borders belong
             to the boxex, but not the other.
+        anchor_set (AnchorSet, optional): The anchor boxes of the model. If given, the anchor box coordinates and
+            variances are taken from it, and `y_pred` is the output of a model built with `mode='compact'`.
 
     Returns:
         A python list of length `batch_size` where each list element represents the predicted boxes
@@ -167,35 +202,9 @@ def decode_detections(y_pred,
     if normalize_coords and ((img_height is None) or (img_width is None)):
         raise ValueError("If relative box coordinates are supposed to be converted to absolute coordinates, the decoder needs the image size in order to decode the predictions, but `img_height == {}` and `img_width == {}`".format(img_height, img_width))
 
-    # 1: Convert the box coordinates from the predicted anchor box offsets to predicted absolute coordinates
+    y_pred, anchors = _split_anchors(y_pred, anchor_set)
 
-    y_pred_decoded_raw = np.copy(y_pred[:,:,:-8]) # Slice out the classes and the four offsets, throw away the anchor coordinates and variances, resulting in a tensor of shape `[batch, n_boxes, n_classes + 4 coordinates]`
-
-    if input_coords == 'centroids':
-        y_pred_decoded_raw[:,:,[-2,-1]] = np.exp(y_pred_decoded_raw[:,:,[-2,-1]] * y_pred[:,:,[-2,-1]]) # exp(ln(w(pred)/w(anchor)) / w_variance * w_variance) == w(pred) / w(anchor), exp(ln(h(pred)/h(anchor)) / h_variance * h_variance) == h(pred) / h(anchor)
-        y_pred_decoded_raw[:,:,[-2,-1]] *= y_pred[:,:,[-6,-5]] # (w(pred) / w(anchor)) * w(anchor) == w(pred), (h(pred) / h(anchor)) * h(anchor) == h(pred)
-        y_pred_decoded_raw[:,:,[-4,-3]] *= y_pred[:,:,[-4,-3]] * y_pred[:,:,[-6,-5]] # (delta_cx(pred) / w(anchor) / cx_variance) * cx_variance * w(anchor) == delta_cx(pred), (delta_cy(pred) / h(anchor) / cy_variance) * cy_variance * h(anchor) == delta_cy(pred)
-        y_pred_decoded_raw[:,:,[-4,-3]] += y_pred[:,:,[-8,-7]] # delta_cx(pred) + cx(anchor) == cx(pred), delta_cy(pred) + cy(anchor) == cy(pred)
-        y_pred_decoded_raw = convert_coordinates(y_pred_decoded_raw, start_index=-4, conversion='centroids2corners')
-    elif input_coords == 'minmax':
-        y_pred_decoded_raw[:,:,-4:] *= y_pred[:,:,-4:] # delta(pred) / size(anchor) / variance * variance == delta(pred) / size(anchor) for all four coordinates, where 'size' refers to w or h, respectively
-        y_pred_decoded_raw[:,:,[-4,-3]] *= np.expand_dims(y_pred[:,:,-7] - y_pred[:,:,-8], axis=-1) # delta_xmin(pred) / w(anchor) * w(anchor) == delta_xmin(pred), delta_xmax(pred) / w(anchor) * w(anchor) == delta_xmax(pred)
-        y_pred_decoded_raw[:,:,[-2,-1]] *= np.expand_dims(y_pred[:,:,-5] - y_pred[:,:,-6], axis=-1) # delta_ymin(pred) / h(anchor) * h(anchor) == delta_ymin(pred), delta_ymax(pred) / h(anchor) * h(anchor) == delta_ymax(pred)
-        y_pred_decoded_raw[:,:,-4:] += y_pred[:,:,-8:-4] # delta(pred) + anchor == pred for all four coordinates
-        y_pred_decoded_raw = convert_coordinates(y_pred_decoded_raw, start_index=-4, conversion='minmax2corners')
-    elif input_coords == 'corners':
-        y_pred_decoded_raw[:,:,-4:] *= y_pred[:,:,-4:] # delta(pred) / size(anchor) / variance * variance == delta(pred) / size(anchor) for all four coordinates, where 'size' refers to w or h, respectively
-        y_pred_decoded_raw[:,:,[-4,-2]] *= np.expand_dims(y_pred[:,:,-6] - y_pred[:,:,-8], axis=-1) # delta_xmin(pred) / w(anchor) * w(anchor) == delta_xmin(pred), delta_xmax(pred) / w(anchor) * w(anchor) == delta_xmax(pred)
-        y_pred_decoded_raw[:,:,[-3,-1]] *= np.expand_dims(y_pred[:,:,-5] - y_pred[:,:,-7], axis=-1) # delta_ymin(pred) / h(anchor) * h(anchor) == delta_ymin(pred), delta_ymax(pred) / h(anchor) * h(anchor) == delta_ymax(pred)
-        y_pred_decoded_raw[:,:,-4:] += y_pred[:,:,-8:-4] # delta(pred) + anchor == pred for all four coordinates
-    else:
-        raise ValueError("Unexpected value for `input_coords`. Supported input coordinate formats are 'minmax', 'corners' and 'centroids'.")
-
-    # 2: If the model predicts normalized box coordinates and they are supposed to be converted back to absolute coordinates, do that
-
-    if normalize_coords:
-        y_pred_decoded_raw[:,:,[-4,-2]] *= img_width # Convert xmin, xmax back to absolute coordinates
-        y_pred_decoded_raw[:,:,[-3,-1]] *= img_height # Convert ymin, ymax back to absolute coordinates
+    y_pred_decoded_raw = _decode_boxes(y_pred, anchors, input_coords, normalize_coords, img_height, img_width)
 
     # 3: Apply confidence thresholding and non-maximum suppression per class
 
@@ -225,6 +234,108 @@ def decode_detections(y_pred,
 
     return y_pred_decoded
 
+def decode_detections_batched(y_pred,
+                              confidence_thresh=0.01,
+                              iou_threshold=0.45,
+                              top_k=200,
+                              pre_nms_top_k='all',
+                              input_coords='centroids',
+                              normalize_coords=True,
+                              img_height=None,
+                              img_width=None,
+                              border_pixels='half',
+                              anchor_set=None):
+    '''
+    The same decoding as `decode_detections()`, per-class confidence thresholding and greedy non-maximum suppression
+    followed by the `top_k` highest confidence results per batch item, but for all batch items and classes at once.
+
+    The confidences of all classes of all batch items are thresholded together into one flat list of candidate
+    boxes, only the coordinates of these boxes are decoded, and the non-maximum suppression runs in a single call
+    over all candidates, grouped by batch item and class, so that boxes only suppress boxes of the same class in
+    the same image. Without `pre_nms_top_k`, the result is the same as the result of `decode_detections()`.
+
+    Arguments:
+        y_pred (array): The prediction output of the SSD model, see `decode_detections()`.
+        confidence_thresh (float, optional): A float in [0,1), the minimum classification confidence in a specific
+            positive class in order to be considered for the non-maximum suppression stage for the respective class.
+        iou_threshold (float, optional): A float in [0,1]. All boxes with a Jaccard similarity of greater than `iou_threshold`
+            with a locally maximal box will be removed from the set of predictions for a given class, where 'maximal' refers
+            to the box score.
+        top_k (int, optional): The number of highest scoring predictions to be kept for each batch item after the
+            non-maximum suppression stage.
+        pre_nms_top_k (int, optional): 'all' or the number of highest scoring boxes per class and batch item that are
+            kept after the confidence thresholding stage, as the `top_k` of the NMS of the original Caffe implementation.
+            Limits the work of the non-maximum suppression when many boxes meet a low `confidence_thresh`.
+        input_coords (str, optional): The box coordinate format that the model outputs, see `decode_detections()`.
+        normalize_coords (bool, optional): Set to `True` if the model outputs relative coordinates that should be
+            converted back to absolute coordinates. Requires `img_height` and `img_width` if set to `True`.
+        img_height (int, optional): The height of the input images. Only needed if `normalize_coords` is `True`.
+        img_width (int, optional): The width of the input images. Only needed if `normalize_coords` is `True`.
+        border_pixels (str, optional): How to treat the border pixels of the bounding boxes, see `decode_detections()`.
+        anchor_set (AnchorSet, optional): The anchor boxes of the model. If given, the anchor box coordinates and
+            variances are taken from it, and `y_pred` is the output of a model built with `mode='compact'`.
+
+    Returns:
+        A python list of length `batch_size` where each list element represents the predicted boxes
+        for one image and contains a Numpy array of shape `(boxes, 6)` where each row is a box prediction for
+        a non-background class for the respective image in the format `[class_id, confidence, xmin, ymin, xmax, ymax]`.
+    '''
+    if normalize_coords and ((img_height is None) or (img_width is None)):
+        raise ValueError("If relative box coordinates are supposed to be converted to absolute coordinates, the decoder needs the image size in order to decode the predictions, but `img_height == {}` and `img_width == {}`".format(img_height, img_width))
+
+    y_pred, anchors = _split_anchors(y_pred, anchor_set)
+
+    # 1: Apply confidence thresholding to all positive classes at once, the candidates are ordered by batch item, class and box
+
+    batch_size, n_boxes = y_pred.shape[:2]
+    n_classes = y_pred.shape[-1] - 4 # The number of classes is the length of the last axis minus the four box coordinates
+
+    confidences = np.transpose(y_pred[:,:,1:n_classes], (0, 2, 1)) # The confidences of the positive classes, an array of shape `[batch, n_classes - 1, n_boxes]`
+    item_indices, class_indices, box_indices = np.nonzero(confidences > confidence_thresh)
+    scores = confidences[item_indices, class_indices, box_indices]
+    groups = item_indices * n_classes + class_indices # One group per batch item and class
+
+    # 2: Keep only the `pre_nms_top_k` highest scoring candidates of each group
+
+    if pre_nms_top_k != 'all' and len(scores) > 0:
+        order = np.lexsort((-scores, groups)) # By group, then by decreasing score
+        group_starts = np.searchsorted(groups[order], groups[order], side='left')
+        keep = order[np.arange(len(order)) - group_starts < pre_nms_top_k]
+        keep.sort() # Back to the order of the candidates
+        item_indices, class_indices, box_indices, scores, groups = item_indices[keep], class_indices[keep], box_indices[keep], scores[keep], groups[keep]
+
+    # 3: Convert the predicted offsets of the candidate boxes only to box coordinates, each box once for all of its classes
+
+    candidate_boxes, candidate_indices = np.unique(item_indices * n_boxes + box_indices, return_inverse=True)
+    candidate_items, candidate_boxes = np.divmod(candidate_boxes, n_boxes)
+    candidate_anchors = anchors[candidate_items if anchors.shape[0] > 1 else 0, candidate_boxes]
+    boxes = _decode_boxes(y_pred[np.newaxis, candidate_items, candidate_boxes, -4:], candidate_anchors[np.newaxis], input_coords, normalize_coords, img_height, img_width)[0, candidate_indices.reshape(-1)]
+
+    # 4: Perform non-maximum suppression on all candidates, within each batch item and class
+
+    maxima = greedy_nms_indices(boxes, scores, iou_threshold=iou_threshold, coords='corners', border_pixels=border_pixels, groups=groups) if len(scores) > 0 else np.zeros(0, dtype=np.int64)
+
+    maxima_output = np.zeros((len(maxima), 6)) # The maxima of all batch items, ordered by batch item and class, in the format `[class_id, confidence, xmin, ymin, xmax, ymax]`
+    maxima_output[:,0] = class_indices[maxima] + 1
+    maxima_output[:,1] = scores[maxima]
+    maxima_output[:,2:] = boxes[maxima]
+
+    # 5: Split the maxima by batch item and keep the `top_k` maxima with the highest scores of each
+
+    item_starts = np.searchsorted(item_indices[maxima], np.arange(batch_size + 1), side='left')
+    y_pred_decoded = [] # Store the final predictions in this list
+    for i in range(batch_size):
+        pred = maxima_output[item_starts[i]:item_starts[i+1]]
+        if pred.shape[0] > 0:
+            if top_k != 'all' and pred.shape[0] > top_k: # If we have more than `top_k` results left at this point, otherwise there is nothing to filter,...
+                top_k_indices = np.argpartition(pred[:,1], kth=pred.shape[0]-top_k, axis=0)[pred.shape[0]-top_k:] # ...get the indices of the `top_k` highest-score maxima...
+                pred = pred[top_k_indices] # ...and keep only those entries of `pred`...
+        else:
+            pred = np.array([]) # As in `decode_detections()`, a batch item without predictions gets an empty array.
+        y_pred_decoded.append(pred)
+
+    return y_pred_decoded
+
 def decode_detections_fast(y_pred,
                            confidence_thresh=0.5,
                            iou_threshold=0.45,
@@ -233,7 +344,8 @@ def decode_detections_fast(y_pred,
                            normalize_coords=True,
                            img_height=None,
                            img_width=None,
-                           border_pixels='half'):
+                           border_pixels='half',
+                           anchor_set=None):
     '''
     Convert model prediction output back to a format that contains only the positive box predictions
     (i.e. the same format that `enconde_y()` takes as input).
@@ -252,6 +364,7 @@ def decode_detections_fast(y_pred,
             of shape `(batch_size, #boxes, #classes + 4 + 4 + 4)`, where `#boxes` is the total number of
             boxes predicted by the model per image and the last axis contains
             `[one-hot vector for the classes, 4 predicted coordinate offsets, 4 anchor box coordinates, 4 variances]`.
+            If `anchor_set` is given, the last axis contains only the classes and the 4 predicted coordinate offsets.
         confidence_thresh (float, optional): A float in [0,1), the minimum classification confidence in any positive
             class required for a given box to be considered a positive prediction. A lower value will result
             in better recall, while a higher value will result in better precision. Do not use this parameter with the
@@ -278,6 +391,8 @@ def decode_detections_fast(y_pred,
             to the boxes. If 'exclude', the border pixels do not belong to the boxes.
             If 'half', then one of each of the two horizontal and vertical borders belong
             to the boxex, but not the other.
+        anchor_set (AnchorSet, optional): The anchor boxes of the model. If given, the anchor box coordinates and
+            variances are taken from it, and `y_pred` is the output of a model built with `mode='compact'`.
 
     Returns:
         A python list of length `batch_size` where each list element represents the predicted boxes
@@ -287,29 +402,31 @@ def decode_detections_fast(y_pred,
     if normalize_coords and ((img_height is None) or (img_width is None)):
         raise ValueError("If relative box coordinates are supposed to be converted to absolute coordinates, the decoder needs the image size in order to decode the predictions, but `img_height == {}` and `img_width == {}`".format(img_height, img_width))
 
+    y_pred, anchors = _split_anchors(y_pred, anchor_set)
+
     # 1: Convert the classes from one-hot encoding to their class ID
-    y_pred_converted = np.copy(y_pred[:,:,-14:-8]) # Slice out the four offset predictions plus two elements whereto we'll write the class IDs and confidences in the next step
-    y_pred_converted[:,:,0] = np.argmax(y_pred[:,:,:-12], axis=-1) # The indices of the highest confidence values in the one-hot class vectors are the class ID
-    y_pred_converted[:,:,1] = np.amax(y_pred[:,:,:-12], axis=-1) # Store the confidence values themselves, too
+    y_pred_converted = np.copy(y_pred[:,:,-6:]) # Slice out the four offset predictions plus two elements whereto we'll write the class IDs and confidences in the next step
+    y_pred_converted[:,:,0] = np.argmax(y_pred[:,:,:-4], axis=-1) # The indices of the highest confidence values in the one-hot class vectors are the class ID
+    y_pred_converted[:,:,1] = np.amax(y_pred[:,:,:-4], axis=-1) # Store the confidence values themselves, too
 
     # 2: Convert the box coordinates from the predicted anchor box offsets to predicted absolute coordinates
     if input_coords == 'centroids':
-        y_pred_converted[:,:,[4,5]] = np.exp(y_pred_converted[:,:,[4,5]] * y_pred[:,:,[-2,-1]]) # exp(ln(w(pred)/w(anchor)) / w_variance * w_variance) == w(pred) / w(anchor), exp(ln(h(pred)/h(anchor)) / h_variance * h_variance) == h(pred) / h(anchor)
-        y_pred_converted[:,:,[4,5]] *= y_pred[:,:,[-6,-5]] # (w(pred) / w(anchor)) * w(anchor) == w(pred), (h(pred) / h(anchor)) * h(anchor) == h(pred)
-        y_pred_converted[:,:,[2,3]] *= y_pred[:,:,[-4,-3]] * y_pred[:,:,[-6,-5]] # (delta_cx(pred) / w(anchor) / cx_variance) * cx_variance * w(anchor) == delta_cx(pred), (delta_cy(pred) / h(anchor) / cy_variance) * cy_variance * h(anchor) == delta_cy(pred)
-        y_pred_converted[:,:,[2,3]] += y_pred[:,:,[-8,-7]] # delta_cx(pred) + cx(anchor) == cx(pred), delta_cy(pred) + cy(anchor) == cy(pred)
+        y_pred_converted[:,:,[4,5]] = np.exp(y_pred_converted[:,:,[4,5]] * anchors[:,:,[6,7]]) # exp(ln(w(pred)/w(anchor)) / w_variance * w_variance) == w(pred) / w(anchor), exp(ln(h(pred)/h(anchor)) / h_variance * h_variance) == h(pred) / h(anchor)
+        y_pred_converted[:,:,[4,5]] *= anchors[:,:,[2,3]] # (w(pred) / w(anchor)) * w(anchor) == w(pred), (h(pred) / h(anchor)) * h(anchor) == h(pred)
+        y_pred_converted[:,:,[2,3]] *= anchors[:,:,[4,5]] * anchors[:,:,[2,3]] # (delta_cx(pred) / w(anchor) / cx_variance) * cx_variance * w(anchor) == delta_cx(pred), (delta_cy(pred) / h(anchor) / cy_variance) * cy_variance * h(anchor) == delta_cy(pred)
+        y_pred_converted[:,:,[2,3]] += anchors[:,:,[0,1]] # delta_cx(pred) + cx(anchor) == cx(pred), delta_cy(pred) + cy(anchor) == cy(pred)
         y_pred_converted = convert_coordinates(y_pred_converted, start_index=-4, conversion='centroids2corners')
     elif input_coords == 'minmax':
-        y_pred_converted[:,:,2:] *= y_pred[:,:,-4:] # delta(pred) / size(anchor) / variance * variance == delta(pred) / size(anchor) for all four coordinates, where 'size' refers to w or h, respectively
-        y_pred_converted[:,:,[2,3]] *= np.expand_dims(y_pred[:,:,-7] - y_pred[:,:,-8], axis=-1) # delta_xmin(pred) / w(anchor) * w(anchor) == delta_xmin(pred), delta_xmax(pred) / w(anchor) * w(anchor) == delta_xmax(pred)
-        y_pred_converted[:,:,[4,5]] *= np.expand_dims(y_pred[:,:,-5] - y_pred[:,:,-6], axis=-1) # delta_ymin(pred) / h(anchor) * h(anchor) == delta_ymin(pred), delta_ymax(pred) / h(anchor) * h(anchor) == delta_ymax(pred)
-        y_pred_converted[:,:,2:] += y_pred[:,:,-8:-4] # delta(pred) + anchor == pred for all four coordinates
+        y_pred_converted[:,:,2:] *= anchors[:,:,4:] # delta(pred) / size(anchor) / variance * variance == delta(pred) / size(anchor) for all four coordinates, where 'size' refers to w or h, respectively
+        y_pred_converted[:,:,[2,3]] *= np.expand_dims(anchors[:,:,1] - anchors[:,:,0], axis=-1) # delta_xmin(pred) / w(anchor) * w(anchor) == delta_xmin(pred), delta_xmax(pred) / w(anchor) * w(anchor) == delta_xmax(pred)
+        y_pred_converted[:,:,[4,5]] *= np.expand_dims(anchors[:,:,3] - anchors[:,:,2], axis=-1) # delta_ymin(pred) / h(anchor) * h(anchor) == delta_ymin(pred), delta_ymax(pred) / h(anchor) * h(anchor) == delta_ymax(pred)
+        y_pred_converted[:,:,2:] += anchors[:,:,:4] # delta(pred) + anchor == pred for all four coordinates
         y_pred_converted = convert_coordinates(y_pred_converted, start_index=-4, conversion='minmax2corners')
     elif input_coords == 'corners':
-        y_pred_converted[:,:,2:] *= y_pred[:,:,-4:] # delta(pred) / size(anchor) / variance * variance == delta(pred) / size(anchor) for all four coordinates, where 'size' refers to w or h, respectively
-        y_pred_converted[:,:,[2,4]] *= np.expand_dims(y_pred[:,:,-6] - y_pred[:,:,-8], axis=-1) # delta_xmin(pred) / w(anchor) * w(anchor) == delta_xmin(pred), delta_xmax(pred) / w(anchor) * w(anchor) == delta_xmax(pred)
-        y_pred_converted[:,:,[3,5]] *= np.expand_dims(y_pred[:,:,-5] - y_pred[:,:,-7], axis=-1) # delta_ymin(pred) / h(anchor) * h(anchor) == delta_ymin(pred), delta_ymax(pred) / h(anchor) * h(anchor) == delta_ymax(pred)
-        y_pred_converted[:,:,2:] += y_pred[:,:,-8:-4] # delta(pred) + anchor == pred for all four coordinates
+        y_pred_converted[:,:,2:] *= anchors[:,:,4:] # delta(pred) / size(anchor) / variance * variance == delta(pred) / size(anchor) for all four coordinates, where 'size' refers to w or h, respectively
+        y_pred_converted[:,:,[2,4]] *= np.expand_dims(anchors[:,:,2] - anchors[:,:,0], axis=-1) # delta_xmin(pred) / w(anchor) * w(anchor) == delta_xmin(pred), delta_xmax(pred) / w(anchor) * w(anchor) == delta_xmax(pred)
+        y_pred_converted[:,:,[3,5]] *= np.expand_dims(anchors[:,:,3] - anchors[:,:,1], axis=-1) # delta_ymin(pred) / h(anchor) * h(anchor) == delta_ymin(pred), delta_ymax(pred) / h(anchor) * h(anchor) == delta_ymax(pred)
+        y_pred_converted[:,:,2:] += anchors[:,:,:4] # delta(pred) + anchor == pred for all four coordinates
     else:
         raise ValueError("Unexpected value for `coords`. Supported values are 'minmax', 'corners' and 'centroids'.")
 
@@ -473,17 +590,7 @@ def _greedy_nms_debug(predictions, iou_threshold=0.45, coords='corners', border_
     left-over boxes for each batch item, which allows you to know which predictor layer predicted a given output
     box and is thus useful for debugging.
     '''
-    boxes_left = np.copy(predictions)
-    maxima = [] # This is where we store the boxes that make it through the non-maximum suppression
-    while boxes_left.shape[0] > 0: # While there are still boxes left to compare...
-        maximum_index = np.argmax(boxes_left[:,1]) # ...get the index of the next box with the highest confidence...
-        maximum_box = np.copy(boxes_left[maximum_index]) # ...copy that box and...
-        maxima.append(maximum_box) # ...append it to `maxima` because we'll definitely keep it
-        boxes_left = np.delete(boxes_left, maximum_index, axis=0) # Now remove the maximum box from `boxes_left`
-        if boxes_left.shape[0] == 0: break # If there are no boxes left after this step, break. Otherwise...
-        similarities = iou(boxes_left[:,2:], maximum_box[2:], coords=coords, mode='element-wise', border_pixels=border_pixels) # ...compare (IoU) the other left over boxes to the maximum box...
-        boxes_left = boxes_left[similarities <= iou_threshold] # ...so that we can remove the ones that overlap too much with the maximum box
-    return np.array(maxima)
+    return _greedy_nms_rows(predictions, 1, iou_threshold=iou_threshold, coords=coords, border_pixels=border_pixels)
 
 def get_num_boxes_per_pred_layer(predictor_sizes, aspect_ratios, two_boxes_for_ar1):
     '''
@@ -22,7 +22,8 @@ limitations under the License.
 from __future__ import division
 import numpy as np
 
-from bounding_box_utils.bounding_box_utils import iou, convert_coordinates
+from bounding_box_utils.bounding_box_utils import convert_coordinates
+from ssd_encoder_decoder.nms_utils import greedy_nms_indices
 
 def greedy_nms(y_pred_decoded, iou_threshold=0.45, coords='corners', border_pixels='half'):
     '''
@@ -60,53 +61,33 @@ def greedy_nms(y_pred_decoded, iou_threshold=0.45, coords='corners', border_pixe
     '''
     y_pred_decoded_nms = []
     for batch_item in y_pred_decoded: # For the labels of each batch item...
-        boxes_left = np.copy(batch_item)
-        maxima = [] # This is where we store the boxes that make it through the non-maximum suppression
-        while boxes_left.shape[0] > 0: # While there are still boxes left to compare...
-            maximum_index = np.argmax(boxes_left[:,1]) # ...get the index of the next box with the highest confidence...
-            maximum_box = np.copy(boxes_left[maximum_index]) # ...copy that box and...
-            maxima.append(maximum_box) # ...append it to `maxima` because we'll definitely keep it
-            boxes_left = np.delete(boxes_left, maximum_index, axis=0) # Now remove the maximum box from `boxes_left`
-            if boxes_left.shape[0] == 0: break # If there are no boxes left after this step, break. Otherwise...
-            similarities = iou(boxes_left[:,2:], maximum_box[2:], coords=coords, mode='element-wise', border_pixels=border_pixels) # ...compare (IoU) the other left over boxes to the maximum box...
-            boxes_left = boxes_left[similarities <= iou_threshold] # ...so that we can remove the ones that overlap too much with the maximum box
-        y_pred_decoded_nms.append(np.array(maxima))
+        y_pred_decoded_nms.append(_greedy_nms_rows(batch_item, 1, iou_threshold=iou_threshold, coords=coords, border_pixels=border_pixels))
 
     return y_pred_decoded_nms
 
+def _greedy_nms_rows(predictions, score_index, iou_threshold=0.45, coords='corners', border_pixels='half'):
+    '''
+    Returns the rows of `predictions` that greedy non-maximum suppression keeps, in the order of selection, for the
+    scores in the column `score_index` and the box coordinates in the columns after it. See `greedy_nms_indices()`.
+    '''
+    if predictions.shape[0] == 0:
+        return np.array([])
+    maxima = greedy_nms_indices(predictions[:,score_index+1:], predictions[:,score_index], iou_threshold=iou_threshold, coords=coords, border_pixels=border_pixels)
+    return predictions[maxima]
+
 def _greedy_nms(predictions, iou_threshold=0.45, coords='corners', border_pixels='half'):
     '''
     The same greedy non-maximum suppression algorithm as above, but slightly modified for use as an internal
     function for per-class NMS in `decode_detections()`.
     '''
-    boxes_left = np.copy(predictions)
-    maxima = [] # This is where we store the boxes that make it through the non-maximum suppression
-    while boxes_left.shape[0] > 0: # While there are still boxes left to compare...
-        maximum_index = np.argmax(boxes_left[:,0]) # ...get the index of the next box with the highest confidence...
-        maximum_box = np.copy(boxes_left[maximum_index]) # ...copy that box and...
-        maxima.append(maximum_box) # ...append it to `maxima` because we'll definitely keep it
-        boxes_left = np.delete(boxes_left, maximum_index, axis=0) # Now remove the maximum box from `boxes_left`
-        if boxes_left.shape[0] == 0: break # If there are no boxes left after this step, break. Otherwise...
-        similarities = iou(boxes_left[:,1:], maximum_box[1:], coords=coords, mode='element-wise', border_pixels=border_pixels) # ...compare (IoU) the other left over boxes to the maximum box...
-        boxes_left = boxes_left[similarities <= iou_threshold] # ...so that we can remove the ones that overlap too much with the maximum box
-    return np.array(maxima)
+    return _greedy_nms_rows(predictions, 0, iou_threshold=iou_threshold, coords=coords, border_pixels=border_pixels)
 
 def _greedy_nms2(predictions, iou_threshold=0.45, coords='corners', border_pixels='half'):
     '''
     The same greedy non-maximum suppression algorithm as above, but slightly modified for use as an internal
     function in `decode_detections_fast()`.
     '''
-    boxes_left = np.copy(predictions)
-    maxima = [] # This is where we store the boxes that make it through the non-maximum suppression
-    while boxes_left.shape[0] > 0: # While there are still boxes left to compare...
-        maximum_index = np.argmax(boxes_left[:,1]) # ...get the index of the next box with the highest confidence...
-        maximum_box = np.copy(boxes_left[maximum_index]) # ...copy that box and...
-        maxima.append(maximum_box) # ...append it to `maxima` because we'll definitely keep it
-        boxes_left = np.delete(boxes_left, maximum_index, axis=0) # Now remove the maximum box from `boxes_left`
-        if boxes_left.shape[0] == 0: break # If there are no boxes left after this step, break. Otherwise...
-        similarities = iou(boxes_left[:,2:], maximum_box[2:], coords=coords, mode='element-wise', border_pixels=border_pixels) # ...compare (IoU) the other left over boxes to the maximum box...
-        boxes_left = boxes_left[similarities <= iou_threshold] # ...so that we can remove the ones that overlap too much with the maximum box
-    return np.array(maxima)
+    return _greedy_nms_rows(predictions, 1, iou_threshold=iou_threshold, coords=coords, border_pixels=border_pixels)
 
 def decode_detections(y_pred,
                       confidence_thresh=0.01,
@@ -473,17 +454,7 @@ def _greedy_nms_debug(predictions, iou_threshold=0.45, coords='corners', border_
     left-over boxes for each batch item, which allows you to know which predictor layer predicted a given output
     box and is thus useful for debugging.
     '''
-    boxes_left = np.copy(predictions)
-    maxima = [] # This is where we store the boxes that make it through the non-maximum suppression
-    while boxes_left.shape[0] > 0: # While there are still boxes left to compare...
-        maximum_index = np.argmax(boxes_left[:,1]) # ...get the index of the next box with the highest confidence...
-        maximum_box = np.copy(boxes_left[maximum_index]) # ...copy that box and...
-        maxima.append(maximum_box) # ...append it to `maxima` because we'll definitely keep it
-        boxes_left = np.delete(boxes_left, maximum_index, axis=0) # Now remove the maximum box from `boxes_left`
-        if boxes_left.shape[0] == 0: break # If there are no boxes left after this step, break. Otherwise...
-        similarities = iou(boxes_left[:,2:], maximum_box[2:], coords=coords, mode='element-wise', border_pixels=border_pixels) # ...compare (IoU) the other left over boxes to the maximum box...
-        boxes_left = boxes_left[similarities <= iou_threshold] # ...so that we can remove the ones that overlap too much with the maximum box
-    return np.array(maxima)
+    return _greedy_nms_rows(predictions, 1, iou_threshold=iou_threshold, coords=coords, border_pixels=border_pixels)
 
 def get_num_boxes_per_pred_layer(predictor_sizes, aspect_ratios, two_boxes_for_ar1):
     '''
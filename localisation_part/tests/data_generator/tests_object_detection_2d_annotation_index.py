@@ -0,0 +1,37 @@
+from data_generator.object_detection_2d_annotation_index import AnnotationIndex
+import numpy as np
+import unittest
+
+
+class test_AnnotationIndex(unittest.TestCase):
+
+    def setUp(self):
+        # Three images with two, zero and one boxes.
+        self.index = AnnotationIndex(image_ids=['000001', '000002', '000003'],
+                                     offsets=np.array([0, 2, 2, 3], dtype=np.int64),
+                                     boxes=np.array([[10, 20, 30, 40], [5, 6, 7, 8], [1, 2, 3, 4]], dtype=np.int32),
+                                     class_ids=np.array([3, 12, 3], dtype=np.int16),
+                                     truncated=np.array([False, True, False]),
+                                     difficult=np.array([False, False, True]))
+
+    def test_labels(self):
+        labels, eval_neutral = self.index.labels()
+        self.assertEqual(labels, [[[3, 10, 20, 30, 40], [12, 5, 6, 7, 8]], [], [[3, 1, 2, 3, 4]]])
+        self.assertEqual(eval_neutral, [[False, False], [], [True]])
+
+        labels, eval_neutral = self.index.labels(labels_output_format=('xmin', 'xmax', 'ymin', 'ymax', 'class_id'), exclude_truncated=True)
+        self.assertEqual(labels, [[[10, 30, 20, 40, 3]], [], [[1, 3, 2, 4, 3]]])
+        self.assertEqual(eval_neutral, [[False], [], [True]])
+
+        labels, _ = self.index.labels(include_classes=[12], exclude_difficult=True)
+        self.assertEqual(labels, [[[12, 5, 6, 7, 8]], [], []])
+
+    def test_unsupported_labels_output_format(self):
+        with self.assertRaises(ValueError):
+            self.index.labels(labels_output_format=('class_id', 'x', 'y', 'w', 'h'))
+        with self.assertRaises(ValueError):
+            self.index.labels(labels_output_format=('class_id', 'xmin', 'ymin', 'xmax', 'ymax', 'difficult'))
+
+
+if __name__ == '__main__':
+    unittest.main()
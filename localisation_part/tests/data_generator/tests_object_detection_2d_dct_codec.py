@@ -0,0 +1,53 @@
+from data_generator.object_detection_2d_dct_codec import JPEGCodec, JPEGCodecError
+import numpy as np
+import os
+import unittest
+
+
+class failing_decoder:
+    # Stands for a `jpegdecoder` decoder that fails on every file.
+    def __init__(self, error):
+        self.error = error
+        self.calls = 0
+
+    def decode_file(self, path, n):
+        self.calls += 1
+        raise self.error
+
+
+class test_JPEGCodec(unittest.TestCase):
+
+    def setUp(self):
+        self.codec = JPEGCodec(max_retries=2)
+        self.image = np.zeros((16, 16, 3), dtype=np.uint8)
+
+    def tearDown(self):
+        self.codec._close_memory_file()
+
+    def test_memory_file_after_fork(self):
+        self.codec._open_memory_file()
+        n_files = len(os.listdir('/proc/self/fd'))
+
+        # A fork is seen as a change of PID, the inherited file must be closed before a new one is opened.
+        for _ in range(4):
+            self.codec.pid = -1
+            self.codec._open_memory_file()
+            self.assertEqual(self.codec.pid, os.getpid())
+            self.assertEqual(len(os.listdir('/proc/self/fd')), n_files)
+
+    def test_retries(self):
+        self.codec.decoder = failing_decoder(RuntimeError('corrupt file'))
+        with self.assertRaises(JPEGCodecError):
+            self.codec(self.image)
+        self.assertEqual(self.codec.decoder.calls, 3)
+        self.assertTrue(self.codec.fd is None)
+
+    def test_no_retry_on_other_errors(self):
+        self.codec.decoder = failing_decoder(TypeError('bug'))
+        with self.assertRaises(TypeError):
+            self.codec(self.image)
+        self.assertEqual(self.codec.decoder.calls, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
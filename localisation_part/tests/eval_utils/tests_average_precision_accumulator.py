@@ -0,0 +1,74 @@
+from eval_utils.average_precision_accumulator import AveragePrecisionAccumulator
+from eval_utils.average_precision_evaluator import Evaluator
+from data_generator.object_detection_2d_data_generator import DataGenerator
+from tests.eval_utils.tests_average_precision_evaluator import random_evaluation_dataset, prediction_results
+import numpy as np
+import unittest
+
+
+def evaluator_average_precisions(data_generator, image_predictions, n_classes, ignore_neutral_boxes=True, matching_iou_threshold=0.5, mode='sample'):
+    # The average precisions of `Evaluator` with a stable sort on the same predictions.
+    evaluator = Evaluator(None, n_classes, data_generator)
+    evaluator.prediction_results = prediction_results(data_generator.image_ids, image_predictions, n_classes)
+    evaluator.get_num_gt_per_class(ignore_neutral_boxes=ignore_neutral_boxes, verbose=False)
+    evaluator.match_predictions(ignore_neutral_boxes=ignore_neutral_boxes, matching_iou_threshold=matching_iou_threshold, sorting_algorithm='mergesort', verbose=False)
+    evaluator.compute_precision_recall(verbose=False)
+    return evaluator.compute_average_precisions(mode=mode, verbose=False, ret=True)
+
+
+def accumulate(accumulator, image_ids, image_predictions, batch_size):
+    for start in range(0, len(image_ids), batch_size):
+        accumulator.update(image_predictions[start:start+batch_size], image_ids[start:start+batch_size])
+
+
+class test_average_precision_accumulator(unittest.TestCase):
+
+    def assert_same_average_precisions(self, accumulator, expected, mode='sample'):
+        average_precisions = accumulator.compute_average_precisions(mode=mode)
+        self.assertEqual(len(average_precisions), len(expected))
+        self.assertTrue(np.array_equal(average_precisions, expected, equal_nan=True))
+
+    def test_same_as_evaluator(self):
+        random_state = np.random.RandomState(0)
+        data_generator, image_predictions = random_evaluation_dataset(random_state, 60, 5)
+        image_ids = data_generator.image_ids
+        for kwargs in [dict(), dict(ignore_neutral_boxes=False, matching_iou_threshold=0.7)]:
+            for mode in ['sample', 'integrate']:
+                expected = evaluator_average_precisions(data_generator, image_predictions, 5, mode=mode, **kwargs)
+                for batch_size in [1, 7, 60]:
+                    accumulator = AveragePrecisionAccumulator(5, data_generator, **kwargs)
+                    accumulate(accumulator, image_ids, image_predictions, batch_size)
+                    self.assert_same_average_precisions(accumulator, expected, mode=mode)
+                    self.assertEqual(accumulator.compute_mean_average_precision(mode=mode), np.average(expected[1:]))
+
+    def test_images_seen_so_far(self):
+        random_state = np.random.RandomState(1)
+        data_generator, image_predictions = random_evaluation_dataset(random_state, 40, 4)
+        image_ids = data_generator.image_ids
+        accumulator = AveragePrecisionAccumulator(4, data_generator)
+        seen_images = 0
+        for n_images in [10, 25, 40]:
+            accumulate(accumulator, image_ids[seen_images:n_images], image_predictions[seen_images:n_images], 4)
+            seen_images = n_images
+            seen = DataGenerator(labels=data_generator.labels[:n_images], image_ids=image_ids[:n_images], eval_neutral=data_generator.eval_neutral[:n_images])
+            self.assert_same_average_precisions(accumulator, evaluator_average_precisions(seen, image_predictions[:n_images], 4))
+        accumulator.reset()
+        self.assertTrue(np.array_equal(accumulator.num_gt_per_class, np.zeros(5)))
+        accumulate(accumulator, image_ids, image_predictions, 40)
+        self.assert_same_average_precisions(accumulator, evaluator_average_precisions(data_generator, image_predictions, 4))
+
+    def test_decoded_predictions(self):
+        random_state = np.random.RandomState(2)
+        data_generator, image_predictions = random_evaluation_dataset(random_state, 30, 3)
+        # Unrounded single precision predictions as decoded by the model, and images without predictions.
+        image_predictions = [(predictions + random_state.uniform(-0.5, 0.5, size=predictions.shape) * [0, 0, 1, 1, 1, 1]).astype(np.float32) for predictions in image_predictions]
+        image_predictions[3] = np.array([])
+        image_predictions[4] = np.zeros((0, 6), dtype=np.float32)
+        rounded = [np.array([[box[0], box[1]] + [round(c, 1) for c in box[2:]] for box in predictions]) for predictions in image_predictions]
+        accumulator = AveragePrecisionAccumulator(3, data_generator)
+        accumulate(accumulator, data_generator.image_ids, image_predictions, 8)
+        self.assert_same_average_precisions(accumulator, evaluator_average_precisions(data_generator, rounded, 3))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+from eval_utils.average_precision_callback import ValidationMeanAveragePrecision
+from tests.eval_utils.tests_average_precision_evaluator import random_evaluation_dataset
+from tests.ssd_encoder_decoder.tests_ssd_output_decoder import random_model_output
+from keras.callbacks import CallbackList, CSVLogger
+import numpy as np
+import csv
+import os
+import shutil
+import tempfile
+import unittest
+
+
+class random_model:
+    # Stands for a Keras model in 'training' mode: `predict_on_batch()` returns the raw predictions of random ground truth.
+    stop_training = False
+
+    def __init__(self, seed):
+        self.random_state = np.random.RandomState(seed)
+
+    def predict_on_batch(self, batch_X):
+        return random_model_output(self.random_state, len(batch_X), 10).astype(np.float32)
+
+
+class test_ValidationMeanAveragePrecision(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_csv_logger(self):
+        random_state = np.random.RandomState(0)
+        data_generator, _ = random_evaluation_dataset(random_state, 12, 20)
+        image_ids = data_generator.image_ids
+        batches = [(np.zeros((len(image_ids[i:i+4]), 1)), image_ids[i:i+4], [[] for _ in image_ids[i:i+4]]) for i in range(0, len(image_ids), 4)]
+        filename = os.path.join(self.directory, 'training_log.csv')
+
+        # The CSV logger reads the keys of the first epoch at every epoch, also at the epochs that are not evaluated.
+        validation_map = ValidationMeanAveragePrecision(batches, data_generator, 20, 300, 300, period=3, verbose=0)
+        callbacks = CallbackList([validation_map, CSVLogger(filename=filename, append=True)])
+        callbacks.set_model(random_model(1))
+        callbacks.on_train_begin()
+        for epoch in range(7):
+            callbacks.on_epoch_end(epoch, {'loss': 1.0, 'val_loss': 2.0})
+        callbacks.on_train_end()
+
+        with open(filename) as f:
+            rows = list(csv.DictReader(f))
+        self.assertEqual([int(row['epoch']) for row in rows], list(range(7)))
+        evaluated = [not np.isnan(float(row['val_mAP'])) for row in rows]
+        self.assertEqual(evaluated, [True, False, True, False, False, True, False])
+        self.assertTrue(all(0 <= float(row['val_mAP']) <= 1 for row in rows[::5]))
+
+    def test_border_pixels(self):
+        random_state = np.random.RandomState(0)
+        data_generator, _ = random_evaluation_dataset(random_state, 4, 20)
+
+        # The decoding and the matching treat the border pixels separately, like `Evaluator.__call__()`.
+        validation_map = ValidationMeanAveragePrecision([], data_generator, 20, 300, 300, verbose=0)
+        self.assertEqual(validation_map.decoding_kwargs['border_pixels'], 'half')
+        self.assertEqual(validation_map.accumulator.border_pixels, 'include')
+
+        validation_map = ValidationMeanAveragePrecision([], data_generator, 20, 300, 300, decoding_border_pixels='exclude', border_pixels='half', verbose=0)
+        self.assertEqual(validation_map.decoding_kwargs['border_pixels'], 'exclude')
+        self.assertEqual(validation_map.accumulator.border_pixels, 'half')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,234 @@
+from eval_utils.average_precision_evaluator import Evaluator, COCO_MATCHING_IOU_THRESHOLDS, COCO_AREA_RANGES, summarize_average_precisions
+from data_generator.object_detection_2d_data_generator import DataGenerator
+from bounding_box_utils.bounding_box_utils import iou
+import numpy as np
+import unittest
+
+
+def match_predictions_by_loop(evaluator, ignore_neutral_boxes=True, matching_iou_threshold=0.5, border_pixels='include', sorting_algorithm='quicksort', area_range=None):
+    # The matching of the evaluator as a loop over the predictions of each class in the order of decreasing confidence.
+    # With an area range `(name, lower bound, upper bound)`, the ground truth boxes out of it are neutral, and so are
+    # the unmatched predictions out of it.
+    def out_of_range(areas):
+        return np.zeros(np.shape(areas), dtype=np.bool_) if area_range is None else (areas < area_range[1]) | (areas > area_range[2])
+    gt_format = evaluator.gt_format
+    data_generator = evaluator.data_generator
+    eval_neutral_available = ignore_neutral_boxes and not (data_generator.eval_neutral is None)
+    ground_truth = {}
+    for i in range(len(data_generator.image_ids)):
+        labels = np.asarray(data_generator.labels[i]).reshape(-1, 5)
+        eval_neutral = np.asarray(data_generator.eval_neutral[i], dtype=np.bool_) if eval_neutral_available else np.zeros(len(labels), dtype=np.bool_)
+        areas = (labels[:,gt_format['ymax']] - labels[:,gt_format['ymin']]) * (labels[:,gt_format['xmax']] - labels[:,gt_format['xmin']])
+        kept = ~(areas < evaluator.ignore_under_area) if evaluator.ignore_under_area > 0 else np.ones(len(labels), dtype=np.bool_)
+        ground_truth[str(data_generator.image_ids[i])] = (labels[kept], eval_neutral[kept] | out_of_range(areas[kept]))
+
+    true_positives, false_positives = [[]], [[]]
+    for class_id in range(1, evaluator.n_classes + 1):
+        predictions = evaluator.prediction_results[class_id]
+        true_pos = np.zeros(len(predictions), dtype=np.int64)
+        false_pos = np.zeros(len(predictions), dtype=np.int64)
+        if len(predictions) > 0:
+            preds_data_type = np.dtype([('image_id', 'U{}'.format(len(str(predictions[0][0])) + 6)),
+                                        ('confidence', 'f4'), ('xmin', 'f4'), ('ymin', 'f4'), ('xmax', 'f4'), ('ymax', 'f4')])
+            predictions = np.array(predictions, dtype=preds_data_type)
+            predictions_sorted = predictions[np.argsort(-predictions['confidence'], kind=sorting_algorithm)]
+            gt_matched = {}
+            for i in range(len(predictions)):
+                prediction = predictions_sorted[i]
+                image_id = prediction['image_id']
+                pred_box = np.asarray(list(prediction[['xmin', 'ymin', 'xmax', 'ymax']]))
+                pred_ignored = out_of_range((pred_box[2] - pred_box[0]) * (pred_box[3] - pred_box[1]))
+                gt, eval_neutral = ground_truth[image_id]
+                class_mask = gt[:,gt_format['class_id']] == class_id
+                gt, eval_neutral = gt[class_mask], eval_neutral[class_mask]
+                if gt.size == 0:
+                    false_pos[i] = not pred_ignored
+                    continue
+                overlaps = iou(gt[:,[gt_format['xmin'], gt_format['ymin'], gt_format['xmax'], gt_format['ymax']]], pred_box,
+                               coords='corners', mode='element-wise', border_pixels=border_pixels)
+                gt_match_index = np.argmax(overlaps)
+                if overlaps[gt_match_index] < matching_iou_threshold:
+                    false_pos[i] = not pred_ignored
+                elif not eval_neutral[gt_match_index]:
+                    matched = gt_matched.setdefault(image_id, np.zeros(gt.shape[0], dtype=np.bool_))
+                    if matched[gt_match_index]:
+                        false_pos[i] = 1
+                    else:
+                        true_pos[i] = 1
+                        matched[gt_match_index] = True
+        true_positives.append(true_pos)
+        false_positives.append(false_pos)
+    return true_positives, false_positives
+
+
+def random_evaluation_dataset(random_state, n_images, n_classes, max_boxes=10, predictions_per_box=5, random_predictions=10, n_scores=100):
+    # Integer ground truth boxes with a few neutral ones, and for each image the rows `[class_id, conf, xmin, ymin, xmax, ymax]`
+    # of its predictions, rounded as by `predict_on_dataset()`: noisy copies of the ground truth boxes, sometimes of another
+    # class, and boxes anywhere, with few distinct confidences.
+    image_ids = ['{:06d}'.format(i) for i in random_state.permutation(10 * n_images)[:n_images]]
+    labels, eval_neutral, image_predictions = [], [], []
+    for image_id in image_ids:
+        n_boxes = random_state.randint(0, max_boxes + 1)
+        mins = random_state.randint(0, 400, size=(n_boxes, 2))
+        boxes = np.concatenate([random_state.randint(1, n_classes + 1, size=(n_boxes, 1)), mins, mins + random_state.randint(1, 150, size=(n_boxes, 2))], axis=1)
+        labels.append(boxes)
+        eval_neutral.append(list(random_state.uniform(size=n_boxes) < 0.1))
+
+        copies = np.repeat(boxes, predictions_per_box, axis=0)
+        copies[:,1:] += random_state.normal(0, 8, size=(len(copies), 4)).astype(np.int64)
+        copies[:,3:] = np.maximum(copies[:,3:], copies[:,1:3])
+        other_class = random_state.uniform(size=len(copies)) < 0.1
+        copies[other_class,0] = random_state.randint(1, n_classes + 1, size=np.sum(other_class))
+        mins = random_state.uniform(0, 400, size=(random_predictions, 2))
+        anywhere = np.concatenate([random_state.randint(1, n_classes + 1, size=(random_predictions, 1)), mins, mins + random_state.uniform(1, 150, size=(random_predictions, 2))], axis=1)
+        predictions = np.concatenate([copies, anywhere], axis=0)
+        confidences = random_state.randint(1, n_scores + 1, size=(len(predictions), 1)) / n_scores
+        image_predictions.append(np.concatenate([predictions[:,:1], confidences, np.round(predictions[:,1:], 1)], axis=1))
+    return DataGenerator(labels=labels, image_ids=image_ids, eval_neutral=eval_neutral), image_predictions
+
+
+def prediction_results(image_ids, image_predictions, n_classes):
+    # The predictions of each class as stored by `predict_on_dataset()`.
+    results = [list() for _ in range(n_classes + 1)]
+    for image_id, predictions in zip(image_ids, image_predictions):
+        for prediction in predictions:
+            results[int(prediction[0])].append((image_id,) + tuple(prediction[1:]))
+    return results
+
+
+def random_evaluator(random_state, n_images, n_classes, ignore_under_area=0, **kwargs):
+    data_generator, image_predictions = random_evaluation_dataset(random_state, n_images, n_classes, **kwargs)
+    evaluator = Evaluator(None, n_classes, data_generator, ignore_under_area=ignore_under_area)
+    evaluator.prediction_results = prediction_results(data_generator.image_ids, image_predictions, n_classes)
+    return evaluator
+
+
+class test_match_predictions(unittest.TestCase):
+
+    def assert_same_matches(self, evaluator, **kwargs):
+        expected_true_positives, expected_false_positives = match_predictions_by_loop(evaluator, **kwargs)
+        true_positives, false_positives, cumulative_true_positives, cumulative_false_positives = evaluator.match_predictions(verbose=False, ret=True, **kwargs)
+        self.assertEqual(len(true_positives), evaluator.n_classes + 1)
+        self.assertEqual(len(cumulative_true_positives), evaluator.n_classes + 1)
+        for class_id in range(1, evaluator.n_classes + 1):
+            self.assertTrue(np.array_equal(true_positives[class_id], expected_true_positives[class_id]))
+            self.assertTrue(np.array_equal(false_positives[class_id], expected_false_positives[class_id]))
+            self.assertTrue(np.array_equal(cumulative_true_positives[class_id], np.cumsum(expected_true_positives[class_id])))
+            self.assertTrue(np.array_equal(cumulative_false_positives[class_id], np.cumsum(expected_false_positives[class_id])))
+
+    def test_same_as_loop(self):
+        random_state = np.random.RandomState(0)
+        evaluator = random_evaluator(random_state, 50, 5)
+        self.assert_same_matches(evaluator)
+        self.assert_same_matches(evaluator, sorting_algorithm='mergesort')
+        self.assert_same_matches(evaluator, ignore_neutral_boxes=False, matching_iou_threshold=0.7)
+        self.assert_same_matches(evaluator, matching_iou_threshold=0.3, border_pixels='half')
+        evaluator.data_generator.eval_neutral = None
+        with np.errstate(invalid='ignore'):
+            self.assert_same_matches(evaluator, border_pixels='exclude')
+
+    def test_ignore_under_area(self):
+        random_state = np.random.RandomState(1)
+        evaluator = random_evaluator(random_state, 50, 5, ignore_under_area=2000)
+        self.assert_same_matches(evaluator)
+        self.assert_same_matches(evaluator, ignore_neutral_boxes=False)
+
+        # The neutral boxes left out with the small boxes are not counted.
+        expected = np.zeros(evaluator.n_classes + 1, dtype=np.int64)
+        for labels, eval_neutral in zip(evaluator.data_generator.labels, evaluator.data_generator.eval_neutral):
+            for label, neutral in zip(labels, eval_neutral):
+                if not neutral and (label[4] - label[2]) * (label[3] - label[1]) >= 2000:
+                    expected[label[0]] += 1
+        self.assertTrue(np.array_equal(evaluator.get_num_gt_per_class(verbose=False, ret=True), expected))
+
+    def test_degenerate_boxes(self):
+        random_state = np.random.RandomState(2)
+        evaluator = random_evaluator(random_state, 20, 3, max_boxes=4, predictions_per_box=3, random_predictions=2)
+        # Boxes without area have undefined IoUs with each other in 'half' mode.
+        for labels in evaluator.data_generator.labels:
+            labels[::2, 3] = labels[::2, 1]
+        for predictions in evaluator.prediction_results:
+            for i in range(0, len(predictions), 2):
+                predictions[i] = predictions[i][:4] + (predictions[i][2],) + predictions[i][5:]
+        with np.errstate(invalid='ignore'):
+            self.assert_same_matches(evaluator, border_pixels='half')
+            self.assert_same_matches(evaluator)
+
+    def test_without_predictions(self):
+        random_state = np.random.RandomState(3)
+        evaluator = random_evaluator(random_state, 10, 4)
+        evaluator.prediction_results[2] = []
+        evaluator.data_generator.labels[3] = np.zeros((0, 5), dtype=np.int64)
+        evaluator.data_generator.eval_neutral[3] = []
+        self.assert_same_matches(evaluator)
+        self.assertEqual(len(evaluator.true_positives[2]), 0)
+
+
+
+class test_match_predictions_at_thresholds(unittest.TestCase):
+
+    def assert_same_matches(self, evaluator, matching_iou_thresholds=COCO_MATCHING_IOU_THRESHOLDS, area_ranges=COCO_AREA_RANGES, **kwargs):
+        true_positives, false_positives = evaluator.match_predictions_at_thresholds(matching_iou_thresholds=matching_iou_thresholds,
+                                                                                    area_ranges=area_ranges, verbose=False, ret=True, **kwargs)
+        for i, area_range in enumerate(area_ranges):
+            for j, matching_iou_threshold in enumerate(matching_iou_thresholds):
+                expected_true_positives, expected_false_positives = match_predictions_by_loop(evaluator,
+                                                                                              matching_iou_threshold=matching_iou_threshold,
+                                                                                              area_range=area_range, **kwargs)
+                for class_id in range(1, evaluator.n_classes + 1):
+                    self.assertTrue(np.array_equal(true_positives[class_id][i, j], expected_true_positives[class_id]))
+                    self.assertTrue(np.array_equal(false_positives[class_id][i, j], expected_false_positives[class_id]))
+
+    def test_same_as_loop(self):
+        random_state = np.random.RandomState(4)
+        evaluator = random_evaluator(random_state, 30, 4)
+        self.assert_same_matches(evaluator)
+        self.assert_same_matches(evaluator, matching_iou_thresholds=[0.3, 0.5], ignore_neutral_boxes=False, sorting_algorithm='mergesort')
+        self.assert_same_matches(evaluator, matching_iou_thresholds=[0.5, 0.9], area_ranges=[('all', 0, np.inf), ('tiny', 0, 100)], border_pixels='half')
+
+    def test_pascal_voc_slice(self):
+        random_state = np.random.RandomState(5)
+        evaluator = random_evaluator(random_state, 40, 5)
+        evaluator.prediction_results[3] = []
+        expected = evaluator.match_predictions(verbose=False, ret=True)
+        evaluator.get_num_gt_per_class(verbose=False)
+        evaluator.compute_precision_recall(verbose=False)
+        expected_average_precisions = evaluator.compute_average_precisions(mode='integrate', verbose=False, ret=True)
+
+        evaluator.match_predictions_at_thresholds(verbose=False)
+        for matches, expected_matches in zip([evaluator.true_positives, evaluator.false_positives,
+                                              evaluator.cumulative_true_positives, evaluator.cumulative_false_positives], expected):
+            for class_id in range(1, evaluator.n_classes + 1):
+                self.assertTrue(np.array_equal(matches[class_id], expected_matches[class_id]))
+                self.assertEqual(matches[class_id].dtype, expected_matches[class_id].dtype)
+        evaluator.compute_precision_recall(verbose=False)
+        self.assertEqual(evaluator.compute_average_precisions(mode='integrate', verbose=False, ret=True), expected_average_precisions)
+
+        average_precisions = evaluator.compute_average_precisions_at_thresholds(mode='integrate', verbose=False, ret=True)
+        self.assertEqual(average_precisions.shape, (4, 10, evaluator.n_classes + 1))
+        self.assertTrue(np.array_equal(average_precisions[0, 0, 1:], expected_average_precisions[1:]))
+        summary = summarize_average_precisions(average_precisions)
+        self.assertEqual(summary['mAP@0.50'], np.mean(expected_average_precisions[1:]))
+        self.assertAlmostEqual(summary['mAP'], np.mean(average_precisions[0, :, 1:]))
+        # The average precisions decrease as the matching threshold increases.
+        self.assertTrue(np.all(np.diff(average_precisions[0, :, 1:], axis=0) <= 1e-12))
+
+    def test_empty_area_ranges(self):
+        random_state = np.random.RandomState(6)
+        evaluator = random_evaluator(random_state, 10, 3)
+        area_ranges = [('all', 0, np.inf), ('huge', 1e6, np.inf), ('some', 0, 2000)]
+        evaluator.match_predictions_at_thresholds(matching_iou_thresholds=[0.5, 0.75], area_ranges=area_ranges, verbose=False)
+        average_precisions = evaluator.compute_average_precisions_at_thresholds(verbose=False, ret=True)
+        # The classes without ground truth box in a range are left out of its mean.
+        self.assertTrue(np.all(np.isnan(average_precisions[1])))
+        self.assertTrue(np.all(np.isnan(average_precisions[:, :, 0])))
+        summary = summarize_average_precisions(average_precisions, [0.5, 0.75], area_ranges)
+        self.assertEqual(sorted(summary), ['mAP', 'mAP@0.50', 'mAP@0.75', 'mAP_huge', 'mAP_some'])
+        self.assertTrue(np.isnan(summary['mAP_huge']))
+        self.assertAlmostEqual(summary['mAP_some'], np.mean(np.nanmean(average_precisions[2, :, 1:], axis=-1)))
+        with self.assertRaises(ValueError):
+            evaluator.match_predictions_at_thresholds(matching_iou_thresholds=[0.55, 0.75], verbose=False)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,122 @@
+from eval_utils.prediction_cache import prediction_cache_config, prediction_cache_path, original_image_sizes, resize_inverter, PredictionCache
+from eval_utils.average_precision_evaluator import Evaluator
+from data_generator.object_detection_2d_data_generator import DataGenerator
+from data_generator.object_detection_2d_geometric_ops import Resize
+from tests.ssd_encoder_decoder.tests_ssd_output_decoder import random_model_output
+from PIL import Image
+import numpy as np
+import os
+import shutil
+import tempfile
+import unittest
+
+
+class random_model:
+    # Stands for a Keras model in 'training' mode: `predict()` returns the float32 raw predictions of random ground truth.
+    def __init__(self, seed):
+        self.random_state = np.random.RandomState(seed)
+        self.n_calls = 0
+
+    def predict(self, batch_X):
+        self.n_calls += 1
+        return random_model_output(self.random_state, len(batch_X), 10).astype(np.float32)
+
+
+def image_dataset(directory, random_state, n_images):
+    # JPEG images of random sizes with a few random ground truth boxes each.
+    filenames, labels, image_ids, eval_neutral = [], [], [], []
+    for i in range(n_images):
+        height, width = random_state.randint(100, 500, size=2)
+        filenames.append(os.path.join(directory, '{:03d}.jpg'.format(i)))
+        Image.fromarray(np.zeros((height, width, 3), dtype=np.uint8)).save(filenames[-1])
+        n_boxes = random_state.randint(1, 5)
+        corners = np.sort(random_state.randint(0, min(height, width), size=(n_boxes, 2, 2)), axis=1)
+        labels.append(np.concatenate([random_state.randint(1, 21, size=(n_boxes, 1)), corners[:, 0], corners[:, 1] + 1], axis=1))
+        image_ids.append('{:03d}'.format(i))
+        eval_neutral.append(random_state.rand(n_boxes) < 0.1)
+    return DataGenerator(filenames=filenames, labels=labels, image_ids=image_ids, eval_neutral=eval_neutral, verbose=False)
+
+
+class test_prediction_cache(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache_dir = os.path.join(self.directory, 'cache')
+        self.weights_path = os.path.join(self.directory, 'weights.h5')
+        with open(self.weights_path, 'wb') as f:
+            f.write(b'weights')
+        self.dataset = image_dataset(self.directory, np.random.RandomState(0), 7)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def predict(self, model, **kwargs):
+        evaluator = Evaluator(model, 20, self.dataset, model_mode='training')
+        return evaluator.predict_on_dataset(300, 300, 3, decoding_top_k=50, verbose=False, ret=True, **kwargs)
+
+    def test_same_as_model(self):
+        expected = self.predict(random_model(1))
+        model = random_model(1)
+        written = self.predict(model, weights_path=self.weights_path, prediction_cache_dir=self.cache_dir)
+        self.assertEqual(written, expected)
+        self.assertEqual(model.n_calls, 3)
+        self.assertEqual(len(os.listdir(self.cache_dir)), 1)
+
+        # The cached predictions are decoded again without running the model.
+        model = random_model(1)
+        self.assertEqual(self.predict(model, weights_path=self.weights_path, prediction_cache_dir=self.cache_dir), expected)
+        self.assertEqual(model.n_calls, 0)
+        evaluator = Evaluator(model, 20, self.dataset, model_mode='training')
+        decoded = evaluator.predict_on_dataset(300, 300, 3, decoding_confidence_thresh=0.5, verbose=False, ret=True,
+                                               weights_path=self.weights_path, prediction_cache_dir=self.cache_dir)
+        self.assertEqual(model.n_calls, 0)
+        self.assertEqual(decoded, Evaluator(random_model(1), 20, self.dataset, model_mode='training').predict_on_dataset(
+                                  300, 300, 3, decoding_confidence_thresh=0.5, verbose=False, ret=True))
+
+    def test_key(self):
+        config = prediction_cache_config(300, 300, 'resize', self.dataset)
+        path = prediction_cache_path(self.weights_path, self.dataset.image_ids, config, self.cache_dir)
+        self.assertEqual(prediction_cache_path(self.weights_path, list(self.dataset.image_ids), dict(config), self.cache_dir), path)
+        self.assertNotEqual(prediction_cache_path(self.weights_path, self.dataset.image_ids[::-1], config, self.cache_dir), path)
+        self.assertNotEqual(prediction_cache_path(self.weights_path, self.dataset.image_ids,
+                                                  prediction_cache_config(512, 512, 'resize', self.dataset), self.cache_dir), path)
+        with open(self.weights_path, 'wb') as f:
+            f.write(b'retrained weights')
+        self.assertNotEqual(prediction_cache_path(self.weights_path, self.dataset.image_ids, config, self.cache_dir), path)
+
+    def test_cached_batches(self):
+        model = random_model(2)
+        self.predict(model, weights_path=self.weights_path, prediction_cache_dir=self.cache_dir)
+        cache = PredictionCache(os.path.join(self.cache_dir, os.listdir(self.cache_dir)[0]))
+        self.assertEqual(cache.image_ids, self.dataset.image_ids)
+        y_preds = [batch[0] for batch in cache.batches(4)]
+        self.assertEqual([len(y_pred) for y_pred in y_preds], [4, 3])
+        expected = random_model(2)
+        for i in range(3):
+            # The model was run on batches of 3 images.
+            y_pred = expected.predict(np.zeros((min(3, 7 - 3 * i), 1)))
+            self.assertTrue(np.array_equal(np.concatenate(y_preds, axis=0)[3 * i:3 * i + len(y_pred)], y_pred))
+
+    def test_resize_inverter(self):
+        random_state = np.random.RandomState(3)
+        predictions = np.concatenate([random_state.randint(1, 21, size=(20, 1)), random_state.rand(20, 1),
+                                      random_state.uniform(0, 300, size=(20, 4))], axis=1)
+        image_sizes = random_state.randint(50, 1000, size=(5, 2))
+        inverse_transforms = [[Resize(300, 300)(np.zeros((height, width, 3), dtype=np.uint8), return_inverter=True)[1]]
+                              for height, width in image_sizes]
+        self.assertTrue(np.array_equal(original_image_sizes(inverse_transforms, 300, 300), image_sizes))
+        for image_size, inverse_transform in zip(image_sizes, inverse_transforms):
+            self.assertTrue(np.array_equal(resize_inverter(image_size, 300, 300)(predictions), inverse_transform[0](predictions)))
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            self.predict(random_model(4), data_generator_mode='pad', weights_path=self.weights_path, prediction_cache_dir=self.cache_dir)
+        with self.assertRaises(ValueError):
+            self.predict(random_model(4), prediction_cache_dir=self.cache_dir)
+        with self.assertRaises(ValueError):
+            Evaluator(random_model(4), 20, self.dataset, model_mode='inference').predict_on_dataset(
+                300, 300, 3, verbose=False, weights_path=self.weights_path, prediction_cache_dir=self.cache_dir)
+
+
+if __name__ == '__main__':
+    unittest.main()
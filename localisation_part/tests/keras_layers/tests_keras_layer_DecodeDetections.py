@@ -0,0 +1,36 @@
+from keras_layers.keras_layer_DecodeDetections import DecodeDetections
+from tests.ssd_encoder_decoder.tests_ssd_output_decoder import random_model_output
+import numpy as np
+import tensorflow as tf
+import unittest
+
+
+class test_DecodeDetections(unittest.TestCase):
+
+    def decode(self, y_pred, **kwargs):
+        with tf.Graph().as_default():
+            layer = DecodeDetections(img_height=300, img_width=300, **kwargs)
+            layer.build(y_pred.shape)
+            y_pred_decoded = layer.call(tf.constant(y_pred, dtype=tf.float32))
+            with tf.Session() as session:
+                return session.run(y_pred_decoded)
+
+    def test_batched_nms_same_as_map_fn(self):
+        y_pred = random_model_output(np.random.RandomState(0), 6, 10).astype(np.float32)
+
+        for kwargs in [dict(confidence_thresh=0.2), dict(confidence_thresh=0.5, iou_threshold=0.3, top_k=50)]:
+            # No class has more than `nms_max_output_size` boxes above the threshold, the outputs of both paths are the same.
+            self.assertTrue(np.amax(np.sum(y_pred[:, :, 1:-12] > kwargs['confidence_thresh'], axis=1)) <= 400)
+            expected = self.decode(y_pred, **kwargs)
+            for nms_chunk_size in [1, 7, 64, 1000]:
+                y_pred_decoded = self.decode(y_pred, batched_nms=True, nms_chunk_size=nms_chunk_size, **kwargs)
+                self.assertEqual(y_pred_decoded.shape, expected.shape)
+                self.assertTrue(np.allclose(y_pred_decoded, expected, atol=1e-4))
+
+    def test_invalid_chunk_size(self):
+        with self.assertRaises(ValueError):
+            DecodeDetections(img_height=300, img_width=300, batched_nms=True, nms_chunk_size=0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,34 @@
+from keras_loss_function.keras_ssd_loss import SSDLoss
+from tests.ssd_encoder_decoder.tests_ssd_input_encoder import ssd300_encoder, random_ground_truth
+import numpy as np
+import tensorflow as tf
+import unittest
+
+
+class test_SSDLoss(unittest.TestCase):
+
+    def loss(self, y_true, y_pred, **kwargs):
+        with tf.Graph().as_default():
+            loss = SSDLoss(**kwargs).compute_loss(tf.constant(y_true, dtype=tf.float32), tf.constant(y_pred, dtype=tf.float32))
+            with tf.Session() as session:
+                return session.run(loss)
+
+    def test_sparse_same_as_dense(self):
+        random_state = np.random.RandomState(0)
+        ground_truth = random_ground_truth(random_state, 8, 10)
+        y_dense = ssd300_encoder()(ground_truth)
+        y_sparse = ssd300_encoder(sparse_targets=True, sparse_dtype=np.float32)(ground_truth)
+
+        # Softmax class scores and random offsets, the last eight entries being unused by the loss.
+        logits = random_state.normal(size=y_dense.shape[:2] + (21,))
+        y_pred = np.concatenate([np.exp(logits) / np.sum(np.exp(logits), axis=-1, keepdims=True),
+                                 random_state.normal(size=y_dense.shape[:2] + (12,))], axis=-1)
+
+        for kwargs in [dict(), dict(neg_pos_ratio=1, n_neg_min=100, alpha=0.5)]:
+            dense_loss = self.loss(y_dense, y_pred, **kwargs)
+            self.assertTrue(np.allclose(self.loss(y_sparse, y_pred, sparse_targets=True, **kwargs), dense_loss, rtol=1e-6))
+            self.assertTrue(np.allclose(self.loss(y_sparse.astype(np.float16), y_pred, sparse_targets=True, **kwargs), dense_loss, rtol=1e-2))
+
+
+if __name__ == '__main__':
+    unittest.main()
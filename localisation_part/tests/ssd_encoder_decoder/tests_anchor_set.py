@@ -0,0 +1,96 @@
+from ssd_encoder_decoder.anchor_set import AnchorSet
+from ssd_encoder_decoder.ssd_output_decoder import decode_detections, decode_detections_batched, decode_detections_fast
+from tests.ssd_encoder_decoder.tests_ssd_input_encoder import ssd300_encoder, random_ground_truth
+import numpy as np
+import os
+import shutil
+import tempfile
+import unittest
+
+
+def ssd300_anchor_config(**kwargs):
+    parameters = dict(img_height=300,
+                      img_width=300,
+                      predictor_sizes=[(38, 38), (19, 19), (10, 10), (5, 5), (3, 3), (1, 1)],
+                      scales=[0.1, 0.2, 0.37, 0.54, 0.71, 0.88, 1.05],
+                      aspect_ratios_per_layer=[[1.0, 2.0, 0.5],
+                                               [1.0, 2.0, 0.5, 3.0, 1.0/3.0],
+                                               [1.0, 2.0, 0.5, 3.0, 1.0/3.0],
+                                               [1.0, 2.0, 0.5, 3.0, 1.0/3.0],
+                                               [1.0, 2.0, 0.5],
+                                               [1.0, 2.0, 0.5]],
+                      two_boxes_for_ar1=True,
+                      steps=[8, 16, 32, 64, 100, 300],
+                      offsets=[0.5, 0.5, 0.5, 0.5, 0.5, 0.5],
+                      variances=[0.1, 0.1, 0.2, 0.2])
+    parameters.update(kwargs)
+    return parameters
+
+
+class test_AnchorSet(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+
+    def test_memoized(self):
+        anchor_set = AnchorSet.get(**ssd300_anchor_config())
+        self.assertTrue(AnchorSet.get(**ssd300_anchor_config(steps=np.array([8, 16, 32, 64, 100, 300]))) is anchor_set)
+        self.assertTrue(ssd300_encoder().anchor_set is anchor_set)
+        self.assertFalse(AnchorSet.get(**ssd300_anchor_config(clip_boxes=True)) is anchor_set)
+        self.assertEqual(len(anchor_set), 8732)
+        self.assertEqual(anchor_set.anchors.shape, (8732, 8))
+
+    def test_save_load(self):
+        config = ssd300_anchor_config(coords='corners', normalize_coords=False)
+        anchor_set = AnchorSet(**config)
+        AnchorSet._memo.pop(anchor_set.key, None)
+        AnchorSet.get(cache_dir=self.cache_dir, **config)
+        self.assertTrue(os.path.isfile(os.path.join(self.cache_dir, 'anchor_set_{}.npz'.format(anchor_set.key))))
+        AnchorSet._memo.pop(anchor_set.key)
+        loaded = AnchorSet.get(cache_dir=self.cache_dir, **config)
+        self.assertEqual(loaded.config, anchor_set.config)
+        self.assertTrue(np.array_equal(loaded.anchors, anchor_set.anchors))
+        for i in range(6):
+            self.assertTrue(np.array_equal(loaded.layer_anchors(i, config['predictor_sizes'][i]),
+                                           anchor_set.layer_anchors(i, config['predictor_sizes'][i])))
+
+    def test_mismatch(self):
+        anchor_set = AnchorSet.get(**ssd300_anchor_config())
+        with self.assertRaises(ValueError):
+            anchor_set.check(AnchorSet.configuration(**ssd300_anchor_config(scales=[0.1, 0.2, 0.37, 0.54, 0.71, 0.88, 1.0])))
+        with self.assertRaises(ValueError):
+            ssd300_encoder(predictor_sizes=[(37, 37), (19, 19), (10, 10), (5, 5), (3, 3), (1, 1)], anchor_set=anchor_set)
+        with self.assertRaises(ValueError):
+            anchor_set.layer_anchors(0, (37, 37))
+
+    def test_encoder(self):
+        anchor_set = AnchorSet(**ssd300_anchor_config(coords='minmax'))
+        encoder = ssd300_encoder(coords='minmax', anchor_set=anchor_set)
+        self.assertTrue(encoder.anchor_set is anchor_set)
+        self.assertTrue(np.array_equal(encoder.anchor_template[:, -8:], anchor_set.anchors))
+        self.assertTrue(np.array_equal(encoder.anchor_template, ssd300_encoder(coords='minmax').anchor_template))
+
+    def test_decoders(self):
+        random_state = np.random.RandomState(0)
+        for coords in ['centroids', 'minmax', 'corners']:
+            encoder = ssd300_encoder(coords=coords)
+            y_pred = encoder(random_ground_truth(random_state, 4, 10)).astype(np.float64)
+            y_pred[:, :, :-12] += random_state.uniform(0, 0.5, size=y_pred[:, :, :-12].shape)
+            y_pred[:, :, -12:-8] += random_state.normal(0, 0.1, size=y_pred[:, :, -12:-8].shape)
+            # The output of a model built with `mode='compact'`, without the anchor boxes and variances.
+            y_pred_without_anchors = y_pred[:, :, :-8]
+            for decoder in [decode_detections, decode_detections_batched, decode_detections_fast]:
+                kwargs = dict(input_coords=coords, img_height=300, img_width=300)
+                expected = decoder(y_pred, **kwargs)
+                decoded = decoder(y_pred_without_anchors, anchor_set=encoder.anchor_set, **kwargs)
+                for expected_item, decoded_item in zip(expected, decoded):
+                    self.assertTrue(np.array_equal(decoded_item, expected_item))
+        with self.assertRaises(ValueError):
+            decode_detections(y_pred[:, :-1], anchor_set=encoder.anchor_set, img_height=300, img_width=300)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+from ssd_encoder_decoder.matching_utils import match_bipartite_greedy
+import numpy as np
+import unittest
+
+
+def match_bipartite_greedy_by_rounds(weight_matrix):
+    # The matching of `match_bipartite_greedy()` as the rounds of `argmax` over the whole weight matrix.
+    weight_matrix = np.copy(weight_matrix)
+    matches = np.zeros(weight_matrix.shape[0], dtype=np.int64)
+    for _ in range(weight_matrix.shape[0]):
+        anchor_indices = np.argmax(weight_matrix, axis=1)
+        ground_truth_index = np.argmax(weight_matrix[np.arange(weight_matrix.shape[0]), anchor_indices])
+        matches[ground_truth_index] = anchor_indices[ground_truth_index]
+        weight_matrix[ground_truth_index] = 0
+        weight_matrix[:, anchor_indices[ground_truth_index]] = 0
+    return matches
+
+
+class test_match_bipartite_greedy(unittest.TestCase):
+
+    def assert_same_matches(self, weight_matrix):
+        matches = match_bipartite_greedy(weight_matrix)
+        self.assertTrue(matches.dtype == np.int64)
+        self.assertTrue(np.array_equal(matches, match_bipartite_greedy_by_rounds(weight_matrix)))
+
+    def test_same_as_rounds(self):
+        random_state = np.random.RandomState(0)
+        for m, n in [(1, 10), (5, 100), (20, 500), (50, 8732), (30, 30)]:
+            # Sparse weights as IoU similarities, most anchor boxes not overlapping a given ground truth box.
+            weight_matrix = random_state.uniform(size=(m, n)) * (random_state.uniform(size=(m, n)) < 0.05)
+            self.assert_same_matches(weight_matrix)
+
+    def test_ties(self):
+        random_state = np.random.RandomState(1)
+        for m, n in [(10, 20), (40, 60), (50, 8732)]:
+            # Few distinct weights, so that many pairs tie, and identical rows and columns.
+            weight_matrix = random_state.randint(0, 4, size=(m, n)) / 4
+            weight_matrix[1] = weight_matrix[0]
+            weight_matrix[:, 3] = weight_matrix[:, 2]
+            self.assert_same_matches(weight_matrix)
+            self.assert_same_matches(weight_matrix.astype(np.int64))
+
+    def test_not_positive_weights(self):
+        random_state = np.random.RandomState(2)
+        # Ground truth boxes without any overlap, and negative weights, are matched again to zeroed columns.
+        weight_matrix = random_state.uniform(size=(8, 50)) * (random_state.uniform(size=(8, 50)) < 0.1)
+        weight_matrix[[2, 5]] = 0
+        self.assert_same_matches(weight_matrix)
+        self.assert_same_matches(weight_matrix - 0.5)
+        self.assert_same_matches(np.zeros((4, 10)))
+        self.assert_same_matches(np.zeros((0, 10)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+from ssd_encoder_decoder.nms_utils import greedy_nms_indices
+from ssd_encoder_decoder.ssd_output_decoder import greedy_nms, _greedy_nms, _greedy_nms2
+from bounding_box_utils.bounding_box_utils import iou
+import numpy as np
+import unittest
+
+
+def greedy_nms_by_rounds(predictions, score_index, iou_threshold=0.45, coords='corners', border_pixels='half'):
+    # The greedy NMS of the decoders as the rounds of `argmax` and `np.delete` over the boxes left.
+    boxes_left = np.copy(predictions)
+    maxima = []
+    while boxes_left.shape[0] > 0:
+        maximum_index = np.argmax(boxes_left[:,score_index])
+        maximum_box = np.copy(boxes_left[maximum_index])
+        maxima.append(maximum_box)
+        boxes_left = np.delete(boxes_left, maximum_index, axis=0)
+        if boxes_left.shape[0] == 0: break
+        similarities = iou(boxes_left[:,score_index+1:], maximum_box[score_index+1:], coords=coords, mode='element-wise', border_pixels=border_pixels)
+        boxes_left = boxes_left[similarities <= iou_threshold]
+    return np.array(maxima)
+
+
+def random_predictions(random_state, n_boxes, n_scores=None):
+    # Rows `[score, xmin, ymin, xmax, ymax]` of boxes clustered around a few objects, as the decoded SSD predictions.
+    centers = random_state.uniform(0, 300, size=(max(n_boxes // 20, 1), 2))
+    box_centers = centers[random_state.randint(0, len(centers), n_boxes)] + random_state.normal(0, 10, size=(n_boxes, 2))
+    sizes = random_state.uniform(10, 100, size=(n_boxes, 2))
+    if n_scores is None:
+        scores = random_state.uniform(0.01, 1, size=n_boxes)
+    else:
+        scores = random_state.randint(1, n_scores + 1, size=n_boxes) / n_scores
+    return np.concatenate([scores[:,np.newaxis], box_centers - sizes / 2, box_centers + sizes / 2], axis=1)
+
+
+class test_greedy_nms_indices(unittest.TestCase):
+
+    def assert_same_maxima(self, predictions, **kwargs):
+        expected = greedy_nms_by_rounds(predictions, 0, **kwargs)
+        for block_size in [1, 7, 128, 10000]:
+            maxima = greedy_nms_indices(predictions[:,1:], predictions[:,0], block_size=block_size, **kwargs)
+            self.assertTrue(maxima.dtype == np.int64)
+            self.assertTrue(np.array_equal(predictions[maxima], expected))
+
+    def test_same_as_rounds(self):
+        random_state = np.random.RandomState(0)
+        for n_boxes in [1, 2, 10, 100, 1000]:
+            predictions = random_predictions(random_state, n_boxes)
+            self.assert_same_maxima(predictions)
+            self.assert_same_maxima(predictions, iou_threshold=0.7, border_pixels='include')
+            self.assert_same_maxima(predictions, iou_threshold=-0.1)
+
+    def test_ties(self):
+        random_state = np.random.RandomState(1)
+        for n_boxes in [10, 300]:
+            # Few distinct scores, and duplicated boxes.
+            predictions = random_predictions(random_state, n_boxes, n_scores=3)
+            predictions[1::3] = predictions[::3][:len(predictions[1::3])]
+            self.assert_same_maxima(predictions)
+
+    def test_degenerate_boxes(self):
+        random_state = np.random.RandomState(2)
+        # Boxes without area have undefined IoU similarities with each other.
+        predictions = random_predictions(random_state, 50)
+        predictions[::4, 3] = predictions[::4, 1]
+        self.assert_same_maxima(predictions)
+        self.assert_same_maxima(predictions, iou_threshold=0)
+        self.assert_same_maxima(predictions, iou_threshold=1)
+
+    def test_coords(self):
+        random_state = np.random.RandomState(3)
+        predictions = random_predictions(random_state, 200)
+        minmax = predictions[:, [0, 1, 3, 2, 4]]
+        self.assertTrue(np.array_equal(greedy_nms_indices(minmax[:,1:], minmax[:,0], coords='minmax'),
+                                       greedy_nms_indices(predictions[:,1:], predictions[:,0])))
+        self.assertEqual(len(greedy_nms_indices(np.zeros((0, 4)), np.zeros(0))), 0)
+
+    def test_groups(self):
+        random_state = np.random.RandomState(5)
+        for n_boxes in [1, 50, 1000]:
+            predictions = random_predictions(random_state, n_boxes, n_scores=10)
+            groups = random_state.randint(0, 7, size=n_boxes) * 3 # Not every group has boxes.
+            expected = [greedy_nms_by_rounds(predictions[groups == group], 0) for group in np.unique(groups)]
+            for block_size in [1, 7, 256]:
+                maxima = greedy_nms_indices(predictions[:,1:], predictions[:,0], block_size=block_size, groups=groups)
+                self.assertTrue(np.array_equal(predictions[maxima], np.concatenate(expected, axis=0)))
+            maxima = greedy_nms_indices(predictions[:,1:], predictions[:,0], iou_threshold=-0.1, groups=groups)
+            self.assertTrue(np.array_equal(np.unique(groups), groups[maxima]))
+
+    def test_decoder_nms(self):
+        random_state = np.random.RandomState(4)
+        predictions = random_predictions(random_state, 300)
+        self.assertTrue(np.array_equal(_greedy_nms(predictions), greedy_nms_by_rounds(predictions, 0)))
+        with_class_ids = np.concatenate([random_state.randint(1, 21, size=(300, 1)), predictions], axis=1)
+        self.assertTrue(np.array_equal(_greedy_nms2(with_class_ids), greedy_nms_by_rounds(with_class_ids, 1)))
+        nms = greedy_nms([with_class_ids, with_class_ids[:0], np.array([])])
+        self.assertTrue(np.array_equal(nms[0], greedy_nms_by_rounds(with_class_ids, 1)))
+        self.assertEqual(nms[1].shape, (0,))
+        self.assertEqual(nms[2].shape, (0,))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,204 @@
+from ssd_encoder_decoder.ssd_input_encoder import SSDInputEncoder, DegenerateBoxError
+from bounding_box_utils.bounding_box_utils import iou_batch
+import numpy as np
+import unittest
+
+
+def ssd300_encoder(**kwargs):
+    # The batched and indexed matching of the training scripts, unless the test asks for another one.
+    parameters = dict(img_height=300,
+                      img_width=300,
+                      n_classes=20,
+                      predictor_sizes=[(38, 38), (19, 19), (10, 10), (5, 5), (3, 3), (1, 1)],
+                      scales=[0.1, 0.2, 0.37, 0.54, 0.71, 0.88, 1.05],
+                      aspect_ratios_per_layer=[[1.0, 2.0, 0.5],
+                                               [1.0, 2.0, 0.5, 3.0, 1.0/3.0],
+                                               [1.0, 2.0, 0.5, 3.0, 1.0/3.0],
+                                               [1.0, 2.0, 0.5, 3.0, 1.0/3.0],
+                                               [1.0, 2.0, 0.5],
+                                               [1.0, 2.0, 0.5]],
+                      two_boxes_for_ar1=True,
+                      steps=[8, 16, 32, 64, 100, 300],
+                      offsets=[0.5, 0.5, 0.5, 0.5, 0.5, 0.5],
+                      variances=[0.1, 0.1, 0.2, 0.2],
+                      pos_iou_threshold=0.5,
+                      neg_iou_limit=0.5,
+                      batched=True,
+                      index_anchors=True)
+    parameters.update(kwargs)
+    return SSDInputEncoder(**parameters)
+
+
+def random_ground_truth(random_state, batch_size, max_boxes):
+    ground_truth = []
+    for _ in range(batch_size):
+        n_boxes = random_state.randint(0, max_boxes + 1)
+        xmin = random_state.randint(0, 290, n_boxes)
+        ymin = random_state.randint(0, 290, n_boxes)
+        xmax = np.minimum(xmin + random_state.randint(1, 300, n_boxes), 300)
+        ymax = np.minimum(ymin + random_state.randint(1, 300, n_boxes), 300)
+        class_id = random_state.randint(1, 21, n_boxes)
+        ground_truth.append(np.stack([class_id, xmin, ymin, xmax, ymax], axis=1))
+    return ground_truth
+
+
+def small_ground_truth(random_state, batch_size, max_boxes):
+    # Many small boxes, most of which have no anchor box above the thresholds.
+    ground_truth = []
+    for _ in range(batch_size):
+        n_boxes = random_state.randint(1, max_boxes + 1)
+        xmin = random_state.randint(0, 295, n_boxes)
+        ymin = random_state.randint(0, 295, n_boxes)
+        xmax = np.minimum(xmin + random_state.randint(1, 60, n_boxes), 300)
+        ymax = np.minimum(ymin + random_state.randint(1, 60, n_boxes), 300)
+        class_id = random_state.randint(1, 21, n_boxes)
+        ground_truth.append(np.stack([class_id, xmin, ymin, xmax, ymax], axis=1))
+    return ground_truth
+
+
+class test_SSDInputEncoder(unittest.TestCase):
+
+    def assert_same_encoding(self, ground_truth, **kwargs):
+        y_per_item = ssd300_encoder(batched=False, **kwargs)(ground_truth, diagnostics=True)
+        y_batched = ssd300_encoder(batched=True, **kwargs)(ground_truth, diagnostics=True)
+
+        for per_item, batched in zip(y_per_item, y_batched):
+            self.assertTrue(per_item.shape == batched.shape)
+            self.assertTrue(np.array_equal(per_item, batched))
+
+    def test_batched_same_as_per_item(self):
+        random_state = np.random.RandomState(0)
+        for batch_size, max_boxes in [(8, 3), (16, 10), (32, 40), (64, 2)]:
+            self.assert_same_encoding(random_ground_truth(random_state, batch_size, max_boxes))
+
+    def test_batched_same_as_per_item_options(self):
+        random_state = np.random.RandomState(1)
+        for kwargs in [dict(coords='corners'),
+                       dict(coords='minmax'),
+                       dict(matching_type='bipartite'),
+                       dict(border_pixels='include'),
+                       dict(neg_iou_limit=0.3),
+                       dict(clip_boxes=True),
+                       dict(normalize_coords=False, coords='corners')]:
+            self.assert_same_encoding(random_ground_truth(random_state, 8, 10), **kwargs)
+
+    def test_batched_same_as_per_item_ties(self):
+        random_state = np.random.RandomState(2)
+        ground_truth = random_ground_truth(random_state, 8, 5)
+        # Identical ground truth boxes have the same similarities with all the anchor boxes.
+        ground_truth = [np.concatenate([labels, labels]) for labels in ground_truth]
+        ground_truth.append(np.array([[1, 0, 0, 300, 300], [2, 0, 0, 300, 300], [3, 100, 100, 200, 200]]))
+        self.assert_same_encoding(ground_truth)
+
+    def test_anchor_index_same_as_all_anchors(self):
+        random_state = np.random.RandomState(5)
+        for kwargs in [dict(),
+                       dict(matching_type='bipartite'),
+                       dict(neg_iou_limit=0.3),
+                       dict(clip_boxes=True),
+                       dict(border_pixels='include', normalize_coords=False, coords='corners'),
+                       dict(coords='minmax')]:
+            ground_truth = small_ground_truth(random_state, 16, 30) + random_ground_truth(random_state, 16, 20)
+            y_indexed = ssd300_encoder(**kwargs)(ground_truth)
+            y_all_anchors = ssd300_encoder(index_anchors=False, **kwargs)(ground_truth)
+            self.assertTrue(np.array_equal(y_indexed, y_all_anchors))
+
+        self.assert_same_encoding(small_ground_truth(random_state, 8, 50))
+
+    def test_anchor_index_candidates(self):
+        random_state = np.random.RandomState(6)
+        encoder = ssd300_encoder(coords='corners')
+        _, valid, _, boxes = encoder._pad_labels(small_ground_truth(random_state, 4, 30), np.eye(21))
+        min_iou = random_state.uniform(0, 0.7, valid.shape)
+
+        items, ground_truth, anchors = encoder.anchor_index.candidates(boxes, valid, min_iou=min_iou)
+        candidates = np.zeros(valid.shape + (8732,), dtype=np.bool_)
+        candidates[items, ground_truth, anchors] = True
+
+        # Every anchor box that overlaps a box and reaches its `min_iou` is a candidate.
+        similarities = iou_batch(boxes, encoder.anchor_template[:, :4], coords='corners')
+        needed = valid[:, :, np.newaxis] & (similarities > 0) & (similarities >= min_iou[:, :, np.newaxis])
+        self.assertTrue(np.all(candidates[needed]))
+        self.assertTrue(len(items) == np.count_nonzero(candidates))
+
+    def test_per_item_by_default(self):
+        encoder = SSDInputEncoder(img_height=300, img_width=300, n_classes=20, predictor_sizes=[(38, 38), (19, 19)],
+                                  scales=[0.1, 0.2, 0.37], aspect_ratios_global=[1.0, 2.0, 0.5])
+        self.assertFalse(encoder.batched)
+        self.assertTrue(encoder.anchor_index is None)
+
+    def test_anchor_index_disabled(self):
+        self.assertTrue(ssd300_encoder().anchor_index is not None)
+        self.assertTrue(ssd300_encoder(index_anchors=False).anchor_index is None)
+        self.assertTrue(ssd300_encoder(neg_iou_limit=0).anchor_index is None)
+        self.assertTrue(ssd300_encoder(iou_dtype=np.float32).anchor_index is None)
+
+    def test_batched_without_ground_truth(self):
+        ground_truth = [np.zeros((0, 5)), np.zeros((0, 5))]
+        self.assert_same_encoding(ground_truth)
+
+        y_encoded = ssd300_encoder()(ground_truth)
+        self.assertTrue(np.all(y_encoded[:, :, 0] == 1))
+
+    def test_batched_degenerate_box(self):
+        ground_truth = [np.array([[1, 10, 10, 50, 50]]), np.array([[1, 10, 10, 50, 50], [2, 40, 10, 40, 50]])]
+
+        with self.assertRaises(DegenerateBoxError) as context:
+            ssd300_encoder()(ground_truth)
+        self.assertTrue("batch item 1" in str(context.exception))
+
+    def test_encoding_template(self):
+        encoder = ssd300_encoder()
+        template = encoder.generate_encoding_template(4)
+
+        # The anchor boxes of the predictor layers in the order of the model output, twice, then the variances.
+        anchor_boxes = np.concatenate([np.reshape(boxes, (-1, 4)) for boxes in encoder.boxes_list], axis=0)
+        self.assertTrue(template.shape == (4, 8732, 21 + 12))
+        self.assertTrue(np.all(template[:, :, :21] == 0))
+        self.assertTrue(np.all(template[:, :, -12:-8] == anchor_boxes))
+        self.assertTrue(np.all(template[:, :, -8:-4] == anchor_boxes))
+        self.assertTrue(np.all(template[:, :, -4:] == [0.1, 0.1, 0.2, 0.2]))
+
+    def test_float32_targets(self):
+        ground_truth = random_ground_truth(np.random.RandomState(3), 8, 10)
+        y_float64 = ssd300_encoder()(ground_truth)
+        y_float32 = ssd300_encoder(dtype=np.float32)(ground_truth)
+
+        self.assertTrue(y_float32.dtype == np.float32)
+        self.assertTrue(np.array_equal(y_float64[:, :, :21], y_float32[:, :, :21]))
+        self.assertTrue(np.allclose(y_float64, y_float32, atol=1e-4))
+
+    def test_buffer_ring(self):
+        random_state = np.random.RandomState(4)
+        encoder = ssd300_encoder(buffer_ring_size=2)
+        reference = ssd300_encoder()
+
+        batches = [random_ground_truth(random_state, batch_size, 10) for batch_size in (8, 8, 4, 16)]
+        y_encoded = [encoder(ground_truth) for ground_truth in batches[:3]]
+
+        # The first buffer is reused by the third batch.
+        self.assertTrue(np.shares_memory(y_encoded[0], y_encoded[2]))
+        self.assertTrue(np.array_equal(y_encoded[1], reference(batches[1])))
+        self.assertTrue(np.array_equal(y_encoded[2], reference(batches[2])))
+        self.assertTrue(np.array_equal(encoder(batches[3]), reference(batches[3])))
+
+    def test_sparse_targets(self):
+        random_state = np.random.RandomState(7)
+        ground_truth = random_ground_truth(random_state, 8, 10)
+        y_dense = ssd300_encoder()(ground_truth)
+        y_sparse = ssd300_encoder(sparse_targets=True)(ground_truth)
+
+        self.assertTrue(y_sparse.shape == (8, 8732, 5) and y_sparse.dtype == np.float16)
+        # The one-hot class vectors, all zeros for the neutral boxes, and the offsets of the positive boxes.
+        class_ids = y_sparse[:, :, 0].astype(np.int64)
+        self.assertTrue(np.array_equal(np.eye(21)[class_ids] * (class_ids >= 0)[:, :, np.newaxis], y_dense[:, :, :21]))
+        self.assertTrue(np.allclose(y_sparse[:, :, 1:], y_dense[:, :, -12:-8], rtol=1e-3, atol=1e-3))
+        self.assertTrue(np.all(y_sparse[class_ids <= 0][:, 1:] == 0))
+
+        encoder = ssd300_encoder(sparse_targets=True, sparse_dtype=np.float32, buffer_ring_size=2)
+        self.assertTrue(np.array_equal(encoder(ground_truth), ssd300_encoder(sparse_dtype=np.float32).sparse_encoding(y_dense)))
+        self.assertTrue(np.array_equal(encoder(ground_truth)[:, :, 1:], y_dense[:, :, -12:-8].astype(np.float32)))
+
+
+if __name__ == '__main__':
+    unittest.main()
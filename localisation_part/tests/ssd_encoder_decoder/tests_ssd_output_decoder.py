@@ -0,0 +1,69 @@
+from ssd_encoder_decoder.ssd_output_decoder import decode_detections, decode_detections_batched
+from tests.ssd_encoder_decoder.tests_ssd_input_encoder import ssd300_encoder, random_ground_truth
+import numpy as np
+import unittest
+
+
+def random_model_output(random_state, batch_size, max_boxes, encoder=None):
+    # The encoded random ground truth with softmax confidences around the one-hot classes and noisy offsets, as the
+    # output of a trained model: a few confident boxes around each object and many low confidences elsewhere.
+    if encoder is None:
+        encoder = ssd300_encoder()
+    y_pred = encoder(random_ground_truth(random_state, batch_size, max_boxes)).astype(np.float64)
+    n_classes = y_pred.shape[-1] - 12
+    logits = 6 * y_pred[:, :, :n_classes] + random_state.normal(0, 1.5, size=y_pred[:, :, :n_classes].shape)
+    logits[:, :, 0] += 3
+    confidences = np.exp(logits - np.amax(logits, axis=-1, keepdims=True))
+    y_pred[:, :, :n_classes] = confidences / np.sum(confidences, axis=-1, keepdims=True)
+    y_pred[:, :, -12:-8] += random_state.normal(0, 0.1, size=y_pred[:, :, -12:-8].shape)
+    return y_pred
+
+
+class test_decode_detections_batched(unittest.TestCase):
+
+    def assert_same_decoding(self, y_pred, **kwargs):
+        expected = decode_detections(y_pred, img_height=300, img_width=300, **kwargs)
+        decoded = decode_detections_batched(y_pred, img_height=300, img_width=300, **kwargs)
+        self.assertEqual(len(decoded), len(expected))
+        for expected_item, decoded_item in zip(expected, decoded):
+            self.assertEqual(decoded_item.shape, expected_item.shape)
+            self.assertTrue(np.array_equal(decoded_item, expected_item))
+
+    def test_same_as_per_class(self):
+        random_state = np.random.RandomState(0)
+        y_pred = random_model_output(random_state, 4, 10)
+        self.assert_same_decoding(y_pred)
+        self.assert_same_decoding(y_pred, confidence_thresh=0.1, iou_threshold=0.6, top_k=20, border_pixels='include')
+        self.assert_same_decoding(y_pred, confidence_thresh=0.5, top_k='all')
+        self.assert_same_decoding(y_pred.astype(np.float32))
+
+    def test_same_as_per_class_coords(self):
+        random_state = np.random.RandomState(1)
+        for coords in ['minmax', 'corners']:
+            y_pred = random_model_output(random_state, 2, 10, encoder=ssd300_encoder(coords=coords))
+            self.assert_same_decoding(y_pred, input_coords=coords)
+
+    def test_without_detections(self):
+        random_state = np.random.RandomState(2)
+        y_pred = random_model_output(random_state, 3, 10)
+        y_pred[1, :, 1:-12] = 0
+        self.assert_same_decoding(y_pred, confidence_thresh=0.3)
+        self.assert_same_decoding(y_pred, confidence_thresh=1)
+
+    def test_pre_nms_top_k(self):
+        random_state = np.random.RandomState(3)
+        y_pred = random_model_output(random_state, 2, 10)
+        decoded = decode_detections_batched(y_pred, top_k='all', img_height=300, img_width=300)
+        decoded_top_k = decode_detections_batched(y_pred, top_k='all', pre_nms_top_k=5, img_height=300, img_width=300)
+        decoded_1 = decode_detections_batched(y_pred, top_k='all', pre_nms_top_k=1, img_height=300, img_width=300)
+        for item, item_top_k, item_1 in zip(decoded, decoded_top_k, decoded_1):
+            for class_id in np.unique(item[:, 0]):
+                # The best box of each class is always kept, and no more boxes than without the pre-NMS top-k.
+                class_item, class_item_top_k = item[item[:, 0] == class_id], item_top_k[item_top_k[:, 0] == class_id]
+                self.assertTrue(1 <= len(class_item_top_k) <= min(len(class_item), 5))
+                self.assertTrue(np.array_equal(class_item_top_k[0], class_item[0]))
+            self.assertTrue(np.array_equal(item_1, item[np.r_[True, item[1:, 0] != item[:-1, 0]]]))
+
+
+if __name__ == '__main__':
+    unittest.main()
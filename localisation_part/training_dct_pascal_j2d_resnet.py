@@ -8,6 +8,11 @@ from argparse import ArgumentParser
 parser = ArgumentParser(description="Script to train the SSD Resnet on the pascal voc dataset.")
 parser.add_argument("--weights", default=None, help="The weights to load into the model")
 parser.add_argument("-vd", "--visible_device", help="The device to use when training with the GPU", default="-1")
+parser.add_argument("-w", "--workers", help="The number of workers building the batches, threads or processes with --use_multiprocessing", type=int, default=1)
+parser.add_argument("--use_multiprocessing", help="Build the batches in processes instead of threads", action="store_true")
+parser.add_argument("--map_period", help="Compute the VOC mAP on a validation subset every this many epochs, 0 to disable it", type=int, default=0)
+parser.add_argument("--map_images", help="The number of validation images on which the mAP is computed", type=int, default=512)
+parser.add_argument("--monitor", help="The quantity that selects the checkpoints to save", choices=["val_loss", "val_mAP"], default="val_loss")
 parser.add_argument("--restart", default=None, help="Wether the simulation starts from a previous save")
 
 parser.add_argument("--archi", help="""The network architecture to use, value can be :\n
@@ -36,6 +41,9 @@ regularizer.add_argument("--no_reg", action="store_true")
 
 args = parser.parse_args()
 
+if args.monitor == "val_mAP" and args.map_period <= 0:
+    parser.error("--monitor val_mAP needs a positive --map_period.")
+
 os.environ["CUDA_VISIBLE_DEVICES"]=args.visible_device
 if "LOCAL_WORK_DIR" not in os.environ:
     os.environ["LOCAL_WORK_DIR"] = "./" + os.environ["CUDA_VISIBLE_DEVICES"]
@@ -71,6 +79,7 @@ from keras_loss_function.keras_ssd_loss import SSDLoss
 from ssd_encoder_decoder.ssd_input_encoder import SSDInputEncoder
 
 from data_generator.object_detection_2d_data_generator_dct_j2d import DataGeneratorDCT
+from data_generator.object_detection_2d_data_sequence_dct_j2d import DataSequenceDCT
 
 from data_generator.object_detection_2d_geometric_ops import Resize
 from data_generator.object_detection_2d_photometric_ops import ConvertTo3Channels
@@ -78,6 +87,8 @@ from data_generator.object_detection_2d_photometric_ops import ConvertTo3Channel
 from data_generator.data_augmentation_chain_original_ssd import SSDDataAugmentation
 from data_generator.data_augmentation_chain_original_ssd_no_crop import SSDDataAugmentationNoCrop
 
+from eval_utils.average_precision_callback import ValidationMeanAveragePrecision
+
 
 from keras_layers.keras_layer_L2Normalization import L2Normalization
 
@@ -262,26 +273,30 @@ ssd_input_encoder = SSDInputEncoder(img_height=img_height,
                                     matching_type='multi',
                                     pos_iou_threshold=0.5,
                                     neg_iou_limit=0.5,
-                                    normalize_coords=normalize_coords)
+                                    normalize_coords=normalize_coords,
+                                    batched=True,
+                                    index_anchors=True)
 
 # 6: Create the generator handles that will be passed to Keras' `fit_generator()` function.
 
-train_generator = train_dataset.generate(batch_size=batch_size,
-                                         shuffle=True,
-                                         transformations=[ssd_data_augmentation],
-                                         label_encoder=ssd_input_encoder,
-                                         returns={'processed_images',
-                                                  'encoded_labels'},
-                                         keep_images_without_gt=False, deconv=deconv)
-
-val_generator = val_dataset.generate(batch_size=batch_size,
-                                     shuffle=False,
-                                     transformations=[convert_to_3_channels,
-                                                      resize],
-                                     label_encoder=ssd_input_encoder,
-                                     returns={'processed_images',
-                                              'encoded_labels'},
-                                     keep_images_without_gt=False, deconv=deconv)
+train_generator = DataSequenceDCT(train_dataset,
+                                  batch_size=batch_size,
+                                  shuffle=True,
+                                  transformations=[ssd_data_augmentation],
+                                  label_encoder=ssd_input_encoder,
+                                  returns={'processed_images',
+                                           'encoded_labels'},
+                                  keep_images_without_gt=False, deconv=deconv)
+
+val_generator = DataSequenceDCT(val_dataset,
+                                batch_size=batch_size,
+                                shuffle=False,
+                                transformations=[convert_to_3_channels,
+                                                 resize],
+                                label_encoder=ssd_input_encoder,
+                                returns={'processed_images',
+                                         'encoded_labels'},
+                                keep_images_without_gt=False, deconv=deconv)
 
 # Get the number of samples in the training and validations datasets.
 train_dataset_size = train_dataset.get_dataset_size()
@@ -299,11 +314,11 @@ tensorboard = TensorBoard(log_dir=os.path.join(os.environ["LOCAL_WORK_DIR"],'./l
 # Define model callbacks.
 
 model_checkpoint = ModelCheckpoint(filepath=os.path.join(os.environ["EXPERIMENTS_OUTPUT_DIRECTORY"], 'ssd300_pascal_07+12_epoch-{epoch:02d}_loss-{loss:.4f}_val_loss-{val_loss:.4f}.h5'),
-                                   monitor='val_loss',
+                                   monitor=args.monitor,
                                    verbose=1,
                                    save_best_only=True,
                                    save_weights_only=False,
-                                   mode='auto',
+                                   mode='max' if args.monitor == 'val_mAP' else 'auto',
                                    period=1)
 
 csv_logger = CSVLogger(filename=os.path.join(os.environ["EXPERIMENTS_OUTPUT_DIRECTORY"], 'ssd300_pascal_07+12_training_log.csv'),
@@ -319,6 +334,28 @@ callbacks = [model_checkpoint,
              tensorboard,
              early_stop]
 
+if args.map_period > 0:
+    # The batches of the validation images in their original coordinates for the mAP, with the images without objects.
+    map_generator = DataSequenceDCT(val_dataset,
+                                    batch_size=batch_size,
+                                    shuffle=False,
+                                    transformations=[convert_to_3_channels,
+                                                     resize],
+                                    returns={'processed_images',
+                                             'image_ids',
+                                             'inverse_transform'},
+                                    keep_images_without_gt=True, deconv=deconv)
+
+    validation_map = ValidationMeanAveragePrecision(map_generator,
+                                                    val_dataset,
+                                                    n_classes=n_classes,
+                                                    img_height=img_height,
+                                                    img_width=img_width,
+                                                    n_batches=ceil(args.map_images/batch_size),
+                                                    period=args.map_period)
+    # The mAP must be in the logs before the other callbacks read them.
+    callbacks.insert(0, validation_map)
+
 # If you're resuming a previous training, set `initial_epoch` and `final_epoch` accordingly.
 if args.restart:
     initial_epoch = int(args.restart.split("-")[1].split("_")[0])
@@ -333,4 +370,6 @@ history = model.fit_generator(generator=train_generator,
                               callbacks=callbacks,
                               validation_data=val_generator,
                               validation_steps=ceil(val_dataset_size/batch_size),
-                              initial_epoch=initial_epoch)
+                              initial_epoch=initial_epoch,
+                              workers=args.workers,
+                              use_multiprocessing=args.use_multiprocessing)